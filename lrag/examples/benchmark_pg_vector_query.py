@@ -0,0 +1,153 @@
+"""
+Benchmark PGVectorStorage queries on a local PostgreSQL with pgvector.
+
+Upserts random entity vectors into a separate workspace, then compares the former
+query (similarity computed for every row of the workspace, joined through the
+chunks, embedding inlined as a text literal) with PGVectorStorage.query, which
+orders by distance with a bound vector so the HNSW index can be used. Recall is
+measured against the exact top_k of the former query.
+
+The connection settings are read from the POSTGRES_* environment variables or
+config.ini, like the LightRAG server. The benchmark workspace is dropped at the end.
+
+Usage:
+    python benchmark_pg_vector_query.py --entities 100000 --dim 1024 --queries 50 --top-k 60
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+os.environ["POSTGRES_WORKSPACE"] = "benchmark_vector_query"
+
+from lightrag.kg.postgres_impl import PGVectorStorage  # noqa: E402
+from lightrag.utils import EmbeddingFunc  # noqa: E402
+
+LEGACY_ENTITIES_SQL = """
+    WITH relevant_chunks AS (
+        SELECT id as chunk_id
+        FROM LIGHTRAG_DOC_CHUNKS
+        WHERE $2::varchar[] IS NULL OR full_doc_id = ANY($2::varchar[])
+    )
+    SELECT entity_name FROM
+        (
+            SELECT e.id, e.entity_name, 1 - (e.content_vector <=> '[{embedding_string}]'::vector) as distance
+            FROM LIGHTRAG_VDB_ENTITY e
+            JOIN relevant_chunks c ON c.chunk_id = ANY(e.chunk_ids)
+            WHERE e.workspace=$1
+        ) as chunk_distances
+        WHERE distance>$3
+        ORDER BY distance DESC
+        LIMIT $4
+"""
+
+
+async def main(args):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.entities, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    lookup = {f"entity {i}": vectors[i] for i in range(args.entities)}
+    lookup.update({f"query {i}": queries[i] for i in range(args.queries)})
+
+    async def embed(texts: list[str]) -> np.ndarray:
+        return np.array([lookup[text] for text in texts])
+
+    embedding_func = EmbeddingFunc(
+        embedding_dim=args.dim, max_token_size=8192, func=embed
+    )
+    chunks = PGVectorStorage(
+        namespace="chunks",
+        global_config={
+            "embedding_batch_num": 1024,
+            "vector_db_storage_cls_kwargs": {"cosine_better_than_threshold": -1.0},
+        },
+        embedding_func=embedding_func,
+    )
+    entities = PGVectorStorage(
+        namespace="entities",
+        global_config={
+            "embedding_batch_num": 1024,
+            "vector_db_storage_cls_kwargs": {"cosine_better_than_threshold": -1.0},
+        },
+        embedding_func=embedding_func,
+    )
+    await chunks.initialize()
+    await entities.initialize()
+    db = entities.db
+    try:
+        # Every entity is referenced by one of 1000 chunks
+        chunk_count = min(1000, args.entities)
+        await chunks.upsert(
+            {
+                f"chunk-{i}": {
+                    "content": f"entity {i}",
+                    "tokens": 1,
+                    "chunk_order_index": i,
+                    "full_doc_id": f"doc-{i % 10}",
+                    "file_path": "benchmark",
+                }
+                for i in range(chunk_count)
+            }
+        )
+        start = time.perf_counter()
+        await entities.upsert(
+            {
+                f"ent-{i}": {
+                    "content": f"entity {i}",
+                    "entity_name": f"entity {i}",
+                    "source_id": f"chunk-{i % chunk_count}",
+                    "file_path": "benchmark",
+                }
+                for i in range(args.entities)
+            }
+        )
+        # Includes maintaining the HNSW index created by initialize()
+        print(f"upsert {args.entities} entities: {time.perf_counter() - start:.2f}s")
+
+        legacy_time = indexed_time = 0.0
+        recall = []
+        for i in range(args.queries):
+            embedding_string = ",".join(map(str, queries[i]))
+            start = time.perf_counter()
+            expected = await db.query(
+                LEGACY_ENTITIES_SQL.format(embedding_string=embedding_string),
+                {
+                    "workspace": db.workspace,
+                    "doc_ids": None,
+                    "better_than_threshold": -1.0,
+                    "top_k": args.top_k,
+                },
+                multirows=True,
+            )
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = await entities.query(f"query {i}", top_k=args.top_k)
+            indexed_time += time.perf_counter() - start
+
+            expected_names = {row["entity_name"] for row in expected}
+            found_names = {row["entity_name"] for row in results}
+            recall.append(
+                len(expected_names & found_names) / max(len(expected_names), 1)
+            )
+
+        print(f"former query: {legacy_time / args.queries * 1000:.1f} ms/query")
+        print(f"HNSW query:   {indexed_time / args.queries * 1000:.1f} ms/query")
+        print(f"recall@{args.top_k}: {np.mean(recall):.3f}")
+    finally:
+        await entities.drop()
+        await chunks.drop()
+        await entities.finalize()
+        await chunks.finalize()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entities", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=60)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,138 @@
+"""
+Benchmark reads of shared KV namespaces across worker processes.
+
+Compares reading records through the Manager dict proxy (one IPC round-trip per
+lookup) with reading them from the process local NamespaceReplica, while one
+worker keeps writing to the namespace. Every read fetches a batch of ids under
+the namespace reader lock, like JsonKVStorage.get_by_ids.
+
+Usage:
+    python benchmark_shared_kv.py --workers 8 --records 10000 --reads 5000 --batch 20
+"""
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import random
+import time
+
+from lightrag.kg.shared_storage import (
+    initialize_share_data,
+    finalize_share_data,
+    get_namespace_lock,
+    get_namespace_data,
+    get_namespace_replica,
+)
+
+NAMESPACE = "benchmark_kv"
+
+
+def make_record(i: int) -> dict:
+    return {
+        "content": f"chunk content {i} " * 20,
+        "tokens": 120,
+        "chunk_order_index": i,
+    }
+
+
+async def read_worker(mode: str, records: int, reads: int, batch: int, results) -> None:
+    batches = [
+        [f"chunk-{random.randrange(records)}" for _ in range(batch)]
+        for _ in range(reads)
+    ]
+    storage_lock = get_namespace_lock(NAMESPACE)
+
+    start = time.perf_counter()
+    if mode == "proxy":
+        data = await get_namespace_data(NAMESPACE)
+        for keys in batches:
+            async with storage_lock.reader():
+                [data.get(key) for key in keys]
+    else:
+        replica = await get_namespace_replica(NAMESPACE)
+        for keys in batches:
+            async with storage_lock.reader():
+                await replica.sync()
+                [replica.data.get(key) for key in keys]
+    results.append(time.perf_counter() - start)
+
+
+async def write_worker(records: int, writes: int) -> None:
+    storage_lock = get_namespace_lock(NAMESPACE)
+    replica = await get_namespace_replica(NAMESPACE)
+    for i in range(writes):
+        key = f"chunk-{random.randrange(records)}"
+        async with storage_lock.writer():
+            await replica.upsert({key: make_record(i)})
+        await asyncio.sleep(0.001)
+
+
+def run_reader(mode: str, records: int, reads: int, batch: int, results) -> None:
+    asyncio.run(read_worker(mode, records, reads, batch, results))
+
+
+def run_writer(records: int, writes: int) -> None:
+    asyncio.run(write_worker(records, writes))
+
+
+async def load_namespace(records: int) -> None:
+    replica = await get_namespace_replica(NAMESPACE)
+    async with get_namespace_lock(NAMESPACE).writer():
+        await replica.load({f"chunk-{i}": make_record(i) for i in range(records)})
+
+
+def benchmark(
+    mode: str, workers: int, records: int, reads: int, batch: int, writes: int
+) -> None:
+    ctx = mp.get_context("fork")
+    results = ctx.Manager().list()
+    writer = ctx.Process(target=run_writer, args=(records, writes))
+    readers = [
+        ctx.Process(target=run_reader, args=(mode, records, reads, batch, results))
+        for _ in range(workers)
+    ]
+
+    start = time.perf_counter()
+    writer.start()
+    for p in readers:
+        p.start()
+    for p in readers + [writer]:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    total_reads = workers * reads
+    print(
+        f"{mode:>8}: {total_reads} reads of {batch} ids by {workers} workers in {elapsed:.2f}s, "
+        f"{total_reads / elapsed:,.0f} reads/s, "
+        f"slowest worker {max(results):.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    # Shared data must be initialized before forking, as gunicorn does
+    initialize_share_data(workers=args.workers + 1)
+    try:
+        asyncio.run(load_namespace(args.records))
+        for mode in ("proxy", "replica"):
+            benchmark(
+                mode,
+                args.workers,
+                args.records,
+                args.reads,
+                args.batch,
+                args.writes,
+            )
+    finally:
+        finalize_share_data()
+
+
+if __name__ == "__main__":
+    main()
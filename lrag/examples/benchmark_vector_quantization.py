@@ -0,0 +1,132 @@
+"""
+Benchmark the int8 search mode of NanoVectorDBStorage and FaissVectorDBStorage.
+
+Upserts a synthetic dataset (vectors drawn around random cluster centers, like the
+embeddings of related entities) into each storage, once with float search and once
+with VECTOR_QUANTIZATION=int8, then reports the memory of the search structures,
+the query latency and the recall@k against the exact float top_k.
+
+Memory is the resident matrix searched by NanoVectorDBStorage (the int8 codes, the
+float matrix is mapped from a temporary file in int8 mode), and the serialized
+Faiss index for FaissVectorDBStorage. The metadata of the records, which
+both storages keep in any mode, is not included.
+
+Usage:
+    python benchmark_vector_quantization.py --vectors 30000 --dim 768 --queries 100 --top-k 60
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from lightrag.kg.faiss_impl import FaissVectorDBStorage
+from lightrag.kg.nano_vector_db_impl import NanoVectorDBStorage
+from lightrag.kg.shared_storage import finalize_share_data, initialize_share_data
+from lightrag.utils import EmbeddingFunc
+
+
+def make_dataset(args) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    assignment = rng.integers(0, args.clusters, args.vectors + args.queries)
+    points = centers[assignment] + 0.5 * rng.standard_normal(
+        (args.vectors + args.queries, args.dim), dtype=np.float32
+    )
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points[: args.vectors], points[args.vectors :]
+
+
+def search_memory(storage) -> int:
+    if isinstance(storage, FaissVectorDBStorage):
+        return len(faiss.serialize_index(storage._index))
+    if storage._quantization:
+        # The float matrix is mapped from a temporary file
+        return storage._get_int8_matrix(storage._client).nbytes
+    return getattr(storage._client, "_NanoVectorDB__storage")["matrix"].nbytes
+
+
+async def run(storage_cls, quantization, args, vectors, queries, expected):
+    lookup = {f"vector {i}": vectors[i] for i in range(len(vectors))}
+    lookup.update({f"query {i}": queries[i] for i in range(len(queries))})
+
+    async def embed(texts: list[str]) -> np.ndarray:
+        return np.array([lookup[text] for text in texts])
+
+    with tempfile.TemporaryDirectory() as working_dir:
+        storage = storage_cls(
+            namespace=f"benchmark_{quantization or 'float'}",
+            global_config={
+                "working_dir": working_dir,
+                "embedding_batch_num": 1024,
+                "vector_db_storage_cls_kwargs": {
+                    "cosine_better_than_threshold": -1.0,
+                    "quantization": quantization,
+                    "rescore_factor": args.rescore_factor,
+                },
+            },
+            embedding_func=EmbeddingFunc(
+                embedding_dim=args.dim, max_token_size=8192, func=embed
+            ),
+        )
+        await storage.initialize()
+        start = time.perf_counter()
+        for batch in range(0, len(vectors), args.batch_size):
+            await storage.upsert(
+                {
+                    f"vec-{i}": {"content": f"vector {i}"}
+                    for i in range(batch, min(batch + args.batch_size, len(vectors)))
+                }
+            )
+        upsert_time = time.perf_counter() - start
+
+        # The first query builds the int8 codes of NanoVectorDBStorage
+        await storage.query("query 0", top_k=args.top_k)
+        start = time.perf_counter()
+        recall = []
+        for i in range(len(queries)):
+            results = await storage.query(f"query {i}", top_k=args.top_k)
+            found = {int(r["id"].split("-")[1]) for r in results}
+            recall.append(len(found & expected[i]) / args.top_k)
+        query_time = (time.perf_counter() - start) / len(queries)
+
+        print(
+            f"{storage_cls.__name__:22} {quantization or 'float':6} "
+            f"memory {search_memory(storage) / 2**20:8.1f} MiB  "
+            f"upsert {upsert_time:6.1f}s  query {query_time * 1000:7.2f} ms  "
+            f"recall@{args.top_k} {np.mean(recall):.3f}"
+        )
+
+
+async def main(args):
+    vectors, queries = make_dataset(args)
+    scores = queries @ vectors.T
+    expected = [
+        set(np.argpartition(row, -args.top_k)[-args.top_k :].tolist()) for row in scores
+    ]
+    for storage_cls in (NanoVectorDBStorage, FaissVectorDBStorage):
+        for quantization in ("", "int8"):
+            await run(storage_cls, quantization, args, vectors, queries, expected)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=30000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=60)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    os.environ.pop("VECTOR_QUANTIZATION", None)
+    initialize_share_data()
+    try:
+        asyncio.run(main(args))
+    finally:
+        finalize_share_data()
@@ -0,0 +1,100 @@
+"""
+Benchmark BaseVectorStorage.query_batch against one query call per query.
+
+Upserts random vectors into NanoVectorDBStorage and FaissVectorDBStorage, then
+runs the same queries one by one and with query_batch. The embedding function
+sleeps --embed-latency-ms per call to stand in for a remote embedding API, the
+number of calls made by each variant is reported with the throughput.
+
+Usage:
+    python benchmark_vector_query_batch.py --vectors 50000 --dim 768 --queries 256 --top-k 60
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+
+from lightrag.kg.faiss_impl import FaissVectorDBStorage
+from lightrag.kg.nano_vector_db_impl import NanoVectorDBStorage
+from lightrag.kg.shared_storage import finalize_share_data, initialize_share_data
+from lightrag.utils import EmbeddingFunc
+
+
+async def run(storage_cls, args, vectors, queries):
+    lookup = {f"vector {i}": vectors[i] for i in range(len(vectors))}
+    lookup.update({f"query {i}": queries[i] for i in range(len(queries))})
+    calls = 0
+
+    async def embed(texts: list[str]) -> np.ndarray:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(args.embed_latency_ms / 1000)
+        return np.array([lookup[text] for text in texts])
+
+    with tempfile.TemporaryDirectory() as working_dir:
+        storage = storage_cls(
+            namespace="benchmark_query_batch",
+            global_config={
+                "working_dir": working_dir,
+                "embedding_batch_num": args.embedding_batch_num,
+                "vector_db_storage_cls_kwargs": {"cosine_better_than_threshold": -1.0},
+            },
+            embedding_func=EmbeddingFunc(
+                embedding_dim=args.dim, max_token_size=8192, func=embed
+            ),
+        )
+        await storage.initialize()
+        await storage.upsert(
+            {f"vec-{i}": {"content": f"vector {i}"} for i in range(len(vectors))}
+        )
+        texts = [f"query {i}" for i in range(len(queries))]
+
+        calls = 0
+        start = time.perf_counter()
+        single = [await storage.query(text, top_k=args.top_k) for text in texts]
+        single_time, single_calls = time.perf_counter() - start, calls
+
+        calls = 0
+        start = time.perf_counter()
+        batched = await storage.query_batch(texts, top_k=args.top_k)
+        batch_time, batch_calls = time.perf_counter() - start, calls
+
+        # Scores of a matrix product may differ in the last bits, compare the sets
+        same = all(
+            {r["id"] for r in a} == {r["id"] for r in b}
+            for a, b in zip(single, batched)
+        )
+        print(
+            f"{storage_cls.__name__:22} "
+            f"query: {len(texts) / single_time:8.1f} q/s ({single_calls} embedding calls)  "
+            f"query_batch: {len(texts) / batch_time:8.1f} q/s ({batch_calls} embedding calls)  "
+            f"same results: {same}"
+        )
+
+
+async def main(args):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    for storage_cls in (NanoVectorDBStorage, FaissVectorDBStorage):
+        await run(storage_cls, args, vectors, queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=60)
+    parser.add_argument("--embed-latency-ms", type=float, default=20)
+    parser.add_argument("--embedding-batch-num", type=int, default=256)
+    args = parser.parse_args()
+
+    initialize_share_data()
+    try:
+        asyncio.run(main(args))
+    finally:
+        finalize_share_data()
@@ -1,6 +1,7 @@
-import networkx as nx
+from lightrag.kg.networkx_impl import NetworkXStorage
 
-G = nx.read_graphml("./dickensTestEmbedcall/graph_chunk_entity_relation.graphml")
+# Load the graph persisted in the working directory (snapshot and mutation log)
+G = NetworkXStorage.load_working_dir_graph("./dickensTestEmbedcall")
 
 
 def get_all_edges_and_nodes(G):
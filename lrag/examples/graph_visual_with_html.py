@@ -5,12 +5,13 @@ if not pm.is_installed("pyvis"):
 if not pm.is_installed("networkx"):
     pm.install("networkx")
 
-import networkx as nx
 from pyvis.network import Network
 import random
 
-# Load the GraphML file
-G = nx.read_graphml("./dickens/graph_chunk_entity_relation.graphml")
+from lightrag.kg.networkx_impl import NetworkXStorage
+
+# Load the graph persisted in the working directory (snapshot and mutation log)
+G = NetworkXStorage.load_working_dir_graph("./dickens")
 
 # Create a Pyvis network
 net = Network(height="100vh", notebook=True)
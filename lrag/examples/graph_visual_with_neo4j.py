@@ -1,5 +1,6 @@
 import os
 import json
+from lrag.lightrag.kg.networkx_impl import NetworkXStorage
 from lrag.lightrag.utils import xml_to_json
 from neo4j import GraphDatabase
 
@@ -43,6 +44,13 @@ def main():
     xml_file = os.path.join(WORKING_DIR, "graph_chunk_entity_relation.graphml")
     json_file = os.path.join(WORKING_DIR, "graph_data.json")
 
+    # The graph is persisted as a snapshot and mutation log, export it as GraphML
+    graph = NetworkXStorage.load_working_dir_graph(WORKING_DIR)
+    if graph is None:
+        print(f"Error: No graph found in {WORKING_DIR}")
+        return
+    NetworkXStorage.write_nx_graph(graph, xml_file)
+
     # Convert XML to JSON
     json_data = convert_xml_to_json(xml_file, json_file)
     if json_data is None:
@@ -222,6 +222,13 @@ def parse_args() -> argparse.Namespace:
         help="Enable automatic scanning when the program starts",
     )
 
+    parser.add_argument(
+        "--watch-input-dir",
+        action="store_true",
+        default=get_env_value("WATCH_INPUT_DIR", False, bool),
+        help="Index new, changed or deleted files of the input directory as they change",
+    )
+
     # Server workers configuration
     parser.add_argument(
         "--workers",
@@ -305,6 +312,18 @@ def parse_args() -> argparse.Namespace:
     # Select Document loading tool (DOCLING, DEFAULT)
     args.document_loading_engine = get_env_value("DOCUMENT_LOADING_ENGINE", "DEFAULT")
 
+    # Document parsing worker pool: processes, timeout per file in seconds, and
+    # number of parsed documents enqueued together
+    args.document_parse_workers = get_env_value("DOCUMENT_PARSE_WORKERS", 2, int)
+    args.document_parse_timeout = get_env_value("DOCUMENT_PARSE_TIMEOUT", 300, int)
+    args.document_enqueue_batch = get_env_value("DOCUMENT_ENQUEUE_BATCH", 20, int)
+    # Uploads up to this many bytes are parsed from memory instead of a file
+    args.document_spool_threshold = get_env_value(
+        "DOCUMENT_SPOOL_THRESHOLD", 4 * 1024 * 1024, int
+    )
+    # Seconds between two garbage collections of orphaned records, 0 to disable
+    args.gc_interval = get_env_value("GC_INTERVAL", 0, int)
+
     # Add environment variables that were previously read directly
     args.cors_origins = get_env_value("CORS_ORIGINS", "*")
     args.summary_language = get_env_value("SUMMARY_LANGUAGE", "en")
@@ -0,0 +1,298 @@
+"""
+Parsing of uploaded and scanned documents in a pool of worker processes.
+
+Extracting the text of PDF, DOCX, PPTX and XLSX files is CPU bound and used to run
+in the event loop of the API server, blocking every other request of the worker
+for the duration of a large file. DocumentParser runs the extractors in a process
+pool instead:
+
+- at most DOCUMENT_PARSE_WORKERS files are parsed at once, others wait their turn
+- a file taking longer than DOCUMENT_PARSE_TIMEOUT seconds is abandoned and the
+  pool is restarted, which stops its worker process
+- extractors read the file from disk page by page (sheet row by row) instead of
+  loading the whole file in memory, only the extracted text is sent back
+- small uploads are parsed from the received bytes without being written to disk,
+  text files directly in the server process
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Union
+
+import pipmaster as pm
+
+from lightrag.utils import logger
+
+TEXT_EXTENSIONS = (
+    ".txt",
+    ".md",
+    ".html",
+    ".htm",
+    ".tex",
+    ".json",
+    ".xml",
+    ".yaml",
+    ".yml",
+    ".rtf",
+    ".odt",
+    ".epub",
+    ".csv",
+    ".log",
+    ".conf",
+    ".ini",
+    ".properties",
+    ".sql",
+    ".bat",
+    ".sh",
+    ".c",
+    ".cpp",
+    ".py",
+    ".java",
+    ".js",
+    ".ts",
+    ".swift",
+    ".go",
+    ".rb",
+    ".php",
+    ".css",
+    ".scss",
+    ".less",
+)
+
+
+# A path to read the file from, or a stream over its received bytes
+Source = Union[str, BinaryIO]
+
+
+class DocumentParseError(Exception):
+    """The content of a file cannot be extracted"""
+
+
+def _extract_text(source: Source) -> Iterator[str]:
+    try:
+        if isinstance(source, str):
+            with open(source, encoding="utf-8") as f:
+                content = f.read()
+        else:
+            content = source.read().decode("utf-8")
+    except UnicodeDecodeError:
+        raise DocumentParseError(
+            "File is not valid UTF-8 encoded text. Please convert it to UTF-8 before processing."
+        )
+    if not content.strip():
+        raise DocumentParseError("Empty content")
+    # Check if content looks like binary data string representation
+    if content.startswith("b'") or content.startswith('b"'):
+        raise DocumentParseError(
+            "File appears to contain binary data representation instead of text"
+        )
+    yield content
+
+
+def _extract_pdf(source: Source) -> Iterator[str]:
+    if not pm.is_installed("pypdf2"):  # type: ignore
+        pm.install("pypdf2")
+    from PyPDF2 import PdfReader  # type: ignore
+
+    # PdfReader reads the pages of a path or stream lazily
+    reader = PdfReader(source)
+    for page in reader.pages:
+        yield page.extract_text() + "\n"
+
+
+def _extract_docx(source: Source) -> Iterator[str]:
+    if not pm.is_installed("python-docx"):  # type: ignore
+        try:
+            pm.install("python-docx")
+        except Exception:
+            pm.install("docx")
+    from docx import Document  # type: ignore
+
+    doc = Document(source)
+    yield "\n".join(paragraph.text for paragraph in doc.paragraphs)
+
+
+def _extract_pptx(source: Source) -> Iterator[str]:
+    if not pm.is_installed("python-pptx"):  # type: ignore
+        pm.install("pptx")
+    from pptx import Presentation  # type: ignore
+
+    prs = Presentation(source)
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield shape.text + "\n"
+
+
+def _extract_xlsx(source: Source) -> Iterator[str]:
+    if not pm.is_installed("openpyxl"):  # type: ignore
+        pm.install("openpyxl")
+    from openpyxl import load_workbook  # type: ignore
+
+    wb = load_workbook(source, read_only=True)
+    try:
+        for sheet in wb:
+            yield f"Sheet: {sheet.title}\n"
+            for row in sheet.iter_rows(values_only=True):
+                yield (
+                    "\t".join(str(cell) if cell is not None else "" for cell in row)
+                    + "\n"
+                )
+            yield "\n"
+    finally:
+        wb.close()
+
+
+def _extract_docling(source: Source, name: str) -> Iterator[str]:
+    if not pm.is_installed("docling"):  # type: ignore
+        pm.install("docling")
+    from docling.datamodel.base_models import DocumentStream  # type: ignore
+    from docling.document_converter import DocumentConverter  # type: ignore
+
+    if not isinstance(source, str):
+        source = DocumentStream(name=name, stream=source)
+    converter = DocumentConverter()
+    result = converter.convert(source)
+    yield result.document.export_to_markdown()
+
+
+EXTRACTORS: dict[str, Callable[[Source], Iterator[str]]] = {
+    **{ext: _extract_text for ext in TEXT_EXTENSIONS},
+    ".pdf": _extract_pdf,
+    ".docx": _extract_docx,
+    ".pptx": _extract_pptx,
+    ".xlsx": _extract_xlsx,
+}
+
+DOCLING_EXTENSIONS = (".pdf", ".docx", ".pptx", ".xlsx")
+
+
+def parse_file(
+    file_path: str, loading_engine: str = "DEFAULT", data: bytes | None = None
+) -> str:
+    """Extract the text of a file, runs in the worker processes
+
+    Args:
+        file_path: Path of the file, only its name is used when data is given
+        loading_engine: DEFAULT or DOCLING
+        data: Content of the file if it was received in memory
+
+    Raises:
+        DocumentParseError: if the file type is not supported or has no usable text
+    """
+    source: Source = file_path if data is None else io.BytesIO(data)
+    ext = Path(file_path).suffix.lower()
+    if loading_engine == "DOCLING" and ext in DOCLING_EXTENSIONS:
+        return "".join(_extract_docling(source, Path(file_path).name))
+    if ext not in EXTRACTORS:
+        raise DocumentParseError(f"Unsupported file type (extension {ext})")
+    return "".join(EXTRACTORS[ext](source))
+
+
+class DocumentParser:
+    """Parses files in a pool of worker processes with bounded concurrency"""
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        timeout: float | None = None,
+        loading_engine: str = "DEFAULT",
+    ):
+        self.max_workers = max_workers or int(os.getenv("DOCUMENT_PARSE_WORKERS", 2))
+        self.timeout = timeout or float(os.getenv("DOCUMENT_PARSE_TIMEOUT", 300))
+        self.loading_engine = loading_engine
+        self._pool: ProcessPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned workers do not inherit the threads and sockets of the server
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _restart_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Stop the processes of a pool, the next parse starts a new one"""
+        if self._pool is not pool:
+            return
+        self._pool = None
+        # shutdown does not interrupt running tasks, the worker processes are stopped
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    async def parse(self, file_path: Path, data: bytes | None = None) -> str | None:
+        """Extract the text of a file
+
+        Args:
+            file_path: Path of the file, only its name is used when data is given
+            data: Content of the file if it was received in memory
+
+        Returns:
+            The text, or None if the file cannot be parsed (the reason is logged)
+        """
+        if data is not None and file_path.suffix.lower() in TEXT_EXTENSIONS:
+            # Decoding a small text file is cheaper than sending it to a worker
+            try:
+                content = parse_file(str(file_path), self.loading_engine, data)
+            except DocumentParseError as e:
+                logger.error(f"Cannot parse {file_path.name}: {e}")
+                return None
+            except Exception as e:
+                logger.error(f"Error parsing {file_path.name}: {e}")
+                return None
+            return content
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            for attempt in range(2):
+                pool = self._get_pool()
+                try:
+                    content = await asyncio.wait_for(
+                        loop.run_in_executor(
+                            pool,
+                            parse_file,
+                            str(file_path),
+                            self.loading_engine,
+                            data,
+                        ),
+                        timeout=self.timeout,
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    logger.error(
+                        f"Parsing {file_path.name} timed out after {self.timeout}s"
+                    )
+                    self._restart_pool(pool)
+                    return None
+                except BrokenProcessPool:
+                    # The pool was restarted by a timeout, or a worker crashed
+                    self._restart_pool(pool)
+                    if attempt:
+                        logger.error(f"Worker process crashed parsing {file_path.name}")
+                        return None
+                except DocumentParseError as e:
+                    logger.error(f"Cannot parse {file_path.name}: {e}")
+                    return None
+                except Exception as e:
+                    # Extractor errors, e.g. on a corrupt file, only fail this file
+                    logger.error(f"Error parsing {file_path.name}: {e}")
+                    return None
+        if not content or not content.strip():
+            logger.error(f"No content could be extracted from file: {file_path.name}")
+            return None
+        return content
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -35,7 +35,9 @@ from .utils import EmbeddingFunc
 from .api.routers.document_routes import (
     DocumentManager,
     create_document_routes,
+    document_parser,
     run_scanning_process,
+    watch_input_directory,
 )
 from .api.routers.query_routes import create_query_routes
 from .api.routers.graph_routes import create_graph_routes
@@ -45,6 +47,7 @@ from .utils import logger, set_verbose_debug
 from .kg.shared_storage import (
     get_namespace_data,
     get_pipeline_status_lock,
+    get_lock_metrics,
     initialize_pipeline_status,
 )
 from fastapi.security import OAuth2PasswordRequestForm
@@ -107,7 +110,19 @@ def create_app(args):
     api_key = os.getenv("LIGHTRAG_API_KEY") or args.key
 
     # Initialize document manager
-    doc_manager = DocumentManager(args.input_dir)
+    doc_manager = DocumentManager(
+        args.input_dir,
+        manifest_file=os.path.join(args.working_dir, "input_dir_manifest.json"),
+    )
+
+    async def run_garbage_collection():
+        """Delete the orphaned records of the storages every gc_interval seconds"""
+        while True:
+            await asyncio.sleep(args.gc_interval)
+            try:
+                await rag.agarbage_collect()
+            except Exception as e:
+                logger.error(f"Garbage collection failed: {e}")
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
@@ -123,12 +138,24 @@ def create_app(args):
             pipeline_status = await get_namespace_data("pipeline_status")
 
             should_start_autoscan = False
+            should_start_watcher = False
+            should_start_gc = False
             async with get_pipeline_status_lock():
                 # Auto scan documents if enabled
                 if args.auto_scan_at_startup:
                     if not pipeline_status.get("autoscanned", False):
                         pipeline_status["autoscanned"] = True
                         should_start_autoscan = True
+                # Watch the input directory in a single process
+                if args.watch_input_dir:
+                    if not pipeline_status.get("input_dir_watched", False):
+                        pipeline_status["input_dir_watched"] = True
+                        should_start_watcher = True
+                # Collect garbage periodically in a single process
+                if args.gc_interval > 0:
+                    if not pipeline_status.get("gc_scheduled", False):
+                        pipeline_status["gc_scheduled"] = True
+                        should_start_gc = True
 
             # Only run auto scan when no other process started it first
             if should_start_autoscan:
@@ -138,13 +165,26 @@ def create_app(args):
                 task.add_done_callback(app.state.background_tasks.discard)
                 logger.info(f"Process {os.getpid()} auto scan task started at startup.")
 
+            if should_start_watcher:
+                task = asyncio.create_task(watch_input_directory(rag, doc_manager))
+                app.state.background_tasks.add(task)
+                task.add_done_callback(app.state.background_tasks.discard)
+
+            if should_start_gc:
+                task = asyncio.create_task(run_garbage_collection())
+                app.state.background_tasks.add(task)
+                task.add_done_callback(app.state.background_tasks.discard)
+
             ASCIIColors.green("\nServer is ready to accept connections! 🚀\n")
 
             yield
 
         finally:
             # Clean up database connections
+            for task in list(app.state.background_tasks):
+                task.cancel()
             await rag.finalize_storages()
+            document_parser.shutdown()
 
     # Initialize FastAPI
     app_kwargs = {
@@ -257,6 +297,7 @@ def create_app(args):
     embedding_func = EmbeddingFunc(
         embedding_dim=args.embedding_dim,
         max_token_size=args.max_embed_tokens,
+        model_name=f"{args.embedding_binding}:{args.embedding_model}",
         func=lambda texts: lollms_embed(
             texts,
             embed_model=args.embedding_model,
@@ -463,6 +504,12 @@ def create_app(args):
                 },
                 "auth_mode": auth_mode,
                 "pipeline_busy": pipeline_status.get("busy", False),
+                # Lock wait metrics of the worker process serving this request
+                "worker_pid": os.getpid(),
+                "lock_metrics": get_lock_metrics(),
+                "embedding_store": rag.embedding_store.stats()
+                if rag.embedding_store is not None
+                else None,
                 "core_version": core_version,
                 "api_version": __api_version__,
                 "webui_title": webui_title,
@@ -3,21 +3,33 @@ This module contains all document-related routes for the LightRAG API.
 """
 
 import asyncio
+import base64
+import json
+import os
 from .utils import logger
-import aiofiles
-import shutil
 import traceback
 import pipmaster as pm
 from datetime import datetime
+from hashlib import md5
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Literal
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from typing import Dict, List, Optional, Any, Literal, Tuple
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    UploadFile,
+)
 from pydantic import BaseModel, Field, field_validator
 
 from lightrag import LightRAG
+from lightrag.utils import clean_text, compute_mdhash_id, load_json, write_json
 from .base import DocProcessingStatus, DocStatus
 from .api.utils_api import get_combined_auth_dependency
 from ..config import global_args
+from ..document_parser import DocumentParser
 
 router = APIRouter(
     prefix="/documents",
@@ -27,6 +39,16 @@ router = APIRouter(
 # Temporary file prefix
 temp_prefix = "__tmp__"
 
+# Uploads are received and hashed in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Worker processes extracting the text of uploaded and scanned files
+document_parser = DocumentParser(
+    max_workers=global_args.document_parse_workers,
+    timeout=global_args.document_parse_timeout,
+    loading_engine=global_args.document_loading_engine,
+)
+
 
 class ScanResponse(BaseModel):
     """Response model for document scanning operation
@@ -292,6 +314,68 @@ class DocsStatusesResponse(BaseModel):
         }
 
 
+class DocsPageResponse(BaseModel):
+    """Response model for a page of the document listing
+
+    Attributes:
+        documents: Documents of the page, in listing order
+        total: Number of documents matching the status filter
+        next_cursor: Cursor of the next page, None on the last page
+    """
+
+    documents: List[DocStatusResponse] = Field(
+        default_factory=list, description="Documents of the page, in listing order"
+    )
+    total: int = Field(description="Number of documents matching the status filter")
+    next_cursor: Optional[str] = Field(
+        default=None,
+        description="Pass as cursor to get the next page, None on the last page",
+    )
+
+
+class DocStatusCountsResponse(BaseModel):
+    """Response model for the number of documents in each status"""
+
+    counts: Dict[str, int] = Field(
+        default_factory=dict, description="Number of documents by status"
+    )
+    total: int = Field(description="Number of documents")
+
+
+def encode_docs_cursor(cursor: Optional[Tuple[Any, str]]) -> Optional[str]:
+    if cursor is None:
+        return None
+    value, doc_id = cursor
+    if not isinstance(value, (str, int, float)):
+        value = str(value)
+    return base64.urlsafe_b64encode(json.dumps([value, doc_id]).encode()).decode()
+
+
+def decode_docs_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, doc_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def doc_status_response(
+    doc_id: str, doc_status: DocProcessingStatus
+) -> DocStatusResponse:
+    return DocStatusResponse(
+        id=doc_id,
+        content_summary=doc_status.content_summary,
+        content_length=doc_status.content_length,
+        status=doc_status.status,
+        created_at=DocStatusResponse.format_datetime(doc_status.created_at),
+        updated_at=DocStatusResponse.format_datetime(doc_status.updated_at),
+        chunks_count=doc_status.chunks_count,
+        error=doc_status.error,
+        metadata=doc_status.metadata,
+        file_path=doc_status.file_path,
+    )
+
+
 class PipelineStatusResponse(BaseModel):
     """Response model for pipeline status
 
@@ -368,233 +452,260 @@ class DocumentManager:
             ".scss",  # Sassy CSS
             ".less",  # LESS CSS
         ),
+        manifest_file: Optional[str] = None,
     ):
         self.input_dir = Path(input_dir)
         self.supported_extensions = supported_extensions
         self.indexed_files = set()
+        self.scan_lock = asyncio.Lock()
 
         # Create input directory if it doesn't exist
         self.input_dir.mkdir(parents=True, exist_ok=True)
 
+        # Indexed files by path relative to input_dir, with their size, mtime,
+        # content hash and document id, persisted when manifest_file is set
+        self.manifest_file = manifest_file
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        self._load_manifest()
+
+    def _relative_path(self, file_path: Path) -> Optional[str]:
+        """Manifest key of a file, None for temporary uploads and files outside input_dir"""
+        if file_path.name.startswith(temp_prefix):
+            return None
+        try:
+            return file_path.resolve().relative_to(self.input_dir.resolve()).as_posix()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _file_hash(file_path: Path) -> str:
+        digest = md5()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _load_manifest(self) -> None:
+        """Reload the manifest, which the other worker processes may have updated"""
+        if not self.manifest_file:
+            return
+        try:
+            self.manifest = load_json(self.manifest_file) or {}
+        except Exception as e:
+            logger.error(f"Error loading scan manifest {self.manifest_file}: {str(e)}")
+
+    def _save_manifest(self) -> None:
+        if not self.manifest_file:
+            return
+        try:
+            temp_file = f"{self.manifest_file}.tmp"
+            write_json(self.manifest, temp_file)
+            os.replace(temp_file, self.manifest_file)
+        except Exception as e:
+            logger.error(f"Error saving scan manifest {self.manifest_file}: {str(e)}")
+
+    def scan_directory_for_changes(
+        self,
+    ) -> Tuple[List[Path], Dict[str, Optional[str]]]:
+        """Walk the input directory once and compare it with the manifest
+
+        Files whose size and mtime did not change are not read. Files whose content
+        hash did not change are not reported either.
+
+        Returns:
+            The new or changed files, and the document ids of the files which were
+            deleted since they were indexed, by relative path
+        """
+        self._load_manifest()
+        extensions = {ext.lower() for ext in self.supported_extensions}
+        changed = []
+        seen = set()
+        touched = False
+        for root, _, files in os.walk(self.input_dir):
+            for name in files:
+                file_path = Path(root) / name
+                if file_path.suffix.lower() not in extensions:
+                    continue
+                rel_path = self._relative_path(file_path)
+                if rel_path is None:
+                    continue
+                seen.add(rel_path)
+                entry = self.manifest.get(rel_path)
+                if entry is None:
+                    if file_path not in self.indexed_files:
+                        changed.append(file_path)
+                    continue
+                try:
+                    stat = file_path.stat()
+                    if (stat.st_size, stat.st_mtime) == (entry["size"], entry["mtime"]):
+                        continue
+                    if self._file_hash(file_path) == entry["hash"]:
+                        # Touched but not modified
+                        entry.update(size=stat.st_size, mtime=stat.st_mtime)
+                        touched = True
+                        continue
+                except OSError as e:
+                    logger.error(f"Error reading file {file_path}: {str(e)}")
+                    continue
+                changed.append(file_path)
+        if touched:
+            self._save_manifest()
+        deleted = {
+            rel_path: entry.get("doc_id")
+            for rel_path, entry in self.manifest.items()
+            if rel_path not in seen
+        }
+        logger.debug(
+            f"Scanned {len(seen)} files in {self.input_dir}: "
+            f"{len(changed)} new or changed, {len(deleted)} deleted"
+        )
+        return changed, deleted
+
     def scan_directory_for_new_files(self) -> List[Path]:
-        """Scan input directory for new files"""
-        new_files = []
-        for ext in self.supported_extensions:
-            logger.debug(f"Scanning for {ext} files in {self.input_dir}")
-            for file_path in self.input_dir.rglob(f"*{ext}"):
-                if file_path not in self.indexed_files:
-                    new_files.append(file_path)
-        return new_files
-
-    def mark_as_indexed(self, file_path: Path):
-        self.indexed_files.add(file_path)
+        """Scan input directory for new or changed files"""
+        return self.scan_directory_for_changes()[0]
+
+    def mark_as_indexed(
+        self,
+        file_path: Path,
+        doc_id: Optional[str] = None,
+        file_hash: Optional[str] = None,
+    ):
+        """Record a file as indexed, with the id of the document it was enqueued as"""
+        self.mark_files_as_indexed(
+            [(file_path, doc_id)], {file_path: file_hash} if file_hash else None
+        )
+
+    def mark_files_as_indexed(
+        self,
+        files: List[Tuple[Path, Optional[str]]],
+        file_hashes: Optional[Dict[Path, str]] = None,
+    ):
+        """Record files as indexed and save the manifest once
+
+        Files whose hash is given, computed as they were received, are not read.
+        """
+        file_hashes = file_hashes or {}
+        self._load_manifest()
+        for file_path, doc_id in files:
+            self.indexed_files.add(file_path)
+            rel_path = self._relative_path(file_path)
+            if rel_path is None:
+                continue
+            try:
+                stat = file_path.stat()
+                self.manifest[rel_path] = {
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "hash": file_hashes.get(file_path) or self._file_hash(file_path),
+                    "doc_id": doc_id,
+                }
+            except OSError as e:
+                logger.error(f"Error reading file {file_path}: {str(e)}")
+        self._save_manifest()
+
+    def indexed_doc_id(self, file_path: Path) -> Optional[str]:
+        """Id of the document a file was last enqueued as"""
+        entry = self.manifest.get(self._relative_path(file_path) or "")
+        return entry.get("doc_id") if entry else None
+
+    def forget_files(self, rel_paths: List[str]):
+        """Remove deleted files from the manifest"""
+        self._load_manifest()
+        for rel_path in rel_paths:
+            self.manifest.pop(rel_path, None)
+        self._save_manifest()
+
+    def is_document_referenced(self, doc_id: str) -> bool:
+        """Whether a file of the manifest was enqueued as the document"""
+        return any(entry.get("doc_id") == doc_id for entry in self.manifest.values())
+
+    def clear(self):
+        """Forget all indexed files, after the documents were dropped"""
+        self.indexed_files.clear()
+        self.manifest.clear()
+        self._save_manifest()
 
     def is_supported_file(self, filename: str) -> bool:
         return any(filename.lower().endswith(ext) for ext in self.supported_extensions)
 
 
-async def pipeline_enqueue_file(rag: LightRAG, file_path: Path) -> bool:
+def _remove_temp_file(file_path: Path) -> None:
+    if file_path.name.startswith(temp_prefix):
+        try:
+            file_path.unlink()
+        except Exception as e:
+            logger.error(f"Error deleting file {file_path}: {str(e)}")
+
+
+def _document_id(content: str) -> str:
+    """Id of the document apipeline_enqueue_documents creates for a content"""
+    return compute_mdhash_id(clean_text(content), prefix="doc-")
+
+
+async def pipeline_enqueue_file(
+    rag: LightRAG,
+    file_path: Path,
+    doc_manager: Optional[DocumentManager] = None,
+    data: Optional[bytes] = None,
+    file_hash: Optional[str] = None,
+) -> bool:
     """Add a file to the queue for processing
 
+    The file is parsed in the worker processes of document_parser.
+
     Args:
         rag: LightRAG instance
         file_path: Path to the saved file
+        doc_manager: Records the file as indexed in its manifest if given
+        data: Content of the file if it was received in memory
+        file_hash: MD5 of the file computed as it was received
     Returns:
         bool: True if the file was successfully enqueued, False otherwise
     """
 
     try:
-        content = ""
-        ext = file_path.suffix.lower()
-
-        file = None
-        async with aiofiles.open(file_path, "rb") as f:
-            file = await f.read()
-
-        # Process based on file type
-        match ext:
-            case (
-                ".txt"
-                | ".md"
-                | ".html"
-                | ".htm"
-                | ".tex"
-                | ".json"
-                | ".xml"
-                | ".yaml"
-                | ".yml"
-                | ".rtf"
-                | ".odt"
-                | ".epub"
-                | ".csv"
-                | ".log"
-                | ".conf"
-                | ".ini"
-                | ".properties"
-                | ".sql"
-                | ".bat"
-                | ".sh"
-                | ".c"
-                | ".cpp"
-                | ".py"
-                | ".java"
-                | ".js"
-                | ".ts"
-                | ".swift"
-                | ".go"
-                | ".rb"
-                | ".php"
-                | ".css"
-                | ".scss"
-                | ".less"
-            ):
-                try:
-                    # Try to decode as UTF-8
-                    content = file.decode("utf-8")
-
-                    # Validate content
-                    if not content or len(content.strip()) == 0:
-                        logger.error(f"Empty content in file: {file_path.name}")
-                        return False
-
-                    # Check if content looks like binary data string representation
-                    if content.startswith("b'") or content.startswith('b"'):
-                        logger.error(
-                            f"File {file_path.name} appears to contain binary data representation instead of text"
-                        )
-                        return False
-
-                except UnicodeDecodeError:
-                    logger.error(
-                        f"File {file_path.name} is not valid UTF-8 encoded text. Please convert it to UTF-8 before processing."
-                    )
-                    return False
-            case ".pdf":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("pypdf2"):  # type: ignore
-                        pm.install("pypdf2")
-                    from PyPDF2 import PdfReader  # type: ignore
-                    from io import BytesIO
-
-                    pdf_file = BytesIO(file)
-                    reader = PdfReader(pdf_file)
-                    for page in reader.pages:
-                        content += page.extract_text() + "\n"
-            case ".docx":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("python-docx"):  # type: ignore
-                        try:
-                            pm.install("python-docx")
-                        except Exception:
-                            pm.install("docx")
-                    from docx import Document  # type: ignore
-                    from io import BytesIO
-
-                    docx_file = BytesIO(file)
-                    doc = Document(docx_file)
-                    content = "\n".join(
-                        [paragraph.text for paragraph in doc.paragraphs]
-                    )
-            case ".pptx":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("python-pptx"):  # type: ignore
-                        pm.install("pptx")
-                    from pptx import Presentation  # type: ignore
-                    from io import BytesIO
-
-                    pptx_file = BytesIO(file)
-                    prs = Presentation(pptx_file)
-                    for slide in prs.slides:
-                        for shape in slide.shapes:
-                            if hasattr(shape, "text"):
-                                content += shape.text + "\n"
-            case ".xlsx":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("openpyxl"):  # type: ignore
-                        pm.install("openpyxl")
-                    from openpyxl import load_workbook  # type: ignore
-                    from io import BytesIO
-
-                    xlsx_file = BytesIO(file)
-                    wb = load_workbook(xlsx_file)
-                    for sheet in wb:
-                        content += f"Sheet: {sheet.title}\n"
-                        for row in sheet.iter_rows(values_only=True):
-                            content += (
-                                "\t".join(
-                                    str(cell) if cell is not None else ""
-                                    for cell in row
-                                )
-                                + "\n"
-                            )
-                        content += "\n"
-            case _:
-                logger.error(
-                    f"Unsupported file type: {file_path.name} (extension {ext})"
-                )
-                return False
+        content = await document_parser.parse(file_path, data)
 
         # Insert into the RAG queue
         if content:
             await rag.apipeline_enqueue_documents(content, file_paths=file_path.name)
             logger.info(f"Successfully fetched and enqueued file: {file_path.name}")
+            if doc_manager is not None:
+                await asyncio.to_thread(
+                    doc_manager.mark_as_indexed,
+                    file_path,
+                    _document_id(content),
+                    file_hash,
+                )
             return True
-        else:
-            logger.error(f"No content could be extracted from file: {file_path.name}")
 
     except Exception as e:
         logger.error(f"Error processing or enqueueing file {file_path.name}: {str(e)}")
         logger.error(traceback.format_exc())
     finally:
-        if file_path.name.startswith(temp_prefix):
-            try:
-                file_path.unlink()
-            except Exception as e:
-                logger.error(f"Error deleting file {file_path}: {str(e)}")
+        _remove_temp_file(file_path)
     return False
 
 
-async def pipeline_index_file(rag: LightRAG, file_path: Path):
+async def pipeline_index_file(
+    rag: LightRAG,
+    file_path: Path,
+    doc_manager: Optional[DocumentManager] = None,
+    data: Optional[bytes] = None,
+    file_hash: Optional[str] = None,
+):
     """Index a file
 
     Args:
         rag: LightRAG instance
         file_path: Path to the saved file
+        doc_manager: Records the file as indexed in its manifest if given
+        data: Content of the file if it was received in memory
+        file_hash: MD5 of the file computed as it was received
     """
     try:
-        if await pipeline_enqueue_file(rag, file_path):
+        if await pipeline_enqueue_file(rag, file_path, doc_manager, data, file_hash):
             await rag.apipeline_process_enqueue_documents()
 
     except Exception as e:
@@ -602,22 +713,81 @@ async def pipeline_index_file(rag: LightRAG, file_path: Path):
         logger.error(traceback.format_exc())
 
 
-async def pipeline_index_files(rag: LightRAG, file_paths: List[Path]):
-    """Index multiple files sequentially to avoid high CPU load
+async def pipeline_index_files(
+    rag: LightRAG,
+    file_paths: List[Path],
+    doc_manager: Optional[DocumentManager] = None,
+    file_data: Optional[List[Optional[bytes]]] = None,
+):
+    """Index multiple files
+
+    Files are parsed concurrently by the worker processes of document_parser, and
+    enqueued in batches of DOCUMENT_ENQUEUE_BATCH documents as they are parsed.
 
     Args:
         rag: LightRAG instance
         file_paths: Paths to the files to index
+        doc_manager: Records the files as indexed in its manifest if given
+        file_data: Content of each file received in memory, None for files on disk
     """
     if not file_paths:
         return
     try:
         enqueued = False
+        contents: List[str] = []
+        names: List[str] = []
+        paths: List[Path] = []
 
-        # Process files sequentially
-        for file_path in file_paths:
-            if await pipeline_enqueue_file(rag, file_path):
+        async def parse(
+            file_path: Path, data: Optional[bytes]
+        ) -> tuple[Path, Optional[str]]:
+            try:
+                return file_path, await document_parser.parse(file_path, data)
+            except Exception as e:
+                # One file must not abort the batch of the others
+                logger.error(f"Error processing file {file_path.name}: {str(e)}")
+                return file_path, None
+            finally:
+                _remove_temp_file(file_path)
+
+        async def enqueue_batch():
+            nonlocal enqueued
+            try:
+                await rag.apipeline_enqueue_documents(contents, file_paths=names)
+                logger.info(f"Successfully enqueued {len(names)} files")
                 enqueued = True
+                if doc_manager is not None:
+                    await asyncio.to_thread(
+                        doc_manager.mark_files_as_indexed,
+                        [
+                            (file_path, _document_id(content))
+                            for file_path, content in zip(paths, contents)
+                        ],
+                    )
+            except Exception as e:
+                logger.error(f"Error enqueueing files {names}: {str(e)}")
+                logger.error(traceback.format_exc())
+            contents.clear()
+            names.clear()
+            paths.clear()
+
+        for task in asyncio.as_completed(
+            [
+                parse(file_path, data)
+                for file_path, data in zip(
+                    file_paths, file_data or [None] * len(file_paths)
+                )
+            ]
+        ):
+            file_path, content = await task
+            if content:
+                contents.append(content)
+                names.append(file_path.name)
+                paths.append(file_path)
+            if len(contents) >= global_args.document_enqueue_batch:
+                await enqueue_batch()
+        if contents:
+            await enqueue_batch()
 
         # Process the queue only if at least one file was successfully enqueued
         if enqueued:
@@ -640,49 +810,134 @@ async def pipeline_index_texts(rag: LightRAG, texts: List[str]):
     await rag.apipeline_process_enqueue_documents()
 
 
+async def receive_upload(
+    file: UploadFile, target: Path, always_write: bool = False
+) -> Tuple[Optional[bytes], str]:
+    """Receive an uploaded file in chunks, hashing it as it is received
+
+    Up to DOCUMENT_SPOOL_THRESHOLD bytes the content is kept in memory, a larger
+    file is written to target as it is received (any file if always_write).
+
+    Args:
+        file: The uploaded file
+        target: Path the file is written to
+        always_write: Write the file to target even if it is kept in memory
+
+    Returns:
+        The content, or None if it is only on disk, and its MD5 hash
+    """
+    threshold = global_args.document_spool_threshold
+    hasher = md5()
+    kept = bytearray()
+    size = 0
+    out = None
+    try:
+        if always_write:
+            out = await asyncio.to_thread(open, target, "wb")
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            size += len(chunk)
+            if out is None and size > threshold:
+                target.parent.mkdir(exist_ok=True)
+                out = await asyncio.to_thread(open, target, "wb")
+                await asyncio.to_thread(out.write, kept)
+            if out is not None:
+                await asyncio.to_thread(out.write, chunk)
+            if size <= threshold:
+                kept += chunk
+            else:
+                kept.clear()
+    except BaseException:
+        if out is not None:
+            out.close()
+            target.unlink(missing_ok=True)
+        raise
+    if out is not None:
+        await asyncio.to_thread(out.close)
+    return (bytes(kept) if size <= threshold else None), hasher.hexdigest()
+
+
 # TODO: deprecate after /insert_file is removed
-async def save_temp_file(input_dir: Path, file: UploadFile = File(...)) -> Path:
-    """Save the uploaded file to a temporary location
+async def save_temp_file(
+    input_dir: Path, file: UploadFile = File(...)
+) -> Tuple[Path, Optional[bytes]]:
+    """Receive the uploaded file, spooling it to a temporary location if large
 
     Args:
         file: The uploaded file
 
     Returns:
-        Path: The path to the saved file
+        The path to the saved file, or the file name with its content if the file
+        is kept in memory
     """
     # Generate unique filename to avoid conflicts
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     unique_filename = f"{temp_prefix}{timestamp}_{file.filename}"
-
-    # Create a temporary file to save the uploaded content
     temp_path = input_dir / "temp" / unique_filename
-    temp_path.parent.mkdir(exist_ok=True)
 
-    # Save the file
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return temp_path
+    data, _ = await receive_upload(file, temp_path)
+    if data is not None:
+        return Path(file.filename), data
+    return temp_path, None
 
 
 async def run_scanning_process(rag: LightRAG, doc_manager: DocumentManager):
-    """Background task to scan and index documents"""
+    """Background task to scan and index documents
+
+    Only files which are new or changed since they were indexed are parsed. The
+    previous documents of changed files and the documents of deleted files are
+    deleted, unless another file has the same content.
+    """
     try:
-        new_files = doc_manager.scan_directory_for_new_files()
-        total_files = len(new_files)
-        logger.info(f"Found {total_files} new files to index.")
+        async with doc_manager.scan_lock:
+            new_files, deleted = await asyncio.to_thread(
+                doc_manager.scan_directory_for_changes
+            )
+            total_files = len(new_files)
+            logger.info(
+                f"Found {total_files} new or changed files to index, "
+                f"{len(deleted)} deleted files."
+            )
 
-        if not new_files:
-            return
+            previous_doc_ids = {
+                doc_manager.indexed_doc_id(file_path) for file_path in new_files
+            }
+            if new_files:
+                # Process all files at once
+                await pipeline_index_files(rag, new_files, doc_manager)
+                logger.info(
+                    f"Scanning process completed: {total_files} files Processed."
+                )
 
-        # Process all files at once
-        await pipeline_index_files(rag, new_files)
-        logger.info(f"Scanning process completed: {total_files} files Processed.")
+            if deleted:
+                doc_manager.forget_files(list(deleted))
+            for doc_id in previous_doc_ids | set(deleted.values()):
+                if doc_id and not doc_manager.is_document_referenced(doc_id):
+                    logger.info(
+                        f"Deleting document {doc_id} of a changed or deleted file"
+                    )
+                    await rag.adelete_by_doc_id(doc_id)
 
     except Exception as e:
         logger.error(f"Error during scanning process: {str(e)}")
         logger.error(traceback.format_exc())
 
 
+async def watch_input_directory(rag: LightRAG, doc_manager: DocumentManager):
+    """Background task scanning the input directory whenever supported files change"""
+    if not pm.is_installed("watchfiles"):  # type: ignore
+        pm.install("watchfiles")
+    from watchfiles import awatch  # type: ignore
+
+    def is_document(_, path: str) -> bool:
+        name = Path(path).name
+        return doc_manager.is_supported_file(name) and not name.startswith(temp_prefix)
+
+    logger.info(f"Watching {doc_manager.input_dir} for new, changed or deleted files")
+    async for _ in awatch(doc_manager.input_dir, watch_filter=is_document):
+        await run_scanning_process(rag, doc_manager)
+
+
 def create_document_routes(
     rag: LightRAG, doc_manager: DocumentManager, api_key: Optional[str] = None
 ):
@@ -749,11 +1004,14 @@ def create_document_routes(
                     message=f"File '{file.filename}' already exists in the input directory.",
                 )
 
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            # The file is kept in the input directory, small files are also
+            # parsed from memory and their hash is not computed again
+            data, file_hash = await receive_upload(file, file_path, always_write=True)
 
             # Add to background tasks
-            background_tasks.add_task(pipeline_index_file, rag, file_path)
+            background_tasks.add_task(
+                pipeline_index_file, rag, file_path, doc_manager, data, file_hash
+            )
 
             return InsertResponse(
                 status="success",
@@ -862,10 +1120,10 @@ def create_document_routes(
                     detail=f"Unsupported file type. Supported types: {doc_manager.supported_extensions}",
                 )
 
-            temp_path = await save_temp_file(doc_manager.input_dir, file)
+            temp_path, data = await save_temp_file(doc_manager.input_dir, file)
 
             # Add to background tasks
-            background_tasks.add_task(pipeline_index_file, rag, temp_path)
+            background_tasks.add_task(pipeline_index_file, rag, temp_path, None, data)
 
             return InsertResponse(
                 status="success",
@@ -907,17 +1165,22 @@ def create_document_routes(
             inserted_count = 0
             failed_files = []
             temp_files = []
+            temp_data = []
 
             for file in files:
                 if doc_manager.is_supported_file(file.filename):
-                    # Create a temporary file to save the uploaded content
-                    temp_files.append(await save_temp_file(doc_manager.input_dir, file))
+                    # Keep the uploaded content in memory or a temporary file
+                    temp_path, data = await save_temp_file(doc_manager.input_dir, file)
+                    temp_files.append(temp_path)
+                    temp_data.append(data)
                     inserted_count += 1
                 else:
                     failed_files.append(f"{file.filename} (unsupported type)")
 
             if temp_files:
-                background_tasks.add_task(pipeline_index_files, rag, temp_files)
+                background_tasks.add_task(
+                    pipeline_index_files, rag, temp_files, None, temp_data
+                )
 
             # Prepare status message
             if inserted_count == len(files):
@@ -1078,6 +1341,7 @@ def create_document_routes(
                     except Exception as e:
                         logger.error(f"Error deleting file {file_path}: {str(e)}")
                         file_errors_count += 1
+            doc_manager.clear()
 
             # Log file deletion results
             if "history_messages" in pipeline_status:
@@ -1230,22 +1494,7 @@ def create_document_routes(
                     if status not in response.statuses:
                         response.statuses[status] = []
                     response.statuses[status].append(
-                        DocStatusResponse(
-                            id=doc_id,
-                            content_summary=doc_status.content_summary,
-                            content_length=doc_status.content_length,
-                            status=doc_status.status,
-                            created_at=DocStatusResponse.format_datetime(
-                                doc_status.created_at
-                            ),
-                            updated_at=DocStatusResponse.format_datetime(
-                                doc_status.updated_at
-                            ),
-                            chunks_count=doc_status.chunks_count,
-                            error=doc_status.error,
-                            metadata=doc_status.metadata,
-                            file_path=doc_status.file_path,
-                        )
+                        doc_status_response(doc_id, doc_status)
                     )
             return response
         except Exception as e:
@@ -1253,6 +1502,83 @@ def create_document_routes(
             logger.error(traceback.format_exc())
             raise HTTPException(status_code=500, detail=str(e))
 
+    @router.get(
+        "/list", response_model=DocsPageResponse, dependencies=[Depends(combined_auth)]
+    )
+    async def list_documents(
+        status: Optional[List[DocStatus]] = Query(
+            default=None, description="Only list documents in these statuses"
+        ),
+        sort_field: Literal["updated_at", "created_at", "id", "file_path"] = Query(
+            default="updated_at", description="Field the documents are sorted by"
+        ),
+        sort_direction: Literal["asc", "desc"] = Query(default="desc"),
+        limit: int = Query(default=50, ge=1, le=1000),
+        offset: int = Query(default=0, ge=0),
+        cursor: Optional[str] = Query(
+            default=None,
+            description="next_cursor of the previous page, takes precedence over offset",
+        ),
+    ) -> DocsPageResponse:
+        """
+        Get one page of the documents, optionally filtered by status.
+
+        Filtering, sorting and paging are done by the document status storage, and
+        only the summaries of the documents are loaded. Pages can be fetched by
+        offset, or with the cursor of the previous page, which stays stable while
+        documents are added.
+
+        Returns:
+            DocsPageResponse: The documents of the page, the number of documents
+                matching the filter and the cursor of the next page.
+
+        Raises:
+            HTTPException: If the cursor is invalid (400) or an error occurs while
+                retrieving the documents (500).
+        """
+        after = decode_docs_cursor(cursor) if cursor else None
+        try:
+            page = await rag.get_docs_paginated(
+                statuses=status,
+                sort_field=sort_field,
+                sort_desc=sort_direction == "desc",
+                limit=limit,
+                offset=offset,
+                after=after,
+            )
+            return DocsPageResponse(
+                documents=[
+                    doc_status_response(doc_id, doc_status)
+                    for doc_id, doc_status in page.documents.items()
+                ],
+                total=page.total,
+                next_cursor=encode_docs_cursor(page.next_cursor),
+            )
+        except Exception as e:
+            logger.error(f"Error GET /documents/list: {str(e)}")
+            logger.error(traceback.format_exc())
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get(
+        "/status_counts",
+        response_model=DocStatusCountsResponse,
+        dependencies=[Depends(combined_auth)],
+    )
+    async def document_status_counts() -> DocStatusCountsResponse:
+        """
+        Get the number of documents in each status, without listing them.
+
+        Returns:
+            DocStatusCountsResponse: The number of documents by status and in total.
+        """
+        try:
+            counts = await rag.get_status_counts()
+            return DocStatusCountsResponse(counts=counts, total=sum(counts.values()))
+        except Exception as e:
+            logger.error(f"Error GET /documents/status_counts: {str(e)}")
+            logger.error(traceback.format_exc())
+            raise HTTPException(status_code=500, detail=str(e))
+
     @router.post(
         "/clear_cache",
         response_model=ClearCacheResponse,
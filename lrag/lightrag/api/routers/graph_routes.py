@@ -2,7 +2,7 @@
 This module contains all graph-related routes for the LightRAG API.
 """
 
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import traceback
 from fastapi import APIRouter, Depends, Query, HTTPException
 from pydantic import BaseModel
@@ -50,6 +50,9 @@ def create_graph_routes(rag, api_key: Optional[str] = None):
         label: str = Query(..., description="Label to get knowledge graph for"),
         max_depth: int = Query(3, description="Maximum depth of graph", ge=1),
         max_nodes: int = Query(1000, description="Maximum nodes to return", ge=1),
+        properties: Optional[List[str]] = Query(
+            None, description="Node and edge properties to return, all if omitted"
+        ),
     ):
         """
         Retrieve a connected subgraph of nodes where the label includes the specified label.
@@ -61,6 +64,8 @@ def create_graph_routes(rag, api_key: Optional[str] = None):
             label (str): Label of the starting node
             max_depth (int, optional): Maximum depth of the subgraph,Defaults to 3
             max_nodes: Maxiumu nodes to return
+            properties (List[str], optional): Node and edge properties to return, e.g. only the ones
+                shown by the web UI. Defaults to all properties
 
         Returns:
             Dict[str, List[str]]: Knowledge graph for label
@@ -70,6 +75,7 @@ def create_graph_routes(rag, api_key: Optional[str] = None):
                 node_label=label,
                 max_depth=max_depth,
                 max_nodes=max_nodes,
+                properties=properties,
             )
         except Exception as e:
             logger.error(f"Error getting knowledge graph for label '{label}': {str(e)}")
@@ -1,20 +1,28 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+import asyncio
 from enum import Enum
+import heapq
 import os
 from dotenv import load_dotenv
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, replace
 from typing import (
+    TYPE_CHECKING,
     Any,
+    AsyncIterator,
     Literal,
     TypedDict,
     TypeVar,
     Callable,
 )
-from .utils import EmbeddingFunc
+import numpy as np
+from .utils import EmbeddingFunc, logger
 from .types import KnowledgeGraph
 
+if TYPE_CHECKING:
+    from .kg.embedding_cache import EmbeddingCache
+
 # use the .env that is inside the current folder
 # allows to use different .env file for each lightrag instance
 # the OS environment variables take precedence over the .env file
@@ -137,12 +145,79 @@ class StorageNameSpace(ABC):
         - If not supported: return {"status": "error", "message": "unsupported"}
         """
 
+    async def compact(self) -> bool:
+        """Reclaim the space left in the files of the storage by deleted records
+
+        Storages whose files do not keep deleted records do nothing.
+
+        Returns:
+            bool: True if the files of the storage were compacted
+        """
+        return False
+
 
 @dataclass
 class BaseVectorStorage(StorageNameSpace, ABC):
     embedding_func: EmbeddingFunc
     cosine_better_than_threshold: float = field(default=0.5)
     meta_fields: set[str] = field(default_factory=set)
+    chunks_vdb: "BaseVectorStorage | None" = field(
+        default=None, repr=False, compare=False
+    )
+    """Chunks storage of the same instance, resolves the documents of entities and
+    relationships for queries filtered by document ids."""
+    embedding_cache: EmbeddingCache | None = field(
+        default=None, repr=False, compare=False
+    )
+    """Persistent embeddings of upserted contents, shared by the storages of an instance."""
+
+    async def embed_contents(self, contents: list[str]) -> np.ndarray:
+        """Embed the contents of upserted records, in batches of embedding_batch_num
+
+        Contents found in the embedding cache are not embedded again, the embeddings
+        of the others are added to it.
+        """
+        batch_size = self.global_config.get("embedding_batch_num", 32)
+        cached = (
+            await self.embedding_cache.lookup(contents)
+            if self.embedding_cache is not None
+            else [None] * len(contents)
+        )
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        texts = [contents[i] for i in missing]
+        embeddings_list = await asyncio.gather(
+            *[
+                self.embedding_func(texts[i : i + batch_size])
+                for i in range(0, len(texts), batch_size)
+            ]
+        )
+        if self.embedding_cache is None:
+            return np.concatenate(embeddings_list)
+
+        if texts:
+            computed = np.concatenate(embeddings_list)
+            if len(computed) != len(texts):
+                # Returned as is, the storages report the mismatch
+                return computed
+            await self.embedding_cache.store(texts, computed)
+            for i, embedding in zip(missing, computed):
+                cached[i] = embedding
+        logger.debug(
+            f"Embedding cache of {self.namespace}: {len(contents) - len(texts)}/"
+            f"{len(contents)} hits, {self.embedding_cache.stats()['hit_rate']:.1%} overall"
+        )
+        return np.array(cached, dtype=np.float32)
+
+    async def embed_queries(self, queries: list[str]) -> np.ndarray:
+        """Embed the queries of query_batch, in concurrent batches of embedding_batch_num"""
+        batch_size = self.global_config.get("embedding_batch_num", 32)
+        embeddings_list = await asyncio.gather(
+            *[
+                self.embedding_func(queries[i : i + batch_size])
+                for i in range(0, len(queries), batch_size)
+            ]
+        )
+        return np.concatenate(embeddings_list)
 
     @abstractmethod
     async def query(
@@ -150,6 +225,41 @@ class BaseVectorStorage(StorageNameSpace, ABC):
     ) -> list[dict[str, Any]]:
         """Query the vector storage and retrieve top_k results."""
 
+    async def query_batch(
+        self, queries: list[str], top_k: int, ids: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        """Query the vector storage with several queries, returns the results of each
+
+        Storages should embed the queries with one embedding_func call and search
+        them together, the default implementation runs the queries concurrently.
+        """
+        return list(
+            await asyncio.gather(*[self.query(query, top_k, ids) for query in queries])
+        )
+
+    async def get_ids_by_doc_ids(self, doc_ids: list[str]) -> set[str]:
+        """Get the ids of the chunks of the given documents
+
+        Only the chunks storage can resolve them, it is used to filter the entities
+        and relationships storages by document.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} cannot look up chunks by document"
+        )
+
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over all records in the order of their ids, without their vectors
+
+        Records hold their id as __id__ and their meta fields. Iteration starts
+        after the given id, so that a scan of the storage can be resumed.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} cannot iterate over its records"
+        )
+        yield
+
     @abstractmethod
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
         """Insert or update vectors in the storage.
@@ -230,14 +340,37 @@ class BaseKVStorage(StorageNameSpace, ABC):
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
         """Get values by ids"""
 
+    async def get_by_mode_and_id(self, mode: str, id: str) -> dict[str, Any] | None:
+        """Get a single LLM cache entry as {id: entry}, or None if it is not cached
+
+        Storages should fetch the entry alone, the default implementation reads
+        the whole cache of the mode.
+        """
+        mode_cache = await self.get_by_id(mode) or {}
+        return {id: mode_cache[id]} if id in mode_cache else None
+
     @abstractmethod
     async def filter_keys(self, keys: set[str]) -> set[str]:
         """Return un-exist keys"""
 
+    async def iter_keys(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[str]]:
+        """Iterate over all keys in order, starting after the given key
+
+        Keys of the LLM cache are returned in the format of the storage (e.g. "mode:hash"
+        for JsonKVStorage), they can be read with get_by_ids and deleted with delete.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot iterate over its keys")
+        yield
+
     @abstractmethod
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
         """Upsert data
 
+        LLM cache entries are upserted as {mode: {hash: entry}}, only the given
+        entries of a mode are inserted or updated.
+
         Importance notes for in-memory storage:
         1. Changes will be persisted to disk during the next index_done_callback
         2. update flags to notify other processes that data persistence is needed
@@ -436,6 +569,71 @@ class BaseGraphStorage(StorageNameSpace, ABC):
             result[node_id] = edges if edges is not None else []
         return result
 
+    async def iter_nodes(
+        self, batch_size: int = 1000
+    ) -> AsyncIterator[dict[str, dict]]:
+        """Iterate over all nodes, in pages of at most batch_size nodes
+
+        Default implementation pages through get_all_labels with get_nodes_batch.
+        Override this method in storage backends which can page through the
+        nodes with a cursor, without loading all node ids.
+        """
+        labels = await self.get_all_labels()
+        for start in range(0, len(labels), batch_size):
+            nodes = await self.get_nodes_batch(labels[start : start + batch_size])
+            if nodes:
+                yield nodes
+
+    async def iter_edges(
+        self, batch_size: int = 1000
+    ) -> AsyncIterator[dict[tuple[str, str], dict]]:
+        """Iterate over all edges, each undirected edge once
+
+        Default implementation pages through get_all_labels, a page holds the
+        edges of batch_size nodes, each edge is returned with its smaller node.
+        Override this method in storage backends which can page through the
+        edges with a cursor.
+        """
+        labels = await self.get_all_labels()
+        for start in range(0, len(labels), batch_size):
+            nodes_edges = await self.get_nodes_edges_batch(
+                labels[start : start + batch_size]
+            )
+            pairs: dict[tuple[str, str], None] = {}
+            for node_id, edges in nodes_edges.items():
+                for src_id, tgt_id in edges:
+                    if node_id == min(src_id, tgt_id):
+                        pairs[(src_id, tgt_id)] = None
+            if not pairs:
+                continue
+            edges = await self.get_edges_batch(
+                [{"src": src_id, "tgt": tgt_id} for src_id, tgt_id in pairs]
+            )
+            if edges:
+                yield edges
+
+    async def upsert_nodes_batch(self, nodes: dict[str, dict[str, str]]) -> None:
+        """Insert or update multiple nodes
+
+        Default implementation upserts nodes one by one.
+        Override this method for better performance in storage backends
+        that support batch operations.
+        """
+        for node_id, node_data in nodes.items():
+            await self.upsert_node(node_id, node_data)
+
+    async def upsert_edges_batch(
+        self, edges: dict[tuple[str, str], dict[str, str]]
+    ) -> None:
+        """Insert or update multiple edges, their nodes must exist
+
+        Default implementation upserts edges one by one.
+        Override this method for better performance in storage backends
+        that support batch operations.
+        """
+        for (src_id, tgt_id), edge_data in edges.items():
+            await self.upsert_edge(src_id, tgt_id, edge_data)
+
     @abstractmethod
     async def upsert_node(self, node_id: str, node_data: dict[str, str]) -> None:
         """Insert a new node or update an existing node in the graph.
@@ -531,6 +729,16 @@ class BaseGraphStorage(StorageNameSpace, ABC):
             indicating whether the graph was truncated due to max_nodes limit
         """
 
+    async def get_graph_version(self) -> Any | None:
+        """Get a version of the graph which changes whenever the graph changes
+
+        Used to cache the subgraphs returned by get_knowledge_graph.
+        Default implementation returns None, the graph is not cached. Only the
+        local storages (NetworkX, CSR) track their changes; remote backends can be
+        changed by other clients and have no cheap version to report.
+        """
+        return None
+
 
 class DocStatus(str, Enum):
     """Document processing status"""
@@ -545,8 +753,8 @@ class DocStatus(str, Enum):
 class DocProcessingStatus:
     """Document processing status data structure"""
 
-    content: str
-    """Original content of the document"""
+    content: str | None
+    """Original content of the document, None once it is only stored in full_docs"""
     content_summary: str
     """First 100 chars of document content, used for preview"""
     content_length: int
@@ -567,6 +775,55 @@ class DocProcessingStatus:
     """Additional metadata"""
 
 
+DOC_STATUS_SORT_FIELDS = ("updated_at", "created_at", "id", "file_path")
+"""Fields the document listing can be sorted by, ties are broken by id."""
+
+
+@dataclass
+class DocStatusPage:
+    """A page of the document listing of DocStatusStorage.get_docs_paginated"""
+
+    documents: dict[str, DocProcessingStatus]
+    """Documents of the page by id, in listing order"""
+    total: int
+    """Number of documents matching the status filter"""
+    next_cursor: tuple[Any, str] | None = None
+    """(sort value, id) of the last document, to fetch the next page with after=,
+    None on the last page"""
+
+
+def doc_status_sort_value(doc_id: str, doc: dict[str, Any], sort_field: str) -> Any:
+    """Value a document status record is sorted by, missing values sort first"""
+    if sort_field == "id":
+        return doc_id
+    value = doc.get(sort_field)
+    return "" if value is None else value
+
+
+def page_doc_keys(
+    keys: list[tuple[Any, str]],
+    sort_desc: bool,
+    limit: int,
+    offset: int = 0,
+    after: tuple[Any, str] | None = None,
+) -> tuple[list[tuple[Any, str]], tuple[Any, str] | None]:
+    """Select a page of the (sort value, id) keys of documents, in any order
+
+    Only the keys up to the end of the page are sorted.
+
+    Returns:
+        The keys of the page and the cursor of the next page
+    """
+    if after is not None:
+        after = tuple(after)
+        keys = [key for key in keys if (key < after if sort_desc else key > after)]
+        offset = 0
+    select = heapq.nlargest if sort_desc else heapq.nsmallest
+    keys = select(offset + limit + 1, keys)
+    page = keys[offset : offset + limit]
+    return page, page[-1] if len(keys) > offset + limit else None
+
+
 @dataclass
 class DocStatusStorage(BaseKVStorage, ABC):
     """Base class for document status storage"""
@@ -581,6 +838,48 @@ class DocStatusStorage(BaseKVStorage, ABC):
     ) -> dict[str, DocProcessingStatus]:
         """Get all documents with a specific status"""
 
+    async def get_docs_paginated(
+        self,
+        statuses: list[DocStatus] | None = None,
+        sort_field: str = "updated_at",
+        sort_desc: bool = True,
+        limit: int = 50,
+        offset: int = 0,
+        after: tuple[Any, str] | None = None,
+        include_content: bool = False,
+    ) -> DocStatusPage:
+        """Get one page of the documents, optionally filtered by status
+
+        Documents are ordered by sort_field then id. A page starts after the
+        (sort value, id) cursor of the previous page if given, at offset otherwise.
+        Without include_content, the content of the documents is their
+        content_summary, storages should not load the full contents.
+
+        Storages should filter, sort and page in the storage, the default
+        implementation loads the documents of each status.
+        """
+        if sort_field not in DOC_STATUS_SORT_FIELDS:
+            raise ValueError(f"Cannot sort documents by {sort_field}")
+        results = await asyncio.gather(
+            *[self.get_docs_by_status(status) for status in statuses or DocStatus]
+        )
+        docs = {doc_id: doc for result in results for doc_id, doc in result.items()}
+        keys = [
+            (doc_status_sort_value(doc_id, asdict(doc), sort_field), doc_id)
+            for doc_id, doc in docs.items()
+        ]
+        page, next_cursor = page_doc_keys(keys, sort_desc, limit, offset, after)
+        return DocStatusPage(
+            documents={
+                doc_id: docs[doc_id]
+                if include_content
+                else replace(docs[doc_id], content=docs[doc_id].content_summary)
+                for _, doc_id in page
+            },
+            total=len(docs),
+            next_cursor=next_cursor,
+        )
+
     async def drop_cache_by_modes(self, modes: list[str] | None = None) -> bool:
         """Drop cache is not supported for Doc Status storage"""
         return False
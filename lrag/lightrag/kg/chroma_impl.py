@@ -1,8 +1,6 @@
-import asyncio
 import os
 from dataclasses import dataclass
-from typing import Any, final
-import numpy as np
+from typing import Any, AsyncIterator, final
 
 from ..base import BaseVectorStorage
 from ..utils import logger
@@ -122,23 +120,7 @@ class ChromaVectorDBStorage(BaseVectorStorage):
                 for item in data.values()
             ]
 
-            # Process in batches
-            batches = [
-                documents[i : i + self._max_batch_size]
-                for i in range(0, len(documents), self._max_batch_size)
-            ]
-
-            embedding_tasks = [self.embedding_func(batch) for batch in batches]
-            embeddings_list = []
-
-            # Pre-allocate embeddings_list with known size
-            embeddings_list = [None] * len(embedding_tasks)
-
-            # Use asyncio.gather instead of as_completed if order doesn't matter
-            embeddings_results = await asyncio.gather(*embedding_tasks)
-            embeddings_list = list(embeddings_results)
-
-            embeddings = np.concatenate(embeddings_list)
+            embeddings = await self.embed_contents(documents)
 
             # Upsert in batches
             for i in range(0, len(ids), self._max_batch_size):
@@ -191,6 +173,39 @@ class ChromaVectorDBStorage(BaseVectorStorage):
             logger.error(f"Error during ChromaDB query: {str(e)}")
             raise
 
+    async def query_batch(
+        self, queries: list[str], top_k: int, ids: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        if not queries:
+            return []
+        try:
+            embeddings = await self.embed_queries(queries)
+
+            # One query with all the embeddings, results are returned per embedding
+            results = self._collection.query(
+                query_embeddings=embeddings.tolist(),
+                n_results=top_k * 2,  # Request more results to allow for filtering
+                include=["metadatas", "distances", "documents"],
+            )
+            return [
+                [
+                    {
+                        "id": results["ids"][q][i],
+                        "distance": 1 - results["distances"][q][i],
+                        "content": results["documents"][q][i],
+                        **results["metadatas"][q][i],
+                    }
+                    for i in range(len(results["ids"][q]))
+                    if (1 - results["distances"][q][i])
+                    >= self.cosine_better_than_threshold
+                ][:top_k]
+                for q in range(len(queries))
+            ]
+
+        except Exception as e:
+            logger.error(f"Error during ChromaDB batch query: {str(e)}")
+            raise
+
     async def index_done_callback(self) -> None:
         # ChromaDB handles persistence automatically
         pass
@@ -302,6 +317,26 @@ class ChromaVectorDBStorage(BaseVectorStorage):
             logger.error(f"Error retrieving vector data for ID {id}: {e}")
             return None
 
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their ids, from a snapshot of the ids"""
+        # get() pages in insertion order, the ids alone are read to sort them
+        ids = sorted(
+            id
+            for id in self._collection.get(include=[])["ids"]
+            if after is None or id > after
+        )
+        for start in range(0, len(ids), batch_size):
+            result = self._collection.get(
+                ids=ids[start : start + batch_size], include=["metadatas"]
+            )
+            records = [
+                {"__id__": id, **(metadata or {})}
+                for id, metadata in zip(result["ids"], result["metadatas"])
+            ]
+            yield sorted(records, key=lambda record: record["__id__"])
+
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
         """Get multiple vector data by their IDs
 
@@ -0,0 +1,887 @@
+import os
+from dataclasses import dataclass
+from typing import final
+
+import numpy as np
+
+from ..types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
+from ..utils import logger
+from ..base import BaseGraphStorage
+from .graph_snapshot import (
+    GraphSnapshot,
+    compact_graph_log,
+    load_graph_snapshot,
+    persist_graph_changes,
+    read_graph_log,
+    write_graph_snapshot,
+)
+from .shared_storage import (
+    get_namespace_lock,
+    get_namespace_version,
+    get_namespace_changes,
+    publish_namespace_changes,
+    reset_namespace_changes,
+)
+
+from dotenv import load_dotenv
+
+# use the .env that is inside the current folder
+# allows to use different .env file for each lightrag instance
+# the OS environment variables take precedence over the .env file
+load_dotenv(dotenv_path=".env", override=False)
+
+MAX_GRAPH_NODES = int(os.getenv("MAX_GRAPH_NODES", 1000))
+# The CSR arrays are rebuilt once the mutations kept in the overlay exceed this
+# fraction of the edges
+CSR_COMPACT_RATIO = float(os.getenv("CSR_COMPACT_RATIO", 0.2))
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Return an array of at least size elements, growing it geometrically"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array), 1024), dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class CSRGraph:
+    """
+    Undirected graph with dense node indices, CSR adjacency and columnar properties.
+
+    Node ids are mapped to dense integer indices. The adjacency of the nodes that existed
+    at the last compaction is stored as CSR arrays (indptr, sorted neighbor indices and the
+    edge row of each entry). Edges added later live in a dict overlay, removed edges and
+    nodes are only flagged dead, until compact() rebuilds the CSR arrays.
+
+    Node and edge properties are stored per attribute as lists indexed by node or edge row,
+    None marking a missing attribute. Degrees are kept in a NumPy array.
+    """
+
+    def __init__(self):
+        # Nodes
+        self._names: list[str | None] = []
+        self._index: dict[str, int] = {}
+        self._node_columns: dict[str, list] = {}
+        self._node_alive = np.zeros(0, dtype=bool)
+        self._degrees = np.zeros(0, dtype=np.int64)
+        # Edges
+        self._edge_count = 0
+        self._edge_rows = 0
+        self._edge_src = np.zeros(0, dtype=np.int32)
+        self._edge_tgt = np.zeros(0, dtype=np.int32)
+        self._edge_alive = np.zeros(0, dtype=bool)
+        self._edge_columns: dict[str, list] = {}
+        # CSR adjacency of the first _base_nodes nodes
+        self._base_nodes = 0
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._adj_edges = np.zeros(0, dtype=np.int32)
+        # Edges added after the last compaction: node -> {neighbor: edge row}
+        self._overlay: dict[int, dict[int, int]] = {}
+        # Mutations of the adjacency since the last compaction
+        self._mutations = 0
+
+    @classmethod
+    def from_snapshot(cls, snapshot: GraphSnapshot) -> "CSRGraph":
+        graph = cls()
+        node_count = len(snapshot.node_ids)
+        graph._names = list(snapshot.node_ids)
+        graph._index = {node_id: i for i, node_id in enumerate(graph._names)}
+        graph._node_columns = {
+            key: list(values) for key, values in snapshot.node_columns.items()
+        }
+        graph._node_alive = np.ones(node_count, dtype=bool)
+        graph._degrees = np.zeros(node_count, dtype=np.int64)
+
+        edge_count = len(snapshot.sources)
+        src = np.fromiter(
+            (graph._node_slot(source) for source in snapshot.sources),
+            dtype=np.int32,
+            count=edge_count,
+        )
+        tgt = np.fromiter(
+            (graph._node_slot(target) for target in snapshot.targets),
+            dtype=np.int32,
+            count=edge_count,
+        )
+        graph._edge_src, graph._edge_tgt = src, tgt
+        graph._edge_alive = np.ones(edge_count, dtype=bool)
+        graph._edge_rows = graph._edge_count = edge_count
+        graph._edge_columns = {
+            key: list(values) for key, values in snapshot.edge_columns.items()
+        }
+        graph._build_csr()
+        return graph
+
+    def number_of_nodes(self) -> int:
+        return len(self._index)
+
+    def number_of_edges(self) -> int:
+        return self._edge_count
+
+    def node_ids(self) -> list[str]:
+        return list(self._index)
+
+    # Nodes
+
+    def _node_slot(self, node_id: str) -> int:
+        """Index of a node, adding it if it does not exist"""
+        i = self._index.get(node_id)
+        if i is not None:
+            return i
+        i = len(self._names)
+        self._names.append(node_id)
+        self._index[node_id] = i
+        for column in self._node_columns.values():
+            column.append(None)
+        self._node_alive = _grow(self._node_alive, i + 1)
+        self._node_alive[i] = True
+        self._degrees = _grow(self._degrees, i + 1)
+        self._degrees[i] = 0
+        return i
+
+    def has_node(self, node_id: str) -> bool:
+        return node_id in self._index
+
+    def get_node(self, node_id: str) -> dict | None:
+        i = self._index.get(node_id)
+        if i is None:
+            return None
+        return self._row(self._node_columns, i)
+
+    def degree(self, node_id: str) -> int:
+        i = self._index.get(node_id)
+        return 0 if i is None else int(self._degrees[i])
+
+    def degrees(self, node_ids: list[str]) -> np.ndarray:
+        """Degrees of the given nodes, 0 for missing nodes"""
+        indices = np.fromiter(
+            (self._index.get(node_id, -1) for node_id in node_ids),
+            dtype=np.int64,
+            count=len(node_ids),
+        )
+        # Index -1 picks the trailing 0
+        degrees = np.append(self._degrees[: len(self._names)], 0)
+        return degrees[indices]
+
+    def upsert_node(self, node_id: str, attrs: dict) -> dict:
+        """Add a node or update its attributes, returns all its attributes"""
+        i = self._node_slot(node_id)
+        self._set_row(self._node_columns, len(self._names), i, attrs)
+        return self._row(self._node_columns, i)
+
+    def remove_node(self, node_id: str) -> bool:
+        i = self._index.pop(node_id, None)
+        if i is None:
+            return False
+        for j in self._neighbors(i).tolist():
+            self._remove_edge_row(i, j)
+        self._names[i] = None
+        self._node_alive[i] = False
+        for column in self._node_columns.values():
+            column[i] = None
+        self._mutations += 1
+        return True
+
+    # Edges
+
+    def _find_edge(self, i: int, j: int) -> int | None:
+        """Row of the edge between nodes i and j, None if there is none"""
+        row = self._overlay.get(i, {}).get(j)
+        if row is not None:
+            return row
+        if i < self._base_nodes:
+            start, end = self._indptr[i], self._indptr[i + 1]
+            pos = start + np.searchsorted(self._indices[start:end], j)
+            if pos < end and self._indices[pos] == j:
+                row = int(self._adj_edges[pos])
+                if self._edge_alive[row]:
+                    return row
+        return None
+
+    def _edge_row(self, source: str, target: str) -> int | None:
+        i, j = self._index.get(source), self._index.get(target)
+        if i is None or j is None:
+            return None
+        return self._find_edge(i, j)
+
+    def has_edge(self, source: str, target: str) -> bool:
+        return self._edge_row(source, target) is not None
+
+    def get_edge(self, source: str, target: str) -> dict | None:
+        row = self._edge_row(source, target)
+        if row is None:
+            return None
+        return self._row(self._edge_columns, row)
+
+    def upsert_edge(self, source: str, target: str, attrs: dict) -> dict:
+        """Add an edge or update its attributes, missing nodes are added"""
+        i, j = self._node_slot(source), self._node_slot(target)
+        row = self._find_edge(i, j)
+        if row is None:
+            row = self._edge_rows
+            self._edge_rows += 1
+            self._edge_src = _grow(self._edge_src, self._edge_rows)
+            self._edge_tgt = _grow(self._edge_tgt, self._edge_rows)
+            self._edge_alive = _grow(self._edge_alive, self._edge_rows)
+            self._edge_src[row], self._edge_tgt[row] = i, j
+            self._edge_alive[row] = True
+            for column in self._edge_columns.values():
+                column.append(None)
+            self._overlay.setdefault(i, {})[j] = row
+            self._overlay.setdefault(j, {})[i] = row
+            self._degrees[i] += 1
+            self._degrees[j] += 1
+            self._edge_count += 1
+            self._mutations += 1
+        self._set_row(self._edge_columns, self._edge_rows, row, attrs)
+        return self._row(self._edge_columns, row)
+
+    def remove_edge(self, source: str, target: str) -> bool:
+        i, j = self._index.get(source), self._index.get(target)
+        if i is None or j is None or self._find_edge(i, j) is None:
+            return False
+        self._remove_edge_row(i, j)
+        return True
+
+    def _remove_edge_row(self, i: int, j: int) -> None:
+        row = self._find_edge(i, j)
+        if row is None:
+            return
+        self._edge_alive[row] = False
+        for column in self._edge_columns.values():
+            column[row] = None
+        for a, b in ((i, j), (j, i)):
+            adjacent = self._overlay.get(a)
+            if adjacent is not None:
+                adjacent.pop(b, None)
+                if not adjacent:
+                    del self._overlay[a]
+        # A self loop counts twice, as in NetworkX
+        self._degrees[i] -= 1
+        self._degrees[j] -= 1
+        self._edge_count -= 1
+        self._mutations += 1
+
+    def node_edges(self, node_id: str) -> list[tuple[str, str]] | None:
+        i = self._index.get(node_id)
+        if i is None:
+            return None
+        neighbors = dict.fromkeys(self._neighbors(i).tolist())
+        return [(node_id, self._names[j]) for j in neighbors]
+
+    # Traversal
+
+    def _neighbors(self, i: int) -> np.ndarray:
+        return self._frontier_neighbors(np.array([i], dtype=np.int64))
+
+    def _frontier_neighbors(self, frontier: np.ndarray) -> np.ndarray:
+        """Neighbors of all the nodes of a frontier, with duplicates"""
+        base = frontier[frontier < self._base_nodes]
+        starts = self._indptr[base]
+        lengths = self._indptr[base + 1] - starts
+        # Positions of the CSR entries of every frontier node, without a Python loop
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        alive = self._edge_alive[self._adj_edges[positions]]
+        neighbors = self._indices[positions][alive]
+
+        if self._overlay:
+            added = [
+                j
+                for i in frontier.tolist()
+                if i in self._overlay
+                for j in self._overlay[i]
+            ]
+            if added:
+                neighbors = np.concatenate(
+                    [neighbors, np.array(added, dtype=neighbors.dtype)]
+                )
+        return neighbors
+
+    def bfs(self, node_id: str, max_depth: int, max_nodes: int) -> tuple[list, bool]:
+        """
+        Breadth-first search from a node, expanding one whole frontier at a time.
+
+        Returns:
+            tuple: (node indices in BFS order, whether max_nodes truncated the result)
+        """
+        start = self._index[node_id]
+        visited = np.zeros(len(self._names), dtype=bool)
+        visited[start] = True
+        levels = [np.array([start], dtype=np.int64)]
+        count, truncated = 1, False
+        frontier = levels[0]
+        for _ in range(max_depth):
+            neighbors = self._frontier_neighbors(frontier)
+            neighbors = neighbors[~visited[neighbors]]
+            if not neighbors.size:
+                break
+            # Deduplicate, keeping the order of discovery
+            _, first = np.unique(neighbors, return_index=True)
+            frontier = neighbors[np.sort(first)].astype(np.int64)
+            if frontier.size > max_nodes - count:
+                frontier = frontier[: max_nodes - count]
+                truncated = True
+            visited[frontier] = True
+            levels.append(frontier)
+            count += frontier.size
+            if truncated:
+                break
+        return np.concatenate(levels).tolist(), truncated
+
+    def top_degree_nodes(self, max_nodes: int) -> tuple[list, bool]:
+        """Indices of the max_nodes nodes with the highest degree, highest first"""
+        candidates = np.flatnonzero(self._node_alive[: len(self._names)])
+        truncated = candidates.size > max_nodes
+        degrees = self._degrees[candidates]
+        if truncated:
+            top = np.argpartition(-degrees, max_nodes - 1)[:max_nodes]
+            candidates, degrees = candidates[top], degrees[top]
+        order = np.argsort(-degrees, kind="stable")
+        return candidates[order].tolist(), truncated
+
+    def subgraph_edges(self, node_indices: list) -> list:
+        """Rows of the edges between the given nodes"""
+        selected = np.zeros(len(self._names), dtype=bool)
+        selected[node_indices] = True
+        rows = self._edge_rows
+        mask = (
+            self._edge_alive[:rows]
+            & selected[self._edge_src[:rows]]
+            & selected[self._edge_tgt[:rows]]
+        )
+        return np.flatnonzero(mask).tolist()
+
+    def node_name(self, i: int) -> str:
+        return self._names[i]
+
+    def node_attrs(self, i: int) -> dict:
+        return self._row(self._node_columns, i)
+
+    def edge_endpoints(self, row: int) -> tuple[str, str]:
+        return self._names[self._edge_src[row]], self._names[self._edge_tgt[row]]
+
+    def edge_attrs(self, row: int) -> dict:
+        return self._row(self._edge_columns, row)
+
+    # Columns
+
+    @staticmethod
+    def _row(columns: dict[str, list], i: int) -> dict:
+        row = {}
+        for key, values in columns.items():
+            value = values[i]
+            if value is not None:
+                row[key] = value
+        return row
+
+    @staticmethod
+    def _set_row(columns: dict[str, list], size: int, i: int, attrs: dict) -> None:
+        for key, value in attrs.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * size
+            column[i] = value
+
+    # Compaction
+
+    def needs_compaction(self) -> bool:
+        return self._mutations > CSR_COMPACT_RATIO * max(self._edge_count, 1024)
+
+    def compact(self) -> None:
+        """Drop dead nodes and edges and rebuild the CSR arrays, merging the overlay"""
+        nodes = np.flatnonzero(self._node_alive[: len(self._names)])
+        remap = np.full(len(self._names), -1, dtype=np.int64)
+        remap[nodes] = np.arange(nodes.size)
+        node_list = nodes.tolist()
+        self._names = [self._names[i] for i in node_list]
+        self._index = {node_id: i for i, node_id in enumerate(self._names)}
+        self._node_columns = {
+            key: [values[i] for i in node_list]
+            for key, values in self._node_columns.items()
+        }
+        self._node_alive = np.ones(nodes.size, dtype=bool)
+
+        edges = np.flatnonzero(self._edge_alive[: self._edge_rows])
+        edge_list = edges.tolist()
+        self._edge_src = remap[self._edge_src[edges]].astype(np.int32)
+        self._edge_tgt = remap[self._edge_tgt[edges]].astype(np.int32)
+        self._edge_alive = np.ones(edges.size, dtype=bool)
+        self._edge_rows = self._edge_count = edges.size
+        self._edge_columns = {
+            key: [values[i] for i in edge_list]
+            for key, values in self._edge_columns.items()
+        }
+        self._build_csr()
+
+    def _build_csr(self) -> None:
+        node_count, rows = len(self._names), self._edge_rows
+        src, tgt = self._edge_src[:rows], self._edge_tgt[:rows]
+        # Each undirected edge is stored in the rows of both of its nodes
+        heads = np.concatenate([src, tgt]).astype(np.int64)
+        tails = np.concatenate([tgt, src])
+        edge_rows = np.concatenate([np.arange(rows), np.arange(rows)])
+        order = np.lexsort((tails, heads))
+        self._indices = tails[order].astype(np.int32)
+        self._adj_edges = edge_rows[order].astype(np.int32)
+        counts = np.bincount(heads, minlength=node_count)
+        self._indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._indptr[1:])
+        self._degrees = counts.astype(np.int64)
+        self._base_nodes = node_count
+        self._overlay = {}
+        self._mutations = 0
+
+    # Persistence
+
+    def write_snapshot(self, file_name: str) -> int:
+        nodes = np.flatnonzero(self._node_alive[: len(self._names)]).tolist()
+        edges = np.flatnonzero(self._edge_alive[: self._edge_rows])
+        edge_list = edges.tolist()
+        return write_graph_snapshot(
+            file_name,
+            [self._names[i] for i in nodes],
+            {
+                key: [values[i] for i in nodes]
+                for key, values in self._node_columns.items()
+            },
+            [self._names[i] for i in self._edge_src[edges].tolist()],
+            [self._names[i] for i in self._edge_tgt[edges].tolist()],
+            {
+                key: [values[i] for i in edge_list]
+                for key, values in self._edge_columns.items()
+            },
+        )
+
+    def apply_changes(self, changes) -> int:
+        """Apply ((kind, key), attrs) changes in order, returns the number applied"""
+        count = 0
+        for (kind, key), attrs in changes:
+            if kind == "node":
+                if attrs is not None:
+                    self.upsert_node(key, attrs)
+                else:
+                    self.remove_node(key)
+            else:
+                if attrs is not None:
+                    self.upsert_edge(*key, attrs)
+                else:
+                    self.remove_edge(*key)
+            count += 1
+        return count
+
+
+@final
+@dataclass
+class CSRGraphStorage(BaseGraphStorage):
+    """
+    In-memory graph storage on compact CSR arrays, an alternative to NetworkXStorage.
+
+    Uses the same snapshot and mutation log files as NetworkXStorage, so a working dir
+    can be switched between both storages.
+    """
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        self._graphml_xml_file = os.path.join(
+            working_dir, f"graph_{self.namespace}.graphml"
+        )
+        self._snapshot_file = os.path.join(
+            working_dir, f"graph_{self.namespace}.msgpack"
+        )
+        self._log_file = os.path.join(working_dir, f"graph_{self.namespace}.log")
+        self._storage_lock = None
+        self._graph = None
+        # Namespace version the graph is at, and local changes not published yet:
+        # ("node", node_id) or ("edge", (src, tgt)) -> attributes, None if deleted
+        self._version = -1
+        self._pending_changes: dict[tuple, dict | None] = {}
+        # Local changes made so far, part of the graph version
+        self._local_changes = 0
+
+        # Load initial graph
+        self._graph = self._load_graph()
+
+    def _load_graph(self) -> CSRGraph:
+        """Load the graph snapshot and replay the mutation log written after it"""
+        snapshot = load_graph_snapshot(self._snapshot_file)
+        if snapshot is not None:
+            graph = CSRGraph.from_snapshot(snapshot)
+            replayed = graph.apply_changes(
+                read_graph_log(self._log_file, snapshot.snapshot_id)
+            )
+            if replayed:
+                graph.compact()
+            logger.info(
+                f"Loaded graph from {self._snapshot_file} with {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges ({replayed} logged changes)"
+            )
+            return graph
+
+        if os.path.exists(self._graphml_xml_file):
+            # Graph persisted by an older NetworkXStorage, converted on the next save
+            import networkx as nx
+
+            graph = CSRGraph()
+            nx_graph = nx.read_graphml(self._graphml_xml_file)
+            for node_id, attrs in nx_graph.nodes(data=True):
+                graph.upsert_node(node_id, attrs)
+            for source, target, attrs in nx_graph.edges(data=True):
+                graph.upsert_edge(source, target, attrs)
+            graph.compact()
+            logger.info(
+                f"Loaded graph from {self._graphml_xml_file} with {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges"
+            )
+            return graph
+
+        logger.info("Created new empty graph")
+        return CSRGraph()
+
+    async def initialize(self):
+        """Initialize storage data"""
+        # Get the storage lock for use in other methods
+        self._storage_lock = get_namespace_lock(self.namespace)
+        async with self._storage_lock.writer():
+            self._version = await get_namespace_version(self.namespace)
+            # Another process saved the graph after it was loaded in __post_init__
+            if self._version:
+                self._graph = self._load_graph()
+
+    async def _get_graph(self) -> CSRGraph:
+        """Check if the storage should be synced with other processes"""
+        async with self._storage_lock.reader():
+            if self._version == await get_namespace_version(self.namespace):
+                return self._graph
+
+        async with self._storage_lock.writer():
+            await self._sync_changes()
+            return self._graph
+
+    async def _sync_changes(self) -> None:
+        """Apply changes published by other processes, the writer lock must be held"""
+        version, changes = await get_namespace_changes(self.namespace, self._version)
+        if changes is None:
+            # Changes are no longer in the log, reload the graph saved by the other process
+            logger.info(
+                f"Process {os.getpid()} reloading graph {self.namespace} due to update by another process"
+            )
+            self._graph = self._load_graph()
+            # Keep the changes of this process which are not saved yet
+            self._graph.apply_changes(self._pending_changes.items())
+        elif changes:
+            for graph_changes, _ in changes:
+                self._graph.apply_changes(graph_changes.items())
+            logger.debug(
+                f"Process {os.getpid()} applied {len(changes)} changes to graph {self.namespace}"
+            )
+        self._version = version
+
+    def _track_change(self, kind: str, key, attrs: dict | None) -> None:
+        """Remember a local change, changes are published to other processes once saved"""
+        if kind == "edge":
+            # The graph is undirected
+            key = tuple(sorted(key))
+        # Move the change to the end, keeping changes ordered by last modification
+        self._pending_changes.pop((kind, key), None)
+        self._pending_changes[(kind, key)] = attrs
+        self._local_changes += 1
+
+    async def get_graph_version(self) -> tuple[int, int]:
+        """The namespace version the graph is synced to and the local changes made"""
+        await self._get_graph()
+        return self._version, self._local_changes
+
+    async def has_node(self, node_id: str) -> bool:
+        graph = await self._get_graph()
+        return graph.has_node(node_id)
+
+    async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
+        graph = await self._get_graph()
+        return graph.has_edge(source_node_id, target_node_id)
+
+    async def get_node(self, node_id: str) -> dict[str, str] | None:
+        graph = await self._get_graph()
+        return graph.get_node(node_id)
+
+    async def node_degree(self, node_id: str) -> int:
+        graph = await self._get_graph()
+        return graph.degree(node_id)
+
+    async def edge_degree(self, src_id: str, tgt_id: str) -> int:
+        graph = await self._get_graph()
+        return graph.degree(src_id) + graph.degree(tgt_id)
+
+    async def get_edge(
+        self, source_node_id: str, target_node_id: str
+    ) -> dict[str, str] | None:
+        graph = await self._get_graph()
+        return graph.get_edge(source_node_id, target_node_id)
+
+    async def get_node_edges(self, source_node_id: str) -> list[tuple[str, str]] | None:
+        graph = await self._get_graph()
+        return graph.node_edges(source_node_id)
+
+    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, dict]:
+        graph = await self._get_graph()
+        result = {}
+        for node_id in node_ids:
+            node = graph.get_node(node_id)
+            if node is not None:
+                result[node_id] = node
+        return result
+
+    async def node_degrees_batch(self, node_ids: list[str]) -> dict[str, int]:
+        graph = await self._get_graph()
+        return dict(zip(node_ids, graph.degrees(node_ids).tolist()))
+
+    async def edge_degrees_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], int]:
+        graph = await self._get_graph()
+        degrees = graph.degrees([src for src, _ in edge_pairs]) + graph.degrees(
+            [tgt for _, tgt in edge_pairs]
+        )
+        return dict(zip(edge_pairs, degrees.tolist()))
+
+    async def get_edges_batch(
+        self, pairs: list[dict[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        graph = await self._get_graph()
+        result = {}
+        for pair in pairs:
+            edge = graph.get_edge(pair["src"], pair["tgt"])
+            if edge is not None:
+                result[(pair["src"], pair["tgt"])] = edge
+        return result
+
+    async def get_nodes_edges_batch(
+        self, node_ids: list[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        graph = await self._get_graph()
+        return {node_id: graph.node_edges(node_id) or [] for node_id in node_ids}
+
+    async def upsert_node(self, node_id: str, node_data: dict[str, str]) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        graph = await self._get_graph()
+        self._track_change("node", node_id, graph.upsert_node(node_id, node_data))
+
+    async def upsert_edge(
+        self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
+    ) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        graph = await self._get_graph()
+        self._track_change(
+            "edge",
+            (source_node_id, target_node_id),
+            graph.upsert_edge(source_node_id, target_node_id, edge_data),
+        )
+
+    async def delete_node(self, node_id: str) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+        graph = await self._get_graph()
+        if graph.remove_node(node_id):
+            self._track_change("node", node_id, None)
+            logger.debug(f"Node {node_id} deleted from the graph.")
+        else:
+            logger.warning(f"Node {node_id} not found in the graph for deletion.")
+
+    async def remove_nodes(self, nodes: list[str]):
+        """Delete multiple nodes
+
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+
+        Args:
+            nodes: List of node IDs to be deleted
+        """
+        graph = await self._get_graph()
+        for node in nodes:
+            if graph.remove_node(node):
+                self._track_change("node", node, None)
+
+    async def remove_edges(self, edges: list[tuple[str, str]]):
+        """Delete multiple edges
+
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+
+        Args:
+            edges: List of edges to be deleted, each edge is a (source, target) tuple
+        """
+        graph = await self._get_graph()
+        for source, target in edges:
+            if graph.remove_edge(source, target):
+                self._track_change("edge", (source, target), None)
+
+    async def get_all_labels(self) -> list[str]:
+        """
+        Get all node labels in the graph
+        Returns:
+            [label1, label2, ...]  # Alphabetically sorted label list
+        """
+        graph = await self._get_graph()
+        return sorted(graph.node_ids())
+
+    async def get_knowledge_graph(
+        self,
+        node_label: str,
+        max_depth: int = 3,
+        max_nodes: int = MAX_GRAPH_NODES,
+    ) -> KnowledgeGraph:
+        """
+        Retrieve a connected subgraph of nodes where the label includes the specified `node_label`.
+
+        Args:
+            node_label: Label of the starting node，* means all nodes
+            max_depth: Maximum depth of the subgraph, Defaults to 3
+            max_nodes: Maxiumu nodes to return by BFS, Defaults to 1000
+
+        Returns:
+            KnowledgeGraph object containing nodes and edges, with an is_truncated flag
+            indicating whether the graph was truncated due to max_nodes limit
+        """
+        graph = await self._get_graph()
+
+        result = KnowledgeGraph()
+        if node_label == "*":
+            nodes, result.is_truncated = graph.top_degree_nodes(max_nodes)
+        else:
+            if not graph.has_node(node_label):
+                logger.warning(f"Node {node_label} not found in the graph")
+                return KnowledgeGraph()  # Return empty graph
+            nodes, result.is_truncated = graph.bfs(node_label, max_depth, max_nodes)
+        if result.is_truncated:
+            logger.info(f"Graph truncated: limited to {max_nodes} nodes")
+
+        for i in nodes:
+            node_id = graph.node_name(i)
+            result.nodes.append(
+                KnowledgeGraphNode(
+                    id=node_id, labels=[node_id], properties=graph.node_attrs(i)
+                )
+            )
+
+        for row in graph.subgraph_edges(nodes):
+            source, target = graph.edge_endpoints(row)
+            # Esure unique edge_id for undirect graph
+            if source > target:
+                source, target = target, source
+            result.edges.append(
+                KnowledgeGraphEdge(
+                    id=f"{source}-{target}",
+                    type="DIRECTED",
+                    source=source,
+                    target=target,
+                    properties=graph.edge_attrs(row),
+                )
+            )
+
+        logger.info(
+            f"Subgraph query successful | Node count: {len(result.nodes)} | Edge count: {len(result.edges)}"
+        )
+        return result
+
+    async def index_done_callback(self) -> bool:
+        """Save data to disk"""
+        async with self._storage_lock.writer():
+            try:
+                # Merge changes saved by other processes first, so they are not overwritten
+                await self._sync_changes()
+                if not self._pending_changes:
+                    return True  # Nothing to save
+
+                # Save data to disk
+                persist_graph_changes(
+                    self._pending_changes,
+                    self._snapshot_file,
+                    self._log_file,
+                    lambda: self._graph.write_snapshot(self._snapshot_file),
+                )
+                # Publish the changes to other processes
+                self._version = await publish_namespace_changes(
+                    self.namespace, upserts=self._pending_changes
+                )
+                self._pending_changes = {}
+                if self._graph.needs_compaction():
+                    self._graph.compact()
+                return True  # Return success
+            except Exception as e:
+                logger.error(f"Error saving graph for {self.namespace}: {e}")
+                return False  # Return error
+
+    async def compact(self) -> bool:
+        """Rebuild the CSR arrays without the deleted nodes and edges, write a new
+        snapshot and reset the mutation log"""
+        if not await self.index_done_callback():
+            return False
+        async with self._storage_lock.writer():
+            await self._sync_changes()
+            if self._pending_changes:
+                # Changed since the save, left to the next compaction
+                return False
+            compacted = self._graph._mutations > 0
+            if compacted:
+                self._graph.compact()
+            return (
+                compact_graph_log(
+                    self._snapshot_file,
+                    self._log_file,
+                    lambda: self._graph.write_snapshot(self._snapshot_file),
+                )
+                or compacted
+            )
+
+    async def drop(self) -> dict[str, str]:
+        """Drop all graph data from storage and clean up resources
+
+        This method will:
+        1. Remove the graph snapshot, mutation log and GraphML files if they exist
+        2. Reset the graph to an empty state
+        3. Notify other processes to reload
+        4. Changes is persisted to disk immediately
+
+        Returns:
+            dict[str, str]: Operation status and message
+            - On success: {"status": "success", "message": "data dropped"}
+            - On failure: {"status": "error", "message": "<error details>"}
+        """
+        try:
+            async with self._storage_lock.writer():
+                for file_name in (
+                    self._snapshot_file,
+                    self._log_file,
+                    self._graphml_xml_file,
+                ):
+                    if os.path.exists(file_name):
+                        os.remove(file_name)
+                self._graph = CSRGraph()
+                # Other processes reload the removed graph
+                self._pending_changes = {}
+                self._version = await reset_namespace_changes(self.namespace)
+                logger.info(
+                    f"Process {os.getpid()} drop graph {self.namespace} (file:{self._snapshot_file})"
+                )
+            return {"status": "success", "message": "data dropped"}
+        except Exception as e:
+            logger.error(f"Error dropping graph {self.namespace}: {e}")
+            return {"status": "error", "message": str(e)}
@@ -0,0 +1,128 @@
+"""
+Persistent embedding cache of the contents upserted into vector storages.
+
+Embeddings are addressed by the md5 hash of (model, text), so re-merging an entity
+whose description did not change, re-ingesting mostly identical chunks or rebuilding
+a vector storage does not call the embedding function again for known contents.
+
+The cache of a working directory is kept in two append-only files:
+
+- embedding_cache_{dim}.f16: one float16 row per embedding, memory-mapped for lookups
+- embedding_cache_{dim}.keys: the 16 byte hash of each row, loaded in a dict
+
+Rows are appended under the namespace lock, worker processes pick up the rows
+appended by others when the files grew.
+"""
+
+import os
+from hashlib import md5
+from typing import Any
+
+import numpy as np
+
+from ..utils import logger
+from .shared_storage import get_namespace_lock
+
+KEY_SIZE = 16
+
+
+class EmbeddingCache:
+    """Content-addressed embeddings of a working directory, stored as float16"""
+
+    def __init__(self, working_dir: str, embedding_dim: int, model: str):
+        self.embedding_dim = embedding_dim
+        self.model = model
+        self.namespace = f"embedding_cache_{embedding_dim}"
+        self._keys_file = os.path.join(working_dir, f"{self.namespace}.keys")
+        self._vectors_file = os.path.join(working_dir, f"{self.namespace}.f16")
+        self._rows: dict[bytes, int] = {}
+        self._count = 0
+        self._vectors: np.ndarray | None = None
+        self._storage_lock = None
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> bytes:
+        return md5(f"{self.model}\0{text}".encode("utf-8")).digest()
+
+    def _refresh(self) -> None:
+        """Load the rows appended since the files were last read"""
+        if not os.path.exists(self._keys_file) or not os.path.exists(
+            self._vectors_file
+        ):
+            return
+        # Rows are complete once their key is written, vectors are written first
+        count = min(
+            os.path.getsize(self._keys_file) // KEY_SIZE,
+            os.path.getsize(self._vectors_file) // (2 * self.embedding_dim),
+        )
+        if count <= self._count:
+            return
+        with open(self._keys_file, "rb") as f:
+            f.seek(self._count * KEY_SIZE)
+            data = f.read((count - self._count) * KEY_SIZE)
+        for row, i in enumerate(range(0, len(data), KEY_SIZE), start=self._count):
+            self._rows.setdefault(data[i : i + KEY_SIZE], row)
+        self._count = count
+        self._vectors = np.memmap(
+            self._vectors_file,
+            dtype=np.float16,
+            mode="r",
+            shape=(count, self.embedding_dim),
+        )
+
+    def _get_lock(self):
+        if self._storage_lock is None:
+            self._storage_lock = get_namespace_lock(self.namespace)
+        return self._storage_lock
+
+    async def lookup(self, texts: list[str]) -> list[np.ndarray | None]:
+        """Cached embeddings of the texts, None for the ones not cached"""
+        keys = [self._key(text) for text in texts]
+        if any(key not in self._rows for key in keys):
+            self._refresh()
+        results = []
+        for key in keys:
+            row = self._rows.get(key)
+            results.append(
+                None if row is None else self._vectors[row].astype(np.float32)
+            )
+        found = sum(result is not None for result in results)
+        self.hits += found
+        self.misses += len(texts) - found
+        return results
+
+    async def store(self, texts: list[str], embeddings: np.ndarray) -> None:
+        """Append the embeddings of the texts which are not cached yet"""
+        async with self._get_lock().writer():
+            self._refresh()
+            new = {}
+            for text, embedding in zip(texts, embeddings):
+                key = self._key(text)
+                if key not in self._rows:
+                    new[key] = embedding
+            if not new:
+                return
+            try:
+                vectors = np.asarray(list(new.values()), dtype=np.float16)
+                # Drop the tail of an interrupted write, then append the vectors
+                # before the keys so that a row is only used once both are complete
+                with open(self._vectors_file, "ab") as f:
+                    f.truncate(self._count * 2 * self.embedding_dim)
+                    vectors.tofile(f)
+                with open(self._keys_file, "ab") as f:
+                    f.truncate(self._count * KEY_SIZE)
+                    f.write(b"".join(new))
+            except OSError as e:
+                logger.error(f"Failed to write embedding cache {self.namespace}: {e}")
+                return
+            self._refresh()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
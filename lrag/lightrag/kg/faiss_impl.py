@@ -1,7 +1,6 @@
 import os
 import time
-import asyncio
-from typing import Any, final
+from typing import Any, AsyncIterator, final
 import json
 import numpy as np
 
@@ -10,11 +9,15 @@ import pipmaster as pm
 
 from ..utils import logger, compute_mdhash_id
 from ..base import BaseVectorStorage
+from .vector_filter import VectorFilterIndex, resolve_filter_keys
+from .vector_quantization import get_quantization_config, top_indices
 
 from .shared_storage import (
-    get_storage_lock,
-    get_update_flag,
-    set_all_update_flags,
+    get_namespace_lock,
+    get_namespace_version,
+    get_namespace_changes,
+    publish_namespace_changes,
+    reset_namespace_changes,
 )
 
 import faiss  # type: ignore
@@ -43,6 +46,7 @@ class FaissVectorDBStorage(BaseVectorStorage):
                 "cosine_better_than_threshold must be specified in vector_db_storage_cls_kwargs"
             )
         self.cosine_better_than_threshold = cosine_threshold
+        self._quantization, self._rescore_factor = get_quantization_config(kwargs)
 
         # Where to save index file if you want persistent storage
         self._faiss_index_file = os.path.join(
@@ -55,38 +59,93 @@ class FaissVectorDBStorage(BaseVectorStorage):
         self._dim = self.embedding_func.embedding_dim
 
         # Create an empty Faiss index for inner product (useful for normalized vectors = cosine similarity).
-        # If you have a large number of vectors, you might want IVF or other indexes.
-        # For demonstration, we use a simple IndexFlatIP.
-        self._index = faiss.IndexFlatIP(self._dim)
+        # IndexFlatIP by default, IndexHNSWSQ with VECTOR_QUANTIZATION=int8.
+        self._index = self._new_index()
+        # Number of vectors the scalar quantizer of the index was trained on
+        self._trained_count = 0
+        # Faiss ids of deleted vectors still in the IndexHNSWSQ, skipped by searches
+        # until compact() rebuilds the index
+        self._deleted_fids: set[int] = set()
         # Keep a local store for metadata, IDs, etc.
         # Maps <int faiss_id> → metadata (including your original ID).
         self._id_to_meta = {}
+        # Faiss ids of the records by document, built on the first filtered query
+        self._filter_index: VectorFilterIndex | None = None
+
+        # Namespace version the index is at, and local changes not published yet
+        self._version = -1
+        self._pending_upserts: dict[str, dict[str, Any]] = {}
+        self._pending_deletes: set[str] = set()
 
         self._load_faiss_index()
 
     async def initialize(self):
         """Initialize storage data"""
-        # Get the update flag for cross-process update notification
-        self.storage_updated = await get_update_flag(self.namespace)
         # Get the storage lock for use in other methods
-        self._storage_lock = get_storage_lock()
+        self._storage_lock = get_namespace_lock(self.namespace)
+        async with self._storage_lock.writer():
+            self._version = await get_namespace_version(self.namespace)
+            # Another process saved the index after it was loaded in __post_init__
+            if self._version:
+                self._reload_faiss_index()
 
     async def _get_index(self):
-        """Check if the shtorage should be reloaded"""
-        # Acquire lock to prevent concurrent read and write
-        async with self._storage_lock:
-            # Check if storage was updated by another process
-            if self.storage_updated.value:
-                logger.info(
-                    f"Process {os.getpid()} FAISS reloading {self.namespace} due to update by another process"
-                )
-                # Reload data
-                self._index = faiss.IndexFlatIP(self._dim)
-                self._id_to_meta = {}
-                self._load_faiss_index()
-                self.storage_updated.value = False
+        """Check if the shtorage should be synced with other processes"""
+        async with self._storage_lock.reader():
+            if self._version == await get_namespace_version(self.namespace):
+                return self._index
+
+        async with self._storage_lock.writer():
+            await self._sync_changes()
         return self._index
 
+    async def _sync_changes(self) -> None:
+        """Apply changes published by other processes, the writer lock must be held"""
+        version, changes = await get_namespace_changes(self.namespace, self._version)
+        if changes is None:
+            # Changes are no longer in the log, reload the index saved by the other process
+            logger.info(
+                f"Process {os.getpid()} FAISS reloading {self.namespace} due to update by another process"
+            )
+            self._reload_faiss_index()
+            # Keep the changes of this process which are not saved yet
+            self._apply_changes(self._pending_upserts, self._pending_deletes)
+        elif changes:
+            for upserts, deletes in changes:
+                self._apply_changes(upserts, deletes)
+            logger.debug(
+                f"Process {os.getpid()} FAISS applied {len(changes)} changes to {self.namespace}"
+            )
+        self._version = version
+
+    def _apply_changes(self, upserts: dict[str, dict[str, Any]], deletes) -> None:
+        self._filter_index = None
+        changed_ids = set(upserts) | set(deletes)
+        stale_fids = [
+            fid
+            for fid, meta in self._id_to_meta.items()
+            if meta.get("__id__") in changed_ids
+        ]
+        if stale_fids:
+            self._remove_fids(stale_fids)
+        if upserts:
+            # Stored vectors are already normalized
+            self._add_records([dict(meta) for meta in upserts.values()])
+
+    def _track_changes(
+        self,
+        upserts: list[dict[str, Any]] | None = None,
+        deletes: list[str] | None = None,
+    ) -> None:
+        """Remember local changes, they are published to other processes once saved"""
+        self._filter_index = None
+        for meta in upserts or []:
+            self._pending_deletes.discard(meta["__id__"])
+            self._pending_upserts[meta["__id__"]] = meta
+        for id in deletes or []:
+            self._pending_upserts.pop(id, None)
+            self._pending_deletes.add(id)
+
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
         """
         Insert or update vectors in the Faiss index.
@@ -120,17 +179,7 @@ class FaissVectorDBStorage(BaseVectorStorage):
             list_data.append(meta)
             contents.append(v["content"])
 
-        # Split into batches for embedding if needed
-        batches = [
-            contents[i : i + self._max_batch_size]
-            for i in range(0, len(contents), self._max_batch_size)
-        ]
-
-        embedding_tasks = [self.embedding_func(batch) for batch in batches]
-        embeddings_list = await asyncio.gather(*embedding_tasks)
-
-        # Flatten the list of arrays
-        embeddings = np.concatenate(embeddings_list, axis=0)
+        embeddings = await self.embed_contents(contents)
         if len(embeddings) != len(list_data):
             logger.error(
                 f"Embedding size mismatch. Embeddings: {len(embeddings)}, Data: {len(list_data)}"
@@ -154,17 +203,13 @@ class FaissVectorDBStorage(BaseVectorStorage):
         if existing_ids_to_remove:
             await self._remove_faiss_ids(existing_ids_to_remove)
 
-        # Step 2: Add new vectors
-        index = await self._get_index()
-        start_idx = index.ntotal
-        index.add(embeddings)
-
-        # Step 3: Store metadata + vector for each new ID
-        for i, meta in enumerate(list_data):
-            fid = start_idx + i
+        # Step 2: Add new vectors with their metadata
+        await self._get_index()
+        for meta, embedding in zip(list_data, embeddings):
             # Store the raw vector so we can rebuild if something is removed
-            meta["__vector__"] = embeddings[i].tolist()
-            self._id_to_meta.update({fid: meta})
+            meta["__vector__"] = embedding.tolist()
+        self._add_records(list_data)
+        self._track_changes(upserts=list_data)
 
         logger.info(f"Upserted {len(list_data)} vectors into Faiss index.")
         return [m["__id__"] for m in list_data]
@@ -176,42 +221,160 @@ class FaissVectorDBStorage(BaseVectorStorage):
         Search by a textual query; returns top_k results with their metadata + similarity distance.
         """
         embedding = await self.embedding_func([query])
-        # embedding is shape (1, dim)
-        embedding = np.array(embedding, dtype=np.float32)
-        faiss.normalize_L2(embedding)  # we do in-place normalization
 
         logger.info(
             f"Query: {query}, top_k: {top_k}, threshold: {self.cosine_better_than_threshold}"
         )
 
+        keys = await resolve_filter_keys(self, ids) if ids else None
+        results = await self._search(embedding, top_k, keys)
+        return results[0]
+
+    async def query_batch(
+        self, queries: list[str], top_k: int, ids: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        """
+        Search by several textual queries, embedded together and searched with one index.search.
+        """
+        if not queries:
+            return []
+        embeddings = await self.embed_queries(queries)
+
+        logger.info(
+            f"Query batch: {len(queries)} queries, top_k: {top_k}, threshold: {self.cosine_better_than_threshold}"
+        )
+
+        keys = await resolve_filter_keys(self, ids) if ids else None
+        return await self._search(embeddings, top_k, keys)
+
+    async def _search(
+        self, embeddings, top_k: int, keys: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        # embeddings is shape (n, dim)
+        embeddings = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)  # we do in-place normalization
+
         # Perform the similarity search
         index = await self._get_index()
-        distances, indices = index.search(embedding, top_k)
+        # Quantized distances only select the candidates re-ranked below
+        k = top_k * self._rescore_factor if self._quantization else top_k
+        selector = None
+        if keys is not None:
+            # Only the vectors of the documents are compared with the query
+            rows = self._get_filter_index().rows(keys)
+            if not len(rows):
+                return [[] for _ in embeddings]
+            selector = faiss.IDSelectorBatch(rows)
+        elif self._deleted_fids:
+            deleted = faiss.IDSelectorBatch(np.fromiter(self._deleted_fids, np.int64))
+            selector = faiss.IDSelectorNot(deleted)
+        if self._quantization:
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(k, 64))
+        else:
+            params = faiss.SearchParameters(sel=selector) if selector else None
+        all_distances, all_indices = index.search(embeddings, k, params=params)
+
+        all_results = []
+        for embedding, distances, indices in zip(
+            embeddings, all_distances, all_indices
+        ):
+            if self._quantization:
+                indices = indices[indices != -1]
+                vectors = np.array(
+                    [self._id_to_meta[idx]["__vector__"] for idx in indices],
+                    dtype=np.float32,
+                ).reshape(-1, self._dim)
+                distances = vectors @ embedding
+                best = top_indices(distances, top_k)
+                distances, indices = distances[best], indices[best]
+
+            results = []
+            for dist, idx in zip(distances, indices):
+                if idx == -1:
+                    # Faiss returns -1 if no neighbor
+                    continue
+
+                # Cosine similarity threshold
+                if dist < self.cosine_better_than_threshold:
+                    continue
+
+                meta = self._id_to_meta.get(idx, {})
+                results.append(
+                    {
+                        **meta,
+                        "id": meta.get("__id__"),
+                        "distance": float(dist),
+                        "created_at": meta.get("__created_at__"),
+                    }
+                )
+            all_results.append(results)
 
-        distances = distances[0]
-        indices = indices[0]
+        return all_results
 
-        results = []
-        for dist, idx in zip(distances, indices):
-            if idx == -1:
-                # Faiss returns -1 if no neighbor
-                continue
-
-            # Cosine similarity threshold
-            if dist < self.cosine_better_than_threshold:
-                continue
-
-            meta = self._id_to_meta.get(idx, {})
-            results.append(
-                {
-                    **meta,
-                    "id": meta.get("__id__"),
-                    "distance": float(dist),
-                    "created_at": meta.get("__created_at__"),
-                }
+    def _new_index(self):
+        if self._quantization:
+            return faiss.IndexHNSWSQ(
+                self._dim,
+                faiss.ScalarQuantizer.QT_8bit,
+                32,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+        return faiss.IndexFlatIP(self._dim)
+
+    def _add_records(self, metas: list[dict[str, Any]]) -> None:
+        """Add records with normalized __vector__ to the index, under the next fids"""
+        self._filter_index = None
+        start_idx = self._index.ntotal
+        for i, meta in enumerate(metas):
+            self._id_to_meta[start_idx + i] = meta
+        if self._quantization and len(self._id_to_meta) > 2 * self._trained_count:
+            # Train the scalar quantizer on all vectors again each time the index doubled
+            self._rebuild_index()
+            return
+        self._index.add(
+            np.array([meta["__vector__"] for meta in metas], dtype=np.float32).reshape(
+                -1, self._dim
             )
+        )
 
-        return results
+    def _remove_fids(self, fid_list) -> None:
+        self._filter_index = None
+        for fid in fid_list:
+            self._id_to_meta.pop(fid, None)
+        if self._quantization:
+            # Rebuilding the HNSW graph is left to compact()
+            self._deleted_fids.update(fid_list)
+        else:
+            self._rebuild_index()
+
+    def _get_filter_index(self) -> VectorFilterIndex:
+        if self._filter_index is None:
+            self._filter_index = VectorFilterIndex(self._id_to_meta.items())
+        return self._filter_index
+
+    async def get_ids_by_doc_ids(self, doc_ids: list[str]) -> set[str]:
+        """Ids of the chunks of the documents"""
+        await self._get_index()
+        return self._get_filter_index().ids(doc_ids)
+
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their ids, from a snapshot of them"""
+        await self._get_index()
+        records = sorted(
+            (
+                meta
+                for meta in self._id_to_meta.values()
+                if after is None or meta["__id__"] > after
+            ),
+            key=lambda meta: meta["__id__"],
+        )
+        for start in range(0, len(records), batch_size):
+            yield [
+                {k: v for k, v in meta.items() if k != "__vector__"}
+                for meta in records[start : start + batch_size]
+            ]
 
     @property
     def client_storage(self):
@@ -235,6 +398,9 @@ class FaissVectorDBStorage(BaseVectorStorage):
                 to_remove.append(fid)
 
         if to_remove:
+            self._track_changes(
+                deletes=[self._id_to_meta[fid]["__id__"] for fid in to_remove]
+            )
             await self._remove_faiss_ids(to_remove)
         logger.debug(
             f"Successfully deleted {len(to_remove)} vectors from {self.namespace}"
@@ -266,6 +432,9 @@ class FaissVectorDBStorage(BaseVectorStorage):
 
         logger.debug(f"Found {len(relations)} relations for {entity_name}")
         if relations:
+            self._track_changes(
+                deletes=[self._id_to_meta[fid]["__id__"] for fid in relations]
+            )
             await self._remove_faiss_ids(relations)
             logger.debug(f"Deleted {len(relations)} relations for {entity_name}")
 
@@ -285,27 +454,33 @@ class FaissVectorDBStorage(BaseVectorStorage):
     async def _remove_faiss_ids(self, fid_list):
         """
         Remove a list of internal Faiss IDs from the index.
-        Because IndexFlatIP doesn't support 'removals',
-        we rebuild the index excluding those vectors.
         """
-        keep_fids = [fid for fid in self._id_to_meta if fid not in fid_list]
-
-        # Rebuild the index
-        vectors_to_keep = []
-        new_id_to_meta = {}
-        for new_fid, old_fid in enumerate(keep_fids):
-            vec_meta = self._id_to_meta[old_fid]
-            vectors_to_keep.append(vec_meta["__vector__"])  # stored as list
-            new_id_to_meta[new_fid] = vec_meta
+        async with self._storage_lock.writer():
+            self._remove_fids(fid_list)
 
-        async with self._storage_lock:
-            # Re-init index
-            self._index = faiss.IndexFlatIP(self._dim)
-            if vectors_to_keep:
-                arr = np.array(vectors_to_keep, dtype=np.float32)
-                self._index.add(arr)
-
-            self._id_to_meta = new_id_to_meta
+    def _rebuild_index(self):
+        """
+        Because IndexFlatIP doesn't support 'removals',
+        we rebuild the index from the vectors of the remaining records.
+        """
+        self._filter_index = None
+        self._id_to_meta = {
+            new_fid: self._id_to_meta[old_fid]
+            for new_fid, old_fid in enumerate(sorted(self._id_to_meta))
+        }
+        self._deleted_fids = set()
+
+        # Re-init index
+        self._index = self._new_index()
+        vectors = np.array(
+            [meta["__vector__"] for meta in self._id_to_meta.values()],
+            dtype=np.float32,
+        ).reshape(-1, self._dim)
+        self._trained_count = len(vectors) if self._quantization else 0
+        if len(vectors):
+            if self._quantization:
+                self._index.train(vectors)
+            self._index.add(vectors)
 
     def _save_faiss_index(self):
         """
@@ -323,11 +498,19 @@ class FaissVectorDBStorage(BaseVectorStorage):
         with open(self._meta_file, "w", encoding="utf-8") as f:
             json.dump(serializable_dict, f)
 
+    def _reload_faiss_index(self):
+        """Drop the in-memory index and load the one persisted on disk"""
+        self._index = self._new_index()
+        self._id_to_meta = {}
+        self._deleted_fids = set()
+        self._load_faiss_index()
+
     def _load_faiss_index(self):
         """
         Load the Faiss index + metadata from disk if it exists,
         and rebuild in-memory structures so we can query.
         """
+        self._filter_index = None
         if not os.path.exists(self._faiss_index_file):
             logger.warning("No existing Faiss index file found. Starting fresh.")
             return
@@ -344,6 +527,15 @@ class FaissVectorDBStorage(BaseVectorStorage):
             for fid_str, meta in stored_dict.items():
                 fid = int(fid_str)
                 self._id_to_meta[fid] = meta
+            self._trained_count = self._index.ntotal
+            self._deleted_fids = (
+                set(range(self._index.ntotal)) - self._id_to_meta.keys()
+            )
+
+            # The index was saved with the other VECTOR_QUANTIZATION setting
+            if isinstance(self._index, faiss.IndexHNSWSQ) != bool(self._quantization):
+                logger.info(f"Rebuilding Faiss index {self.namespace} for quantization")
+                self._rebuild_index()
 
             logger.info(
                 f"Faiss index loaded with {self._index.ntotal} vectors from {self._faiss_index_file}"
@@ -351,39 +543,47 @@ class FaissVectorDBStorage(BaseVectorStorage):
         except Exception as e:
             logger.error(f"Failed to load Faiss index or metadata: {e}")
             logger.warning("Starting with an empty Faiss index.")
-            self._index = faiss.IndexFlatIP(self._dim)
+            self._index = self._new_index()
             self._id_to_meta = {}
+            self._deleted_fids = set()
 
     async def index_done_callback(self) -> None:
-        async with self._storage_lock:
-            # Check if storage was updated by another process
-            if self.storage_updated.value:
-                # Storage was updated by another process, reload data instead of saving
-                logger.warning(
-                    f"Storage for FAISS {self.namespace} was updated by another process, reloading..."
-                )
-                async with self._storage_lock:
-                    self._index = faiss.IndexFlatIP(self._dim)
-                    self._id_to_meta = {}
-                    self._load_faiss_index()
-                    self.storage_updated.value = False
-                return False  # Return error
-
-        # Acquire lock and perform persistence
-        async with self._storage_lock:
+        async with self._storage_lock.writer():
             try:
+                # Merge changes saved by other processes first, so they are not overwritten
+                await self._sync_changes()
+                if not self._pending_upserts and not self._pending_deletes:
+                    return True  # Nothing to save
+
                 # Save data to disk
                 self._save_faiss_index()
-                # Notify other processes that data has been updated
-                await set_all_update_flags(self.namespace)
-                # Reset own update flag to avoid self-reloading
-                self.storage_updated.value = False
+                # Publish the changes to other processes
+                self._version = await publish_namespace_changes(
+                    self.namespace,
+                    upserts=self._pending_upserts,
+                    deletes=list(self._pending_deletes),
+                )
+                self._pending_upserts = {}
+                self._pending_deletes = set()
             except Exception as e:
                 logger.error(f"Error saving FAISS index for {self.namespace}: {e}")
                 return False  # Return error
 
         return True  # Return success
 
+    async def compact(self) -> bool:
+        """Rebuild the int8 index without the vectors of deleted records and save it"""
+        if not await self.index_done_callback():
+            return False
+        async with self._storage_lock.writer():
+            await self._sync_changes()
+            if not self._deleted_fids or self._pending_upserts or self._pending_deletes:
+                # Changed since the save, left to the next compaction
+                return False
+            self._rebuild_index()
+            self._save_faiss_index()
+            return True
+
     async def search_by_prefix(self, prefix: str) -> list[dict[str, Any]]:
         """Search for records with IDs starting with a specific prefix.
 
@@ -454,7 +654,7 @@ class FaissVectorDBStorage(BaseVectorStorage):
         This method will:
         1. Remove the vector database storage file if it exists
         2. Reinitialize the vector database client
-        3. Update flags to notify other processes
+        3. Notify other processes to reload
         4. Changes is persisted to disk immediately
 
         This method will remove all vectors from the Faiss index and delete the storage files.
@@ -465,10 +665,11 @@ class FaissVectorDBStorage(BaseVectorStorage):
             - On failure: {"status": "error", "message": "<error details>"}
         """
         try:
-            async with self._storage_lock:
+            async with self._storage_lock.writer():
                 # Reset the index
-                self._index = faiss.IndexFlatIP(self._dim)
+                self._index = self._new_index()
                 self._id_to_meta = {}
+                self._deleted_fids = set()
 
                 # Remove storage files if they exist
                 if os.path.exists(self._faiss_index_file):
@@ -479,9 +680,10 @@ class FaissVectorDBStorage(BaseVectorStorage):
                 self._id_to_meta = {}
                 self._load_faiss_index()
 
-                # Notify other processes
-                await set_all_update_flags(self.namespace)
-                self.storage_updated.value = False
+                # Other processes reload the removed index
+                self._pending_upserts = {}
+                self._pending_deletes = set()
+                self._version = await reset_namespace_changes(self.namespace)
 
                 logger.info(f"Process {os.getpid()} drop FAISS index {self.namespace}")
             return {"status": "success", "message": "data dropped"}
@@ -0,0 +1,257 @@
+"""
+On-disk format shared by the in-memory graph storages (NetworkXStorage, CSRGraphStorage).
+
+A graph is persisted as a msgpack snapshot of a node table and an edge table, whose
+attributes are stored column by column with string values interned in a shared string
+table. Changes made after the snapshot are appended to a mutation log that starts with
+the id of the snapshot it applies to. Once the log outgrows the snapshot, a new snapshot
+is written and the log is reset.
+
+Changes are ((kind, key), attrs) items: ("node", node_id) or ("edge", (src, tgt)) with
+the full attributes of the node or edge, or None if it was deleted.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+import pipmaster as pm
+
+from ..utils import logger
+
+if not pm.is_installed("msgpack"):
+    pm.install("msgpack")
+
+import msgpack
+
+from dotenv import load_dotenv
+
+# use the .env that is inside the current folder
+# allows to use different .env file for each lightrag instance
+# the OS environment variables take precedence over the .env file
+load_dotenv(dotenv_path=".env", override=False)
+
+# The mutation log is compacted into a new snapshot once it is larger than the
+# snapshot itself, and at least this size
+GRAPH_LOG_COMPACT_MIN_BYTES = int(
+    os.getenv("GRAPH_LOG_COMPACT_MIN_BYTES", 16 * 1024 * 1024)
+)
+
+SNAPSHOT_FORMAT = "lightrag-networkx"
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+@dataclass
+class GraphSnapshot:
+    """Node and edge tables of a snapshot, columns hold None for missing attributes"""
+
+    snapshot_id: int
+    node_ids: list[str]
+    node_columns: dict[str, list]
+    sources: list[str]
+    targets: list[str]
+    edge_columns: dict[str, list]
+
+
+def rows_to_columns(attrs_list: list[dict]) -> dict[str, list]:
+    """Turn a list of attribute dicts into columns"""
+    keys = {}
+    for attrs in attrs_list:
+        keys.update(dict.fromkeys(attrs))
+    return {key: [attrs.get(key) for attrs in attrs_list] for key in keys}
+
+
+def columns_to_rows(columns: dict[str, list], count: int) -> list[dict]:
+    """Turn columns back into a list of attribute dicts, skipping missing attributes"""
+    attrs_list = [{} for _ in range(count)]
+    for key, values in columns.items():
+        for attrs, value in zip(attrs_list, values):
+            if value is not None:
+                attrs[key] = value
+    return attrs_list
+
+
+def _encode_columns(columns: dict[str, list], intern) -> dict[str, Any]:
+    """Encode columns for a snapshot, string only columns are interned"""
+    encoded = {}
+    for key, values in columns.items():
+        interned = all(value is None or isinstance(value, str) for value in values)
+        if interned:
+            values = [None if value is None else intern(value) for value in values]
+        encoded[key] = {"interned": interned, "values": values}
+    return encoded
+
+
+def _decode_columns(columns: dict[str, Any], strings: list[str]) -> dict[str, list]:
+    decoded = {}
+    for key, column in columns.items():
+        values = column["values"]
+        if column["interned"]:
+            values = [None if value is None else strings[value] for value in values]
+        decoded[key] = values
+    return decoded
+
+
+def write_graph_snapshot(
+    file_name: str,
+    node_ids: list[str],
+    node_columns: dict[str, list],
+    sources: list[str],
+    targets: list[str],
+    edge_columns: dict[str, list],
+) -> int:
+    """Write node and edge tables as a msgpack snapshot
+
+    Node ids and string attribute values are interned in a shared string table.
+    Returns the snapshot id, which the mutation log written after it refers to.
+    """
+    logger.info(
+        f"Writing graph snapshot with {len(node_ids)} nodes, {len(sources)} edges"
+    )
+    strings: list[str] = []
+    string_ids: dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        string_id = string_ids.get(value)
+        if string_id is None:
+            string_id = string_ids[value] = len(strings)
+            strings.append(value)
+        return string_id
+
+    snapshot_id = time.time_ns()
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_FORMAT_VERSION,
+        "snapshot_id": snapshot_id,
+        "nodes": {
+            "id": [intern(node_id) for node_id in node_ids],
+            "columns": _encode_columns(node_columns, intern),
+        },
+        "edges": {
+            "source": [intern(source) for source in sources],
+            "target": [intern(target) for target in targets],
+            "columns": _encode_columns(edge_columns, intern),
+        },
+        "strings": strings,
+    }
+    # Replace the previous snapshot atomically
+    tmp_file = f"{file_name}.tmp"
+    with open(tmp_file, "wb") as f:
+        msgpack.pack(snapshot, f, use_bin_type=True)
+    os.replace(tmp_file, file_name)
+    return snapshot_id
+
+
+def load_graph_snapshot(file_name: str) -> GraphSnapshot | None:
+    """Load a graph snapshot, None if there is none"""
+    if not os.path.exists(file_name):
+        return None
+
+    with open(file_name, "rb") as f:
+        snapshot = msgpack.unpack(f, raw=False)
+    if snapshot.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{file_name} is not a graph snapshot")
+
+    strings = snapshot["strings"]
+    nodes, edges = snapshot["nodes"], snapshot["edges"]
+    return GraphSnapshot(
+        snapshot_id=snapshot["snapshot_id"],
+        node_ids=[strings[i] for i in nodes["id"]],
+        node_columns=_decode_columns(nodes["columns"], strings),
+        sources=[strings[i] for i in edges["source"]],
+        targets=[strings[i] for i in edges["target"]],
+        edge_columns=_decode_columns(edges["columns"], strings),
+    )
+
+
+def reset_graph_log(file_name: str, snapshot_id: int) -> None:
+    """Start an empty mutation log on top of the snapshot with the given id"""
+    tmp_file = f"{file_name}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(msgpack.packb({"snapshot_id": snapshot_id}))
+    os.replace(tmp_file, file_name)
+
+
+def append_graph_log(changes: dict[tuple, dict | None], file_name: str) -> None:
+    """Append changes to the mutation log"""
+    packer = msgpack.Packer(use_bin_type=True)
+    with open(file_name, "ab") as f:
+        f.write(
+            b"".join(
+                packer.pack([kind, key, attrs])
+                for (kind, key), attrs in changes.items()
+            )
+        )
+
+
+def read_graph_log(file_name: str, snapshot_id: int) -> Iterator[tuple]:
+    """Yield the changes of the mutation log written on top of a snapshot"""
+    if not os.path.exists(file_name):
+        return
+    with open(file_name, "rb") as f:
+        unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+        header = next(unpacker, None)
+        if not header or header.get("snapshot_id") != snapshot_id:
+            # Left over from before the last snapshot, already part of it
+            return
+        try:
+            for kind, key, attrs in unpacker:
+                yield (kind, tuple(key) if kind == "edge" else key), attrs
+        except (ValueError, msgpack.UnpackException) as e:
+            # A save interrupted while appending leaves a partial record behind
+            logger.warning(f"Ignoring corrupted tail of graph log {file_name}: {e}")
+
+
+def persist_graph_changes(
+    changes: dict[tuple, dict | None],
+    snapshot_file: str,
+    log_file: str,
+    write_snapshot: Callable[[], int],
+) -> None:
+    """Append changes to the mutation log, or compact it into a new snapshot
+
+    Args:
+        changes: Changes made since the last save
+        snapshot_file: The snapshot file of the graph
+        log_file: The mutation log file of the graph
+        write_snapshot: Writes the whole graph to snapshot_file, returns the snapshot id
+    """
+    if os.path.exists(snapshot_file) and os.path.exists(log_file):
+        log_size = os.path.getsize(log_file)
+        if log_size < max(GRAPH_LOG_COMPACT_MIN_BYTES, os.path.getsize(snapshot_file)):
+            append_graph_log(changes, log_file)
+            return
+
+    reset_graph_log(log_file, write_snapshot())
+
+
+def compact_graph_log(
+    snapshot_file: str,
+    log_file: str,
+    write_snapshot: Callable[[], int],
+) -> bool:
+    """Write a new snapshot and reset the mutation log if the log holds changes
+
+    Args:
+        snapshot_file: The snapshot file of the graph
+        log_file: The mutation log file of the graph
+        write_snapshot: Writes the whole graph to snapshot_file, returns the snapshot id
+
+    Returns:
+        bool: True if the log was compacted into a new snapshot
+    """
+    if not os.path.exists(snapshot_file) or not os.path.exists(log_file):
+        return False
+    with open(log_file, "rb") as f:
+        unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+        try:
+            next(unpacker, None)
+            has_changes = next(unpacker, None) is not None
+        except (ValueError, msgpack.UnpackException):
+            has_changes = True
+    if not has_changes:
+        return False
+
+    reset_graph_log(log_file, write_snapshot())
+    return True
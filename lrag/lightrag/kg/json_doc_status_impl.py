@@ -3,9 +3,13 @@ import os
 from typing import Any, Union, final
 
 from ..base import (
+    DOC_STATUS_SORT_FIELDS,
     DocProcessingStatus,
     DocStatus,
+    DocStatusPage,
     DocStatusStorage,
+    doc_status_sort_value,
+    page_doc_keys,
 )
 from ..utils import (
     load_json,
@@ -13,8 +17,8 @@ from ..utils import (
     write_json,
 )
 from .shared_storage import (
-    get_namespace_data,
-    get_storage_lock,
+    get_namespace_replica,
+    get_namespace_lock,
     get_data_init_lock,
     get_update_flag,
     set_all_update_flags,
@@ -31,36 +35,38 @@ class JsonDocStatusStorage(DocStatusStorage):
     def __post_init__(self):
         working_dir = self.global_config["working_dir"]
         self._file_name = os.path.join(working_dir, f"kv_store_{self.namespace}.json")
-        self._data = None
+        self._replica = None
         self._storage_lock = None
         self.storage_updated = None
 
     async def initialize(self):
         """Initialize storage data"""
-        self._storage_lock = get_storage_lock()
+        self._storage_lock = get_namespace_lock(self.namespace)
         self.storage_updated = await get_update_flag(self.namespace)
         async with get_data_init_lock():
             # check need_init must before get_namespace_data
             need_init = await try_initialize_namespace(self.namespace)
-            self._data = await get_namespace_data(self.namespace)
+            self._replica = await get_namespace_replica(self.namespace)
             if need_init:
                 loaded_data = load_json(self._file_name) or {}
-                async with self._storage_lock:
-                    self._data.update(loaded_data)
+                async with self._storage_lock.writer():
+                    await self._replica.load(loaded_data)
                     logger.info(
                         f"Process {os.getpid()} doc status load {self.namespace} with {len(loaded_data)} records"
                     )
 
     async def filter_keys(self, keys: set[str]) -> set[str]:
         """Return keys that should be processed (not in storage or not successfully processed)"""
-        async with self._storage_lock:
-            return set(keys) - set(self._data.keys())
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            return set(keys) - self._replica.data.keys()
 
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
         result: list[dict[str, Any]] = []
-        async with self._storage_lock:
+        async with self._storage_lock.reader():
+            await self._replica.sync()
             for id in ids:
-                data = self._data.get(id, None)
+                data = self._replica.data.get(id, None)
                 if data:
                     result.append(data)
         return result
@@ -68,40 +74,87 @@ class JsonDocStatusStorage(DocStatusStorage):
     async def get_status_counts(self) -> dict[str, int]:
         """Get counts of documents in each status"""
         counts = {status.value: 0 for status in DocStatus}
-        async with self._storage_lock:
-            for doc in self._data.values():
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            for doc in self._replica.data.values():
                 counts[doc["status"]] += 1
         return counts
 
+    @staticmethod
+    def _to_doc_status(data: dict[str, Any]) -> DocProcessingStatus:
+        # Make a copy of the data to avoid modifying the original
+        data = data.copy()
+        # The content of documents enqueued now is only stored in full_docs
+        data.setdefault("content", None)
+        # If file_path is not in data, use document id as file path
+        if "file_path" not in data:
+            data["file_path"] = "no-file-path"
+        return DocProcessingStatus(**data)
+
     async def get_docs_by_status(
         self, status: DocStatus
     ) -> dict[str, DocProcessingStatus]:
         """Get all documents with a specific status"""
         result = {}
-        async with self._storage_lock:
-            for k, v in self._data.items():
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            for k, v in self._replica.data.items():
                 if v["status"] == status.value:
                     try:
-                        # Make a copy of the data to avoid modifying the original
-                        data = v.copy()
-                        # If content is missing, use content_summary as content
-                        if "content" not in data and "content_summary" in data:
-                            data["content"] = data["content_summary"]
-                        # If file_path is not in data, use document id as file path
-                        if "file_path" not in data:
-                            data["file_path"] = "no-file-path"
-                        result[k] = DocProcessingStatus(**data)
+                        result[k] = self._to_doc_status(v)
                     except KeyError as e:
                         logger.error(f"Missing required field for document {k}: {e}")
                         continue
         return result
 
+    async def get_docs_paginated(
+        self,
+        statuses: list[DocStatus] | None = None,
+        sort_field: str = "updated_at",
+        sort_desc: bool = True,
+        limit: int = 50,
+        offset: int = 0,
+        after: tuple[Any, str] | None = None,
+        include_content: bool = False,
+    ) -> DocStatusPage:
+        """Get one page of the documents, optionally filtered by status
+
+        Only the sort keys of the matching records are collected, the records of
+        the page are converted to DocProcessingStatus.
+        """
+        if sort_field not in DOC_STATUS_SORT_FIELDS:
+            raise ValueError(f"Cannot sort documents by {sort_field}")
+        values = {status.value for status in statuses or DocStatus}
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            data = self._replica.data
+            keys = [
+                (str(doc_status_sort_value(k, v, sort_field)), k)
+                for k, v in data.items()
+                if v.get("status") in values
+            ]
+            page, next_cursor = page_doc_keys(keys, sort_desc, limit, offset, after)
+            documents = {}
+            for _, k in page:
+                record = data[k]
+                if not include_content:
+                    record = {
+                        **record,
+                        "content": record.get("content_summary", ""),
+                    }
+                try:
+                    documents[k] = self._to_doc_status(record)
+                except KeyError as e:
+                    logger.error(f"Missing required field for document {k}: {e}")
+        return DocStatusPage(
+            documents=documents, total=len(keys), next_cursor=next_cursor
+        )
+
     async def index_done_callback(self) -> None:
-        async with self._storage_lock:
+        async with self._storage_lock.writer():
             if self.storage_updated.value:
-                data_dict = (
-                    dict(self._data) if hasattr(self._data, "_getvalue") else self._data
-                )
+                await self._replica.sync()
+                data_dict = self._replica.data
                 logger.info(
                     f"Process {os.getpid()} doc status writting {len(data_dict)} records to {self.namespace}"
                 )
@@ -117,15 +170,16 @@ class JsonDocStatusStorage(DocStatusStorage):
         if not data:
             return
         logger.debug(f"Inserting {len(data)} records to {self.namespace}")
-        async with self._storage_lock:
-            self._data.update(data)
+        async with self._storage_lock.writer():
+            await self._replica.upsert(data)
             await set_all_update_flags(self.namespace)
 
         await self.index_done_callback()
 
     async def get_by_id(self, id: str) -> Union[dict[str, Any], None]:
-        async with self._storage_lock:
-            return self._data.get(id)
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            return self._replica.data.get(id)
 
     async def delete(self, doc_ids: list[str]) -> None:
         """Delete specific records from storage by their IDs
@@ -140,14 +194,8 @@ class JsonDocStatusStorage(DocStatusStorage):
         Returns:
             None
         """
-        async with self._storage_lock:
-            any_deleted = False
-            for doc_id in doc_ids:
-                result = self._data.pop(doc_id, None)
-                if result is not None:
-                    any_deleted = True
-
-            if any_deleted:
+        async with self._storage_lock.writer():
+            if await self._replica.delete(doc_ids):
                 await set_all_update_flags(self.namespace)
 
     async def drop(self) -> dict[str, str]:
@@ -164,8 +212,8 @@ class JsonDocStatusStorage(DocStatusStorage):
             - On failure: {"status": "error", "message": "<error details>"}
         """
         try:
-            async with self._storage_lock:
-                self._data.clear()
+            async with self._storage_lock.writer():
+                await self._replica.load({})
                 await set_all_update_flags(self.namespace)
 
             await self.index_done_callback()
@@ -1,18 +1,19 @@
 import os
 from dataclasses import dataclass
-from typing import Any, final
+from typing import Any, AsyncIterator, final
 
 from ..base import (
     BaseKVStorage,
 )
+from ..namespace import NameSpace, is_namespace
 from ..utils import (
     load_json,
     logger,
     write_json,
 )
 from .shared_storage import (
-    get_namespace_data,
-    get_storage_lock,
+    get_namespace_replica,
+    get_namespace_lock,
     get_data_init_lock,
     get_update_flag,
     set_all_update_flags,
@@ -21,66 +22,72 @@ from .shared_storage import (
 )
 
 
+def migrate_llm_cache_layout(data: dict[str, Any]) -> int:
+    """Convert a LLM cache from the legacy {mode: {hash: entry}} layout to flat
+    "mode:hash" keys in place
+
+    Returns:
+        int: Number of cache entries migrated, 0 if the cache was already flat
+    """
+    legacy_modes = [key for key in data if ":" not in key]
+    migrated = 0
+    for mode in legacy_modes:
+        mode_cache = data.pop(mode) or {}
+        for args_hash, entry in mode_cache.items():
+            data[f"{mode}:{args_hash}"] = entry
+        migrated += len(mode_cache)
+    return migrated
+
+
 @final
 @dataclass
 class JsonKVStorage(BaseKVStorage):
     def __post_init__(self):
         working_dir = self.global_config["working_dir"]
         self._file_name = os.path.join(working_dir, f"kv_store_{self.namespace}.json")
-        self._data = None
+        # LLM cache entries are stored flat under "mode:hash" keys, so that reading
+        # or saving one entry does not copy the whole cache of its mode
+        self._is_llm_cache = is_namespace(
+            self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE
+        )
+        self._replica = None
         self._storage_lock = None
         self.storage_updated = None
 
     async def initialize(self):
         """Initialize storage data"""
-        self._storage_lock = get_storage_lock()
+        self._storage_lock = get_namespace_lock(self.namespace)
         self.storage_updated = await get_update_flag(self.namespace)
         async with get_data_init_lock():
             # check need_init must before get_namespace_data
             need_init = await try_initialize_namespace(self.namespace)
-            self._data = await get_namespace_data(self.namespace)
+            self._replica = await get_namespace_replica(self.namespace)
             if need_init:
                 loaded_data = load_json(self._file_name) or {}
-                async with self._storage_lock:
-                    self._data.update(loaded_data)
-
-                    # Calculate data count based on namespace
-                    if self.namespace.endswith("cache"):
-                        # For cache namespaces, sum the cache entries across all cache types
-                        data_count = sum(
-                            len(first_level_dict)
-                            for first_level_dict in loaded_data.values()
-                            if isinstance(first_level_dict, dict)
-                        )
-                    else:
-                        # For non-cache namespaces, use the original count method
-                        data_count = len(loaded_data)
+                migrated = 0
+                if self._is_llm_cache:
+                    migrated = migrate_llm_cache_layout(loaded_data)
+                async with self._storage_lock.writer():
+                    await self._replica.load(loaded_data)
+                    if migrated:
+                        # Persist the migrated layout on the next index_done_callback
+                        await set_all_update_flags(self.namespace)
 
                     logger.info(
-                        f"Process {os.getpid()} KV load {self.namespace} with {data_count} records"
+                        f"Process {os.getpid()} KV load {self.namespace} with {len(loaded_data)} records"
                     )
+                    if migrated:
+                        logger.info(
+                            f"Migrated {migrated} LLM cache entries of {self.namespace} to the flat layout"
+                        )
 
     async def index_done_callback(self) -> None:
-        async with self._storage_lock:
+        async with self._storage_lock.writer():
             if self.storage_updated.value:
-                data_dict = (
-                    dict(self._data) if hasattr(self._data, "_getvalue") else self._data
-                )
-
-                # Calculate data count based on namespace
-                if self.namespace.endswith("cache"):
-                    # # For cache namespaces, sum the cache entries across all cache types
-                    data_count = sum(
-                        len(first_level_dict)
-                        for first_level_dict in data_dict.values()
-                        if isinstance(first_level_dict, dict)
-                    )
-                else:
-                    # For non-cache namespaces, use the original count method
-                    data_count = len(data_dict)
-
+                await self._replica.sync()
+                data_dict = self._replica.data
                 logger.info(
-                    f"Process {os.getpid()} KV writting {data_count} records to {self.namespace}"
+                    f"Process {os.getpid()} KV writting {len(data_dict)} records to {self.namespace}"
                 )
                 write_json(data_dict, self._file_name)
                 await clear_all_update_flags(self.namespace)
@@ -91,27 +98,57 @@ class JsonKVStorage(BaseKVStorage):
         Returns:
             Dictionary containing all stored data
         """
-        async with self._storage_lock:
-            return dict(self._data)
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            return dict(self._replica.data)
+
+    def _get(self, id: str) -> dict[str, Any] | None:
+        data = self._replica.data
+        if self._is_llm_cache and ":" not in id:
+            # A cache mode, collect its entries
+            prefix = f"{id}:"
+            mode_cache = {
+                key[len(prefix) :]: data[key] for key in self._replica.keys_of_group(id)
+            }
+            return mode_cache or None
+        return data.get(id)
 
     async def get_by_id(self, id: str) -> dict[str, Any] | None:
-        async with self._storage_lock:
-            return self._data.get(id)
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            return self._get(id)
 
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
-        async with self._storage_lock:
-            return [
-                (
-                    {k: v for k, v in self._data[id].items()}
-                    if self._data.get(id, None)
-                    else None
-                )
-                for id in ids
-            ]
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            results = [self._get(id) for id in ids]
+            return [dict(result) if result else None for result in results]
+
+    async def get_by_mode_and_id(self, mode: str, id: str) -> dict[str, Any] | None:
+        """Specifically for llm_response_cache."""
+        if not self._is_llm_cache:
+            return None
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            entry = self._replica.data.get(f"{mode}:{id}")
+            return {id: entry} if entry is not None else None
 
     async def filter_keys(self, keys: set[str]) -> set[str]:
-        async with self._storage_lock:
-            return set(keys) - set(self._data.keys())
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            return set(keys) - self._replica.data.keys()
+
+    async def iter_keys(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[str]]:
+        """Iterate over the keys in order, from a snapshot of them"""
+        async with self._storage_lock.reader():
+            await self._replica.sync()
+            keys = sorted(
+                key for key in self._replica.data if after is None or key > after
+            )
+        for start in range(0, len(keys), batch_size):
+            yield keys[start : start + batch_size]
 
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
         """
@@ -121,9 +158,15 @@ class JsonKVStorage(BaseKVStorage):
         """
         if not data:
             return
+        if self._is_llm_cache:
+            data = {
+                f"{mode}:{args_hash}": entry
+                for mode, mode_cache in data.items()
+                for args_hash, entry in mode_cache.items()
+            }
         logger.debug(f"Inserting {len(data)} records to {self.namespace}")
-        async with self._storage_lock:
-            self._data.update(data)
+        async with self._storage_lock.writer():
+            await self._replica.upsert(data)
             await set_all_update_flags(self.namespace)
 
     async def delete(self, ids: list[str]) -> None:
@@ -139,14 +182,8 @@ class JsonKVStorage(BaseKVStorage):
         Returns:
             None
         """
-        async with self._storage_lock:
-            any_deleted = False
-            for doc_id in ids:
-                result = self._data.pop(doc_id, None)
-                if result is not None:
-                    any_deleted = True
-
-            if any_deleted:
+        async with self._storage_lock.writer():
+            if await self._replica.delete(ids):
                 await set_all_update_flags(self.namespace)
 
     async def drop_cache_by_modes(self, modes: list[str] | None = None) -> bool:
@@ -167,7 +204,16 @@ class JsonKVStorage(BaseKVStorage):
             return False
 
         try:
-            await self.delete(modes)
+            if not self._is_llm_cache:
+                await self.delete(modes)
+                return True
+            async with self._storage_lock.writer():
+                await self._replica.sync()
+                keys = [
+                    key for mode in modes for key in self._replica.keys_of_group(mode)
+                ]
+                if await self._replica.delete(keys):
+                    await set_all_update_flags(self.namespace)
             return True
         except Exception:
             return False
@@ -187,8 +233,8 @@ class JsonKVStorage(BaseKVStorage):
             - On failure: {"status": "error", "message": "<error details>"}
         """
         try:
-            async with self._storage_lock:
-                self._data.clear()
+            async with self._storage_lock.writer():
+                await self._replica.load({})
                 await set_all_update_flags(self.namespace)
 
             await self.index_done_callback()
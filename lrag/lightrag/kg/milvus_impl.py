@@ -1,8 +1,6 @@
-import asyncio
 import os
-from typing import Any, final
+from typing import Any, AsyncIterator, final
 from dataclasses import dataclass
-import numpy as np
 from ..utils import logger, compute_mdhash_id
 from ..base import BaseVectorStorage
 import pipmaster as pm
@@ -87,15 +85,8 @@ class MilvusVectorDBStorage(BaseVectorStorage):
             for k, v in data.items()
         ]
         contents = [v["content"] for v in data.values()]
-        batches = [
-            contents[i : i + self._max_batch_size]
-            for i in range(0, len(contents), self._max_batch_size)
-        ]
-
-        embedding_tasks = [self.embedding_func(batch) for batch in batches]
-        embeddings_list = await asyncio.gather(*embedding_tasks)
 
-        embeddings = np.concatenate(embeddings_list)
+        embeddings = await self.embed_contents(contents)
         for i, d in enumerate(list_data):
             d["vector"] = embeddings[i]
         results = self._client.upsert(collection_name=self.namespace, data=list_data)
@@ -121,6 +112,31 @@ class MilvusVectorDBStorage(BaseVectorStorage):
             for dp in results[0]
         ]
 
+    async def query_batch(
+        self, queries: list[str], top_k: int, ids: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        if not queries:
+            return []
+        embeddings = await self.embed_queries(queries)
+        # One search request with a vector per query
+        results = self._client.search(
+            collection_name=self.namespace,
+            data=embeddings,
+            limit=top_k,
+            output_fields=list(self.meta_fields),
+            search_params={
+                "metric_type": "COSINE",
+                "params": {"radius": self.cosine_better_than_threshold},
+            },
+        )
+        return [
+            [
+                {**dp["entity"], "id": dp["id"], "distance": dp["distance"]}
+                for dp in hits
+            ]
+            for hits in results
+        ]
+
     async def index_done_callback(self) -> None:
         # Milvus handles persistence automatically
         pass
@@ -259,6 +275,26 @@ class MilvusVectorDBStorage(BaseVectorStorage):
             logger.error(f"Error retrieving vector data for ID {id}: {e}")
             return None
 
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their ids, with a query iterator"""
+        iterator = self._client.query_iterator(
+            collection_name=self.namespace,
+            batch_size=batch_size,
+            filter=f'id > "{after}"' if after is not None else "",
+            output_fields=list(self.meta_fields) + ["id"],
+        )
+        try:
+            # The iterator pages through the primary keys in order
+            while records := iterator.next():
+                yield [
+                    {"__id__": record["id"], **record}
+                    for record in sorted(records, key=lambda record: record["id"])
+                ]
+        finally:
+            iterator.close()
+
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
         """Get multiple vector data by their IDs
 
@@ -4,14 +4,16 @@ import numpy as np
 import configparser
 import asyncio
 
-from typing import Any, List, Union, final
+from typing import Any, AsyncIterator, List, Union, final
 
 from ..base import (
+    DOC_STATUS_SORT_FIELDS,
     BaseGraphStorage,
     BaseKVStorage,
     BaseVectorStorage,
     DocProcessingStatus,
     DocStatus,
+    DocStatusPage,
     DocStatusStorage,
 )
 from ..namespace import NameSpace, is_namespace
@@ -30,6 +32,7 @@ from motor.motor_asyncio import (  # type: ignore
     AsyncIOMotorDatabase,
     AsyncIOMotorCollection,
 )
+from pymongo import UpdateOne  # type: ignore
 from pymongo.operations import SearchIndexModel  # type: ignore
 from pymongo.errors import PyMongoError  # type: ignore
 
@@ -74,6 +77,26 @@ class ClientManager:
                         cls._instances["db"] = None
 
 
+async def _iter_documents(
+    collection: AsyncIOMotorCollection,
+    batch_size: int,
+    after: str | None,
+    projection: dict[str, int],
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Pages of the documents of a collection in _id order, each one starting after
+    the last _id of the previous page"""
+    while True:
+        query = {"_id": {"$gt": after}} if after is not None else {}
+        cursor = collection.find(query, projection).sort("_id", 1).limit(batch_size)
+        docs = await cursor.to_list(length=batch_size)
+        if not docs:
+            return
+        yield docs
+        if len(docs) < batch_size:
+            return
+        after = docs[-1]["_id"]
+
+
 @final
 @dataclass
 class MongoKVStorage(BaseKVStorage):
@@ -100,7 +123,19 @@ class MongoKVStorage(BaseKVStorage):
 
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
         cursor = self._data.find({"_id": {"$in": ids}})
-        return await cursor.to_list()
+        # In the order of ids, None for missing ids, like the other storages
+        docs = {doc["_id"]: doc async for doc in cursor}
+        return [docs.get(id) for id in ids]
+
+    async def iter_keys(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[str]]:
+        """Iterate over the keys in order, by _id ranges
+
+        Keys of the LLM cache are the "mode_hash" ids of its documents.
+        """
+        async for docs in _iter_documents(self._data, batch_size, after, {"_id": 1}):
+            yield [doc["_id"] for doc in docs]
 
     async def filter_keys(self, keys: set[str]) -> set[str]:
         cursor = self._data.find({"_id": {"$in": list(keys)}}, {"_id": 1})
@@ -112,26 +147,22 @@ class MongoKVStorage(BaseKVStorage):
         if not data:
             return
 
+        # One unordered bulk write instead of a round trip per record
+        operations: list[UpdateOne] = []
         if is_namespace(self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
-            update_tasks: list[Any] = []
             for mode, items in data.items():
                 for k, v in items.items():
                     key = f"{mode}_{k}"
                     data[mode][k]["_id"] = f"{mode}_{k}"
-                    update_tasks.append(
-                        self._data.update_one(
-                            {"_id": key}, {"$setOnInsert": v}, upsert=True
-                        )
+                    operations.append(
+                        UpdateOne({"_id": key}, {"$setOnInsert": v}, upsert=True)
                     )
-            await asyncio.gather(*update_tasks)
         else:
-            update_tasks = []
             for k, v in data.items():
                 data[k]["_id"] = k
-                update_tasks.append(
-                    self._data.update_one({"_id": k}, {"$set": v}, upsert=True)
-                )
-            await asyncio.gather(*update_tasks)
+                operations.append(UpdateOne({"_id": k}, {"$set": v}, upsert=True))
+        if operations:
+            await self._data.bulk_write(operations, ordered=False)
 
     async def get_by_mode_and_id(self, mode: str, id: str) -> Union[dict, None]:
         if is_namespace(self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
@@ -224,6 +255,8 @@ class MongoDocStatusStorage(DocStatusStorage):
         if self.db is None:
             self.db = await ClientManager.get_client()
             self._data = await get_or_create_collection(self.db, self._collection_name)
+            # Index of the paginated document listing (get_docs_paginated)
+            await self._data.create_index([("status", 1), ("updated_at", -1)])
             logger.debug(f"Use MongoDB as DocStatus {self._collection_name}")
 
     async def finalize(self):
@@ -248,13 +281,11 @@ class MongoDocStatusStorage(DocStatusStorage):
         logger.info(f"Inserting {len(data)} to {self.namespace}")
         if not data:
             return
-        update_tasks: list[Any] = []
+        operations = []
         for k, v in data.items():
             data[k]["_id"] = k
-            update_tasks.append(
-                self._data.update_one({"_id": k}, {"$set": v}, upsert=True)
-            )
-        await asyncio.gather(*update_tasks)
+            operations.append(UpdateOne({"_id": k}, {"$set": v}, upsert=True))
+        await self._data.bulk_write(operations, ordered=False)
 
     async def get_status_counts(self) -> dict[str, int]:
         """Get counts of documents in each status"""
@@ -274,7 +305,7 @@ class MongoDocStatusStorage(DocStatusStorage):
         result = await cursor.to_list()
         return {
             doc["_id"]: DocProcessingStatus(
-                content=doc["content"],
+                content=doc.get("content"),
                 content_summary=doc.get("content_summary"),
                 content_length=doc["content_length"],
                 status=doc["status"],
@@ -286,6 +317,67 @@ class MongoDocStatusStorage(DocStatusStorage):
             for doc in result
         }
 
+    async def get_docs_paginated(
+        self,
+        statuses: list[DocStatus] | None = None,
+        sort_field: str = "updated_at",
+        sort_desc: bool = True,
+        limit: int = 50,
+        offset: int = 0,
+        after: tuple[Any, str] | None = None,
+        include_content: bool = False,
+    ) -> DocStatusPage:
+        """Get one page of the documents, filtered, sorted and paged by MongoDB"""
+        if sort_field not in DOC_STATUS_SORT_FIELDS:
+            raise ValueError(f"Cannot sort documents by {sort_field}")
+        query: dict[str, Any] = {
+            "status": {"$in": [status.value for status in statuses or DocStatus]}
+        }
+        total = await self._data.count_documents(query)
+
+        field_name = "_id" if sort_field == "id" else sort_field
+        direction = -1 if sort_desc else 1
+        if after is not None:
+            value, after_id = after
+            op = "$lt" if sort_desc else "$gt"
+            if value is None:
+                # Missing values sort first, the values of the other documents are greater
+                beyond = [] if sort_desc else [{field_name: {"$ne": None}}]
+            else:
+                beyond = [{field_name: {op: value}}]
+            query = {
+                **query,
+                "$or": [*beyond, {field_name: value, "_id": {op: after_id}}],
+            }
+            offset = 0
+        cursor = (
+            self._data.find(query, None if include_content else {"content": 0})
+            .sort([(field_name, direction), ("_id", direction)])
+            .skip(offset)
+            .limit(limit + 1)
+        )
+        rows = await cursor.to_list(length=limit + 1)
+        documents = {
+            doc["_id"]: DocProcessingStatus(
+                content=doc.get("content")
+                if include_content
+                else doc.get("content_summary"),
+                content_summary=doc.get("content_summary"),
+                content_length=doc["content_length"],
+                status=doc["status"],
+                created_at=doc.get("created_at"),
+                updated_at=doc.get("updated_at"),
+                chunks_count=doc.get("chunks_count", -1),
+                file_path=doc.get("file_path", doc["_id"]),
+            )
+            for doc in rows[:limit]
+        }
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = (last.get(field_name), last["_id"])
+        return DocStatusPage(documents=documents, total=total, next_cursor=next_cursor)
+
     async def index_done_callback(self) -> None:
         # Mongo handles persistence automatically
         pass
@@ -1007,23 +1099,18 @@ class MongoVectorDBStorage(BaseVectorStorage):
             for k, v in data.items()
         ]
         contents = [v["content"] for v in data.values()]
-        batches = [
-            contents[i : i + self._max_batch_size]
-            for i in range(0, len(contents), self._max_batch_size)
-        ]
 
-        embedding_tasks = [self.embedding_func(batch) for batch in batches]
-        embeddings_list = await asyncio.gather(*embedding_tasks)
-        embeddings = np.concatenate(embeddings_list)
+        embeddings = await self.embed_contents(contents)
         for i, d in enumerate(list_data):
             d["vector"] = np.array(embeddings[i], dtype=np.float32).tolist()
 
-        update_tasks = []
-        for doc in list_data:
-            update_tasks.append(
-                self._data.update_one({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
-            )
-        await asyncio.gather(*update_tasks)
+        await self._data.bulk_write(
+            [
+                UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
+                for doc in list_data
+            ],
+            ordered=False,
+        )
 
         return list_data
 
@@ -1162,6 +1249,13 @@ class MongoVectorDBStorage(BaseVectorStorage):
             logger.error(f"Error searching by prefix in {self.namespace}: {str(e)}")
             return []
 
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their ids, by _id ranges"""
+        async for docs in _iter_documents(self._data, batch_size, after, {"vector": 0}):
+            yield [{"__id__": doc.pop("_id"), **doc} for doc in docs]
+
     async def get_by_id(self, id: str) -> dict[str, Any] | None:
         """Get vector data by its ID
 
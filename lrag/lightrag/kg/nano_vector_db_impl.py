@@ -1,6 +1,5 @@
-import asyncio
 import os
-from typing import Any, final
+from typing import Any, AsyncIterator, final
 from dataclasses import dataclass
 import numpy as np
 import time
@@ -16,12 +15,25 @@ if not pm.is_installed("nano-vectordb"):
     pm.install("nano-vectordb")
 
 from nano_vectordb import NanoVectorDB
+from nano_vectordb.dbs import normalize
+from .vector_filter import VectorFilterIndex, resolve_filter_keys
+from .vector_quantization import (
+    Int8Matrix,
+    get_quantization_config,
+    map_to_temporary_file,
+    top_indices,
+)
 from .shared_storage import (
-    get_storage_lock,
-    get_update_flag,
-    set_all_update_flags,
+    get_namespace_lock,
+    get_namespace_version,
+    get_namespace_changes,
+    publish_namespace_changes,
+    reset_namespace_changes,
 )
 
+# Scores computed at once by a query_batch, the queries are split in groups below it
+SEARCH_SCORES_PER_GROUP = 2**24
+
 
 @final
 @dataclass
@@ -30,7 +42,14 @@ class NanoVectorDBStorage(BaseVectorStorage):
         # Initialize basic attributes
         self._client = None
         self._storage_lock = None
-        self.storage_updated = None
+        # Namespace version the client is at, and local changes not published yet
+        self._version = -1
+        self._pending_upserts: dict[str, dict[str, Any]] = {}
+        self._pending_deletes: set[str] = set()
+        # Rows of the records by document and int8 codes of the matrix, built on
+        # the first query needing them. Writes update the codes of their rows
+        self._filter_index: VectorFilterIndex | None = None
+        self._int8_matrix: Int8Matrix | None = None
 
         # Use global config value if specified, otherwise use default
         kwargs = self.global_config.get("vector_db_storage_cls_kwargs", {})
@@ -40,6 +59,7 @@ class NanoVectorDBStorage(BaseVectorStorage):
                 "cosine_better_than_threshold must be specified in vector_db_storage_cls_kwargs"
             )
         self.cosine_better_than_threshold = cosine_threshold
+        self._quantization, self._rescore_factor = get_quantization_config(kwargs)
 
         self._client_file_name = os.path.join(
             self.global_config["working_dir"], f"vdb_{self.namespace}.json"
@@ -53,30 +73,106 @@ class NanoVectorDBStorage(BaseVectorStorage):
 
     async def initialize(self):
         """Initialize storage data"""
-        # Get the update flag for cross-process update notification
-        self.storage_updated = await get_update_flag(self.namespace)
         # Get the storage lock for use in other methods
-        self._storage_lock = get_storage_lock(enable_logging=False)
-
-    async def _get_client(self):
-        """Check if the storage should be reloaded"""
-        # Acquire lock to prevent concurrent read and write
-        async with self._storage_lock:
-            # Check if data needs to be reloaded
-            if self.storage_updated.value:
-                logger.info(
-                    f"Process {os.getpid()} reloading {self.namespace} due to update by another process"
-                )
-                # Reload data
+        self._storage_lock = get_namespace_lock(self.namespace, enable_logging=False)
+        async with self._storage_lock.writer():
+            self._version = await get_namespace_version(self.namespace)
+            # Another process saved the file after it was loaded in __post_init__
+            if self._version:
+                self._reset_search_indexes()
                 self._client = NanoVectorDB(
                     self.embedding_func.embedding_dim,
                     storage_file=self._client_file_name,
                 )
-                # Reset update flag
-                self.storage_updated.value = False
 
+    async def _get_client(self):
+        """Check if the storage should be synced with other processes"""
+        async with self._storage_lock.reader():
+            if self._version == await get_namespace_version(self.namespace):
+                return self._client
+
+        async with self._storage_lock.writer():
+            await self._sync_changes()
             return self._client
 
+    async def _sync_changes(self) -> None:
+        """Apply changes published by other processes, the writer lock must be held"""
+        version, changes = await get_namespace_changes(self.namespace, self._version)
+        if changes is None:
+            # Changes are no longer in the log, reload the file saved by the other process
+            logger.info(
+                f"Process {os.getpid()} reloading {self.namespace} due to update by another process"
+            )
+            self._reset_search_indexes()
+            self._client = NanoVectorDB(
+                self.embedding_func.embedding_dim,
+                storage_file=self._client_file_name,
+            )
+            # Keep the changes of this process which are not saved yet
+            self._apply_changes(self._pending_upserts, self._pending_deletes)
+        elif changes:
+            for upserts, deletes in changes:
+                self._apply_changes(upserts, deletes)
+            logger.debug(
+                f"Process {os.getpid()} applied {len(changes)} changes to {self.namespace}"
+            )
+        self._version = version
+
+    def _apply_changes(self, upserts: dict[str, dict[str, Any]], deletes) -> None:
+        if upserts:
+            # NanoVectorDB.upsert consumes the __vector__ of the records passed in
+            self._upsert_records(
+                self._client, [dict(record) for record in upserts.values()]
+            )
+        if deletes:
+            self._delete_records(self._client, list(deletes))
+
+    def _upsert_records(self, client, records: list[dict[str, Any]]):
+        """Upsert records into the client and quantize the vectors of their rows"""
+        self._filter_index = None
+        storage = getattr(client, "_NanoVectorDB__storage")
+        count = len(storage["data"])
+        results = client.upsert(datas=records)
+        if self._int8_matrix is not None:
+            updated = set(results["update"])
+            rows = np.array(
+                [
+                    i
+                    for i, dp in enumerate(storage["data"][:count])
+                    if dp["__id__"] in updated
+                ]
+                if updated
+                else [],
+                dtype=np.int64,
+            )
+            self._int8_matrix.update(rows, storage["matrix"][rows])
+            self._int8_matrix.append(storage["matrix"][count:])
+        return results
+
+    def _delete_records(self, client, ids: list[str]) -> None:
+        """Delete records from the client and the codes of their rows"""
+        self._filter_index = None
+        if self._int8_matrix is not None:
+            storage = getattr(client, "_NanoVectorDB__storage")
+            id_set = set(ids)
+            self._int8_matrix.delete(
+                [i for i, dp in enumerate(storage["data"]) if dp["__id__"] in id_set]
+            )
+        client.delete(ids)
+
+    def _track_changes(
+        self,
+        upserts: list[dict[str, Any]] | None = None,
+        deletes: list[str] | None = None,
+    ) -> None:
+        """Remember local changes, they are published to other processes once saved"""
+        for record in upserts or []:
+            self._pending_deletes.discard(record["__id__"])
+            self._pending_upserts[record["__id__"]] = dict(record)
+        for id in deletes or []:
+            self._pending_upserts.pop(id, None)
+            self._pending_deletes.add(id)
+
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
         """
         Importance notes:
@@ -99,22 +195,15 @@ class NanoVectorDBStorage(BaseVectorStorage):
             for k, v in data.items()
         ]
         contents = [v["content"] for v in data.values()]
-        batches = [
-            contents[i : i + self._max_batch_size]
-            for i in range(0, len(contents), self._max_batch_size)
-        ]
 
         # Execute embedding outside of lock to avoid long lock times
-        embedding_tasks = [self.embedding_func(batch) for batch in batches]
-        embeddings_list = await asyncio.gather(*embedding_tasks)
-
-        embeddings = np.concatenate(embeddings_list)
+        embeddings = await self.embed_contents(contents)
         if len(embeddings) == len(list_data):
             for i, d in enumerate(list_data):
                 d["__vector__"] = embeddings[i]
             client = await self._get_client()
-            results = client.upsert(datas=list_data)
-            return results
+            self._track_changes(upserts=list_data)
+            return self._upsert_records(client, list_data)
         else:
             # sometimes the embedding is not returned correctly. just log it.
             logger.error(
@@ -128,13 +217,36 @@ class NanoVectorDBStorage(BaseVectorStorage):
         embedding = await self.embedding_func([query])
         embedding = embedding[0]
 
+        keys = await resolve_filter_keys(self, ids) if ids else None
         client = await self._get_client()
-        results = client.query(
-            query=embedding,
-            top_k=top_k,
-            better_than_threshold=self.cosine_better_than_threshold,
-        )
-        results = [
+        if keys is None and self._quantization is None:
+            results = client.query(
+                query=embedding,
+                top_k=top_k,
+                better_than_threshold=self.cosine_better_than_threshold,
+            )
+        else:
+            results = self._search(client, embedding[None], top_k, keys)[0]
+        return self._format_results(results)
+
+    async def query_batch(
+        self, queries: list[str], top_k: int, ids: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        if not queries:
+            return []
+        # Execute embedding outside of lock to avoid long lock times
+        embeddings = await self.embed_queries(queries)
+
+        keys = await resolve_filter_keys(self, ids) if ids else None
+        client = await self._get_client()
+        return [
+            self._format_results(results)
+            for results in self._search(client, embeddings, top_k, keys)
+        ]
+
+    @staticmethod
+    def _format_results(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [
             {
                 **dp,
                 "id": dp["__id__"],
@@ -143,8 +255,106 @@ class NanoVectorDBStorage(BaseVectorStorage):
             }
             for dp in results
         ]
+
+    def _get_filter_index(self, client) -> VectorFilterIndex:
+        if self._filter_index is None:
+            storage = getattr(client, "_NanoVectorDB__storage")
+            self._filter_index = VectorFilterIndex(enumerate(storage["data"]))
+        return self._filter_index
+
+    def _get_int8_matrix(self, client) -> Int8Matrix:
+        storage = getattr(client, "_NanoVectorDB__storage")
+        if self._int8_matrix is None:
+            self._int8_matrix = Int8Matrix(storage["matrix"])
+        # Only the rows of the candidates are read from the float matrix, which
+        # nano-vectordb loads back in memory when rows are appended or deleted
+        storage["matrix"] = map_to_temporary_file(
+            storage["matrix"], self.global_config["working_dir"]
+        )
+        return self._int8_matrix
+
+    def _reset_search_indexes(self) -> None:
+        """Drop the indexes derived from the records, they are rebuilt when needed"""
+        self._filter_index = None
+        self._int8_matrix = None
+
+    def _search(
+        self,
+        client,
+        embeddings: np.ndarray,
+        top_k: int,
+        keys: list[str] | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """Cosine query of several embeddings with one matrix product per group of them
+
+        The search is restricted to the records matching the filter keys if given. In
+        int8 mode the codes select the candidates which are re-ranked with the float
+        vectors.
+        """
+        storage = getattr(client, "_NanoVectorDB__storage")
+        queries = normalize(np.asarray(embeddings, dtype=np.float32))
+        rows = None if keys is None else self._get_filter_index(client).rows(keys)
+        if rows is not None and not len(rows):
+            return [[] for _ in queries]
+
+        results = []
+        # Bound the memory of the scores of a group of queries
+        group = max(1, SEARCH_SCORES_PER_GROUP // max(len(storage["data"]), 1))
+        for start in range(0, len(queries), group):
+            group_queries = queries[start : start + group]
+            if self._quantization == "int8":
+                all_scores = self._get_int8_matrix(client).scores(group_queries, rows)
+                for query, scores in zip(group_queries, all_scores):
+                    candidates = np.sort(
+                        top_indices(scores, top_k * self._rescore_factor)
+                    )
+                    if rows is not None:
+                        candidates = rows[candidates]
+                    scores = storage["matrix"][candidates] @ query
+                    results.append(
+                        self._top_records(storage, scores, candidates, top_k)
+                    )
+            else:
+                matrix = storage["matrix"] if rows is None else storage["matrix"][rows]
+                for scores in group_queries @ matrix.T:
+                    results.append(self._top_records(storage, scores, rows, top_k))
         return results
 
+    def _top_records(
+        self,
+        storage: dict[str, Any],
+        scores: np.ndarray,
+        rows: np.ndarray | None,
+        top_k: int,
+    ) -> list[dict[str, Any]]:
+        """Records of the top_k scores passing the threshold, rows maps scores to records"""
+        return [
+            {
+                **storage["data"][i if rows is None else rows[i]],
+                "__metrics__": scores[i],
+            }
+            for i in top_indices(scores, top_k)
+            if scores[i] >= self.cosine_better_than_threshold
+        ]
+
+    async def get_ids_by_doc_ids(self, doc_ids: list[str]) -> set[str]:
+        """Ids of the chunks of the documents"""
+        client = await self._get_client()
+        return self._get_filter_index(client).ids(doc_ids)
+
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their ids, from a snapshot of them"""
+        client = await self._get_client()
+        storage = getattr(client, "_NanoVectorDB__storage")
+        records = sorted(
+            (dp for dp in storage["data"] if after is None or dp["__id__"] > after),
+            key=lambda dp: dp["__id__"],
+        )
+        for start in range(0, len(records), batch_size):
+            yield [dict(dp) for dp in records[start : start + batch_size]]
+
     @property
     async def client_storage(self):
         client = await self._get_client()
@@ -163,7 +373,8 @@ class NanoVectorDBStorage(BaseVectorStorage):
         """
         try:
             client = await self._get_client()
-            client.delete(ids)
+            self._delete_records(client, ids)
+            self._track_changes(deletes=ids)
             logger.debug(
                 f"Successfully deleted {len(ids)} vectors from {self.namespace}"
             )
@@ -187,7 +398,8 @@ class NanoVectorDBStorage(BaseVectorStorage):
             # Check if the entity exists
             client = await self._get_client()
             if client.get([entity_id]):
-                client.delete([entity_id])
+                self._delete_records(client, [entity_id])
+                self._track_changes(deletes=[entity_id])
                 logger.debug(f"Successfully deleted entity {entity_name}")
             else:
                 logger.debug(f"Entity {entity_name} not found in storage")
@@ -215,7 +427,8 @@ class NanoVectorDBStorage(BaseVectorStorage):
 
             if ids_to_delete:
                 client = await self._get_client()
-                client.delete(ids_to_delete)
+                self._delete_records(client, ids_to_delete)
+                self._track_changes(deletes=ids_to_delete)
                 logger.debug(
                     f"Deleted {len(ids_to_delete)} relations for {entity_name}"
                 )
@@ -226,37 +439,28 @@ class NanoVectorDBStorage(BaseVectorStorage):
 
     async def index_done_callback(self) -> bool:
         """Save data to disk"""
-        async with self._storage_lock:
-            # Check if storage was updated by another process
-            if self.storage_updated.value:
-                # Storage was updated by another process, reload data instead of saving
-                logger.warning(
-                    f"Storage for {self.namespace} was updated by another process, reloading..."
-                )
-                self._client = NanoVectorDB(
-                    self.embedding_func.embedding_dim,
-                    storage_file=self._client_file_name,
-                )
-                # Reset update flag
-                self.storage_updated.value = False
-                return False  # Return error
-
-        # Acquire lock and perform persistence
-        async with self._storage_lock:
+        async with self._storage_lock.writer():
             try:
+                # Merge changes saved by other processes first, so they are not overwritten
+                await self._sync_changes()
+                if not self._pending_upserts and not self._pending_deletes:
+                    return True  # Nothing to save
+
                 # Save data to disk
                 self._client.save()
-                # Notify other processes that data has been updated
-                await set_all_update_flags(self.namespace)
-                # Reset own update flag to avoid self-reloading
-                self.storage_updated.value = False
+                # Publish the changes to other processes
+                self._version = await publish_namespace_changes(
+                    self.namespace,
+                    upserts=self._pending_upserts,
+                    deletes=list(self._pending_deletes),
+                )
+                self._pending_upserts = {}
+                self._pending_deletes = set()
                 return True  # Return success
             except Exception as e:
                 logger.error(f"Error saving data for {self.namespace}: {e}")
                 return False  # Return error
 
-        return True  # Return success
-
     async def search_by_prefix(self, prefix: str) -> list[dict[str, Any]]:
         """Search for records with IDs starting with a specific prefix.
 
@@ -313,7 +517,7 @@ class NanoVectorDBStorage(BaseVectorStorage):
         This method will:
         1. Remove the vector database storage file if it exists
         2. Reinitialize the vector database client
-        3. Update flags to notify other processes
+        3. Notify other processes to reload
         4. Changes is persisted to disk immediately
 
         This method is intended for use in scenarios where all data needs to be removed,
@@ -324,20 +528,21 @@ class NanoVectorDBStorage(BaseVectorStorage):
             - On failure: {"status": "error", "message": "<error details>"}
         """
         try:
-            async with self._storage_lock:
+            async with self._storage_lock.writer():
                 # delete _client_file_name
                 if os.path.exists(self._client_file_name):
                     os.remove(self._client_file_name)
 
+                self._reset_search_indexes()
                 self._client = NanoVectorDB(
                     self.embedding_func.embedding_dim,
                     storage_file=self._client_file_name,
                 )
 
-                # Notify other processes that data has been updated
-                await set_all_update_flags(self.namespace)
-                # Reset own update flag to avoid self-reloading
-                self.storage_updated.value = False
+                # Other processes reload the removed file
+                self._pending_upserts = {}
+                self._pending_deletes = set()
+                self._version = await reset_namespace_changes(self.namespace)
 
                 logger.info(
                     f"Process {os.getpid()} drop {self.namespace}(file:{self._client_file_name})"
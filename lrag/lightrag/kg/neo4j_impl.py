@@ -726,6 +726,135 @@ class Neo4JStorage(BaseGraphStorage):
             await result.consume()  # Ensure results are fully consumed
             return edges_dict
 
+    async def iter_nodes(self, batch_size: int = 1000):
+        """Iterate over all nodes ordered by entity_id, paged with a keyset cursor
+
+        Each page starts after the last entity_id of the previous one, which uses
+        the entity_id index instead of skipping the nodes already returned.
+        """
+        after = None
+        while True:
+            async with self._driver.session(
+                database=self._DATABASE, default_access_mode="READ"
+            ) as session:
+                query = """
+                MATCH (n:base)
+                WHERE $after IS NULL OR n.entity_id > $after
+                RETURN n.entity_id AS entity_id, properties(n) AS properties
+                ORDER BY n.entity_id
+                LIMIT $limit
+                """
+                result = await session.run(query, after=after, limit=batch_size)
+                nodes = {
+                    record["entity_id"]: record["properties"] async for record in result
+                }
+                await result.consume()
+            if not nodes:
+                return
+            yield nodes
+            if len(nodes) < batch_size:
+                return
+            after = next(reversed(nodes))
+
+    async def iter_edges(self, batch_size: int = 1000):
+        """Iterate over all edges, paged by their start nodes with a keyset cursor
+
+        A page holds the edges starting at batch_size nodes, each relationship is
+        matched from its start node only and returned once.
+        """
+        after = None
+        while True:
+            async with self._driver.session(
+                database=self._DATABASE, default_access_mode="READ"
+            ) as session:
+                query = """
+                MATCH (a:base)
+                WHERE $after IS NULL OR a.entity_id > $after
+                WITH a ORDER BY a.entity_id LIMIT $limit
+                OPTIONAL MATCH (a)-[r]->(b:base)
+                RETURN a.entity_id AS src_id, b.entity_id AS tgt_id,
+                       properties(r) AS properties
+                ORDER BY src_id
+                """
+                result = await session.run(query, after=after, limit=batch_size)
+                last = None
+                edges = {}
+                async for record in result:
+                    last = record["src_id"]
+                    if record["tgt_id"] is not None:
+                        edges[(record["src_id"], record["tgt_id"])] = record[
+                            "properties"
+                        ]
+                await result.consume()
+            if last is None:
+                return
+            if edges:
+                yield edges
+            after = last
+
+    async def upsert_nodes_batch(self, nodes: dict[str, dict[str, str]]) -> None:
+        """Upsert multiple nodes with one UNWIND query per entity type
+
+        The entity type is set as a label, which cannot be a query parameter.
+        """
+        by_type: dict[str, list[dict]] = {}
+        for node_id, node_data in nodes.items():
+            if "entity_id" not in node_data:
+                raise ValueError(
+                    "Neo4j: node properties must contain an 'entity_id' field"
+                )
+            by_type.setdefault(node_data["entity_type"], []).append(
+                {"entity_id": node_id, "properties": node_data}
+            )
+        try:
+            async with self._driver.session(database=self._DATABASE) as session:
+                for entity_type, rows in by_type.items():
+
+                    async def execute_upsert(tx: AsyncManagedTransaction):
+                        query = (
+                            """
+                        UNWIND $rows AS row
+                        MERGE (n:base {entity_id: row.entity_id})
+                        SET n += row.properties
+                        SET n:`%s`
+                        """
+                            % entity_type
+                        )
+                        result = await tx.run(query, rows=rows)
+                        await result.consume()
+
+                    await session.execute_write(execute_upsert)
+        except Exception as e:
+            logger.error(f"Error during batch upsert: {str(e)}")
+            raise
+
+    async def upsert_edges_batch(
+        self, edges: dict[tuple[str, str], dict[str, str]]
+    ) -> None:
+        """Upsert multiple edges with one UNWIND query"""
+        rows = [
+            {"src": src_id, "tgt": tgt_id, "properties": edge_data}
+            for (src_id, tgt_id), edge_data in edges.items()
+        ]
+        try:
+            async with self._driver.session(database=self._DATABASE) as session:
+
+                async def execute_upsert(tx: AsyncManagedTransaction):
+                    query = """
+                    UNWIND $rows AS row
+                    MATCH (source:base {entity_id: row.src})
+                    MATCH (target:base {entity_id: row.tgt})
+                    MERGE (source)-[r:DIRECTED]-(target)
+                    SET r += row.properties
+                    """
+                    result = await tx.run(query, rows=rows)
+                    await result.consume()
+
+                await session.execute_write(execute_upsert)
+        except Exception as e:
+            logger.error(f"Error during batch edge upsert: {str(e)}")
+            raise
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -1,8 +1,10 @@
+import heapq
 import os
+from collections import deque
 from dataclasses import dataclass
 from typing import final
 
-from .types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
+from ..types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
 from ..utils import logger
 from ..base import BaseGraphStorage
 
@@ -15,10 +17,21 @@ if not pm.is_installed("graspologic"):
     pm.install("graspologic")
 
 import networkx as nx
+from .graph_snapshot import (
+    columns_to_rows,
+    compact_graph_log,
+    load_graph_snapshot,
+    persist_graph_changes,
+    read_graph_log,
+    rows_to_columns,
+    write_graph_snapshot,
+)
 from .shared_storage import (
-    get_storage_lock,
-    get_update_flag,
-    set_all_update_flags,
+    get_namespace_lock,
+    get_namespace_version,
+    get_namespace_changes,
+    publish_namespace_changes,
+    reset_namespace_changes,
 )
 
 from dotenv import load_dotenv
@@ -47,49 +60,206 @@ class NetworkXStorage(BaseGraphStorage):
         )
         nx.write_graphml(graph, file_name)
 
+    @staticmethod
+    def write_graph_snapshot(graph: nx.Graph, file_name: str) -> int:
+        """Write the graph as a msgpack snapshot, see graph_snapshot"""
+        node_ids, node_attrs = [], []
+        for node_id, attrs in graph.nodes(data=True):
+            node_ids.append(node_id)
+            node_attrs.append(attrs)
+        sources, targets, edge_attrs = [], [], []
+        for source, target, attrs in graph.edges(data=True):
+            sources.append(source)
+            targets.append(target)
+            edge_attrs.append(attrs)
+        return write_graph_snapshot(
+            file_name,
+            node_ids,
+            rows_to_columns(node_attrs),
+            sources,
+            targets,
+            rows_to_columns(edge_attrs),
+        )
+
+    @staticmethod
+    def load_graph_snapshot(file_name: str) -> tuple[nx.Graph | None, int | None]:
+        """Load a graph snapshot, returns (graph, snapshot_id)"""
+        snapshot = load_graph_snapshot(file_name)
+        if snapshot is None:
+            return None, None
+
+        graph = nx.Graph()
+        graph.add_nodes_from(
+            zip(
+                snapshot.node_ids,
+                columns_to_rows(snapshot.node_columns, len(snapshot.node_ids)),
+            )
+        )
+        graph.add_edges_from(
+            zip(
+                snapshot.sources,
+                snapshot.targets,
+                columns_to_rows(snapshot.edge_columns, len(snapshot.sources)),
+            )
+        )
+        return graph, snapshot.snapshot_id
+
     def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        # Kept to migrate graphs persisted as GraphML, and as default export file
         self._graphml_xml_file = os.path.join(
-            self.global_config["working_dir"], f"graph_{self.namespace}.graphml"
+            working_dir, f"graph_{self.namespace}.graphml"
         )
+        self._snapshot_file = os.path.join(
+            working_dir, f"graph_{self.namespace}.msgpack"
+        )
+        self._log_file = os.path.join(working_dir, f"graph_{self.namespace}.log")
         self._storage_lock = None
-        self.storage_updated = None
         self._graph = None
+        # Namespace version the graph is at, and local changes not published yet:
+        # ("node", node_id) or ("edge", (src, tgt)) -> attributes, None if deleted
+        self._version = -1
+        self._pending_changes: dict[tuple, dict | None] = {}
+        # Local changes made so far, part of the graph version
+        self._local_changes = 0
 
         # Load initial graph
-        preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
-        if preloaded_graph is not None:
+        self._graph = self._load_graph()
+
+    @staticmethod
+    def read_graph_files(
+        snapshot_file: str, log_file: str, graphml_file: str
+    ) -> nx.Graph | None:
+        """Load the graph snapshot and replay the mutation log written after it,
+        or load the GraphML file of older versions, None if neither exists"""
+        graph, snapshot_id = NetworkXStorage.load_graph_snapshot(snapshot_file)
+        if graph is not None:
+            replayed = NetworkXStorage._replay_changes(
+                graph,
+                read_graph_log(log_file, snapshot_id),
+            )
             logger.info(
-                f"Loaded graph from {self._graphml_xml_file} with {preloaded_graph.number_of_nodes()} nodes, {preloaded_graph.number_of_edges()} edges"
+                f"Loaded graph from {snapshot_file} with {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges ({replayed} logged changes)"
             )
-        else:
-            logger.info("Created new empty graph")
-        self._graph = preloaded_graph or nx.Graph()
+            return graph
+
+        graph = NetworkXStorage.load_nx_graph(graphml_file)
+        if graph is not None:
+            logger.info(
+                f"Loaded graph from {graphml_file} with {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges"
+            )
+        return graph
+
+    @staticmethod
+    def load_working_dir_graph(
+        working_dir: str, namespace: str = "chunk_entity_relation"
+    ) -> nx.Graph | None:
+        """Load the graph persisted in a working directory without a storage instance
+
+        For scripts and tools reading the graph of NetworkXStorage or CSRGraphStorage,
+        which share the snapshot format. Use export_graphml for a GraphML file.
+        """
+        return NetworkXStorage.read_graph_files(
+            os.path.join(working_dir, f"graph_{namespace}.msgpack"),
+            os.path.join(working_dir, f"graph_{namespace}.log"),
+            os.path.join(working_dir, f"graph_{namespace}.graphml"),
+        )
+
+    def _load_graph(self) -> nx.Graph:
+        """Load the graph snapshot and replay the mutation log written after it"""
+        # A GraphML graph is converted to a snapshot on the next save
+        graph = NetworkXStorage.read_graph_files(
+            self._snapshot_file, self._log_file, self._graphml_xml_file
+        )
+        if graph is not None:
+            return graph
+
+        logger.info("Created new empty graph")
+        return nx.Graph()
+
+    def _persist_changes(self, changes: dict[tuple, dict | None]) -> None:
+        """Append changes to the mutation log, or compact it into a new snapshot"""
+        persist_graph_changes(
+            changes,
+            self._snapshot_file,
+            self._log_file,
+            lambda: NetworkXStorage.write_graph_snapshot(
+                self._graph, self._snapshot_file
+            ),
+        )
 
     async def initialize(self):
         """Initialize storage data"""
-        # Get the update flag for cross-process update notification
-        self.storage_updated = await get_update_flag(self.namespace)
         # Get the storage lock for use in other methods
-        self._storage_lock = get_storage_lock()
+        self._storage_lock = get_namespace_lock(self.namespace)
+        async with self._storage_lock.writer():
+            self._version = await get_namespace_version(self.namespace)
+            # Another process saved the graph after it was loaded in __post_init__
+            if self._version:
+                self._graph = self._load_graph()
 
     async def _get_graph(self):
-        """Check if the storage should be reloaded"""
-        # Acquire lock to prevent concurrent read and write
-        async with self._storage_lock:
-            # Check if data needs to be reloaded
-            if self.storage_updated.value:
-                logger.info(
-                    f"Process {os.getpid()} reloading graph {self.namespace} due to update by another process"
-                )
-                # Reload data
-                self._graph = (
-                    NetworkXStorage.load_nx_graph(self._graphml_xml_file) or nx.Graph()
-                )
-                # Reset update flag
-                self.storage_updated.value = False
+        """Check if the storage should be synced with other processes"""
+        async with self._storage_lock.reader():
+            if self._version == await get_namespace_version(self.namespace):
+                return self._graph
 
+        async with self._storage_lock.writer():
+            await self._sync_changes()
             return self._graph
 
+    async def _sync_changes(self) -> None:
+        """Apply changes published by other processes, the writer lock must be held"""
+        version, changes = await get_namespace_changes(self.namespace, self._version)
+        if changes is None:
+            # Changes are no longer in the log, reload the graph saved by the other process
+            logger.info(
+                f"Process {os.getpid()} reloading graph {self.namespace} due to update by another process"
+            )
+            self._graph = self._load_graph()
+            # Keep the changes of this process which are not saved yet
+            NetworkXStorage._replay_changes(self._graph, self._pending_changes.items())
+        elif changes:
+            for graph_changes, _ in changes:
+                NetworkXStorage._replay_changes(self._graph, graph_changes.items())
+            logger.debug(
+                f"Process {os.getpid()} applied {len(changes)} changes to graph {self.namespace}"
+            )
+        self._version = version
+
+    @staticmethod
+    def _replay_changes(graph: nx.Graph, changes) -> int:
+        """Apply ((kind, key), attrs) changes in order, returns the number applied"""
+        count = 0
+        for (kind, key), attrs in changes:
+            if kind == "node":
+                if attrs is not None:
+                    graph.add_node(key, **attrs)
+                elif graph.has_node(key):
+                    graph.remove_node(key)
+            else:
+                if attrs is not None:
+                    graph.add_edge(*key, **attrs)
+                elif graph.has_edge(*key):
+                    graph.remove_edge(*key)
+            count += 1
+        return count
+
+    def _track_change(self, kind: str, key, attrs: dict | None) -> None:
+        """Remember a local change, changes are published to other processes once saved"""
+        if kind == "edge":
+            # The graph is undirected
+            key = tuple(sorted(key))
+        # Move the change to the end, keeping changes ordered by last modification
+        self._pending_changes.pop((kind, key), None)
+        self._pending_changes[(kind, key)] = attrs
+        self._local_changes += 1
+
+    async def get_graph_version(self) -> tuple[int, int]:
+        """The namespace version the graph is synced to and the local changes made"""
+        await self._get_graph()
+        return self._version, self._local_changes
+
     async def has_node(self, node_id: str) -> bool:
         graph = await self._get_graph()
         return graph.has_node(node_id)
@@ -122,6 +292,32 @@ class NetworkXStorage(BaseGraphStorage):
             return list(graph.edges(source_node_id))
         return None
 
+    async def iter_nodes(self, batch_size: int = 1000):
+        """Iterate over all nodes, in pages of at most batch_size nodes"""
+        node_ids = list((await self._get_graph()).nodes)
+        for start in range(0, len(node_ids), batch_size):
+            graph = await self._get_graph()
+            nodes = {
+                node_id: dict(graph.nodes[node_id])
+                for node_id in node_ids[start : start + batch_size]
+                if graph.has_node(node_id)
+            }
+            if nodes:
+                yield nodes
+
+    async def iter_edges(self, batch_size: int = 1000):
+        """Iterate over all edges, in pages of at most batch_size edges"""
+        pairs = list((await self._get_graph()).edges)
+        for start in range(0, len(pairs), batch_size):
+            graph = await self._get_graph()
+            edges = {
+                pair: dict(graph.edges[pair])
+                for pair in pairs[start : start + batch_size]
+                if graph.has_edge(*pair)
+            }
+            if edges:
+                yield edges
+
     async def upsert_node(self, node_id: str, node_data: dict[str, str]) -> None:
         """
         Importance notes:
@@ -131,6 +327,7 @@ class NetworkXStorage(BaseGraphStorage):
         """
         graph = await self._get_graph()
         graph.add_node(node_id, **node_data)
+        self._track_change("node", node_id, dict(graph.nodes[node_id]))
 
     async def upsert_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
@@ -143,6 +340,11 @@ class NetworkXStorage(BaseGraphStorage):
         """
         graph = await self._get_graph()
         graph.add_edge(source_node_id, target_node_id, **edge_data)
+        self._track_change(
+            "edge",
+            (source_node_id, target_node_id),
+            dict(graph.edges[source_node_id, target_node_id]),
+        )
 
     async def delete_node(self, node_id: str) -> None:
         """
@@ -154,6 +356,7 @@ class NetworkXStorage(BaseGraphStorage):
         graph = await self._get_graph()
         if graph.has_node(node_id):
             graph.remove_node(node_id)
+            self._track_change("node", node_id, None)
             logger.debug(f"Node {node_id} deleted from the graph.")
         else:
             logger.warning(f"Node {node_id} not found in the graph for deletion.")
@@ -173,6 +376,7 @@ class NetworkXStorage(BaseGraphStorage):
         for node in nodes:
             if graph.has_node(node):
                 graph.remove_node(node)
+                self._track_change("node", node, None)
 
     async def remove_edges(self, edges: list[tuple[str, str]]):
         """Delete multiple edges
@@ -189,6 +393,7 @@ class NetworkXStorage(BaseGraphStorage):
         for source, target in edges:
             if graph.has_edge(source, target):
                 graph.remove_edge(source, target)
+                self._track_change("edge", (source, target), None)
 
     async def get_all_labels(self) -> list[str]:
         """
@@ -228,107 +433,76 @@ class NetworkXStorage(BaseGraphStorage):
 
         # Handle special case for "*" label
         if node_label == "*":
-            # Get degrees of all nodes
-            degrees = dict(graph.degree())
-            # Sort nodes by degree in descending order and take top max_nodes
-            sorted_nodes = sorted(degrees.items(), key=lambda x: x[1], reverse=True)
+            # Only the max_nodes highest degree nodes are needed, no full sort
+            limited_nodes = heapq.nlargest(
+                max_nodes, graph.degree(), key=lambda x: x[1]
+            )
 
             # Check if graph is truncated
-            if len(sorted_nodes) > max_nodes:
+            if graph.number_of_nodes() > max_nodes:
                 result.is_truncated = True
                 logger.info(
-                    f"Graph truncated: {len(sorted_nodes)} nodes found, limited to {max_nodes}"
+                    f"Graph truncated: {graph.number_of_nodes()} nodes found, limited to {max_nodes}"
                 )
 
-            limited_nodes = [node for node, _ in sorted_nodes[:max_nodes]]
             # Create subgraph with the highest degree nodes
-            subgraph = graph.subgraph(limited_nodes)
+            subgraph = graph.subgraph(node for node, _ in limited_nodes)
         else:
             # Check if node exists
             if node_label not in graph:
                 logger.warning(f"Node {node_label} not found in the graph")
                 return KnowledgeGraph()  # Return empty graph
 
-            # Use BFS to get nodes
-            bfs_nodes = []
-            visited = set()
-            queue = [(node_label, 0)]  # (node, depth) tuple
-
-            # Breadth-first search
-            while queue and len(bfs_nodes) < max_nodes:
-                current, depth = queue.pop(0)
-                if current not in visited:
-                    visited.add(current)
-                    bfs_nodes.append(current)
-
-                    # Only explore neighbors if we haven't reached max_depth
-                    if depth < max_depth:
-                        # Add neighbor nodes to queue with incremented depth
-                        neighbors = list(graph.neighbors(current))
-                        queue.extend(
-                            [(n, depth + 1) for n in neighbors if n not in visited]
+            # Breadth-first search, nodes are marked visited when queued so
+            # every node is queued once
+            bfs_nodes = [node_label]
+            visited = {node_label}
+            queue = deque([(node_label, 0)])  # (node, depth) tuple
+            while queue and not result.is_truncated:
+                current, depth = queue.popleft()
+                # Only explore neighbors if we haven't reached max_depth
+                if depth >= max_depth:
+                    continue
+                for neighbor in graph.neighbors(current):
+                    if neighbor in visited:
+                        continue
+                    if len(bfs_nodes) >= max_nodes:
+                        result.is_truncated = True
+                        logger.info(
+                            f"Graph truncated: breadth-first search limited to {max_nodes} nodes"
                         )
-
-            # Check if graph is truncated - if we still have nodes in the queue
-            # and we've reached max_nodes, then the graph is truncated
-            if queue and len(bfs_nodes) >= max_nodes:
-                result.is_truncated = True
-                logger.info(
-                    f"Graph truncated: breadth-first search limited to {max_nodes} nodes"
-                )
+                        break
+                    visited.add(neighbor)
+                    bfs_nodes.append(neighbor)
+                    queue.append((neighbor, depth + 1))
 
             # Create subgraph with BFS discovered nodes
             subgraph = graph.subgraph(bfs_nodes)
 
         # Add nodes to result
-        seen_nodes = set()
-        seen_edges = set()
-        for node in subgraph.nodes():
-            if str(node) in seen_nodes:
-                continue
-
-            node_data = dict(subgraph.nodes[node])
-            # Get entity_type as labels
-            labels = []
-            if "entity_type" in node_data:
-                if isinstance(node_data["entity_type"], list):
-                    labels.extend(node_data["entity_type"])
-                else:
-                    labels.append(node_data["entity_type"])
-
-            # Create node with properties
-            node_properties = {k: v for k, v in node_data.items()}
-
+        for node, node_data in subgraph.nodes(data=True):
             result.nodes.append(
                 KnowledgeGraphNode(
-                    id=str(node), labels=[str(node)], properties=node_properties
+                    id=str(node), labels=[str(node)], properties=dict(node_data)
                 )
             )
-            seen_nodes.add(str(node))
 
-        # Add edges to result
-        for edge in subgraph.edges():
-            source, target = edge
+        # Add edges to result, an undirected graph yields every edge once
+        for source, target, edge_data in subgraph.edges(data=True):
             # Esure unique edge_id for undirect graph
             if str(source) > str(target):
                 source, target = target, source
-            edge_id = f"{source}-{target}"
-            if edge_id in seen_edges:
-                continue
-
-            edge_data = dict(subgraph.edges[edge])
 
             # Create edge with complete information
             result.edges.append(
                 KnowledgeGraphEdge(
-                    id=edge_id,
+                    id=f"{source}-{target}",
                     type="DIRECTED",
                     source=str(source),
                     target=str(target),
-                    properties=edge_data,
+                    properties=dict(edge_data),
                 )
             )
-            seen_edges.add(edge_id)
 
         logger.info(
             f"Subgraph query successful | Node count: {len(result.nodes)} | Edge count: {len(result.edges)}"
@@ -337,43 +511,49 @@ class NetworkXStorage(BaseGraphStorage):
 
     async def index_done_callback(self) -> bool:
         """Save data to disk"""
-        async with self._storage_lock:
-            # Check if storage was updated by another process
-            if self.storage_updated.value:
-                # Storage was updated by another process, reload data instead of saving
-                logger.info(
-                    f"Graph for {self.namespace} was updated by another process, reloading..."
-                )
-                self._graph = (
-                    NetworkXStorage.load_nx_graph(self._graphml_xml_file) or nx.Graph()
-                )
-                # Reset update flag
-                self.storage_updated.value = False
-                return False  # Return error
-
-        # Acquire lock and perform persistence
-        async with self._storage_lock:
+        async with self._storage_lock.writer():
             try:
+                # Merge changes saved by other processes first, so they are not overwritten
+                await self._sync_changes()
+                if not self._pending_changes:
+                    return True  # Nothing to save
+
                 # Save data to disk
-                NetworkXStorage.write_nx_graph(self._graph, self._graphml_xml_file)
-                # Notify other processes that data has been updated
-                await set_all_update_flags(self.namespace)
-                # Reset own update flag to avoid self-reloading
-                self.storage_updated.value = False
+                self._persist_changes(self._pending_changes)
+                # Publish the changes to other processes
+                self._version = await publish_namespace_changes(
+                    self.namespace, upserts=self._pending_changes
+                )
+                self._pending_changes = {}
                 return True  # Return success
             except Exception as e:
                 logger.error(f"Error saving graph for {self.namespace}: {e}")
                 return False  # Return error
 
-        return True
+    async def compact(self) -> bool:
+        """Write a new snapshot of the graph and reset its mutation log"""
+        if not await self.index_done_callback():
+            return False
+        async with self._storage_lock.writer():
+            await self._sync_changes()
+            if self._pending_changes:
+                # Changed since the save, left to the next compaction
+                return False
+            return compact_graph_log(
+                self._snapshot_file,
+                self._log_file,
+                lambda: NetworkXStorage.write_graph_snapshot(
+                    self._graph, self._snapshot_file
+                ),
+            )
 
     async def drop(self) -> dict[str, str]:
         """Drop all graph data from storage and clean up resources
 
         This method will:
-        1. Remove the graph storage file if it exists
+        1. Remove the graph snapshot, mutation log and GraphML files if they exist
         2. Reset the graph to an empty state
-        3. Update flags to notify other processes
+        3. Notify other processes to reload
         4. Changes is persisted to disk immediately
 
         Returns:
@@ -382,19 +562,39 @@ class NetworkXStorage(BaseGraphStorage):
             - On failure: {"status": "error", "message": "<error details>"}
         """
         try:
-            async with self._storage_lock:
-                # delete _client_file_name
-                if os.path.exists(self._graphml_xml_file):
-                    os.remove(self._graphml_xml_file)
+            async with self._storage_lock.writer():
+                for file_name in (
+                    self._snapshot_file,
+                    self._log_file,
+                    self._graphml_xml_file,
+                ):
+                    if os.path.exists(file_name):
+                        os.remove(file_name)
                 self._graph = nx.Graph()
-                # Notify other processes that data has been updated
-                await set_all_update_flags(self.namespace)
-                # Reset own update flag to avoid self-reloading
-                self.storage_updated.value = False
+                # Other processes reload the removed graph
+                self._pending_changes = {}
+                self._version = await reset_namespace_changes(self.namespace)
                 logger.info(
-                    f"Process {os.getpid()} drop graph {self.namespace} (file:{self._graphml_xml_file})"
+                    f"Process {os.getpid()} drop graph {self.namespace} (file:{self._snapshot_file})"
                 )
             return {"status": "success", "message": "data dropped"}
         except Exception as e:
             logger.error(f"Error dropping graph {self.namespace}: {e}")
             return {"status": "error", "message": str(e)}
+
+    async def export_graphml(self, file_name: str | None = None) -> str:
+        """Export the graph as GraphML, e.g. for visualization tools
+
+        GraphML is no longer used for persistence, the snapshot and mutation log are.
+
+        Args:
+            file_name: Target file, defaults to graph_<namespace>.graphml in the working dir
+
+        Returns:
+            str: The path of the exported file
+        """
+        file_name = file_name or self._graphml_xml_file
+        graph = await self._get_graph()
+        async with self._storage_lock.reader():
+            NetworkXStorage.write_nx_graph(graph, file_name)
+        return file_name
@@ -1,13 +1,15 @@
 import asyncio
 import json
 import os
+import struct
 import time
 from dataclasses import dataclass, field
-from typing import Any, Union, final
+from datetime import datetime
+from typing import Any, AsyncIterator, Union, final
 import numpy as np
 import configparser
 
-from .types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
+from ..types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
 
 from tenacity import (
     retry,
@@ -17,11 +19,13 @@ from tenacity import (
 )
 
 from ..base import (
+    DOC_STATUS_SORT_FIELDS,
     BaseGraphStorage,
     BaseKVStorage,
     BaseVectorStorage,
     DocProcessingStatus,
     DocStatus,
+    DocStatusPage,
     DocStatusStorage,
 )
 from ..namespace import NameSpace, is_namespace
@@ -45,6 +49,26 @@ load_dotenv(dotenv_path=".env", override=False)
 # Get maximum number of graph nodes from environment variable, default is 1000
 MAX_GRAPH_NODES = int(os.getenv("MAX_GRAPH_NODES", 1000))
 
+# Upserts of at least this many rows are copied into a staging table and merged
+# from there, smaller ones are sent with executemany
+POSTGRES_COPY_MIN_ROWS = int(os.getenv("POSTGRES_COPY_MIN_ROWS", 1000))
+
+# HNSW index parameters of the vector tables, see the pgvector documentation
+POSTGRES_HNSW_M = int(os.getenv("POSTGRES_HNSW_M", 16))
+POSTGRES_HNSW_EF_CONSTRUCTION = int(os.getenv("POSTGRES_HNSW_EF_CONSTRUCTION", 64))
+# Size of the candidate list of HNSW searches, bounds the number of results
+POSTGRES_HNSW_EF_SEARCH = int(os.getenv("POSTGRES_HNSW_EF_SEARCH", 100))
+
+
+def _encode_vector(value) -> bytes:
+    """Binary wire format of a pgvector vector: dim, unused, big endian float32s"""
+    vector = np.asarray(value, dtype=">f4")
+    return struct.pack(">HH", len(vector), 0) + vector.tobytes()
+
+
+def _decode_vector(data: bytes) -> list[float]:
+    return np.frombuffer(data, dtype=">f4", offset=4).tolist()
+
 
 class PostgreSQLDB:
     def __init__(self, config: dict[str, Any], **kwargs: Any):
@@ -71,6 +95,7 @@ class PostgreSQLDB:
                 port=self.port,
                 min_size=1,
                 max_size=self.max,
+                init=self.configure_vector,
             )
 
             logger.info(
@@ -82,6 +107,22 @@ class PostgreSQLDB:
             )
             raise
 
+    @staticmethod
+    async def configure_vector(connection: asyncpg.Connection) -> None:
+        """Send pgvector vectors in binary format, from numpy arrays or lists of floats"""
+        try:
+            await connection.set_type_codec(
+                "vector",
+                schema="public",
+                encoder=_encode_vector,
+                decoder=_decode_vector,
+                format="binary",
+            )
+        except ValueError:
+            # The vector extension is not installed
+            return
+        await connection.execute(f"SET hnsw.ef_search = {POSTGRES_HNSW_EF_SEARCH}")
+
     @staticmethod
     async def configure_age(connection: asyncpg.Connection, graph_name: str) -> None:
         """Set the Apache AGE environment and creates a graph if it does not exist.
@@ -141,6 +182,49 @@ class PostgreSQLDB:
                     f"PostgreSQL, Failed to create index on table {k}, Got: {e}"
                 )
 
+        # Index of the paginated document listing (PGDocStatusStorage.get_docs_paginated)
+        try:
+            await self.execute(
+                "DROP INDEX IF EXISTS idx_lightrag_doc_status_status_updated_at"
+            )
+            await self.execute(
+                f"""CREATE INDEX IF NOT EXISTS idx_lightrag_doc_status_status_updated_key
+                ON LIGHTRAG_DOC_STATUS (workspace, status, {doc_status_sort_key("updated_at")}, id)"""
+            )
+        except Exception as e:
+            logger.error(
+                f"PostgreSQL, Failed to create index on table LIGHTRAG_DOC_STATUS, Got: {e}"
+            )
+
+    async def check_vector_index(self, table_name: str, dimension: int) -> None:
+        """Create the HNSW index of a vector table if it does not exist
+
+        The vector columns have no fixed dimension, which pgvector requires for an
+        index, so the index is built on the column cast to the embedding dimension.
+        Queries must order by the same expression to use it.
+        """
+        index_name = f"idx_{table_name.lower()}_hnsw_cosine_{dimension}"
+        check_index_sql = f"""
+        SELECT 1 FROM pg_indexes
+        WHERE indexname = '{index_name}'
+        AND tablename = '{table_name.lower()}'
+        """
+        try:
+            if await self.query(check_index_sql):
+                return
+            logger.info(
+                f"PostgreSQL, Creating HNSW index {index_name} on table {table_name}"
+            )
+            await self.execute(
+                f"""CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}
+                USING hnsw ((content_vector::vector({dimension})) vector_cosine_ops)
+                WITH (m = {POSTGRES_HNSW_M}, ef_construction = {POSTGRES_HNSW_EF_CONSTRUCTION})"""
+            )
+        except Exception as e:
+            logger.error(
+                f"PostgreSQL, Failed to create HNSW index on table {table_name}, Got: {e}"
+            )
+
     async def query(
         self,
         sql: str,
@@ -217,6 +301,79 @@ class PostgreSQLDB:
             logger.error(f"PostgreSQL database,\nsql:{sql},\ndata:{data},\nerror:{e}")
             raise
 
+    async def executemany(self, sql: str, data: list[dict[str, Any]]) -> None:
+        """Execute a statement for many rows on one connection, in one transaction"""
+        if not data:
+            return
+        try:
+            async with self.pool.acquire() as connection:  # type: ignore
+                async with connection.transaction():
+                    await connection.executemany(
+                        sql, [tuple(row.values()) for row in data]
+                    )
+        except Exception as e:
+            logger.error(
+                f"PostgreSQL database,\nsql:{sql},\nrows:{len(data)},\nerror:{e}"
+            )
+            raise
+
+    async def copy_upsert(
+        self,
+        table_name: str,
+        data: list[dict[str, Any]],
+        conflict_columns: tuple[str, ...] = ("workspace", "id"),
+    ) -> None:
+        """Upsert many rows by copying them into a temporary staging table and merging
+        it into the table with a single INSERT ... ON CONFLICT DO UPDATE
+
+        The keys of the rows are the column names, all rows must have the same keys.
+        """
+        if not data:
+            return
+        columns = list(data[0].keys())
+        column_list = ", ".join(columns)
+        updates = ", ".join(
+            f"{column} = EXCLUDED.{column}"
+            for column in columns
+            if column not in conflict_columns
+        )
+        staging_table = f"staging_{table_name.lower()}"
+        merge_sql = f"""INSERT INTO {table_name} ({column_list})
+                        SELECT {column_list} FROM {staging_table}
+                        ON CONFLICT ({", ".join(conflict_columns)}) DO UPDATE
+                        SET {updates}, update_time = CURRENT_TIMESTAMP"""
+        try:
+            async with self.pool.acquire() as connection:  # type: ignore
+                async with connection.transaction():
+                    await connection.execute(
+                        f"CREATE TEMP TABLE {staging_table} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP"
+                    )
+                    await connection.copy_records_to_table(
+                        staging_table,
+                        records=[tuple(row.values()) for row in data],
+                        columns=columns,
+                    )
+                    await connection.execute(merge_sql)
+        except Exception as e:
+            logger.error(
+                f"PostgreSQL database, copy upsert of {len(data)} rows into {table_name}, error:{e}"
+            )
+            raise
+
+    async def upsert_many(
+        self,
+        sql: str,
+        table_name: str,
+        data: list[dict[str, Any]],
+        conflict_columns: tuple[str, ...] = ("workspace", "id"),
+    ) -> None:
+        """Upsert rows with the given upsert statement, or with copy_upsert for large
+        batches. The keys of the rows must be the column names in statement order."""
+        if len(data) >= POSTGRES_COPY_MIN_ROWS:
+            await self.copy_upsert(table_name, data, conflict_columns)
+        else:
+            await self.executemany(sql, data)
+
 
 class ClientManager:
     _instances: dict[str, Any] = {"db": None, "ref_count": 0}
@@ -375,7 +532,25 @@ class PGKVStorage(BaseKVStorage):
                 dict_res[row["mode"]][row["id"]] = row
             return [{k: v} for k, v in dict_res.items()]
         else:
-            return await self.db.query(sql, params, multirows=True)
+            results = await self.db.query(sql, params, multirows=True)
+            # In the order of ids, None for missing ids, like the other storages
+            results_by_id = {row["id"]: row for row in results}
+            return [results_by_id.get(id) for id in ids]
+
+    async def iter_keys(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[str]]:
+        """Iterate over the keys in order, keyset paginated on id"""
+        if is_namespace(self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
+            # Entries are keyed by mode and id, and do not record their chunk
+            raise NotImplementedError(
+                f"{type(self).__name__} cannot iterate over the LLM cache"
+            )
+        sql = SQL_TEMPLATES["iter_keys"].format(
+            table_name=namespace_to_table_name(self.namespace)
+        )
+        async for rows in _iter_rows(self.db, sql, batch_size, after):
+            yield [row["id"] for row in rows]
 
     async def get_by_status(self, status: str) -> Union[list[dict[str, Any]], None]:
         """Specifically for llm_response_cache."""
@@ -413,27 +588,35 @@ class PGKVStorage(BaseKVStorage):
         if is_namespace(self.namespace, NameSpace.KV_STORE_TEXT_CHUNKS):
             pass
         elif is_namespace(self.namespace, NameSpace.KV_STORE_FULL_DOCS):
-            for k, v in data.items():
-                upsert_sql = SQL_TEMPLATES["upsert_doc_full"]
-                _data = {
+            rows = [
+                {
                     "id": k,
                     "content": v["content"],
                     "workspace": self.db.workspace,
                 }
-                await self.db.execute(upsert_sql, _data)
+                for k, v in data.items()
+            ]
+            await self.db.upsert_many(
+                SQL_TEMPLATES["upsert_doc_full"], "LIGHTRAG_DOC_FULL", rows
+            )
         elif is_namespace(self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE):
-            for mode, items in data.items():
-                for k, v in items.items():
-                    upsert_sql = SQL_TEMPLATES["upsert_llm_response_cache"]
-                    _data = {
-                        "workspace": self.db.workspace,
-                        "id": k,
-                        "original_prompt": v["original_prompt"],
-                        "return_value": v["return"],
-                        "mode": mode,
-                    }
-
-                    await self.db.execute(upsert_sql, _data)
+            rows = [
+                {
+                    "workspace": self.db.workspace,
+                    "id": k,
+                    "original_prompt": v["original_prompt"],
+                    "return_value": v["return"],
+                    "mode": mode,
+                }
+                for mode, items in data.items()
+                for k, v in items.items()
+            ]
+            await self.db.upsert_many(
+                SQL_TEMPLATES["upsert_llm_response_cache"],
+                "LIGHTRAG_LLM_CACHE",
+                rows,
+                conflict_columns=("workspace", "mode", "id"),
+            )
 
     async def index_done_callback(self) -> None:
         # PG handles persistence automatically
@@ -538,6 +721,10 @@ class PGVectorStorage(BaseVectorStorage):
     async def initialize(self):
         if self.db is None:
             self.db = await ClientManager.get_client()
+            await self.db.check_vector_index(
+                namespace_to_table_name(self.namespace),
+                self.embedding_func.embedding_dim,
+            )
 
     async def finalize(self):
         if self.db is not None:
@@ -554,7 +741,7 @@ class PGVectorStorage(BaseVectorStorage):
                 "chunk_order_index": item["chunk_order_index"],
                 "full_doc_id": item["full_doc_id"],
                 "content": item["content"],
-                "content_vector": json.dumps(item["__vector__"].tolist()),
+                "content_vector": item["__vector__"],
                 "file_path": item["file_path"],
             }
         except Exception as e:
@@ -576,7 +763,7 @@ class PGVectorStorage(BaseVectorStorage):
             "id": item["__id__"],
             "entity_name": item["entity_name"],
             "content": item["content"],
-            "content_vector": json.dumps(item["__vector__"].tolist()),
+            "content_vector": item["__vector__"],
             "chunk_ids": chunk_ids,
             "file_path": item["file_path"],
             # TODO: add document_id
@@ -597,7 +784,7 @@ class PGVectorStorage(BaseVectorStorage):
             "source_id": item["src_id"],
             "target_id": item["tgt_id"],
             "content": item["content"],
-            "content_vector": json.dumps(item["__vector__"].tolist()),
+            "content_vector": item["__vector__"],
             "chunk_ids": chunk_ids,
             "file_path": item["file_path"],
             # TODO: add document_id
@@ -619,44 +806,68 @@ class PGVectorStorage(BaseVectorStorage):
             for k, v in data.items()
         ]
         contents = [v["content"] for v in data.values()]
-        batches = [
-            contents[i : i + self._max_batch_size]
-            for i in range(0, len(contents), self._max_batch_size)
-        ]
-
-        embedding_tasks = [self.embedding_func(batch) for batch in batches]
-        embeddings_list = await asyncio.gather(*embedding_tasks)
 
-        embeddings = np.concatenate(embeddings_list)
+        embeddings = await self.embed_contents(contents)
         for i, d in enumerate(list_data):
             d["__vector__"] = embeddings[i]
-        for item in list_data:
-            if is_namespace(self.namespace, NameSpace.VECTOR_STORE_CHUNKS):
-                upsert_sql, data = self._upsert_chunks(item)
-            elif is_namespace(self.namespace, NameSpace.VECTOR_STORE_ENTITIES):
-                upsert_sql, data = self._upsert_entities(item)
-            elif is_namespace(self.namespace, NameSpace.VECTOR_STORE_RELATIONSHIPS):
-                upsert_sql, data = self._upsert_relationships(item)
-            else:
-                raise ValueError(f"{self.namespace} is not supported")
 
-            await self.db.execute(upsert_sql, data)
+        if is_namespace(self.namespace, NameSpace.VECTOR_STORE_CHUNKS):
+            prepare = self._upsert_chunks
+        elif is_namespace(self.namespace, NameSpace.VECTOR_STORE_ENTITIES):
+            prepare = self._upsert_entities
+        elif is_namespace(self.namespace, NameSpace.VECTOR_STORE_RELATIONSHIPS):
+            prepare = self._upsert_relationships
+        else:
+            raise ValueError(f"{self.namespace} is not supported")
+
+        rows = []
+        for item in list_data:
+            upsert_sql, row = prepare(item)
+            rows.append(row)
+        await self.db.upsert_many(
+            upsert_sql, namespace_to_table_name(self.namespace), rows
+        )
 
     #################### query method ###############
     async def query(
         self, query: str, top_k: int, ids: list[str] | None = None
     ) -> list[dict[str, Any]]:
         embeddings = await self.embedding_func([query])
-        embedding = embeddings[0]
-        embedding_string = ",".join(map(str, embedding))
-        # Use parameterized document IDs (None means search across all documents)
-        sql = SQL_TEMPLATES[self.namespace].format(embedding_string=embedding_string)
+        return await self._query_embedding(embeddings[0], top_k, ids)
+
+    async def query_batch(
+        self, queries: list[str], top_k: int, ids: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        if not queries:
+            return []
+        embeddings = await self.embed_queries(queries)
+        # The searches of the embeddings run concurrently on the connections of the pool
+        return list(
+            await asyncio.gather(
+                *[
+                    self._query_embedding(embedding, top_k, ids)
+                    for embedding in embeddings
+                ]
+            )
+        )
+
+    async def _query_embedding(
+        self, embedding: np.ndarray, top_k: int, ids: list[str] | None = None
+    ) -> list[dict[str, Any]]:
+        # Filter by document IDs only when given (None means search across all documents)
+        doc_filter = SQL_TEMPLATES[f"{self.namespace}_doc_filter"] if ids else ""
+        sql = SQL_TEMPLATES[self.namespace].format(
+            dim=self.embedding_func.embedding_dim, doc_filter=doc_filter
+        )
         params = {
             "workspace": self.db.workspace,
-            "doc_ids": ids,
-            "better_than_threshold": self.cosine_better_than_threshold,
+            "embedding": embedding,
             "top_k": top_k,
+            # cosine similarity > threshold <=> cosine distance < 1 - threshold
+            "max_distance": 1 - self.cosine_better_than_threshold,
         }
+        if ids:
+            params["doc_ids"] = ids
         results = await self.db.query(sql, params=params, multirows=True)
         return results
 
@@ -761,6 +972,14 @@ class PGVectorStorage(BaseVectorStorage):
             logger.error(f"Error during prefix search for '{prefix}': {e}")
             return []
 
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their ids, keyset paginated on id"""
+        sql = SQL_TEMPLATES["iter_records_" + self.namespace]
+        async for rows in _iter_rows(self.db, sql, batch_size, after, "__id__"):
+            yield rows
+
     async def get_by_id(self, id: str) -> dict[str, Any] | None:
         """Get vector data by its ID
 
@@ -834,6 +1053,21 @@ class PGVectorStorage(BaseVectorStorage):
             return {"status": "error", "message": str(e)}
 
 
+# Values of the nullable sort columns for NULL, they sort first as in doc_status_sort_value
+DOC_STATUS_NULL_SORT_VALUES = {
+    "file_path": "''",
+    "created_at": "'-infinity'::timestamp",
+    "updated_at": "'-infinity'::timestamp",
+}
+
+
+def doc_status_sort_key(sort_field: str, value: str | None = None) -> str:
+    """SQL expression of the sort key of the documents, or of a cursor value"""
+    value = value or sort_field
+    null_value = DOC_STATUS_NULL_SORT_VALUES.get(sort_field)
+    return f"COALESCE({value}, {null_value})" if null_value else value
+
+
 @final
 @dataclass
 class PGDocStatusStorage(DocStatusStorage):
@@ -949,6 +1183,67 @@ class PGDocStatusStorage(DocStatusStorage):
         }
         return docs_by_status
 
+    async def get_docs_paginated(
+        self,
+        statuses: list[DocStatus] | None = None,
+        sort_field: str = "updated_at",
+        sort_desc: bool = True,
+        limit: int = 50,
+        offset: int = 0,
+        after: tuple[Any, str] | None = None,
+        include_content: bool = False,
+    ) -> DocStatusPage:
+        """Get one page of the documents, filtered, sorted and paged by PostgreSQL"""
+        if sort_field not in DOC_STATUS_SORT_FIELDS:
+            raise ValueError(f"Cannot sort documents by {sort_field}")
+        values = [status.value for status in statuses or DocStatus]
+        params: dict[str, Any] = {"workspace": self.db.workspace, "statuses": values}
+        where = "workspace=$1 AND status = ANY($2)"
+        count_sql = f"SELECT COUNT(1) AS count FROM LIGHTRAG_DOC_STATUS WHERE {where}"
+        total = (await self.db.query(count_sql, params))["count"]
+
+        direction = "DESC" if sort_desc else "ASC"
+        sort_key = doc_status_sort_key(sort_field)
+        if after is not None:
+            value, after_id = after
+            if value is not None and sort_field in ("created_at", "updated_at"):
+                value = datetime.fromisoformat(value)
+            params.update(after_value=value, after_id=after_id)
+            cursor_key = doc_status_sort_key(sort_field, "$3")
+            where += (
+                f" AND ({sort_key}, id) {'<' if sort_desc else '>'} ({cursor_key}, $4)"
+            )
+            offset = 0
+        columns = "id, content_summary, content_length, chunks_count, status, file_path, created_at, updated_at"
+        if include_content:
+            columns += ", content"
+        # One row more than the page tells whether there is a next page
+        sql = f"""SELECT {columns} FROM LIGHTRAG_DOC_STATUS WHERE {where}
+                 ORDER BY {sort_key} {direction}, id {direction}
+                 LIMIT {int(limit) + 1} OFFSET {int(offset)}"""
+        rows = await self.db.query(sql, params, multirows=True) or []
+        documents = {
+            row["id"]: DocProcessingStatus(
+                content=row["content"] if include_content else row["content_summary"],
+                content_summary=row["content_summary"],
+                content_length=row["content_length"],
+                status=row["status"],
+                created_at=row["created_at"],
+                updated_at=row["updated_at"],
+                chunks_count=row["chunks_count"],
+                file_path=row["file_path"],
+            )
+            for row in rows[:limit]
+        }
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            value = last[sort_field]
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            next_cursor = (value, last["id"])
+        return DocStatusPage(documents=documents, total=total, next_cursor=next_cursor)
+
     async def index_done_callback(self) -> None:
         # PG handles persistence automatically
         pass
@@ -1002,21 +1297,24 @@ class PGDocStatusStorage(DocStatusStorage):
                   status = EXCLUDED.status,
                   file_path = EXCLUDED.file_path,
                   updated_at = CURRENT_TIMESTAMP"""
-        for k, v in data.items():
-            # chunks_count is optional
-            await self.db.execute(
-                sql,
+        await self.db.executemany(
+            sql,
+            [
                 {
                     "workspace": self.db.workspace,
                     "id": k,
-                    "content": v["content"],
+                    # Documents enqueued now keep their content in full_docs only
+                    "content": v.get("content"),
                     "content_summary": v["content_summary"],
                     "content_length": v["content_length"],
+                    # chunks_count is optional
                     "chunks_count": v["chunks_count"] if "chunks_count" in v else -1,
                     "status": v["status"],
                     "file_path": v["file_path"],
-                },
-            )
+                }
+                for k, v in data.items()
+            ],
+        )
 
     async def drop(self) -> dict[str, str]:
         """Drop the storage"""
@@ -2088,6 +2386,25 @@ NAMESPACE_TABLE_MAP = {
 }
 
 
+async def _iter_rows(
+    db: PostgreSQLDB, sql: str, batch_size: int, after: str | None, key: str = "id"
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Pages of the rows of an iter_keys or iter_records query, each one starting
+    after the id (in the key column) of the last row of the previous page"""
+    while True:
+        rows = await db.query(
+            sql,
+            {"workspace": db.workspace, "after": after or "", "limit": batch_size},
+            multirows=True,
+        )
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][key]
+
+
 def namespace_to_table_name(namespace: str) -> str:
     for k, v in NAMESPACE_TABLE_MAP.items():
         if is_namespace(namespace, k):
@@ -2207,6 +2524,18 @@ SQL_TEMPLATES = {
                                  FROM LIGHTRAG_LLM_CACHE WHERE workspace=$1 AND mode= IN ({ids})
                                 """,
     "filter_keys": "SELECT id FROM {table_name} WHERE workspace=$1 AND id IN ({ids})",
+    # Keyset pagination for the garbage collection, see _iter_rows
+    "iter_keys": """SELECT id FROM {table_name} WHERE workspace=$1 AND id > $2
+                    ORDER BY id LIMIT $3""",
+    "iter_records_chunks": """SELECT id AS "__id__", full_doc_id, file_path
+                              FROM LIGHTRAG_DOC_CHUNKS WHERE workspace=$1 AND id > $2
+                              ORDER BY id LIMIT $3""",
+    "iter_records_entities": """SELECT id AS "__id__", entity_name, file_path
+                                FROM LIGHTRAG_VDB_ENTITY WHERE workspace=$1 AND id > $2
+                                ORDER BY id LIMIT $3""",
+    "iter_records_relationships": """SELECT id AS "__id__", source_id AS src_id, target_id AS tgt_id, file_path
+                                     FROM LIGHTRAG_VDB_RELATION WHERE workspace=$1 AND id > $2
+                                     ORDER BY id LIMIT $3""",
     "upsert_doc_full": """INSERT INTO LIGHTRAG_DOC_FULL (id, content, workspace)
                         VALUES ($1, $2, $3)
                         ON CONFLICT (workspace,id) DO UPDATE
@@ -2256,57 +2585,54 @@ SQL_TEMPLATES = {
                       file_path=EXCLUDED.file_path,
                       update_time = CURRENT_TIMESTAMP
                      """,
+    # Nearest neighbours in the order of the HNSW index on the vector column (see
+    # PostgreSQLDB.check_vector_index), the similarity threshold is applied to the
+    # top_k results. {doc_filter} restricts the search to documents when given.
     "relationships": """
-    WITH relevant_chunks AS (
-        SELECT id as chunk_id
-        FROM LIGHTRAG_DOC_CHUNKS
-        WHERE $2::varchar[] IS NULL OR full_doc_id = ANY($2::varchar[])
-    )
-    SELECT source_id as src_id, target_id as tgt_id
-    FROM (
-        SELECT r.id, r.source_id, r.target_id, 1 - (r.content_vector <=> '[{embedding_string}]'::vector) as distance
-        FROM LIGHTRAG_VDB_RELATION r
-        JOIN relevant_chunks c ON c.chunk_id = ANY(r.chunk_ids)
-        WHERE r.workspace=$1
-    ) filtered
-    WHERE distance>$3
-    ORDER BY distance DESC
-    LIMIT $4
+        SELECT src_id, tgt_id FROM (
+            SELECT r.source_id as src_id, r.target_id as tgt_id,
+                r.content_vector::vector({dim}) <=> $2::vector({dim}) as distance
+            FROM LIGHTRAG_VDB_RELATION r
+            WHERE r.workspace=$1 {doc_filter}
+            ORDER BY r.content_vector::vector({dim}) <=> $2::vector({dim})
+            LIMIT $3
+        ) nearest
+        WHERE distance < $4
+        ORDER BY distance
     """,
     "entities": """
-        WITH relevant_chunks AS (
-            SELECT id as chunk_id
-            FROM LIGHTRAG_DOC_CHUNKS
-            WHERE $2::varchar[] IS NULL OR full_doc_id = ANY($2::varchar[])
-        )
-        SELECT entity_name FROM
-            (
-                SELECT e.id, e.entity_name, 1 - (e.content_vector <=> '[{embedding_string}]'::vector) as distance
-                FROM LIGHTRAG_VDB_ENTITY e
-                JOIN relevant_chunks c ON c.chunk_id = ANY(e.chunk_ids)
-                WHERE e.workspace=$1
-            ) as chunk_distances
-            WHERE distance>$3
-            ORDER BY distance DESC
-            LIMIT $4
+        SELECT entity_name FROM (
+            SELECT e.entity_name,
+                e.content_vector::vector({dim}) <=> $2::vector({dim}) as distance
+            FROM LIGHTRAG_VDB_ENTITY e
+            WHERE e.workspace=$1 {doc_filter}
+            ORDER BY e.content_vector::vector({dim}) <=> $2::vector({dim})
+            LIMIT $3
+        ) nearest
+        WHERE distance < $4
+        ORDER BY distance
     """,
     "chunks": """
-        WITH relevant_chunks AS (
-            SELECT id as chunk_id
-            FROM LIGHTRAG_DOC_CHUNKS
-            WHERE $2::varchar[] IS NULL OR full_doc_id = ANY($2::varchar[])
-        )
-        SELECT id, content, file_path FROM
-            (
-                SELECT id, content, file_path, 1 - (content_vector <=> '[{embedding_string}]'::vector) as distance
-                FROM LIGHTRAG_DOC_CHUNKS
-                WHERE workspace=$1
-                AND id IN (SELECT chunk_id FROM relevant_chunks)
-            ) as chunk_distances
-            WHERE distance>$3
-            ORDER BY distance DESC
-            LIMIT $4
+        SELECT id, content, file_path FROM (
+            SELECT c.id, c.content, c.file_path,
+                c.content_vector::vector({dim}) <=> $2::vector({dim}) as distance
+            FROM LIGHTRAG_DOC_CHUNKS c
+            WHERE c.workspace=$1 {doc_filter}
+            ORDER BY c.content_vector::vector({dim}) <=> $2::vector({dim})
+            LIMIT $3
+        ) nearest
+        WHERE distance < $4
+        ORDER BY distance
     """,
+    "relationships_doc_filter": """AND EXISTS (
+                SELECT 1 FROM LIGHTRAG_DOC_CHUNKS c
+                WHERE c.workspace=$1 AND c.id = ANY(r.chunk_ids)
+                AND c.full_doc_id = ANY($5::varchar[]))""",
+    "entities_doc_filter": """AND EXISTS (
+                SELECT 1 FROM LIGHTRAG_DOC_CHUNKS c
+                WHERE c.workspace=$1 AND c.id = ANY(e.chunk_ids)
+                AND c.full_doc_id = ANY($5::varchar[]))""",
+    "chunks_doc_filter": "AND c.full_doc_id = ANY($5::varchar[])",
     # DROP tables
     "drop_specifiy_table_workspace": """
         DELETE FROM {table_name} WHERE workspace=$1
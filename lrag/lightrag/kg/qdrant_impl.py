@@ -1,8 +1,6 @@
-import asyncio
 import os
-from typing import Any, final, List
+from typing import Any, AsyncIterator, final, List
 from dataclasses import dataclass
-import numpy as np
 import hashlib
 import uuid
 from ..utils import logger
@@ -96,15 +94,8 @@ class QdrantVectorDBStorage(BaseVectorStorage):
             for k, v in data.items()
         ]
         contents = [v["content"] for v in data.values()]
-        batches = [
-            contents[i : i + self._max_batch_size]
-            for i in range(0, len(contents), self._max_batch_size)
-        ]
-
-        embedding_tasks = [self.embedding_func(batch) for batch in batches]
-        embeddings_list = await asyncio.gather(*embedding_tasks)
 
-        embeddings = np.concatenate(embeddings_list)
+        embeddings = await self.embed_contents(contents)
 
         list_points = []
         for i, d in enumerate(list_data):
@@ -137,6 +128,29 @@ class QdrantVectorDBStorage(BaseVectorStorage):
 
         return [{**dp.payload, "distance": dp.score} for dp in results]
 
+    async def query_batch(
+        self, queries: list[str], top_k: int, ids: list[str] | None = None
+    ) -> list[list[dict[str, Any]]]:
+        if not queries:
+            return []
+        embeddings = await self.embed_queries(queries)
+        # One request searching all the query vectors
+        results = self._client.search_batch(
+            collection_name=self.namespace,
+            requests=[
+                models.SearchRequest(
+                    vector=embedding.tolist(),
+                    limit=top_k,
+                    with_payload=True,
+                    score_threshold=self.cosine_better_than_threshold,
+                )
+                for embedding in embeddings
+            ],
+        )
+        return [
+            [{**dp.payload, "distance": dp.score} for dp in hits] for hits in results
+        ]
+
     async def index_done_callback(self) -> None:
         # Qdrant handles persistence automatically
         pass
@@ -302,6 +316,34 @@ class QdrantVectorDBStorage(BaseVectorStorage):
             logger.error(f"Error retrieving vector data for ID {id}: {e}")
             return None
 
+    async def iter_records(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their point ids, with scroll
+
+        Point ids are derived from the record ids, a scan resumes at the point of the
+        record it is resumed after.
+        """
+        offset = compute_mdhash_id_for_qdrant(after) if after is not None else None
+        while True:
+            points, offset = self._client.scroll(
+                collection_name=self.namespace,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            # The offset of a resumed scan is inclusive
+            records = [
+                {"__id__": point.payload["id"], **point.payload}
+                for point in points
+                if point.payload.get("id") != after
+            ]
+            if records:
+                yield records
+            if offset is None:
+                return
+
     async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
         """Get multiple vector data by their IDs
 
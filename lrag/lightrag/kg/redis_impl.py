@@ -1,5 +1,5 @@
 import os
-from typing import Any, final
+from typing import Any, AsyncIterator, final
 from dataclasses import dataclass
 import pipmaster as pm
 import configparser
@@ -10,10 +10,11 @@ if not pm.is_installed("redis"):
 
 # aioredis is a depricated library, replaced with redis
 from redis.asyncio import Redis, ConnectionPool  # type: ignore
-from redis.exceptions import RedisError, ConnectionError  # type: ignore
+from redis.exceptions import RedisError, ConnectionError, WatchError  # type: ignore
 from ..utils import logger
 
 from ..base import BaseKVStorage
+from ..namespace import NameSpace, is_namespace
 import json
 
 
@@ -42,10 +43,61 @@ class RedisKVStorage(BaseKVStorage):
             socket_connect_timeout=SOCKET_CONNECT_TIMEOUT,
         )
         self._redis = Redis(connection_pool=self._pool)
+        # LLM cache entries are stored in a Redis hash per mode, so that reading or
+        # saving one entry does not transfer the whole cache of its mode
+        self._is_llm_cache = is_namespace(
+            self.namespace, NameSpace.KV_STORE_LLM_RESPONSE_CACHE
+        )
         logger.info(
             f"Initialized Redis connection pool for {self.namespace} with max {MAX_CONNECTIONS} connections"
         )
 
+    async def initialize(self):
+        """Migrate a LLM cache stored in the legacy layout"""
+        if self._is_llm_cache:
+            migrated = await self.migrate_llm_cache_layout()
+            if migrated:
+                logger.info(
+                    f"Migrated {migrated} LLM cache entries of {self.namespace} to Redis hashes"
+                )
+
+    async def migrate_llm_cache_layout(self) -> int:
+        """Convert LLM cache modes stored as one JSON string per mode to Redis hashes
+
+        Safe to run concurrently from several workers, a mode that changes while it
+        is converted is left to the worker that changed it.
+
+        Returns:
+            int: Number of cache entries migrated
+        """
+        migrated = 0
+        async with self._get_redis_connection() as redis:
+            async for key in redis.scan_iter(
+                match=f"{self.namespace}:*", _type="string"
+            ):
+                async with redis.pipeline() as pipe:
+                    try:
+                        await pipe.watch(key)
+                        if await pipe.type(key) != "string":
+                            continue
+                        mode_cache = json.loads(await pipe.get(key) or "{}")
+                        pipe.multi()
+                        pipe.delete(key)
+                        if mode_cache:
+                            pipe.hset(
+                                key,
+                                mapping={
+                                    args_hash: json.dumps(entry)
+                                    for args_hash, entry in mode_cache.items()
+                                },
+                            )
+                        await pipe.execute()
+                        migrated += len(mode_cache)
+                    except WatchError:
+                        # Converted by another worker meanwhile
+                        continue
+        return migrated
+
     @asynccontextmanager
     async def _get_redis_connection(self):
         """Safe context manager for Redis operations."""
@@ -79,6 +131,8 @@ class RedisKVStorage(BaseKVStorage):
         await self.close()
 
     async def get_by_id(self, id: str) -> dict[str, Any] | None:
+        if self._is_llm_cache:
+            return (await self.get_by_ids([id]))[0]
         async with self._get_redis_connection() as redis:
             try:
                 data = await redis.get(f"{self.namespace}:{id}")
@@ -92,13 +146,59 @@ class RedisKVStorage(BaseKVStorage):
             try:
                 pipe = redis.pipeline()
                 for id in ids:
-                    pipe.get(f"{self.namespace}:{id}")
+                    if self._is_llm_cache:
+                        pipe.hgetall(f"{self.namespace}:{id}")
+                    else:
+                        pipe.get(f"{self.namespace}:{id}")
                 results = await pipe.execute()
+                if self._is_llm_cache:
+                    return [
+                        {
+                            args_hash: json.loads(entry)
+                            for args_hash, entry in result.items()
+                        }
+                        if result
+                        else None
+                        for result in results
+                    ]
                 return [json.loads(result) if result else None for result in results]
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error in batch get: {e}")
                 return [None] * len(ids)
 
+    async def get_by_mode_and_id(self, mode: str, id: str) -> dict[str, Any] | None:
+        """Specifically for llm_response_cache."""
+        if not self._is_llm_cache:
+            return None
+        async with self._get_redis_connection() as redis:
+            try:
+                entry = await redis.hget(f"{self.namespace}:{mode}", id)
+                return {id: json.loads(entry)} if entry else None
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON decode error for cache entry {mode}:{id}: {e}")
+                return None
+
+    async def iter_keys(
+        self, batch_size: int = 1000, after: str | None = None
+    ) -> AsyncIterator[list[str]]:
+        """Iterate over the keys in order, from a SCAN of the keys of the namespace"""
+        if self._is_llm_cache:
+            # Entries are fields of a hash per mode, read and deleted by mode
+            raise NotImplementedError(
+                f"{type(self).__name__} cannot iterate over the LLM cache"
+            )
+        prefix = f"{self.namespace}:"
+        async with self._get_redis_connection() as redis:
+            # SCAN returns the keys in no particular order, they are sorted so that
+            # the scan can be resumed after a key
+            keys = sorted(
+                key[len(prefix) :]
+                async for key in redis.scan_iter(match=f"{prefix}*", count=batch_size)
+                if after is None or key[len(prefix) :] > after
+            )
+        for start in range(0, len(keys), batch_size):
+            yield keys[start : start + batch_size]
+
     async def filter_keys(self, keys: set[str]) -> set[str]:
         async with self._get_redis_connection() as redis:
             pipe = redis.pipeline()
@@ -117,6 +217,18 @@ class RedisKVStorage(BaseKVStorage):
         async with self._get_redis_connection() as redis:
             try:
                 pipe = redis.pipeline()
+                if self._is_llm_cache:
+                    for mode, mode_cache in data.items():
+                        pipe.hset(
+                            f"{self.namespace}:{mode}",
+                            mapping={
+                                args_hash: json.dumps(entry)
+                                for args_hash, entry in mode_cache.items()
+                            },
+                        )
+                    await pipe.execute()
+                    return
+
                 for k, v in data.items():
                     pipe.set(f"{self.namespace}:{k}", json.dumps(v))
                 await pipe.execute()
@@ -151,7 +263,7 @@ class RedisKVStorage(BaseKVStorage):
         """Delete specific records from storage by by cache mode
 
         Importance notes for Redis storage:
-        1. This will immediately delete the specified cache modes from Redis
+        1. This will immediately delete the hashes of the specified cache modes from Redis
 
         Args:
             modes (list[str]): List of cache mode to be drop from storage
@@ -1,8 +1,11 @@
 import os
 import sys
+import time
 import asyncio
+import ctypes
+from contextlib import asynccontextmanager
 from multiprocessing.synchronize import Lock as ProcessLock
-from multiprocessing import Manager
+from multiprocessing import Manager, Array
 from typing import Any, Dict, Optional, Union, TypeVar, Generic
 
 
@@ -44,6 +47,35 @@ _data_init_lock: Optional[LockType] = None
 # async locks for coroutine synchronization in multiprocess mode
 _async_locks: Optional[Dict[str, asyncio.Lock]] = None
 
+# multiprocess locks are polled with exponential backoff instead of a blocking acquire
+LOCK_BACKOFF_MIN = float(os.getenv("LOCK_BACKOFF_MIN", 0.001))
+LOCK_BACKOFF_MAX = float(os.getenv("LOCK_BACKOFF_MAX", 0.05))
+
+# per process lock wait metrics: lock name -> metrics
+_lock_metrics: Dict[str, Dict[str, float]] = {}
+
+# per namespace reader/writer locks
+_namespace_process_locks: Optional[Dict[str, Any]] = None  # namespace -> writer lock
+_namespace_locks: Dict[str, "NamespaceLock"] = {}  # per process namespace locks
+
+# versioned change logs for process local replicas of shared namespaces
+MAX_SHARED_NAMESPACES = int(os.getenv("MAX_SHARED_NAMESPACES", 256))
+SHARED_CHANGE_LOG_SIZE = int(os.getenv("SHARED_CHANGE_LOG_SIZE", 1000))
+SHARED_CHANGE_MAX_RECORDS = int(os.getenv("SHARED_CHANGE_MAX_RECORDS", 5000))
+_change_logs: Optional[Dict[str, Any]] = None  # namespace -> [(upserts, deletes)]
+_version_slots: Optional[Dict[str, int]] = None  # namespace -> index in _versions
+_versions: Optional[Any] = None  # namespace versions, shared memory in multiprocess
+_version_bases: Optional[Any] = None  # namespace versions before the change log
+_TRUNCATING = -1  # marks a namespace base while its change log is being truncated
+_local_version_slots: Dict[str, int] = {}  # per process cache of _version_slots
+_local_change_logs: Dict[str, Any] = {}  # per process cache of _change_logs proxies
+_replicas: Dict[str, "NamespaceReplica"] = {}  # per process replicas
+
+# Computations claimed by a worker process, see utils.SingleFlight
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", 300))
+_INFLIGHT_POLL_MAX = 0.5
+_inflight_keys: Optional[Dict[str, tuple]] = None  # key -> (pid, claim time)
+
 
 class UnifiedLock(Generic[T]):
     """Provide a unified lock interface type for asyncio.Lock and multiprocessing.Lock"""
@@ -64,6 +96,8 @@ class UnifiedLock(Generic[T]):
         self._async_lock = async_lock  # auxiliary lock for coroutine synchronization
 
     async def __aenter__(self) -> "UnifiedLock[T]":
+        start_time = time.perf_counter()
+        async_lock_acquired = False
         try:
             direct_log(
                 f"== Lock == Process {self._pid}: Acquiring lock '{self._name}' (async={self._is_async})",
@@ -77,6 +111,7 @@ class UnifiedLock(Generic[T]):
                     enable_output=self._enable_logging,
                 )
                 await self._async_lock.acquire()
+                async_lock_acquired = True
                 direct_log(
                     f"== Lock == Process {self._pid}: Async lock for '{self._name}' acquired",
                     enable_output=self._enable_logging,
@@ -86,13 +121,19 @@ class UnifiedLock(Generic[T]):
             if self._is_async:
                 await self._lock.acquire()
             else:
-                self._lock.acquire()
+                await self._acquire_process_lock()
 
+            _record_lock_wait(self._name, time.perf_counter() - start_time)
             direct_log(
                 f"== Lock == Process {self._pid}: Lock '{self._name}' acquired (async={self._is_async})",
                 enable_output=self._enable_logging,
             )
             return self
+        except asyncio.CancelledError:
+            # Cancelled while waiting for the main lock, let other coroutines proceed
+            if async_lock_acquired:
+                self._async_lock.release()
+            raise
         except Exception as e:
             # If main lock acquisition fails, release the async lock if it was acquired
             if (
@@ -109,6 +150,17 @@ class UnifiedLock(Generic[T]):
             )
             raise
 
+    async def _acquire_process_lock(self) -> None:
+        """Acquire the multiprocess lock without blocking the event loop
+
+        The Manager lock proxy only supports a blocking acquire or a try-acquire,
+        so poll it with exponential backoff while other coroutines keep running.
+        """
+        delay = LOCK_BACKOFF_MIN
+        while not self._lock.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LOCK_BACKOFF_MAX)
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         main_lock_released = False
         try:
@@ -216,6 +268,145 @@ class UnifiedLock(Generic[T]):
             raise
 
 
+def _record_lock_wait(name: str, wait_time: float) -> None:
+    """Record the time spent waiting for a lock in the per process lock metrics"""
+    metrics = _lock_metrics.get(name)
+    if metrics is None:
+        metrics = _lock_metrics[name] = {
+            "acquisitions": 0,
+            "contended": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+    metrics["acquisitions"] += 1
+    # An uncontended acquire of a Manager lock is still an IPC round-trip
+    if wait_time > LOCK_BACKOFF_MIN:
+        metrics["contended"] += 1
+    metrics["total_wait"] += wait_time
+    metrics["max_wait"] = max(metrics["max_wait"], wait_time)
+
+
+def get_lock_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Get the lock wait metrics of the current process.
+
+    Returns:
+        Dict[str, Dict[str, float]]: lock name -> {acquisitions, contended, total_wait,
+            max_wait, avg_wait}, wait times are in seconds
+    """
+    return {
+        name: {
+            **metrics,
+            "avg_wait": metrics["total_wait"] / metrics["acquisitions"],
+        }
+        for name, metrics in _lock_metrics.items()
+    }
+
+
+class _AsyncRWLock:
+    """Writer preferring reader/writer lock for coroutines of one process"""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    async def acquire_read(self) -> None:
+        async with self._cond:
+            # New readers wait for queued writers, so writers do not starve
+            await self._cond.wait_for(
+                lambda: not self._writer and not self._waiting_writers
+            )
+            self._readers += 1
+
+    async def release_read(self) -> None:
+        async with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    async def acquire_write(self) -> None:
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(
+                    lambda: not self._writer and not self._readers
+                )
+            finally:
+                self._waiting_writers -= 1
+                if self._waiting_writers == 0:
+                    self._cond.notify_all()
+            self._writer = True
+
+    async def release_write(self) -> None:
+        async with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class NamespaceLock:
+    """
+    Reader/writer lock scoped to a single storage namespace.
+
+    Any number of coroutines of a process may hold the reader lock at the same time,
+    the writer lock is exclusive. Readers are not synchronized across processes: each
+    process reads its own copy of the data, and reloads it under the writer lock when
+    another process has updated it. In multiprocess mode the writer lock is also held
+    across processes, so only one process updates or persists a namespace at a time.
+
+    Usage:
+        async with lock.reader():
+            ...
+        async with lock.writer():
+            ...
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        process_lock: Optional[ProcessLock] = None,
+        enable_logging: bool = False,
+    ):
+        self._namespace = namespace
+        self._rw_lock = _AsyncRWLock()
+        self._process_lock = process_lock
+        self._enable_logging = enable_logging
+
+    @asynccontextmanager
+    async def reader(self):
+        start_time = time.perf_counter()
+        await self._rw_lock.acquire_read()
+        _record_lock_wait(
+            f"namespace_lock:{self._namespace}:read", time.perf_counter() - start_time
+        )
+        try:
+            yield self
+        finally:
+            await self._rw_lock.release_read()
+
+    @asynccontextmanager
+    async def writer(self):
+        start_time = time.perf_counter()
+        await self._rw_lock.acquire_write()
+        _record_lock_wait(
+            f"namespace_lock:{self._namespace}:write", time.perf_counter() - start_time
+        )
+        try:
+            if self._process_lock is None:
+                yield self
+            else:
+                async with UnifiedLock(
+                    lock=self._process_lock,
+                    is_async=False,
+                    name=f"namespace_process_lock:{self._namespace}",
+                    enable_logging=self._enable_logging,
+                ):
+                    yield self
+        finally:
+            await self._rw_lock.release_write()
+
+
 def get_internal_lock(enable_logging: bool = False) -> UnifiedLock:
     """return unified storage lock for data consistency"""
     async_lock = _async_locks.get("internal_lock") if _is_multiprocess else None
@@ -276,6 +467,27 @@ def get_data_init_lock(enable_logging: bool = False) -> UnifiedLock:
     )
 
 
+def get_namespace_lock(namespace: str, enable_logging: bool = False) -> NamespaceLock:
+    """return the reader/writer lock of a storage namespace"""
+    lock = _namespace_locks.get(namespace)
+    if lock is None:
+        process_lock = None
+        if _is_multiprocess:
+            if _namespace_process_locks is None:
+                raise ValueError(
+                    "Try to get namespace lock before Shared-Data is initialized"
+                )
+            # setdefault is atomic in the manager process, the first process wins
+            process_lock = _namespace_process_locks.setdefault(
+                namespace, _manager.Lock()
+            )
+        lock = _namespace_locks.setdefault(
+            namespace,
+            NamespaceLock(namespace, process_lock, enable_logging=enable_logging),
+        )
+    return lock
+
+
 def initialize_share_data(workers: int = 1):
     """
     Initialize shared storage data for single or multi-process mode.
@@ -307,7 +519,13 @@ def initialize_share_data(workers: int = 1):
         _init_flags, \
         _initialized, \
         _update_flags, \
-        _async_locks
+        _async_locks, \
+        _namespace_process_locks, \
+        _change_logs, \
+        _version_slots, \
+        _versions, \
+        _version_bases, \
+        _inflight_keys
 
     # Check if already initialized
     if _initialized:
@@ -329,6 +547,14 @@ def initialize_share_data(workers: int = 1):
         _shared_dicts = _manager.dict()
         _init_flags = _manager.dict()
         _update_flags = _manager.dict()
+        _namespace_process_locks = _manager.dict()
+        _change_logs = _manager.dict()
+        _version_slots = _manager.dict()
+        _inflight_keys = _manager.dict()
+        # Created before workers are forked, so reading a namespace version is a
+        # plain shared memory access instead of a round-trip to the manager process
+        _versions = Array(ctypes.c_longlong, MAX_SHARED_NAMESPACES, lock=False)
+        _version_bases = Array(ctypes.c_longlong, MAX_SHARED_NAMESPACES, lock=False)
 
         # Initialize async locks for multiprocess mode
         _async_locks = {
@@ -352,6 +578,14 @@ def initialize_share_data(workers: int = 1):
         _shared_dicts = {}
         _init_flags = {}
         _update_flags = {}
+        _namespace_process_locks = (
+            None  # No need for process locks in single process mode
+        )
+        _change_logs = {}
+        _version_slots = {}
+        _versions = [0] * MAX_SHARED_NAMESPACES
+        _version_bases = [0] * MAX_SHARED_NAMESPACES
+        _inflight_keys = None  # Deduplicated within the process only
         _async_locks = None  # No need for async locks in single process mode
         direct_log(f"Process {os.getpid()} Shared-Data created for Single Process")
 
@@ -377,6 +611,7 @@ async def initialize_pipeline_status():
             {
                 "autoscanned": False,  # Auto-scan started
                 "busy": False,  # Control concurrent processes
+                "gc_busy": False,  # Garbage collection running
                 "job_name": "-",  # Current job name (indexing files/indexing texts)
                 "job_start": None,  # Job start time
                 "docs": 0,  # Total number of documents to be indexed
@@ -518,6 +753,293 @@ async def get_namespace_data(namespace: str) -> Dict[str, Any]:
     return _shared_dicts[namespace]
 
 
+async def _get_version_slot(namespace: str) -> int:
+    """Get the index of a namespace in the shared version array, allocating it if needed"""
+    slot = _local_version_slots.get(namespace)
+    if slot is not None:
+        return slot
+
+    if _version_slots is None:
+        raise ValueError(
+            "Try to get namespace version before Shared-Data is initialized"
+        )
+
+    async with get_internal_lock():
+        if namespace not in _version_slots:
+            if len(_version_slots) >= MAX_SHARED_NAMESPACES:
+                raise ValueError(
+                    f"Too many shared namespaces, increase MAX_SHARED_NAMESPACES (current: {MAX_SHARED_NAMESPACES})"
+                )
+            _version_slots[namespace] = len(_version_slots)
+            _change_logs[namespace] = _manager.list() if _is_multiprocess else []
+        slot = _version_slots[namespace]
+        # Getting a nested proxy from the manager is expensive, keep it per process
+        _local_change_logs[namespace] = _change_logs[namespace]
+
+    _local_version_slots[namespace] = slot
+    return slot
+
+
+async def get_namespace_version(namespace: str) -> int:
+    """
+    Get the current version of a namespace.
+    The version is increased by every published change, reading it does not involve IPC.
+    """
+    slot = await _get_version_slot(namespace)
+    return _versions[slot]
+
+
+async def publish_namespace_changes(
+    namespace: str,
+    upserts: Optional[Dict[str, Any]] = None,
+    deletes: Optional[list] = None,
+) -> int:
+    """
+    Append a change to the versioned change log of a namespace.
+    The caller must hold the (cross-process) writer lock of the namespace.
+
+    Args:
+        namespace: The namespace the change belongs to
+        upserts: Records inserted or updated by the change, keyed by id
+        deletes: Ids removed by the change
+
+    Returns:
+        int: The new version of the namespace
+    """
+    upserts, deletes = upserts or {}, deletes or []
+    # Nobody reads the log in single process mode, and a change too large to ship
+    # through the manager is cheaper to reload from the persisted data
+    if not _is_multiprocess or len(upserts) + len(deletes) > SHARED_CHANGE_MAX_RECORDS:
+        return await reset_namespace_changes(namespace)
+
+    slot = await _get_version_slot(namespace)
+    change_log = _local_change_logs[namespace]
+    change_log.append((upserts, deletes))
+    version = _versions[slot] + 1
+
+    # Truncate the log, processes behind the new base fall back to a full reload
+    base = _version_bases[slot]
+    log_size = version - base
+    if log_size > SHARED_CHANGE_LOG_SIZE:
+        dropped = log_size - SHARED_CHANGE_LOG_SIZE // 2
+        _version_bases[slot] = _TRUNCATING
+        del change_log[:dropped]
+        _version_bases[slot] = base + dropped
+
+    _versions[slot] = version
+    return version
+
+
+async def reset_namespace_changes(namespace: str) -> int:
+    """
+    Discard the change log of a namespace and bump its version,
+    forcing every other process to fully reload the namespace on next sync.
+    The caller must hold the (cross-process) writer lock of the namespace.
+
+    Returns:
+        int: The new version of the namespace
+    """
+    slot = await _get_version_slot(namespace)
+    version = _versions[slot] + 1
+    _version_bases[slot] = _TRUNCATING
+    del _local_change_logs[namespace][:]
+    _version_bases[slot] = version
+    _versions[slot] = version
+    return version
+
+
+async def get_namespace_changes(
+    namespace: str, since_version: int
+) -> tuple[int, Optional[list]]:
+    """
+    Get the changes of a namespace published after a given version.
+
+    Args:
+        namespace: The namespace to read the change log of
+        since_version: The version the caller is currently at
+
+    Returns:
+        tuple: (current_version, changes), changes is a list of (upserts, deletes) tuples,
+            or None if the log was truncated past since_version and a full reload is needed
+    """
+    slot = await _get_version_slot(namespace)
+    version = _versions[slot]
+    if since_version == version:
+        return version, []
+
+    base = _version_bases[slot]
+    if base == _TRUNCATING or since_version < base or since_version > version:
+        return version, None
+
+    # Slicing a ListProxy fetches all the entries in a single round-trip
+    changes = list(_local_change_logs[namespace][since_version - base : version - base])
+    # Readers do not hold the writer lock, check the log was not truncated meanwhile
+    if _version_bases[slot] != base:
+        return version, None
+    return version, changes
+
+
+class NamespaceReplica:
+    """
+    Process local read replica of a shared key-value namespace.
+
+    In multi-process mode reads are plain dict lookups on the local copy. Writes are
+    applied locally, to the authoritative Manager dict of the namespace, and appended
+    to the change log of the namespace. Other processes apply the change log on their
+    next sync() and only copy the whole namespace when the log was truncated.
+
+    In single-process mode the replica directly wraps the shared dict.
+
+    sync() must be called with the reader lock of the namespace held, the other
+    methods with its writer lock held (see get_namespace_lock).
+    """
+
+    def __init__(self, namespace: str, shared_data: Dict[str, Any]):
+        self.namespace = namespace
+        self._shared_data = shared_data
+        self.version = -1
+        self.data: Dict[str, Any] = shared_data if not _is_multiprocess else {}
+        # Keys by their part before ":", built by the first keys_of_group call
+        self._groups: Dict[str, set] | None = None
+
+    def keys_of_group(self, group: str) -> set:
+        """Keys of the form "<group>:...", e.g. the LLM cache entries of a mode
+
+        The returned set is updated by the writes, copy it to keep it past the lock.
+        """
+        if self._groups is None:
+            self._groups = {}
+            self._index_keys(self.data)
+        return self._groups.get(group, set())
+
+    def _index_keys(self, keys) -> None:
+        if self._groups is None:
+            return
+        for key in keys:
+            group, sep, _ = key.partition(":")
+            if sep:
+                self._groups.setdefault(group, set()).add(key)
+
+    def _unindex_keys(self, keys) -> None:
+        if self._groups is None:
+            return
+        for key in keys:
+            group_keys = self._groups.get(key.partition(":")[0])
+            if group_keys is not None:
+                group_keys.discard(key)
+
+    async def sync(self) -> None:
+        """Bring the local copy up to date with changes published by other processes"""
+        if not _is_multiprocess:
+            return
+
+        since_version = self.version
+        if since_version == await get_namespace_version(self.namespace):
+            return
+
+        version, changes = await get_namespace_changes(self.namespace, since_version)
+        if self.version != since_version:
+            # Synced by a concurrent reader of this process meanwhile
+            return
+        if changes is None:
+            self.data = dict(self._shared_data)
+            self._groups = None
+            direct_log(
+                f"Process {os.getpid()} reloaded replica [{self.namespace}] at version {version} with {len(self.data)} records",
+                enable_output=False,
+            )
+        else:
+            for upserts, deletes in changes:
+                self.data.update(upserts)
+                self._index_keys(upserts)
+                for key in deletes:
+                    self.data.pop(key, None)
+                self._unindex_keys(deletes)
+        self.version = version
+
+    async def upsert(self, data: Dict[str, Any]) -> None:
+        """Insert or update records and publish them to other processes"""
+        await self.sync()
+        self.data.update(data)
+        self._index_keys(data)
+        if _is_multiprocess:
+            self._shared_data.update(data)
+            self.version = await publish_namespace_changes(self.namespace, upserts=data)
+
+    async def delete(self, keys: list) -> bool:
+        """Delete records and publish the deletion, returns True if anything was deleted"""
+        await self.sync()
+        deleted = [key for key in keys if self.data.pop(key, None) is not None]
+        self._unindex_keys(deleted)
+        if deleted and _is_multiprocess:
+            for key in deleted:
+                self._shared_data.pop(key, None)
+            self.version = await publish_namespace_changes(
+                self.namespace, deletes=deleted
+            )
+        return bool(deleted)
+
+    async def load(self, data: Dict[str, Any]) -> None:
+        """Replace the whole namespace, e.g. on initial load or drop"""
+        self._shared_data.clear()
+        self._shared_data.update(data)
+        self._groups = None
+        if _is_multiprocess:
+            self.data = dict(data)
+            self.version = await reset_namespace_changes(self.namespace)
+
+
+async def get_namespace_replica(namespace: str) -> NamespaceReplica:
+    """get the process local replica of a shared namespace"""
+    replica = _replicas.get(namespace)
+    if replica is None:
+        shared_data = await get_namespace_data(namespace)
+        replica = _replicas.setdefault(
+            namespace, NamespaceReplica(namespace, shared_data)
+        )
+    return replica
+
+
+def claim_inflight(key: str) -> bool:
+    """
+    Claim a computation for the current worker process.
+
+    Returns:
+        bool: True if the caller should run the computation, False if another worker
+            is already running it. Always True in single process mode.
+    """
+    if not _is_multiprocess:
+        return True
+    claim = (os.getpid(), time.time())
+    current = _inflight_keys.setdefault(key, claim)
+    if current == claim:
+        return True
+    if time.time() - current[1] > SINGLE_FLIGHT_TIMEOUT:
+        # The worker holding the claim died or hangs, take it over
+        _inflight_keys[key] = claim
+        return True
+    return False
+
+
+def release_inflight(key: str) -> None:
+    """Release a computation claimed with claim_inflight"""
+    if _is_multiprocess:
+        _inflight_keys.pop(key, None)
+
+
+async def wait_inflight(key: str) -> None:
+    """Wait until the worker running a computation released it, or its claim expired"""
+    if not _is_multiprocess:
+        return
+    delay = LOCK_BACKOFF_MIN
+    while True:
+        claim = _inflight_keys.get(key)
+        if claim is None or time.time() - claim[1] > SINGLE_FLIGHT_TIMEOUT:
+            return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, _INFLIGHT_POLL_MAX)
+
+
 def finalize_share_data():
     """
     Release shared resources and clean up.
@@ -540,7 +1062,13 @@ def finalize_share_data():
         _init_flags, \
         _initialized, \
         _update_flags, \
-        _async_locks
+        _async_locks, \
+        _namespace_process_locks, \
+        _change_logs, \
+        _version_slots, \
+        _versions, \
+        _version_bases, \
+        _inflight_keys
 
     # Check if already initialized
     if not _initialized:
@@ -568,6 +1096,10 @@ def finalize_share_data():
                 _shared_dicts.clear()
             if _init_flags is not None:
                 _init_flags.clear()
+            if _change_logs is not None:
+                _change_logs.clear()
+            if _inflight_keys is not None:
+                _inflight_keys.clear()
             if _update_flags is not None:
                 # Clear each namespace's update flags list and Value objects
                 try:
@@ -606,5 +1138,16 @@ def finalize_share_data():
     _data_init_lock = None
     _update_flags = None
     _async_locks = None
+    _namespace_process_locks = None
+    _namespace_locks.clear()
+    _lock_metrics.clear()
+    _change_logs = None
+    _version_slots = None
+    _versions = None
+    _version_bases = None
+    _inflight_keys = None
+    _local_version_slots.clear()
+    _local_change_logs.clear()
+    _replicas.clear()
 
     direct_log(f"Process {os.getpid()} storage data finalization complete")
@@ -0,0 +1,70 @@
+"""
+Document filters of the in-process vector storages (NanoVectorDBStorage, FaissVectorDBStorage).
+
+QueryParam.ids restricts a query to documents. Chunk records carry the id of their
+document in full_doc_id. Entity and relationship records carry the ids of their
+source chunks in source_id, which are resolved to documents through the chunks
+storage of the same LightRAG instance (BaseVectorStorage.chunks_vdb).
+"""
+
+from collections import defaultdict
+from typing import Any, Iterable
+
+import numpy as np
+
+from ..namespace import NameSpace, is_namespace
+from ..prompt import GRAPH_FIELD_SEP
+from ..utils import logger
+
+
+def record_filter_keys(record: dict[str, Any]) -> list[str]:
+    """Keys a record is matched by: its document for chunks, its source chunks otherwise"""
+    if record.get("full_doc_id"):
+        return [record["full_doc_id"]]
+    source_id = record.get("source_id")
+    return source_id.split(GRAPH_FIELD_SEP) if source_id else []
+
+
+class VectorFilterIndex:
+    """Rows of the records of a vector storage by filter key
+
+    Built from the (row, record) pairs of a storage, and rebuilt after it changed.
+    """
+
+    def __init__(self, records: Iterable[tuple[int, dict[str, Any]]]):
+        self._rows: dict[str, list[int]] = defaultdict(list)
+        self._ids: dict[int, str] = {}
+        for row, record in records:
+            self._ids[row] = record["__id__"]
+            for key in record_filter_keys(record):
+                self._rows[key].append(row)
+
+    def rows(self, keys: Iterable[str]) -> np.ndarray:
+        """Sorted rows of the records matching any of the keys"""
+        rows = [row for key in keys for row in self._rows.get(key, ())]
+        return np.unique(np.array(rows, dtype=np.int64))
+
+    def ids(self, keys: Iterable[str]) -> set[str]:
+        """Ids of the records matching any of the keys"""
+        return {self._ids[row] for row in self.rows(keys)}
+
+
+async def resolve_filter_keys(storage, doc_ids: list[str]) -> list[str] | None:
+    """Filter keys of the records of a storage belonging to the documents
+
+    Returns:
+        The document ids for the chunks storage, the ids of their chunks for the
+        entities and relationships storages, or None if they cannot be resolved
+    """
+    if is_namespace(storage.namespace, NameSpace.VECTOR_STORE_CHUNKS):
+        return doc_ids
+    if storage.chunks_vdb is None:
+        logger.warning(
+            f"Cannot filter {storage.namespace} by document without its chunks storage"
+        )
+        return None
+    try:
+        return list(await storage.chunks_vdb.get_ids_by_doc_ids(doc_ids))
+    except NotImplementedError as e:
+        logger.warning(f"Cannot filter {storage.namespace} by document: {e}")
+        return None
@@ -0,0 +1,122 @@
+"""
+Compressed search mode of the in-process vector storages (NanoVectorDBStorage, FaissVectorDBStorage).
+
+With VECTOR_QUANTIZATION=int8 (or the "quantization" key of vector_db_storage_cls_kwargs)
+the candidates of a query are found with vectors quantized to one byte per dimension:
+
+- NanoVectorDBStorage scores int8 codes with a scale per vector, and moves its float
+  matrix to a temporary file mapped in memory, from which only the rows of the
+  candidates are read
+- FaissVectorDBStorage searches an IndexHNSWSQ with 8 bit scalar quantization
+
+The top_k * VECTOR_RESCORE_FACTOR candidates are then re-ranked with the exact float
+vectors, so results only differ from the float search if a true neighbour is not
+among the candidates. The persisted files keep the float vectors, the mode can be
+switched on and off on an existing storage.
+"""
+
+import os
+import tempfile
+from typing import Any
+
+import numpy as np
+
+# Rows converted to float32 at once when scoring int8 codes, small enough to stay in cache
+SCORE_BLOCK_ROWS = 1024
+
+
+def get_quantization_config(storage_kwargs: dict[str, Any]) -> tuple[str | None, int]:
+    """Quantization mode and rescore factor of a vector storage
+
+    Returns:
+        The mode (None for float search) and the number of candidates per result
+        which are re-ranked with the float vectors
+    """
+    mode = storage_kwargs.get("quantization", os.getenv("VECTOR_QUANTIZATION", ""))
+    mode = (mode or "").lower()
+    if mode in ("", "none", "float"):
+        mode = None
+    elif mode != "int8":
+        raise ValueError(f"Unsupported vector quantization {mode!r}, expected int8")
+    rescore_factor = int(
+        storage_kwargs.get("rescore_factor", os.getenv("VECTOR_RESCORE_FACTOR", 4))
+    )
+    return mode, max(rescore_factor, 1)
+
+
+class Int8Matrix:
+    """Symmetric int8 codes of a matrix of normalized vectors, with a scale per row"""
+
+    def __init__(self, matrix: np.ndarray):
+        self.codes, self.scales = self._quantize(matrix)
+
+    @staticmethod
+    def _quantize(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        scales = np.abs(matrix).max(axis=1, initial=0.0) / 127
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def update(self, rows: np.ndarray, matrix: np.ndarray) -> None:
+        """Quantize the changed rows again, matrix holds their new vectors"""
+        if len(rows):
+            self.codes[rows], self.scales[rows] = self._quantize(matrix)
+
+    def append(self, matrix: np.ndarray) -> None:
+        if len(matrix):
+            codes, scales = self._quantize(matrix)
+            self.codes = np.concatenate([self.codes, codes])
+            self.scales = np.concatenate([self.scales, scales])
+
+    def delete(self, rows: list[int]) -> None:
+        if rows:
+            self.codes = np.delete(self.codes, rows, axis=0)
+            self.scales = np.delete(self.scales, rows)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def scores(self, queries: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Approximate inner products of the queries with all rows, or the given rows
+
+        Returns:
+            One array of scores per query
+        """
+        codes = self.codes if rows is None else self.codes[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        buffer = np.empty((SCORE_BLOCK_ROWS, codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = buffer[: len(codes[start : start + SCORE_BLOCK_ROWS])]
+            np.copyto(block, codes[start : start + len(block)])
+            scores[:, start : start + len(block)] = queries @ block.T
+        return scores * scales
+
+
+def map_to_temporary_file(matrix: np.ndarray, directory: str) -> np.ndarray:
+    """Move a matrix out of memory to a temporary file mapped copy-on-write
+
+    Pages are read back from the file when rows are accessed and can be evicted
+    again, writes to the returned matrix stay in memory. The file is deleted once
+    the matrix is released.
+    """
+    if isinstance(matrix, np.memmap) or not matrix.size:
+        return matrix
+    with tempfile.TemporaryFile(dir=directory) as f:
+        np.ascontiguousarray(matrix, dtype=np.float32).tofile(f)
+        f.flush()
+        return np.memmap(f, dtype=np.float32, mode="c", shape=matrix.shape)
+
+
+def top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if len(scores) > k:
+        best = np.argpartition(scores, -k)[-k:]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(scores[best])[::-1]]
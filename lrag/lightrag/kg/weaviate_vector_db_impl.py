@@ -3,11 +3,13 @@ from weaviate.exceptions import WeaviateBaseError
 from weaviate.auth import AuthApiKey
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from weaviate.classes.config import DataType 
+from weaviate.classes.config import DataType, Property, Tokenization
 from or_lib.base import BaseKVStorage, BaseVectorStorage  
-from weaviate.classes.query import Filter, MetadataQuery
+from or_lib.prompt import GRAPH_FIELD_SEP
+from weaviate.classes.query import Filter, MetadataQuery, Sort
 from logging import getLogger
 import asyncio
+from itertools import islice
 import numpy as np
 import os
 import weaviate.classes as wvc
@@ -19,6 +21,9 @@ import json
 load_dotenv()
 logger = getLogger("weaviate-vectordb")
 
+# Objects fetched at once by the filtered scans
+PAGE_SIZE = int(os.getenv("WEAVIATE_PAGE_SIZE") or 1000)
+
 @dataclass
 class WeaviateDBBase:
     """Base class for WeaviateDB storage handling shared initialization."""
@@ -71,12 +76,15 @@ class WeaviateDBBase:
             if self.namespace.lower() not in existing_collections:
                 client.collections.create(
                     name=self.namespace,
-                    properties=[{"name": "content", "data_type": DataType.TEXT}], 
+                    properties=self._collection_properties(),
                     vectorizer_config=None,  
                 )
 
         return client
 
+    def _collection_properties(self) -> list:
+        return [{"name": "content", "data_type": DataType.TEXT}]
+
 
 class WeaviateDBKVStorage(BaseKVStorage, WeaviateDBBase):
     """Weaviate Key-Value Storage Implementation."""
@@ -133,13 +141,76 @@ class WeaviateDBKVStorage(BaseKVStorage, WeaviateDBBase):
             self._client.close()
 
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, AsyncIterator
+
+# Field tokenized copies of the ids of collections created with a word tokenized
+# __id__ or full_doc_id, see WeaviateDBVectorStorage.initialize
+LEGACY_KEYS = {"__id__": "__id_key__", "full_doc_id": "__doc_key__"}
+
 
 @dataclass(unsafe_hash=True)
 class WeaviateDBVectorStorage(BaseVectorStorage, WeaviateDBBase):
-    
+    # Properties the filters match ids on, by stored property
+    _keys: dict[str, str] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    async def initialize(self):
+        """Backfill the properties of the document filters on existing collections
+
+        Collections created before the document filters have a word tokenized __id__
+        (and full_doc_id of chunks), whose ids are split into words by the filters,
+        and entities and relationships without full_doc_ids. Field tokenized copies
+        of the ids and the missing full_doc_ids are written once, the filters use
+        them from then on.
+        """
+        if self._keys:
+            return
+        collection = self._client.collections.get(self.namespace)
+        properties = {p.name: p for p in collection.config.get().properties}
+        keys = {}
+        for name in ("__id__", "full_doc_id") if "chunks" in self.namespace else ("__id__",):
+            prop = properties.get(name)
+            keys[name] = name if prop is None or prop.tokenization == Tokenization.FIELD else LEGACY_KEYS[name]
+        new_properties = [key for key in keys.values() if key not in properties]
+        if "chunks" not in self.namespace and "full_doc_ids" not in properties:
+            new_properties.append("full_doc_ids")
+        for key in new_properties:
+            data_type = DataType.TEXT_ARRAY if key == "full_doc_ids" else DataType.TEXT
+            collection.config.add_property(Property(name=key, data_type=data_type, tokenization=Tokenization.FIELD))
+            logger.info(f"Added property {key} to {self.namespace}")
+        self._keys = keys
+        if new_properties:
+            await self._backfill(collection, new_properties)
+
+    async def _backfill(self, collection, new_properties: list[str]):
+        """Write the new properties of the objects stored before they were added"""
+        if "full_doc_ids" in new_properties and self.chunks_vdb is not None:
+            # The documents of the entities and relationships are read from the chunks
+            await self.chunks_vdb.initialize()
+        sources = {legacy_key: name for name, legacy_key in LEGACY_KEYS.items()}
+        count = 0
+        iterator = collection.iterator()
+        while True:
+            objects = list(islice(iterator, PAGE_SIZE))
+            if not objects:
+                break
+            rows = [{key: obj.properties.get(sources.get(key, key)) for key in new_properties} | {"source_id": obj.properties.get("source_id")} for obj in objects]
+            if "full_doc_ids" in new_properties:
+                await self._add_doc_ids(rows)
+            for obj, row in zip(objects, rows):
+                collection.data.update(uuid=obj.uuid, properties={key: row.get(key) for key in new_properties})
+            count += len(objects)
+        logger.info(f"Backfilled {', '.join(new_properties)} of {count} objects of {self.namespace}")
+
+    def _with_keys(self, row: dict) -> dict:
+        """The row with the field tokenized copies of its ids, if the collection has them"""
+        for name, key in self._keys.items():
+            if key != name and name in row:
+                row[key] = row[name]
+        return row
+
+    def _key(self, name: str) -> str:
+        return self._keys.get(name, name)
 
-    
     async def upsert(self, data: dict[str, dict]):
         if not data:
             logger.warning("Attempted to insert empty data into vector DB.")
@@ -162,6 +233,8 @@ class WeaviateDBVectorStorage(BaseVectorStorage, WeaviateDBBase):
         embeddings_list = await asyncio.gather(*[self.embedding_func(batch) for batch in batches])
         embeddings = np.concatenate(embeddings_list)
         logger.info(f"[DEBUG] Generated {len(embeddings)} embeddings")
+        await self._add_doc_ids(formatted_data)
+        formatted_data = [self._with_keys(row) for row in formatted_data]
 
         collection = self._client.collections.get(self.namespace)
 
@@ -198,6 +271,8 @@ class WeaviateDBVectorStorage(BaseVectorStorage, WeaviateDBBase):
         batches = [contents[i: i + self._max_batch_size] for i in range(0, len(contents), self._max_batch_size)]
         embeddings_list = await asyncio.gather(*[self.embedding_func(batch) for batch in batches])
         embeddings = np.concatenate(embeddings_list)
+        await self._add_doc_ids(formatted_data)
+        formatted_data = [self._with_keys(row) for row in formatted_data]
 
         collection = self._client.collections.get(self.namespace)
 
@@ -296,9 +371,11 @@ class WeaviateDBVectorStorage(BaseVectorStorage, WeaviateDBBase):
                 raise ValueError("Final embedding is not a valid list of floats.")
 
             collection = self._client.collections.get(self.namespace)
+            filters = self._doc_filter(ids) if ids else None
             result = collection.query.near_vector(
                 near_vector=embedding,
                 limit=top_k,
+                filters=filters,
                 return_metadata=MetadataQuery(distance=True)
             )
             logger.info(f"[DEBUG] Weaviate query returned {len(result.objects)} objects")
@@ -321,6 +398,98 @@ class WeaviateDBVectorStorage(BaseVectorStorage, WeaviateDBBase):
             logger.error(f"Error in query: {e}")
             return []
 
+    def _collection_properties(self) -> list:
+        # Ids are matched whole by the document filters, not split into words
+        doc_ids = (
+            Property(name="full_doc_id", data_type=DataType.TEXT, tokenization=Tokenization.FIELD)
+            if "chunks" in self.namespace
+            else Property(name="full_doc_ids", data_type=DataType.TEXT_ARRAY, tokenization=Tokenization.FIELD)
+        )
+        return [
+            Property(name="content", data_type=DataType.TEXT),
+            Property(name="__id__", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+            doc_ids,
+        ]
+
+    def _doc_filter(self, doc_ids: list[str]):
+        """Where filter restricting a query to documents"""
+        if "chunks" in self.namespace:
+            return Filter.by_property(self._key("full_doc_id")).contains_any(doc_ids)
+        return Filter.by_property("full_doc_ids").contains_any(doc_ids)
+
+    async def _add_doc_ids(self, rows: list[dict]):
+        """Set full_doc_ids of entity and relationship rows to the documents of their source chunks"""
+        if "chunks" in self.namespace:
+            return
+        if self.chunks_vdb is None:
+            logger.warning(f"Cannot store the documents of {self.namespace} without its chunks storage")
+            return
+        # source_id joins the ids of the source chunks with GRAPH_FIELD_SEP
+        sources = [[c for c in (row.get("source_id") or "").split(GRAPH_FIELD_SEP) if c] for row in rows]
+        doc_of_chunk = await self.chunks_vdb.get_doc_ids_by_chunk_ids(list({c for chunk_ids in sources for c in chunk_ids}))
+        for row, chunk_ids in zip(rows, sources):
+            row["full_doc_ids"] = sorted({doc_of_chunk[c] for c in chunk_ids if c in doc_of_chunk})
+
+    def _pages(self, filters, return_properties: list[str] | None, after: str | None = None, page_size: int = PAGE_SIZE):
+        """Pages of the objects matching a filter, in __id__ order after the given __id__
+
+        The cursor API (after=) cannot be combined with filters, each page is read
+        after the last __id__ of the previous page instead.
+        """
+        collection = self._client.collections.get(self.namespace)
+        id_key = self._key("__id__")
+        if return_properties is not None:
+            return_properties = list(dict.fromkeys([*return_properties, id_key]))
+        while True:
+            page_filter = filters
+            if after is not None:
+                after_filter = Filter.by_property(id_key).greater_than(after)
+                page_filter = after_filter if filters is None else filters & after_filter
+            result = collection.query.fetch_objects(
+                filters=page_filter,
+                limit=page_size,
+                sort=Sort.by_property(id_key),
+                return_properties=return_properties,
+            )
+            if result.objects:
+                yield result.objects
+            if len(result.objects) < page_size:
+                return
+            after = result.objects[-1].properties[id_key]
+
+    def _fetch_all(self, filters, return_properties: list[str]) -> list:
+        """All objects matching a filter, PAGE_SIZE at a time"""
+        return [obj for page in self._pages(filters, ["__id__", *return_properties]) for obj in page]
+
+    async def iter_records(self, batch_size: int = 1000, after: str | None = None) -> AsyncIterator[list[dict[str, Any]]]:
+        """Iterate over the records in the order of their ids, without their vectors"""
+        for objects in self._pages(None, None, after, batch_size):
+            yield [dict(obj.properties) for obj in objects]
+
+    async def delete(self, ids: list[str]):
+        """Delete the objects of the records with the given ids"""
+        collection = self._client.collections.get(self.namespace)
+        for i in range(0, len(ids), PAGE_SIZE):
+            try:
+                collection.data.delete_many(where=Filter.by_property(self._key("__id__")).contains_any(ids[i : i + PAGE_SIZE]))
+            except Exception as e:
+                logger.error(f"Failed to delete records from {self.namespace}: {e}")
+
+    async def get_ids_by_doc_ids(self, doc_ids: list[str]) -> set[str]:
+        """Ids of the chunks of the documents"""
+        objects = self._fetch_all(self._doc_filter(doc_ids), [])
+        return {obj.properties["__id__"] for obj in objects}
+
+    async def get_doc_ids_by_chunk_ids(self, chunk_ids: list[str]) -> dict[str, str]:
+        """Document of each of the chunks"""
+        doc_ids = {}
+        # Bounds the size of the filter
+        for i in range(0, len(chunk_ids), PAGE_SIZE):
+            filters = Filter.by_property(self._key("__id__")).contains_any(chunk_ids[i : i + PAGE_SIZE])
+            for obj in self._fetch_all(filters, ["full_doc_id"]):
+                doc_ids[obj.properties["__id__"]] = obj.properties.get("full_doc_id")
+        return doc_ids
+
     async def index_done_callback(self):
         logger.info("Index done callback called, keeping Weaviate client open.")
         # await self.close()
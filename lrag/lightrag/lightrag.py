@@ -26,6 +26,7 @@ from .kg import (
     verify_storage_implementation,
 )
 
+from .kg.embedding_cache import EmbeddingCache
 from .kg.shared_storage import (
     get_namespace_data,
     get_pipeline_status_lock,
@@ -37,6 +38,7 @@ from .base import (
     BaseVectorStorage,
     DocProcessingStatus,
     DocStatus,
+    DocStatusPage,
     DocStatusStorage,
     QueryParam,
     StorageNameSpace,
@@ -45,7 +47,10 @@ from .base import (
 from .namespace import NameSpace, make_namespace
 from .operate import (
     chunking_by_token_size,
+    build_extraction_context,
+    extract_chunk_entities,
     extract_entities,
+    merge_nodes_and_edges,
     kg_query,
     mix_kg_vector_query,
     naive_query,
@@ -57,6 +62,8 @@ from .utils import (
     TiktokenTokenizer,
     EmbeddingFunc,
     always_get_an_event_loop,
+    embedding_request_scope,
+    compute_args_hash,
     compute_mdhash_id,
     convert_response_to_json,
     lazy_external_import,
@@ -65,6 +72,7 @@ from .utils import (
     clean_text,
     check_storage_env_vars,
     logger,
+    single_flight,
 )
 from .types import KnowledgeGraph
 from dotenv import load_dotenv
@@ -79,6 +87,21 @@ config = configparser.ConfigParser()
 config.read("config.ini", "utf-8")
 
 
+@dataclass
+class _DocumentJob:
+    """State of a single document travelling through the ingestion pipeline"""
+
+    doc_id: str
+    status_doc: DocProcessingStatus
+    file_path: str
+    file_number: int = 0
+    chunks: dict[str, Any] = field(default_factory=dict)
+    chunk_results: list[tuple[dict, dict]] = field(default_factory=list)
+    pending_chunks: int = 0
+    embedded: asyncio.Event = field(default_factory=asyncio.Event)
+    error: BaseException | None = None
+
+
 @final
 @dataclass
 class LightRAG:
@@ -202,6 +225,13 @@ class LightRAG:
     - use_llm_check: If True, validates cached embeddings using an LLM.
     """
 
+    enable_embedding_store: bool = field(
+        default=os.getenv("ENABLE_EMBEDDING_STORE", "false").lower() == "true"
+    )
+    """If True, embeddings of upserted contents are persisted in the working directory,
+    keyed by the hash of the model and text, and reused instead of embedding them again.
+    Requires embedding_func.model_name."""
+
     # LLM Configuration
     # ---
 
@@ -242,6 +272,16 @@ class LightRAG:
     max_parallel_insert: int = field(default=int(os.getenv("MAX_PARALLEL_INSERT", 2)))
     """Maximum number of parallel insert operations."""
 
+    pipeline_queue_size: int = field(
+        default=int(os.getenv("PIPELINE_QUEUE_SIZE", 256))
+    )
+    """Capacity of the bounded queues between the stages of the ingestion pipeline."""
+
+    knowledge_graph_cache_size: int = field(
+        default=int(os.getenv("KNOWLEDGE_GRAPH_CACHE_SIZE", 32))
+    )
+    """Number of subgraphs returned by get_knowledge_graph kept until the graph changes, 0 disables the cache. Only applies to NetworkXStorage and CSRGraphStorage."""
+
     addon_params: dict[str, Any] = field(
         default_factory=lambda: {
             "language": os.getenv("SUMMARY_LANGUAGE", PROMPTS["DEFAULT_LANGUAGE"])
@@ -272,6 +312,10 @@ class LightRAG:
 
     _storages_status: StoragesStatus = field(default=StoragesStatus.NOT_CREATED)
 
+    _knowledge_graph_cache: dict[tuple, tuple[Any, KnowledgeGraph]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
     def __post_init__(self):
         from .kg.shared_storage import (
             initialize_share_data,
@@ -340,6 +384,19 @@ class LightRAG:
         logger.debug(f"LightRAG init with param:\n  {_print_config}\n")
 
         # Init Embedding
+        self.embedding_store = None
+        if self.enable_embedding_store:
+            # The function name cannot tell models apart, e.g. lambdas, and a store of
+            # another model of the same dimension would serve wrong embeddings
+            model = getattr(self.embedding_func, "model_name", None)
+            if not model:
+                raise ValueError(
+                    "enable_embedding_store requires the model_name of the embedding_func, "
+                    'e.g. EmbeddingFunc(..., model_name="text-embedding-3-small")'
+                )
+            self.embedding_store = EmbeddingCache(
+                self.working_dir, self.embedding_func.embedding_dim, model
+            )
         self.embedding_func = limit_async_func_call(self.embedding_func_max_async)(  # type: ignore
             self.embedding_func
         )
@@ -396,12 +453,22 @@ class LightRAG:
             embedding_func=self.embedding_func,
         )
 
+        self.chunks_vdb: BaseVectorStorage = self.vector_db_storage_cls(  # type: ignore
+            namespace=make_namespace(
+                self.namespace_prefix, NameSpace.VECTOR_STORE_CHUNKS
+            ),
+            embedding_func=self.embedding_func,
+            meta_fields={"full_doc_id", "content", "file_path"},
+            embedding_cache=self.embedding_store,
+        )
         self.entities_vdb: BaseVectorStorage = self.vector_db_storage_cls(  # type: ignore
             namespace=make_namespace(
                 self.namespace_prefix, NameSpace.VECTOR_STORE_ENTITIES
             ),
             embedding_func=self.embedding_func,
             meta_fields={"entity_name", "source_id", "content", "file_path"},
+            chunks_vdb=self.chunks_vdb,
+            embedding_cache=self.embedding_store,
         )
         self.relationships_vdb: BaseVectorStorage = self.vector_db_storage_cls(  # type: ignore
             namespace=make_namespace(
@@ -409,13 +476,8 @@ class LightRAG:
             ),
             embedding_func=self.embedding_func,
             meta_fields={"src_id", "tgt_id", "source_id", "content", "file_path"},
-        )
-        self.chunks_vdb: BaseVectorStorage = self.vector_db_storage_cls(  # type: ignore
-            namespace=make_namespace(
-                self.namespace_prefix, NameSpace.VECTOR_STORE_CHUNKS
-            ),
-            embedding_func=self.embedding_func,
-            meta_fields={"full_doc_id", "content", "file_path"},
+            chunks_vdb=self.chunks_vdb,
+            embedding_cache=self.embedding_store,
         )
 
         # Initialize document status storage
@@ -519,21 +581,52 @@ class LightRAG:
         node_label: str,
         max_depth: int = 3,
         max_nodes: int = 1000,
+        properties: list[str] | None = None,
     ) -> KnowledgeGraph:
         """Get knowledge graph for a given label
 
+        Subgraphs are cached until the graph changes, for graph storages which report
+        a version through get_graph_version: the local NetworkXStorage and
+        CSRGraphStorage. Subgraphs of the other graph storages are not cached. Callers
+        get a copy of the cached subgraph.
+
         Args:
             node_label (str): Label to get knowledge graph for
             max_depth (int): Maximum depth of graph
             max_nodes (int, optional): Maximum number of nodes to return. Defaults to 1000.
+            properties (list[str], optional): Only return these node and edge properties. Defaults to all.
 
         Returns:
             KnowledgeGraph: Knowledge graph containing nodes and edges
         """
+        graph_storage = self.chunk_entity_relation_graph
+        cache_key = (node_label, max_depth, max_nodes)
+        version = None
+        if self.knowledge_graph_cache_size > 0:
+            version = await graph_storage.get_graph_version()
+
+        cached = self._knowledge_graph_cache.pop(cache_key, None)
+        if version is not None and cached is not None and cached[0] == version:
+            knowledge_graph = cached[1]
+        else:
+            knowledge_graph = await graph_storage.get_knowledge_graph(
+                node_label, max_depth, max_nodes
+            )
 
-        return await self.chunk_entity_relation_graph.get_knowledge_graph(
-            node_label, max_depth, max_nodes
-        )
+        if version is not None:
+            # Most recently used last, evict the least recently used
+            self._knowledge_graph_cache[cache_key] = (version, knowledge_graph)
+            while len(self._knowledge_graph_cache) > self.knowledge_graph_cache_size:
+                del self._knowledge_graph_cache[next(iter(self._knowledge_graph_cache))]
+
+        if properties is not None:
+            from .utils_graph import project_knowledge_graph
+
+            return project_knowledge_graph(knowledge_graph, properties)
+        if version is not None:
+            # The caller may modify the graph, the cached one must stay intact
+            return knowledge_graph.model_copy(deep=True)
+        return knowledge_graph
 
     def _get_storage_class(self, storage_name: str) -> Callable[..., Any]:
         import_path = STORAGES[storage_name]
@@ -856,10 +949,10 @@ class LightRAG:
         }
         logger.info(f"[DEBUG] After duplicate removal: {len(contents)} unique contents")
         # 3. Generate document initial status
+        # The content is stored once, in full_docs, the status only summarizes it
         new_docs: dict[str, Any] = {
             id_: {
                 "status": DocStatus.PENDING,
-                "content": content_data["content"],
                 "content_summary": get_content_summary(content_data["content"]),
                 "content_length": len(content_data["content"]),
                 "created_at": datetime.now().isoformat(),
@@ -901,7 +994,11 @@ class LightRAG:
             logger.info("No new unique documents were found.")
             return
 
-        # 5. Store status document
+        # 5. Store the contents, then the status documents
+        await self.full_docs.upsert(
+            {doc_id: {"content": contents[doc_id]["content"]} for doc_id in new_docs}
+        )
+        await self.full_docs.index_done_callback()
         await self.doc_status.upsert(new_docs)
         logger.info(f"Stored {len(new_docs)} new unique documents")
 
@@ -997,180 +1094,13 @@ class LightRAG:
                 job_name = f"{path_prefix}[{total_files} files]"
                 pipeline_status["job_name"] = job_name
 
-                # Create a counter to track the number of processed files
-                processed_count = 0
-                # Create a semaphore to limit the number of concurrent file processing
-                semaphore = asyncio.Semaphore(self.max_parallel_insert)
-
-                async def process_document(
-                    doc_id: str,
-                    status_doc: DocProcessingStatus,
-                    split_by_character: str | None,
-                    split_by_character_only: bool,
-                    pipeline_status: dict,
-                    pipeline_status_lock: asyncio.Lock,
-                    semaphore: asyncio.Semaphore,
-                ) -> None:
-                    """Process single document"""
-                    async with semaphore:
-                        nonlocal processed_count
-                        current_file_number = 0
-                        try:
-                            # Get file path from status document
-                            file_path = getattr(
-                                status_doc, "file_path", "unknown_source"
-                            )
-
-                            async with pipeline_status_lock:
-                                # Update processed file count and save current file number
-                                processed_count += 1
-                                current_file_number = (
-                                    processed_count  # Save the current file number
-                                )
-                                pipeline_status["cur_batch"] = processed_count
-
-                                log_message = f"Processing file ({current_file_number}/{total_files}): {file_path}"
-                                logger.info(log_message)
-                                pipeline_status["history_messages"].append(log_message)
-                                log_message = f"Processing d-id: {doc_id}"
-                                logger.info(log_message)
-                                pipeline_status["latest_message"] = log_message
-                                pipeline_status["history_messages"].append(log_message)
-
-                            # Generate chunks from document
-                            chunks: dict[str, Any] = {
-                                compute_mdhash_id(dp["content"], prefix="chunk-"): {
-                                    **dp,
-                                    "full_doc_id": doc_id,
-                                    "file_path": file_path,  # Add file path to each chunk
-                                }
-                                for dp in self.chunking_func(
-                                    self.tokenizer,
-                                    status_doc.content,
-                                    split_by_character,
-                                    split_by_character_only,
-                                    self.chunk_overlap_token_size,
-                                    self.chunk_token_size,
-                                )
-                            }
-
-                            # Process document (text chunks and full docs) in parallel
-                            # Create tasks with references for potential cancellation
-                            doc_status_task = asyncio.create_task(
-                                self.doc_status.upsert(
-                                    {
-                                        doc_id: {
-                                            "status": DocStatus.PROCESSING,
-                                            "chunks_count": len(chunks),
-                                            "content": status_doc.content,
-                                            "content_summary": status_doc.content_summary,
-                                            "content_length": status_doc.content_length,
-                                            "created_at": status_doc.created_at,
-                                            "updated_at": datetime.now().isoformat(),
-                                            "file_path": file_path,
-                                        }
-                                    }
-                                )
-                            )
-                            chunks_vdb_task = asyncio.create_task(
-                                self.chunks_vdb.upsert(chunks)
-                            )
-                            entity_relation_task = asyncio.create_task(
-                                self._process_entity_relation_graph(
-                                    chunks, pipeline_status, pipeline_status_lock
-                                )
-                            )
-                            full_docs_task = asyncio.create_task(
-                                self.full_docs.upsert(
-                                    {doc_id: {"content": status_doc.content}}
-                                )
-                            )
-                            text_chunks_task = asyncio.create_task(
-                                self.text_chunks.upsert(chunks)
-                            )
-                            tasks = [
-                                doc_status_task,
-                                chunks_vdb_task,
-                                entity_relation_task,
-                                full_docs_task,
-                                text_chunks_task,
-                            ]
-                            await asyncio.gather(*tasks)
-                            await self.doc_status.upsert(
-                                {
-                                    doc_id: {
-                                        "status": DocStatus.PROCESSED,
-                                        "chunks_count": len(chunks),
-                                        "content": status_doc.content,
-                                        "content_summary": status_doc.content_summary,
-                                        "content_length": status_doc.content_length,
-                                        "created_at": status_doc.created_at,
-                                        "updated_at": datetime.now().isoformat(),
-                                        "file_path": file_path,
-                                    }
-                                }
-                            )
-
-                            # Call _insert_done after processing each file
-                            await self._insert_done()
-
-                            async with pipeline_status_lock:
-                                log_message = f"Completed processing file {current_file_number}/{total_files}: {file_path}"
-                                logger.info(log_message)
-                                pipeline_status["latest_message"] = log_message
-                                pipeline_status["history_messages"].append(log_message)
-
-                        except Exception as e:
-                            # Log error and update pipeline status
-                            error_msg = f"Failed to process document {doc_id}: {traceback.format_exc()}"
-
-                            logger.error(error_msg)
-                            async with pipeline_status_lock:
-                                pipeline_status["latest_message"] = error_msg
-                                pipeline_status["history_messages"].append(error_msg)
-
-                                # Cancel other tasks as they are no longer meaningful
-                                for task in [
-                                    chunks_vdb_task,
-                                    entity_relation_task,
-                                    full_docs_task,
-                                    text_chunks_task,
-                                ]:
-                                    if not task.done():
-                                        task.cancel()
-                            # Update document status to failed
-                            await self.doc_status.upsert(
-                                {
-                                    doc_id: {
-                                        "status": DocStatus.FAILED,
-                                        "error": str(e),
-                                        "content": status_doc.content,
-                                        "content_summary": status_doc.content_summary,
-                                        "content_length": status_doc.content_length,
-                                        "created_at": status_doc.created_at,
-                                        "updated_at": datetime.now().isoformat(),
-                                        "file_path": file_path,
-                                    }
-                                }
-                            )
-
-                # Create processing tasks for all documents
-                doc_tasks = []
-                for doc_id, status_doc in to_process_docs.items():
-                    doc_tasks.append(
-                        process_document(
-                            doc_id,
-                            status_doc,
-                            split_by_character,
-                            split_by_character_only,
-                            pipeline_status,
-                            pipeline_status_lock,
-                            semaphore,
-                        )
-                    )
-
-                # Wait for all document processing to complete
-                await asyncio.gather(*doc_tasks)
+                await self._run_ingestion_pipeline(
+                    to_process_docs,
+                    split_by_character,
+                    split_by_character_only,
+                    pipeline_status,
+                    pipeline_status_lock,
+                )
 
                 # Check if there's a pending request to process more documents (with lock)
                 has_pending_request = False
@@ -1209,6 +1139,252 @@ class LightRAG:
                 pipeline_status["latest_message"] = log_message
                 pipeline_status["history_messages"].append(log_message)
 
+    async def _run_ingestion_pipeline(
+        self,
+        to_process_docs: dict[str, DocProcessingStatus],
+        split_by_character: str | None,
+        split_by_character_only: bool,
+        pipeline_status: dict,
+        pipeline_status_lock,
+    ) -> None:
+        """Process documents through a staged ingestion pipeline
+
+        Stages are connected by bounded queues (pipeline_queue_size) and each stage
+        has its own concurrency, so that LLM and embedding backends stay saturated
+        while other documents are being chunked or persisted:
+
+        1. chunk: max_parallel_insert workers, chunking runs in a worker thread
+        2. embed: embedding_func_max_async workers, one chunks_vdb upsert per document
+        3. extract: llm_model_max_async workers, the work unit is a single chunk so
+           chunks of different documents interleave
+        4. merge: one worker, graph merges are serialized by graph_db_lock anyway
+        5. persist: max_parallel_insert workers, store docs and chunks, mark as processed
+
+        A failing document is marked as FAILED and dropped from the later stages
+        without affecting the other documents.
+        """
+        total_files = len(to_process_docs)
+        processed_count = 0
+        global_config = asdict(self)
+        extraction_context = build_extraction_context(global_config)
+
+        queue_size = max(1, self.pipeline_queue_size)
+        doc_queue: asyncio.Queue[_DocumentJob] = asyncio.Queue()
+        embed_queue: asyncio.Queue[_DocumentJob] = asyncio.Queue(queue_size)
+        extract_queue: asyncio.Queue[tuple[_DocumentJob, str, dict[str, Any]]] = (
+            asyncio.Queue(queue_size)
+        )
+        merge_queue: asyncio.Queue[_DocumentJob] = asyncio.Queue(queue_size)
+        persist_queue: asyncio.Queue[_DocumentJob] = asyncio.Queue(queue_size)
+
+        async def log_progress(log_message: str, level: str = "info") -> None:
+            getattr(logger, level)(log_message)
+            async with pipeline_status_lock:
+                pipeline_status["latest_message"] = log_message
+                pipeline_status["history_messages"].append(log_message)
+
+        def doc_status_data(job: _DocumentJob, status: DocStatus) -> dict[str, Any]:
+            return {
+                "status": status,
+                "chunks_count": len(job.chunks),
+                "content_summary": job.status_doc.content_summary,
+                "content_length": job.status_doc.content_length,
+                "created_at": job.status_doc.created_at,
+                "updated_at": datetime.now().isoformat(),
+                "file_path": job.file_path,
+            }
+
+        async def fail_document(job: _DocumentJob, error: BaseException) -> None:
+            """Mark a document as failed, must be called from an except block"""
+            if job.error is not None:
+                return
+            job.error = error
+            # Let a persist worker waiting on this document move on
+            job.embedded.set()
+            # A failure here must not kill the worker, the queues would never drain
+            try:
+                await log_progress(
+                    f"Failed to process document {job.doc_id}: {traceback.format_exc()}",
+                    level="error",
+                )
+                data = doc_status_data(job, DocStatus.FAILED)
+                data["error"] = str(error)
+                await self.doc_status.upsert({job.doc_id: data})
+            except Exception as e:
+                logger.error(f"Failed to mark document {job.doc_id} as failed: {e}")
+
+        async def chunk_worker() -> None:
+            nonlocal processed_count
+            while True:
+                job = await doc_queue.get()
+                try:
+                    async with pipeline_status_lock:
+                        processed_count += 1
+                        job.file_number = processed_count
+                        pipeline_status["cur_batch"] = processed_count
+                    await log_progress(
+                        f"Processing file ({job.file_number}/{total_files}): {job.file_path}"
+                    )
+                    await log_progress(f"Processing d-id: {job.doc_id}")
+
+                    full_doc = await self.full_docs.get_by_id(job.doc_id)
+                    if full_doc is None:
+                        if job.status_doc.content is None:
+                            raise ValueError(
+                                f"Content of document {job.doc_id} is missing from full_docs"
+                            )
+                        # Enqueued when the status also stored the content
+                        full_doc = {"content": job.status_doc.content}
+                        await self.full_docs.upsert({job.doc_id: full_doc})
+
+                    # Chunking is CPU bound, keep it off the event loop
+                    chunk_list = await asyncio.to_thread(
+                        self.chunking_func,
+                        self.tokenizer,
+                        full_doc["content"],
+                        split_by_character,
+                        split_by_character_only,
+                        self.chunk_overlap_token_size,
+                        self.chunk_token_size,
+                    )
+                    job.chunks = {
+                        compute_mdhash_id(dp["content"], prefix="chunk-"): {
+                            **dp,
+                            "full_doc_id": job.doc_id,
+                            "file_path": job.file_path,
+                        }
+                        for dp in chunk_list
+                    }
+                    job.pending_chunks = len(job.chunks)
+                    await self.doc_status.upsert(
+                        {job.doc_id: doc_status_data(job, DocStatus.PROCESSING)}
+                    )
+
+                    await embed_queue.put(job)
+                    if not job.chunks:
+                        await merge_queue.put(job)
+                    for chunk_key, chunk_dp in job.chunks.items():
+                        await extract_queue.put((job, chunk_key, chunk_dp))
+                except Exception as e:
+                    await fail_document(job, e)
+                finally:
+                    doc_queue.task_done()
+
+        async def embed_worker() -> None:
+            while True:
+                job = await embed_queue.get()
+                try:
+                    if job.error is None:
+                        await self.chunks_vdb.upsert(job.chunks)
+                except Exception as e:
+                    await fail_document(job, e)
+                finally:
+                    job.embedded.set()
+                    embed_queue.task_done()
+
+        async def extract_worker() -> None:
+            while True:
+                job, chunk_key, chunk_dp = await extract_queue.get()
+                try:
+                    if job.error is None:
+                        maybe_nodes, maybe_edges = await extract_chunk_entities(
+                            chunk_key,
+                            chunk_dp,
+                            global_config,
+                            llm_response_cache=self.llm_response_cache,
+                            extraction_context=extraction_context,
+                        )
+                        job.chunk_results.append((maybe_nodes, maybe_edges))
+                        await log_progress(
+                            f"Chk {len(job.chunk_results)}/{len(job.chunks)} of file {job.file_number}: "
+                            f"extracted {len(maybe_nodes)} Ent + {len(maybe_edges)} Rel"
+                        )
+                except Exception as e:
+                    await fail_document(job, e)
+                finally:
+                    job.pending_chunks -= 1
+                    if job.pending_chunks == 0 and job.error is None:
+                        await merge_queue.put(job)
+                    extract_queue.task_done()
+
+        async def merge_worker() -> None:
+            while True:
+                job = await merge_queue.get()
+                try:
+                    if job.error is None:
+                        await merge_nodes_and_edges(
+                            job.chunk_results,
+                            knowledge_graph_inst=self.chunk_entity_relation_graph,
+                            entity_vdb=self.entities_vdb,
+                            relationships_vdb=self.relationships_vdb,
+                            global_config=global_config,
+                            pipeline_status=pipeline_status,
+                            pipeline_status_lock=pipeline_status_lock,
+                            llm_response_cache=self.llm_response_cache,
+                        )
+                        await persist_queue.put(job)
+                except Exception as e:
+                    await fail_document(job, e)
+                finally:
+                    merge_queue.task_done()
+
+        async def persist_worker() -> None:
+            while True:
+                job = await persist_queue.get()
+                try:
+                    await job.embedded.wait()
+                    if job.error is None:
+                        await self.text_chunks.upsert(job.chunks)
+                        await self.doc_status.upsert(
+                            {job.doc_id: doc_status_data(job, DocStatus.PROCESSED)}
+                        )
+                        # Call _insert_done after processing each file
+                        await self._insert_done()
+                        await log_progress(
+                            f"Completed processing file {job.file_number}/{total_files}: {job.file_path}"
+                        )
+                except Exception as e:
+                    await fail_document(job, e)
+                finally:
+                    persist_queue.task_done()
+
+        stage_workers = [
+            (chunk_worker, self.max_parallel_insert),
+            (embed_worker, self.embedding_func_max_async),
+            (extract_worker, self.llm_model_max_async),
+            (merge_worker, 1),
+            (persist_worker, self.max_parallel_insert),
+        ]
+        workers = [
+            asyncio.create_task(worker())
+            for worker, concurrency in stage_workers
+            for _ in range(max(1, concurrency))
+        ]
+
+        try:
+            for doc_id, status_doc in to_process_docs.items():
+                doc_queue.put_nowait(
+                    _DocumentJob(
+                        doc_id=doc_id,
+                        status_doc=status_doc,
+                        file_path=getattr(status_doc, "file_path", "unknown_source"),
+                    )
+                )
+            # Upstream stages only mark an item done after handing it downstream,
+            # so joining the queues in stage order drains the whole pipeline
+            for queue in (
+                doc_queue,
+                extract_queue,
+                embed_queue,
+                merge_queue,
+                persist_queue,
+            ):
+                await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
     async def _process_entity_relation_graph(
         self, chunk: dict[str, Any], pipeline_status=None, pipeline_status_lock=None
     ) -> None:
@@ -1308,6 +1484,7 @@ class LightRAG:
 
             # Insert entities into knowledge graph
             all_entities_data: list[dict[str, str]] = []
+            nodes: dict[str, dict[str, str]] = {}
             for entity_data in custom_kg.get("entities", []):
                 entity_name = entity_data["entity_name"]
                 entity_type = entity_data.get("entity_type", "UNKNOWN")
@@ -1328,16 +1505,18 @@ class LightRAG:
                     "description": description,
                     "source_id": source_id,
                 }
-                # Insert node data into the knowledge graph
-                await self.chunk_entity_relation_graph.upsert_node(
-                    entity_name, node_data=node_data
-                )
-                node_data["entity_name"] = entity_name
-                all_entities_data.append(node_data)
+                nodes[entity_name] = node_data
+                all_entities_data.append({**node_data, "entity_name": entity_name})
                 update_storage = True
 
+            # Insert node data into the knowledge graph
+            if nodes:
+                await self.chunk_entity_relation_graph.upsert_nodes_batch(nodes)
+
             # Insert relationships into knowledge graph
             all_relationships_data: list[dict[str, str]] = []
+            edges: dict[tuple[str, str], dict[str, str]] = {}
+            missing_nodes: dict[str, dict[str, str]] = {}
             for relationship_data in custom_kg.get("relationships", []):
                 src_id = relationship_data["src_id"]
                 tgt_id = relationship_data["tgt_id"]
@@ -1353,14 +1532,12 @@ class LightRAG:
                         f"Relationship from '{src_id}' to '{tgt_id}' has an UNKNOWN source_id. Please check the source mapping."
                     )
 
-                # Check if nodes exist in the knowledge graph
+                # Nodes of the edge which are not in the knowledge graph
                 for need_insert_id in [src_id, tgt_id]:
-                    if not (
-                        await self.chunk_entity_relation_graph.has_node(need_insert_id)
-                    ):
-                        await self.chunk_entity_relation_graph.upsert_node(
+                    if need_insert_id not in nodes:
+                        missing_nodes.setdefault(
                             need_insert_id,
-                            node_data={
+                            {
                                 "entity_id": need_insert_id,
                                 "source_id": source_id,
                                 "description": "UNKNOWN",
@@ -1368,17 +1545,12 @@ class LightRAG:
                             },
                         )
 
-                # Insert edge into the knowledge graph
-                await self.chunk_entity_relation_graph.upsert_edge(
-                    src_id,
-                    tgt_id,
-                    edge_data={
-                        "weight": weight,
-                        "description": description,
-                        "keywords": keywords,
-                        "source_id": source_id,
-                    },
-                )
+                edges[(src_id, tgt_id)] = {
+                    "weight": weight,
+                    "description": description,
+                    "keywords": keywords,
+                    "source_id": source_id,
+                }
                 edge_data: dict[str, str] = {
                     "src_id": src_id,
                     "tgt_id": tgt_id,
@@ -1390,6 +1562,23 @@ class LightRAG:
                 all_relationships_data.append(edge_data)
                 update_storage = True
 
+            # Insert the missing nodes and the edges into the knowledge graph
+            if missing_nodes:
+                existing = await self.chunk_entity_relation_graph.get_nodes_batch(
+                    list(missing_nodes)
+                )
+                missing_nodes = {
+                    node_id: node_data
+                    for node_id, node_data in missing_nodes.items()
+                    if node_id not in existing
+                }
+                if missing_nodes:
+                    await self.chunk_entity_relation_graph.upsert_nodes_batch(
+                        missing_nodes
+                    )
+            if edges:
+                await self.chunk_entity_relation_graph.upsert_edges_batch(edges)
+
             # Insert entities into vector storage with consistent format
             data_for_vdb = {
                 compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
@@ -1466,6 +1655,27 @@ class LightRAG:
         Returns:
             str: The result of the query execution.
         """
+        # Identical queries running at the same time share one retrieval and generation,
+        # across workers when the answer is cached for the ones waiting
+        query_key = compute_args_hash(
+            query.strip(), system_prompt, param, cache_type="aquery"
+        )
+        # The query and keywords are embedded once for the cache and all vector storages
+        with embedding_request_scope():
+            return await single_flight.do(
+                query_key,
+                partial(self._aquery, query, param, system_prompt),
+                across_workers=self.enable_llm_cache
+                and param.mode != "bypass"
+                and not (param.only_need_context or param.only_need_prompt),
+            )
+
+    async def _aquery(
+        self,
+        query: str,
+        param: QueryParam,
+        system_prompt: str | None = None,
+    ) -> str | AsyncIterator[str]:
         # If a custom model is provided in param, temporarily update global config
         global_config = asdict(self)
 
@@ -1554,18 +1764,19 @@ class LightRAG:
         Returns:
             Query response or async iterator
         """
-        response = await query_with_keywords(
-            query=query,
-            prompt=prompt,
-            param=param,
-            knowledge_graph_inst=self.chunk_entity_relation_graph,
-            entities_vdb=self.entities_vdb,
-            relationships_vdb=self.relationships_vdb,
-            chunks_vdb=self.chunks_vdb,
-            text_chunks_db=self.text_chunks,
-            global_config=asdict(self),
-            hashing_kv=self.llm_response_cache,
-        )
+        with embedding_request_scope():
+            response = await query_with_keywords(
+                query=query,
+                prompt=prompt,
+                param=param,
+                knowledge_graph_inst=self.chunk_entity_relation_graph,
+                entities_vdb=self.entities_vdb,
+                relationships_vdb=self.relationships_vdb,
+                chunks_vdb=self.chunks_vdb,
+                text_chunks_db=self.text_chunks,
+                global_config=asdict(self),
+                hashing_kv=self.llm_response_cache,
+            )
 
         await self._query_done()
         return response
@@ -1636,6 +1847,31 @@ class LightRAG:
         """
         return await self.doc_status.get_docs_by_status(status)
 
+    async def get_docs_paginated(
+        self,
+        statuses: list[DocStatus] | None = None,
+        sort_field: str = "updated_at",
+        sort_desc: bool = True,
+        limit: int = 50,
+        offset: int = 0,
+        after: tuple[Any, str] | None = None,
+        include_content: bool = False,
+    ) -> DocStatusPage:
+        """Get one page of the documents, see DocStatusStorage.get_docs_paginated"""
+        return await self.doc_status.get_docs_paginated(
+            statuses=statuses,
+            sort_field=sort_field,
+            sort_desc=sort_desc,
+            limit=limit,
+            offset=offset,
+            after=after,
+            include_content=include_content,
+        )
+
+    async def get_status_counts(self) -> dict[str, int]:
+        """Get the number of documents in each status"""
+        return await self.doc_status.get_status_counts()
+
     async def aget_docs_by_ids(
         self, ids: str | list[str]
     ) -> dict[str, DocProcessingStatus]:
@@ -1715,6 +1951,10 @@ class LightRAG:
                 return
 
             logger.debug(f"Starting deletion for document {doc_id}")
+            # Whatever this deletion leaves behind is reclaimed by garbage collection
+            from .maintenance import add_deleted_docs
+
+            await add_deleted_docs(self.working_dir, [doc_id])
 
             # 2. Get all chunks related to this document
             # Find all chunks where full_doc_id equals the current doc_id
@@ -2172,6 +2412,7 @@ class LightRAG:
         target_entity: str,
         merge_strategy: dict[str, str] = None,
         target_entity_data: dict[str, Any] = None,
+        chunk_size: int | None = None,
     ) -> dict[str, Any]:
         """Asynchronously merge multiple entities into one entity.
 
@@ -2189,6 +2430,8 @@ class LightRAG:
                 - "join_unique": Join all unique values (for fields separated by delimiter)
             target_entity_data: Dictionary of specific values to set for the target entity,
                 overriding any merged values, e.g. {"description": "custom description", "entity_type": "PERSON"}
+            chunk_size: Move the relationships chunk_size at a time, releasing the graph
+                database lock between chunks. None (default) merges holding the lock.
 
         Returns:
             Dictionary containing the merged entity information
@@ -2203,6 +2446,7 @@ class LightRAG:
             target_entity,
             merge_strategy,
             target_entity_data,
+            chunk_size,
         )
 
     def merge_entities(
@@ -2211,11 +2455,16 @@ class LightRAG:
         target_entity: str,
         merge_strategy: dict[str, str] = None,
         target_entity_data: dict[str, Any] = None,
+        chunk_size: int | None = None,
     ) -> dict[str, Any]:
         loop = always_get_an_event_loop()
         return loop.run_until_complete(
             self.amerge_entities(
-                source_entities, target_entity, merge_strategy, target_entity_data
+                source_entities,
+                target_entity,
+                merge_strategy,
+                target_entity_data,
+                chunk_size,
             )
         )
 
@@ -2275,3 +2524,138 @@ class LightRAG:
         loop.run_until_complete(
             self.aexport_data(output_path, file_format, include_vector_data)
         )
+
+    async def aexport_graph(
+        self,
+        output_path: str,
+        file_format: Literal["jsonl", "parquet"] = "jsonl",
+        include_vector_data: bool = False,
+        batch_size: int = 1000,
+        progress_callback: Callable[[str, int], None] | None = None,
+    ) -> dict[str, int]:
+        """Export all entities and relations for a later aimport_graph
+
+        The graph is streamed page by page, the memory used does not grow with it.
+        Args:
+            output_path: File (jsonl) or directory (parquet) to write
+            file_format: "jsonl" or "parquet"
+            include_vector_data: Also export the metadata of the vector storage records
+            batch_size: Nodes or edges read and written at once
+            progress_callback: Called with ("entities" | "relations", count exported)
+        """
+        from .utils_graph import aexport_graph
+
+        return await aexport_graph(
+            self.chunk_entity_relation_graph,
+            self.entities_vdb,
+            self.relationships_vdb,
+            output_path,
+            file_format,
+            include_vector_data,
+            batch_size,
+            progress_callback,
+        )
+
+    def export_graph(
+        self,
+        output_path: str,
+        file_format: Literal["jsonl", "parquet"] = "jsonl",
+        include_vector_data: bool = False,
+        batch_size: int = 1000,
+        progress_callback: Callable[[str, int], None] | None = None,
+    ) -> dict[str, int]:
+        loop = always_get_an_event_loop()
+        return loop.run_until_complete(
+            self.aexport_graph(
+                output_path,
+                file_format,
+                include_vector_data,
+                batch_size,
+                progress_callback,
+            )
+        )
+
+    async def aimport_graph(
+        self,
+        input_path: str,
+        file_format: Literal["jsonl", "parquet"] = "jsonl",
+        batch_size: int = 1000,
+        progress_callback: Callable[[str, int], None] | None = None,
+    ) -> dict[str, int]:
+        """Import entities and relations written by aexport_graph
+
+        Pages of entities and relations are upserted with the batch graph and
+        vector storage APIs.
+        Args:
+            input_path: File (jsonl) or directory (parquet) to read
+            file_format: "jsonl" or "parquet"
+            batch_size: Entities or relations read and upserted at once
+            progress_callback: Called with ("entities" | "relations", count imported)
+        """
+        from .utils_graph import aimport_graph
+
+        return await aimport_graph(
+            self.chunk_entity_relation_graph,
+            self.entities_vdb,
+            self.relationships_vdb,
+            input_path,
+            file_format,
+            batch_size,
+            progress_callback,
+        )
+
+    def import_graph(
+        self,
+        input_path: str,
+        file_format: Literal["jsonl", "parquet"] = "jsonl",
+        batch_size: int = 1000,
+        progress_callback: Callable[[str, int], None] | None = None,
+    ) -> dict[str, int]:
+        loop = always_get_an_event_loop()
+        return loop.run_until_complete(
+            self.aimport_graph(input_path, file_format, batch_size, progress_callback)
+        )
+
+    async def agarbage_collect(
+        self,
+        batch_size: int | None = None,
+        batch_interval: float | None = None,
+    ) -> dict[str, Any] | None:
+        """Delete records left behind by deletions and edits, then compact storages
+
+        Entity, relation and chunk vectors, chunks and extraction cache entries
+        whose entity, relation, document or chunk is gone are deleted in batches.
+        An interrupted collection resumes where it stopped.
+
+        Args:
+            batch_size: Records checked at once (default GC_BATCH_SIZE)
+            batch_interval: Seconds slept between batches (default GC_BATCH_INTERVAL)
+
+        Returns:
+            The records scanned and deleted by storage, or None if another
+            collection is running
+        """
+        from .maintenance import GC_BATCH_INTERVAL, GC_BATCH_SIZE, agarbage_collect
+
+        return await agarbage_collect(
+            self.chunk_entity_relation_graph,
+            self.entities_vdb,
+            self.relationships_vdb,
+            self.chunks_vdb,
+            self.text_chunks,
+            self.full_docs,
+            self.doc_status,
+            self.llm_response_cache,
+            batch_size or GC_BATCH_SIZE,
+            GC_BATCH_INTERVAL if batch_interval is None else batch_interval,
+        )
+
+    def garbage_collect(
+        self,
+        batch_size: int | None = None,
+        batch_interval: float | None = None,
+    ) -> dict[str, Any] | None:
+        loop = always_get_an_event_loop()
+        return loop.run_until_complete(
+            self.agarbage_collect(batch_size, batch_interval)
+        )
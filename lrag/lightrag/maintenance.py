@@ -0,0 +1,334 @@
+"""
+Garbage collection of the records left behind by deletions and edits.
+
+Deleting documents, entities or relations and editing entities only clean the
+storages they know about, and some backends cannot delete every kind of record
+(e.g. vector storages without delete_entity_relation). Over time this leaves:
+
+- entity vectors of nodes which are no longer in the graph
+- relation vectors of edges which are no longer in the graph
+- chunks and chunk vectors of deleted documents
+- entity extraction LLM cache entries of chunks which are no longer stored
+
+A collection scans these storages in batches, deletes the orphans, then compacts the
+files of the storages. It sleeps between batches, so that queries and indexing are
+not held up, and saves its progress in the working directory: an interrupted
+collection resumes after the last batch whose deletions were saved.
+
+Only the chunks of the documents recorded by add_deleted_docs are collected, chunks
+of documents which never had a doc status (e.g. inserted by insert_custom_kg) are
+kept.
+
+Storages which cannot iterate over their records (iter_records or iter_keys) are
+skipped, the README lists the supported ones.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from .base import (
+    BaseGraphStorage,
+    BaseKVStorage,
+    BaseVectorStorage,
+    DocStatusStorage,
+    StorageNameSpace,
+)
+from .kg.shared_storage import (
+    get_graph_db_lock,
+    get_namespace_data,
+    get_pipeline_status_lock,
+)
+from .utils import load_json, logger, write_json
+
+# Records checked at once, and seconds slept between two batches
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", 1000))
+GC_BATCH_INTERVAL = float(os.getenv("GC_BATCH_INTERVAL", 0.1))
+
+GC_PROGRESS_FILE = "gc_progress.json"
+GC_DELETED_DOCS_FILE = "gc_deleted_docs.json"
+
+# A page of a scan: the key to resume after, and the records or keys of the page
+Page = tuple[str, list]
+
+
+async def _record_pages(
+    storage: BaseVectorStorage, batch_size: int, after: str | None
+) -> AsyncIterator[Page]:
+    async for records in storage.iter_records(batch_size, after):
+        yield records[-1]["__id__"], records
+
+
+async def _key_pages(
+    storage: BaseKVStorage, batch_size: int, after: str | None
+) -> AsyncIterator[Page]:
+    async for keys in storage.iter_keys(batch_size, after):
+        yield keys[-1], keys
+
+
+async def add_deleted_docs(working_dir: str, doc_ids: list[str]) -> None:
+    """Record documents being deleted, so that collections reclaim their chunks"""
+    path = os.path.join(working_dir, GC_DELETED_DOCS_FILE)
+    async with get_pipeline_status_lock():
+        deleted_docs = set(load_json(path) or [])
+        write_json(sorted(deleted_docs | set(doc_ids)), path)
+
+
+async def _remove_deleted_docs(working_dir: str, doc_ids: list[str]) -> None:
+    path = os.path.join(working_dir, GC_DELETED_DOCS_FILE)
+    async with get_pipeline_status_lock():
+        deleted_docs = set(load_json(path) or []) - set(doc_ids)
+        if deleted_docs:
+            write_json(sorted(deleted_docs), path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+class _GarbageCollection:
+    """State of a collection, saved to the progress file after each batch"""
+
+    def __init__(self, working_dir: str, batch_size: int, batch_interval: float):
+        self.working_dir = working_dir
+        self._progress_file = os.path.join(working_dir, GC_PROGRESS_FILE)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.state: dict[str, Any] = load_json(self._progress_file) or {
+            "stores": {},
+            "compacted": [],
+        }
+        if self.state["stores"]:
+            logger.info(f"Resuming garbage collection from {self._progress_file}")
+        # The deleted documents are fixed when a collection starts, the ones recorded
+        # later are left to the next collection
+        if "deleted_docs" not in self.state:
+            self.state["deleted_docs"] = (
+                load_json(os.path.join(working_dir, GC_DELETED_DOCS_FILE)) or []
+            )
+
+    def save(self) -> None:
+        write_json(self.state, self._progress_file)
+
+    async def finish(self) -> dict[str, Any]:
+        deleted_docs = self.state.pop("deleted_docs")
+        if deleted_docs:
+            await _remove_deleted_docs(self.working_dir, deleted_docs)
+        if os.path.exists(self._progress_file):
+            os.remove(self._progress_file)
+        return {**self.state, "completed": True}
+
+    async def collect(
+        self,
+        storage: StorageNameSpace,
+        pages: Callable[[int, str | None], AsyncIterator[Page]],
+        reclaim: Callable[[list], Awaitable[list[str]]],
+    ) -> None:
+        """Scan a storage and delete the orphans of each page
+
+        Args:
+            storage: The storage to scan
+            pages: Yields the pages of the storage from a key, see _record_pages
+            reclaim: Returns the ids of the orphans of a page
+        """
+        progress = self.state["stores"].setdefault(
+            storage.namespace,
+            {"after": None, "scanned": 0, "deleted": 0, "done": False},
+        )
+        if progress["done"]:
+            return
+
+        # Deletions are saved once a batch worth of them accumulated, the progress
+        # file never gets ahead of the saved deletions
+        unsaved = 0
+        try:
+            async for after, page in pages(self.batch_size, progress["after"]):
+                orphans = await reclaim(page)
+                if orphans:
+                    await storage.delete(orphans)
+                    unsaved += len(orphans)
+                progress["after"] = after
+                progress["scanned"] += len(page)
+                progress["deleted"] += len(orphans)
+                if unsaved >= self.batch_size:
+                    await storage.index_done_callback()
+                    unsaved = 0
+                if not unsaved:
+                    self.save()
+                await asyncio.sleep(self.batch_interval)
+        except NotImplementedError as e:
+            logger.info(f"Garbage collection skips {storage.namespace}: {e}")
+            progress["skipped"] = True
+
+        await storage.index_done_callback()
+        progress["done"] = True
+        self.save()
+        if progress["deleted"]:
+            logger.info(
+                f"Garbage collection deleted {progress['deleted']} of {progress['scanned']} records from {storage.namespace}"
+            )
+
+    async def compact(self, storages: list[StorageNameSpace]) -> None:
+        for storage in storages:
+            if storage.namespace in self.state["compacted"]:
+                continue
+            try:
+                if await storage.compact():
+                    logger.info(f"Garbage collection compacted {storage.namespace}")
+                    self.state["compacted"].append(storage.namespace)
+            except Exception as e:
+                logger.error(f"Error compacting {storage.namespace}: {e}")
+
+
+async def agarbage_collect(
+    chunk_entity_relation_graph: BaseGraphStorage,
+    entities_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    chunks_vdb: BaseVectorStorage,
+    text_chunks: BaseKVStorage,
+    full_docs: BaseKVStorage,
+    doc_status: DocStatusStorage,
+    llm_response_cache: BaseKVStorage | None,
+    batch_size: int = GC_BATCH_SIZE,
+    batch_interval: float = GC_BATCH_INTERVAL,
+) -> dict[str, Any] | None:
+    """Delete the orphaned records of the storages and compact their files
+
+    Entity and relation vectors are checked against the graph under the graph lock,
+    one batch at a time, so that merges of the indexing pipeline are not seen half
+    done. Extraction cache entries of chunks still being extracted may be deleted,
+    which only costs a cache miss.
+
+    Args:
+        batch_size: Records checked at once
+        batch_interval: Seconds slept between two batches
+
+    Returns:
+        The records scanned and deleted by storage namespace under "stores" and the
+        namespaces whose files were compacted under "compacted", or None if another
+        collection is running.
+    """
+    pipeline_status = await get_namespace_data("pipeline_status")
+    async with get_pipeline_status_lock():
+        if pipeline_status.get("gc_busy", False):
+            logger.info("Garbage collection is already running")
+            return None
+        pipeline_status["gc_busy"] = True
+
+    try:
+        gc = _GarbageCollection(
+            chunk_entity_relation_graph.global_config["working_dir"],
+            batch_size,
+            batch_interval,
+        )
+        graph_db_lock = get_graph_db_lock(enable_logging=False)
+        deleted_docs = set(gc.state["deleted_docs"])
+
+        async def missing_docs(doc_ids: set[str]) -> set[str]:
+            # A deleted document may have been inserted again since
+            doc_ids &= deleted_docs
+            return await doc_status.filter_keys(doc_ids) if doc_ids else set()
+
+        async def reclaim_entities(records: list[dict[str, Any]]) -> list[str]:
+            names = {r["entity_name"] for r in records if r.get("entity_name")}
+            async with graph_db_lock:
+                nodes = await chunk_entity_relation_graph.get_nodes_batch(list(names))
+                return [
+                    r["__id__"]
+                    for r in records
+                    if r.get("entity_name") in names - nodes.keys()
+                ]
+
+        async def reclaim_relations(records: list[dict[str, Any]]) -> list[str]:
+            pairs = {
+                (r["src_id"], r["tgt_id"])
+                for r in records
+                if r.get("src_id") and r.get("tgt_id")
+            }
+            async with graph_db_lock:
+                edges = await chunk_entity_relation_graph.get_edges_batch(
+                    [{"src": src_id, "tgt": tgt_id} for src_id, tgt_id in pairs]
+                )
+                missing = pairs - edges.keys()
+                return [
+                    r["__id__"]
+                    for r in records
+                    if (r.get("src_id"), r.get("tgt_id")) in missing
+                ]
+
+        async def reclaim_text_chunks(keys: list[str]) -> list[str]:
+            chunks = await text_chunks.get_by_ids(keys)
+            doc_ids = {
+                chunk["full_doc_id"]
+                for chunk in chunks
+                if chunk and "full_doc_id" in chunk
+            }
+            missing = await missing_docs(doc_ids)
+            return [
+                key
+                for key, chunk in zip(keys, chunks)
+                if chunk and chunk.get("full_doc_id") in missing
+            ]
+
+        async def reclaim_chunks(records: list[dict[str, Any]]) -> list[str]:
+            doc_ids = {r["full_doc_id"] for r in records if r.get("full_doc_id")}
+            missing = await missing_docs(doc_ids)
+            return [r["__id__"] for r in records if r.get("full_doc_id") in missing]
+
+        async def reclaim_llm_cache(keys: list[str]) -> list[str]:
+            entries = await llm_response_cache.get_by_ids(keys)
+            chunk_ids = {
+                entry["chunk_id"]
+                for entry in entries
+                if entry and entry.get("chunk_id")
+            }
+            missing = await text_chunks.filter_keys(chunk_ids) if chunk_ids else set()
+            return [
+                key
+                for key, entry in zip(keys, entries)
+                if entry and entry.get("chunk_id") in missing
+            ]
+
+        def records_of(storage):
+            return lambda size, after: _record_pages(storage, size, after)
+
+        def keys_of(storage):
+            return lambda size, after: _key_pages(storage, size, after)
+
+        await gc.collect(entities_vdb, records_of(entities_vdb), reclaim_entities)
+        await gc.collect(
+            relationships_vdb, records_of(relationships_vdb), reclaim_relations
+        )
+        await gc.collect(text_chunks, keys_of(text_chunks), reclaim_text_chunks)
+        await gc.collect(chunks_vdb, records_of(chunks_vdb), reclaim_chunks)
+        # After the chunks, the entries of the chunks deleted above are collected too
+        if llm_response_cache is not None:
+            await gc.collect(
+                llm_response_cache, keys_of(llm_response_cache), reclaim_llm_cache
+            )
+
+        await gc.compact(
+            [
+                storage
+                for storage in (
+                    chunk_entity_relation_graph,
+                    entities_vdb,
+                    relationships_vdb,
+                    chunks_vdb,
+                    text_chunks,
+                    full_docs,
+                    doc_status,
+                    llm_response_cache,
+                )
+                if storage is not None
+            ]
+        )
+        report = await gc.finish()
+        deleted = sum(store["deleted"] for store in report["stores"].values())
+        logger.info(
+            f"Garbage collection completed: {deleted} records deleted, {len(report['compacted'])} storages compacted"
+        )
+        return report
+    finally:
+        async with get_pipeline_status_lock():
+            pipeline_status["gc_busy"] = False
@@ -22,6 +22,8 @@ from .utils import (
     compute_args_hash,
     handle_cache,
     save_to_cache,
+    save_stream_to_cache,
+    stream_cached_response,
     CacheData,
     get_conversation_turns,
     use_llm_func_with_cache,
@@ -476,20 +478,15 @@ async def _merge_edges_then_upsert(
     return edge_data
 
 
-async def extract_entities(
-    chunks: dict[str, TextChunkSchema],
-    knowledge_graph_inst: BaseGraphStorage,
-    entity_vdb: BaseVectorStorage,
-    relationships_vdb: BaseVectorStorage,
-    global_config: dict[str, str],
-    pipeline_status: dict = None,
-    pipeline_status_lock=None,
-    llm_response_cache: BaseKVStorage | None = None,
-) -> None:
-    use_llm_func: callable = global_config["llm_model_func"]
-    entity_extract_max_gleaning = global_config["entity_extract_max_gleaning"]
+def build_extraction_context(global_config: dict[str, str]) -> dict[str, Any]:
+    """Build the prompts shared by every chunk extraction of one pipeline run
 
-    ordered_chunks = list(chunks.items())
+    Args:
+        global_config: Global configuration dictionary
+
+    Returns:
+        dict: Prompt templates and delimiters used by extract_chunk_entities
+    """
     # add language and example number params to prompt
     language = global_config["addon_params"].get(
         "language", PROMPTS["DEFAULT_LANGUAGE"]
@@ -515,7 +512,6 @@ async def extract_entities(
     # add example's format
     examples = examples.format(**example_context_base)
 
-    entity_extract_prompt = PROMPTS["entity_extraction"]
     context_base = dict(
         tuple_delimiter=PROMPTS["DEFAULT_TUPLE_DELIMITER"],
         record_delimiter=PROMPTS["DEFAULT_RECORD_DELIMITER"],
@@ -525,189 +521,191 @@ async def extract_entities(
         language=language,
     )
 
-    continue_prompt = PROMPTS["entity_continue_extraction"].format(**context_base)
-    if_loop_prompt = PROMPTS["entity_if_loop_extraction"]
-
-    processed_chunks = 0
-    total_chunks = len(ordered_chunks)
-    total_entities_count = 0
-    total_relations_count = 0
+    return dict(
+        context_base=context_base,
+        entity_extract_prompt=PROMPTS["entity_extraction"],
+        continue_prompt=PROMPTS["entity_continue_extraction"].format(**context_base),
+        if_loop_prompt=PROMPTS["entity_if_loop_extraction"],
+    )
 
-    # Get lock manager from shared storage
-    from .kg.shared_storage import get_graph_db_lock
 
-    graph_db_lock = get_graph_db_lock(enable_logging=False)
-
-    # Use the global use_llm_func_with_cache function from utils.py
+async def _process_extraction_result(
+    result: str,
+    chunk_key: str,
+    context_base: dict[str, Any],
+    file_path: str = "unknown_source",
+):
+    """Process a single extraction result (either initial or gleaning)
+    Args:
+        result (str): The extraction result to process
+        chunk_key (str): The chunk key for source tracking
+        context_base (dict): Delimiters used by the extraction prompt
+        file_path (str): The file path for citation
+    Returns:
+        tuple: (nodes_dict, edges_dict) containing the extracted entities and relationships
+    """
+    maybe_nodes = defaultdict(list)
+    maybe_edges = defaultdict(list)
 
-    async def _process_extraction_result(
-        result: str, chunk_key: str, file_path: str = "unknown_source"
-    ):
-        """Process a single extraction result (either initial or gleaning)
-        Args:
-            result (str): The extraction result to process
-            chunk_key (str): The chunk key for source tracking
-            file_path (str): The file path for citation
-        Returns:
-            tuple: (nodes_dict, edges_dict) containing the extracted entities and relationships
-        """
-        maybe_nodes = defaultdict(list)
-        maybe_edges = defaultdict(list)
+    records = split_string_by_multi_markers(
+        result,
+        [context_base["record_delimiter"], context_base["completion_delimiter"]],
+    )
 
-        records = split_string_by_multi_markers(
-            result,
-            [context_base["record_delimiter"], context_base["completion_delimiter"]],
+    for record in records:
+        record = re.search(r"\((.*)\)", record)
+        if record is None:
+            continue
+        record = record.group(1)
+        record_attributes = split_string_by_multi_markers(
+            record, [context_base["tuple_delimiter"]]
         )
 
-        for record in records:
-            record = re.search(r"\((.*)\)", record)
-            if record is None:
-                continue
-            record = record.group(1)
-            record_attributes = split_string_by_multi_markers(
-                record, [context_base["tuple_delimiter"]]
-            )
+        if_entities = await _handle_single_entity_extraction(
+            record_attributes, chunk_key, file_path
+        )
+        if if_entities is not None:
+            maybe_nodes[if_entities["entity_name"]].append(if_entities)
+            continue
 
-            if_entities = await _handle_single_entity_extraction(
-                record_attributes, chunk_key, file_path
+        if_relation = await _handle_single_relationship_extraction(
+            record_attributes, chunk_key, file_path
+        )
+        if if_relation is not None:
+            maybe_edges[(if_relation["src_id"], if_relation["tgt_id"])].append(
+                if_relation
             )
-            if if_entities is not None:
-                maybe_nodes[if_entities["entity_name"]].append(if_entities)
-                continue
 
-            if_relation = await _handle_single_relationship_extraction(
-                record_attributes, chunk_key, file_path
-            )
-            if if_relation is not None:
-                maybe_edges[(if_relation["src_id"], if_relation["tgt_id"])].append(
-                    if_relation
-                )
+    return maybe_nodes, maybe_edges
 
-        return maybe_nodes, maybe_edges
 
-    async def _process_single_content(chunk_key_dp: tuple[str, TextChunkSchema]):
-        """Process a single chunk
-        Args:
-            chunk_key_dp (tuple[str, TextChunkSchema]):
-                ("chunk-xxxxxx", {"tokens": int, "content": str, "full_doc_id": str, "chunk_order_index": int})
-        Returns:
-            tuple: (maybe_nodes, maybe_edges) containing extracted entities and relationships
-        """
-        nonlocal processed_chunks
-        chunk_key = chunk_key_dp[0]
-        chunk_dp = chunk_key_dp[1]
-        content = chunk_dp["content"]
-        # Get file path from chunk data or use default
-        file_path = chunk_dp.get("file_path", "unknown_source")
-
-        # Get initial extraction
-        hint_prompt = entity_extract_prompt.format(
-            **{**context_base, "input_text": content}
-        )
+async def extract_chunk_entities(
+    chunk_key: str,
+    chunk_dp: TextChunkSchema,
+    global_config: dict[str, str],
+    llm_response_cache: BaseKVStorage | None = None,
+    extraction_context: dict[str, Any] | None = None,
+) -> tuple[dict, dict]:
+    """Run entity and relation extraction (including gleaning) on a single chunk
 
-        final_result = await use_llm_func_with_cache(
-            hint_prompt,
-            use_llm_func,
-            llm_response_cache=llm_response_cache,
-            cache_type="extract",
-        )
-        history = pack_user_ass_to_openai_messages(hint_prompt, final_result)
+    This is the unit of LLM work of the ingestion pipeline: chunks of different
+    documents can be extracted concurrently and merged later by merge_nodes_and_edges.
 
-        # Process initial extraction with file path
-        maybe_nodes, maybe_edges = await _process_extraction_result(
-            final_result, chunk_key, file_path
-        )
+    Args:
+        chunk_key: The chunk id ("chunk-xxxxxx")
+        chunk_dp: {"tokens": int, "content": str, "full_doc_id": str, "chunk_order_index": int}
+        global_config: Global configuration dictionary
+        llm_response_cache: Optional LLM cache storage
+        extraction_context: Prompts built by build_extraction_context, built on demand if None
 
-        # Process additional gleaning results
-        for now_glean_index in range(entity_extract_max_gleaning):
-            glean_result = await use_llm_func_with_cache(
-                continue_prompt,
-                use_llm_func,
-                llm_response_cache=llm_response_cache,
-                history_messages=history,
-                cache_type="extract",
-            )
+    Returns:
+        tuple: (maybe_nodes, maybe_edges) containing extracted entities and relationships
+    """
+    use_llm_func: callable = global_config["llm_model_func"]
+    entity_extract_max_gleaning = global_config["entity_extract_max_gleaning"]
+    if extraction_context is None:
+        extraction_context = build_extraction_context(global_config)
+    context_base = extraction_context["context_base"]
+    continue_prompt = extraction_context["continue_prompt"]
+    if_loop_prompt = extraction_context["if_loop_prompt"]
 
-            history += pack_user_ass_to_openai_messages(continue_prompt, glean_result)
+    content = chunk_dp["content"]
+    # Get file path from chunk data or use default
+    file_path = chunk_dp.get("file_path", "unknown_source")
 
-            # Process gleaning result separately with file path
-            glean_nodes, glean_edges = await _process_extraction_result(
-                glean_result, chunk_key, file_path
-            )
+    # Get initial extraction
+    hint_prompt = extraction_context["entity_extract_prompt"].format(
+        **{**context_base, "input_text": content}
+    )
 
-            # Merge results - only add entities and edges with new names
-            for entity_name, entities in glean_nodes.items():
-                if (
-                    entity_name not in maybe_nodes
-                ):  # Only accetp entities with new name in gleaning stage
-                    maybe_nodes[entity_name].extend(entities)
-            for edge_key, edges in glean_edges.items():
-                if (
-                    edge_key not in maybe_edges
-                ):  # Only accetp edges with new name in gleaning stage
-                    maybe_edges[edge_key].extend(edges)
-
-            if now_glean_index == entity_extract_max_gleaning - 1:
-                break
-
-            if_loop_result: str = await use_llm_func_with_cache(
-                if_loop_prompt,
-                use_llm_func,
-                llm_response_cache=llm_response_cache,
-                history_messages=history,
-                cache_type="extract",
-            )
-            if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
-            if if_loop_result != "yes":
-                break
+    final_result = await use_llm_func_with_cache(
+        hint_prompt,
+        use_llm_func,
+        llm_response_cache=llm_response_cache,
+        cache_type="extract",
+        chunk_id=chunk_key,
+    )
+    history = pack_user_ass_to_openai_messages(hint_prompt, final_result)
 
-        processed_chunks += 1
-        entities_count = len(maybe_nodes)
-        relations_count = len(maybe_edges)
-        log_message = f"Chk {processed_chunks}/{total_chunks}: extracted {entities_count} Ent + {relations_count} Rel"
-        logger.info(log_message)
-        if pipeline_status is not None:
-            async with pipeline_status_lock:
-                pipeline_status["latest_message"] = log_message
-                pipeline_status["history_messages"].append(log_message)
+    # Process initial extraction with file path
+    maybe_nodes, maybe_edges = await _process_extraction_result(
+        final_result, chunk_key, context_base, file_path
+    )
 
-        # Return the extracted nodes and edges for centralized processing
-        return maybe_nodes, maybe_edges
+    # Process additional gleaning results
+    for now_glean_index in range(entity_extract_max_gleaning):
+        glean_result = await use_llm_func_with_cache(
+            continue_prompt,
+            use_llm_func,
+            llm_response_cache=llm_response_cache,
+            history_messages=history,
+            cache_type="extract",
+            chunk_id=chunk_key,
+        )
 
-    # Get max async tasks limit from global_config
-    llm_model_max_async = global_config.get("llm_model_max_async", 4)
-    semaphore = asyncio.Semaphore(llm_model_max_async)
+        history += pack_user_ass_to_openai_messages(continue_prompt, glean_result)
 
-    async def _process_with_semaphore(chunk):
-        async with semaphore:
-            return await _process_single_content(chunk)
+        # Process gleaning result separately with file path
+        glean_nodes, glean_edges = await _process_extraction_result(
+            glean_result, chunk_key, context_base, file_path
+        )
 
-    tasks = []
-    for c in ordered_chunks:
-        task = asyncio.create_task(_process_with_semaphore(c))
-        tasks.append(task)
+        # Merge results - only add entities and edges with new names
+        for entity_name, entities in glean_nodes.items():
+            if (
+                entity_name not in maybe_nodes
+            ):  # Only accetp entities with new name in gleaning stage
+                maybe_nodes[entity_name].extend(entities)
+        for edge_key, edges in glean_edges.items():
+            if (
+                edge_key not in maybe_edges
+            ):  # Only accetp edges with new name in gleaning stage
+                maybe_edges[edge_key].extend(edges)
+
+        if now_glean_index == entity_extract_max_gleaning - 1:
+            break
+
+        if_loop_result: str = await use_llm_func_with_cache(
+            if_loop_prompt,
+            use_llm_func,
+            llm_response_cache=llm_response_cache,
+            history_messages=history,
+            cache_type="extract",
+            chunk_id=chunk_key,
+        )
+        if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
+        if if_loop_result != "yes":
+            break
 
-    # Wait for tasks to complete or for the first exception to occur
-    # This allows us to cancel remaining tasks if any task fails
-    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    return maybe_nodes, maybe_edges
 
-    # Check if any task raised an exception
-    for task in done:
-        if task.exception():
-            # If a task failed, cancel all pending tasks
-            # This prevents unnecessary processing since the parent function will abort anyway
-            for pending_task in pending:
-                pending_task.cancel()
 
-            # Wait for cancellation to complete
-            if pending:
-                await asyncio.wait(pending)
+async def merge_nodes_and_edges(
+    chunk_results: list[tuple[dict, dict]],
+    knowledge_graph_inst: BaseGraphStorage,
+    entity_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    global_config: dict[str, str],
+    pipeline_status: dict = None,
+    pipeline_status_lock=None,
+    llm_response_cache: BaseKVStorage | None = None,
+) -> None:
+    """Merge the extraction results of a set of chunks into the graph and vector storages
 
-            # Re-raise the exception to notify the caller
-            raise task.exception()
+    Args:
+        chunk_results: List of (maybe_nodes, maybe_edges) returned by extract_chunk_entities
+        knowledge_graph_inst: Knowledge graph storage
+        entity_vdb: Entity vector storage
+        relationships_vdb: Relationship vector storage
+        global_config: Global configuration dictionary
+        pipeline_status: Pipeline status dictionary
+        pipeline_status_lock: Lock for pipeline status
+        llm_response_cache: Optional LLM cache storage
+    """
+    # Get lock manager from shared storage
+    from .kg.shared_storage import get_graph_db_lock
 
-    # If all tasks completed successfully, collect results
-    chunk_results = [task.result() for task in tasks]
+    graph_db_lock = get_graph_db_lock(enable_logging=False)
 
     # Collect all nodes and edges from all chunks
     all_nodes = defaultdict(list)
@@ -806,6 +804,115 @@ async def extract_entities(
             await relationships_vdb.upsert(data_for_vdb)
 
 
+async def extract_entities(
+    chunks: dict[str, TextChunkSchema],
+    knowledge_graph_inst: BaseGraphStorage,
+    entity_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    global_config: dict[str, str],
+    pipeline_status: dict = None,
+    pipeline_status_lock=None,
+    llm_response_cache: BaseKVStorage | None = None,
+) -> None:
+    ordered_chunks = list(chunks.items())
+    extraction_context = build_extraction_context(global_config)
+
+    processed_chunks = 0
+    total_chunks = len(ordered_chunks)
+
+    async def _process_single_content(chunk_key_dp: tuple[str, TextChunkSchema]):
+        """Process a single chunk
+        Args:
+            chunk_key_dp (tuple[str, TextChunkSchema]):
+                ("chunk-xxxxxx", {"tokens": int, "content": str, "full_doc_id": str, "chunk_order_index": int})
+        Returns:
+            tuple: (maybe_nodes, maybe_edges) containing extracted entities and relationships
+        """
+        nonlocal processed_chunks
+        maybe_nodes, maybe_edges = await extract_chunk_entities(
+            chunk_key_dp[0],
+            chunk_key_dp[1],
+            global_config,
+            llm_response_cache=llm_response_cache,
+            extraction_context=extraction_context,
+        )
+
+        processed_chunks += 1
+        entities_count = len(maybe_nodes)
+        relations_count = len(maybe_edges)
+        log_message = f"Chk {processed_chunks}/{total_chunks}: extracted {entities_count} Ent + {relations_count} Rel"
+        logger.info(log_message)
+        if pipeline_status is not None:
+            async with pipeline_status_lock:
+                pipeline_status["latest_message"] = log_message
+                pipeline_status["history_messages"].append(log_message)
+
+        # Return the extracted nodes and edges for centralized processing
+        return maybe_nodes, maybe_edges
+
+    # Get max async tasks limit from global_config
+    llm_model_max_async = global_config.get("llm_model_max_async", 4)
+    semaphore = asyncio.Semaphore(llm_model_max_async)
+
+    async def _process_with_semaphore(chunk):
+        async with semaphore:
+            return await _process_single_content(chunk)
+
+    tasks = []
+    for c in ordered_chunks:
+        task = asyncio.create_task(_process_with_semaphore(c))
+        tasks.append(task)
+
+    # Wait for tasks to complete or for the first exception to occur
+    # This allows us to cancel remaining tasks if any task fails
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+
+    # Check if any task raised an exception
+    for task in done:
+        if task.exception():
+            # If a task failed, cancel all pending tasks
+            # This prevents unnecessary processing since the parent function will abort anyway
+            for pending_task in pending:
+                pending_task.cancel()
+
+            # Wait for cancellation to complete
+            if pending:
+                await asyncio.wait(pending)
+
+            # Re-raise the exception to notify the caller
+            raise task.exception()
+
+    # If all tasks completed successfully, collect results
+    chunk_results = [task.result() for task in tasks]
+
+    await merge_nodes_and_edges(
+        chunk_results,
+        knowledge_graph_inst,
+        entity_vdb,
+        relationships_vdb,
+        global_config,
+        pipeline_status,
+        pipeline_status_lock,
+        llm_response_cache,
+    )
+
+
+async def _cache_response(
+    hashing_kv: BaseKVStorage, response: str | AsyncIterator[str], cache_data: CacheData
+) -> str | AsyncIterator[str]:
+    """Save a query response to the LLM cache if it is enabled
+
+    A streaming response is returned wrapped, it is cached once the whole stream was
+    consumed.
+    """
+    if not hashing_kv.global_config.get("enable_llm_cache"):
+        return response
+    if hasattr(response, "__aiter__"):
+        return save_stream_to_cache(hashing_kv, response, cache_data)
+    await save_to_cache(hashing_kv, cache_data)
+    return response
+
+
 async def kg_query(
     query: str,
     knowledge_graph_inst: BaseGraphStorage,
@@ -828,6 +935,8 @@ async def kg_query(
         hashing_kv, args_hash, query, query_param.mode, cache_type="query"
     )
     if cached_response is not None:
+        if query_param.stream:
+            return stream_cached_response(cached_response)
         return cached_response
 
     hl_keywords, ll_keywords = await get_keywords_from_query(
@@ -910,23 +1019,20 @@ async def kg_query(
             .strip()
         )
 
-    if hashing_kv.global_config.get("enable_llm_cache"):
-        # Save to cache
-        await save_to_cache(
-            hashing_kv,
-            CacheData(
-                args_hash=args_hash,
-                content=response,
-                prompt=query,
-                quantized=quantized,
-                min_val=min_val,
-                max_val=max_val,
-                mode=query_param.mode,
-                cache_type="query",
-            ),
-        )
-
-    return response
+    return await _cache_response(
+        hashing_kv,
+        response,
+        CacheData(
+            args_hash=args_hash,
+            content=response,
+            prompt=query,
+            quantized=quantized,
+            min_val=min_val,
+            max_val=max_val,
+            mode=query_param.mode,
+            cache_type="query",
+        ),
+    )
 
 
 async def get_keywords_from_query(
@@ -1094,6 +1200,8 @@ async def mix_kg_vector_query(
         hashing_kv, args_hash, query, "mix", cache_type="query"
     )
     if cached_response is not None:
+        if query_param.stream:
+            return stream_cached_response(cached_response)
         return cached_response
 
     # Process conversation history
@@ -1269,23 +1377,20 @@ async def mix_kg_vector_query(
             .strip()
         )
 
-        if hashing_kv.global_config.get("enable_llm_cache"):
-            # 7. Save cache - Only cache after collecting complete response
-            await save_to_cache(
-                hashing_kv,
-                CacheData(
-                    args_hash=args_hash,
-                    content=response,
-                    prompt=query,
-                    quantized=quantized,
-                    min_val=min_val,
-                    max_val=max_val,
-                    mode="mix",
-                    cache_type="query",
-                ),
-            )
-
-    return response
+    return await _cache_response(
+        hashing_kv,
+        response,
+        CacheData(
+            args_hash=args_hash,
+            content=response,
+            prompt=query,
+            quantized=quantized,
+            min_val=min_val,
+            max_val=max_val,
+            mode="mix",
+            cache_type="query",
+        ),
+    )
 
 
 async def _build_query_context(
@@ -1985,6 +2090,8 @@ async def naive_query(
         hashing_kv, args_hash, query, query_param.mode, cache_type="query"
     )
     if cached_response is not None:
+        if query_param.stream:
+            return stream_cached_response(cached_response)
         return cached_response
 
     results = await chunks_vdb.query(
@@ -2081,23 +2188,20 @@ async def naive_query(
             .strip()
         )
 
-    if hashing_kv.global_config.get("enable_llm_cache"):
-        # Save to cache
-        await save_to_cache(
-            hashing_kv,
-            CacheData(
-                args_hash=args_hash,
-                content=response,
-                prompt=query,
-                quantized=quantized,
-                min_val=min_val,
-                max_val=max_val,
-                mode=query_param.mode,
-                cache_type="query",
-            ),
-        )
-
-    return response
+    return await _cache_response(
+        hashing_kv,
+        response,
+        CacheData(
+            args_hash=args_hash,
+            content=response,
+            prompt=query,
+            quantized=quantized,
+            min_val=min_val,
+            max_val=max_val,
+            mode=query_param.mode,
+            cache_type="query",
+        ),
+    )
 
 
 async def kg_query_with_keywords(
@@ -2129,6 +2233,8 @@ async def kg_query_with_keywords(
         hashing_kv, args_hash, query, query_param.mode, cache_type="query"
     )
     if cached_response is not None:
+        if query_param.stream:
+            return stream_cached_response(cached_response)
         return cached_response
 
     # ---------------------------
@@ -2231,23 +2337,20 @@ async def kg_query_with_keywords(
             .strip()
         )
 
-        if hashing_kv.global_config.get("enable_llm_cache"):
-            # 7. Save cache - 只有在收集完整响应后才缓存
-            await save_to_cache(
-                hashing_kv,
-                CacheData(
-                    args_hash=args_hash,
-                    content=response,
-                    prompt=query,
-                    quantized=quantized,
-                    min_val=min_val,
-                    max_val=max_val,
-                    mode=query_param.mode,
-                    cache_type="query",
-                ),
-            )
-
-    return response
+    return await _cache_response(
+        hashing_kv,
+        response,
+        CacheData(
+            args_hash=args_hash,
+            content=response,
+            prompt=query,
+            quantized=quantized,
+            min_val=min_val,
+            max_val=max_val,
+            mode=query_param.mode,
+            cache_type="query",
+        ),
+    )
 
 
 async def query_with_keywords(
@@ -512,7 +512,8 @@ class GraphViewer:
         self.sphere_index_buffer = None
 
     def load_file(self, filepath: str):
-        """Load a GraphML file with error handling"""
+        """Load a GraphML file, or the graph snapshot of a working directory
+        (graph_<namespace>.msgpack, replaying its mutation log), with error handling"""
         try:
             # Clear existing data
             self.id_node_map.clear()
@@ -522,7 +523,15 @@ class GraphViewer:
             self.setup_buffers()
 
             # Load new graph
-            self.graph = nx.read_graphml(filepath)
+            if filepath.endswith(".msgpack"):
+                from lightrag.kg.networkx_impl import NetworkXStorage
+
+                working_dir, file_name = os.path.split(filepath)
+                self.graph = NetworkXStorage.load_working_dir_graph(
+                    working_dir, file_name[len("graph_") : -len(".msgpack")]
+                )
+            else:
+                self.graph = nx.read_graphml(filepath)
             self.calculate_layout()
             self.update_buffers()
             self.show_load_error = False
@@ -973,10 +982,15 @@ def generate_colors(n: int) -> List[glm.vec3]:
 
 
 def show_file_dialog() -> Optional[str]:
-    """Show a file dialog for selecting GraphML files"""
+    """Show a file dialog for selecting GraphML files or graph snapshots"""
     file_path = filedialog.askopenfilename(
-        title="Select GraphML File",
-        filetypes=[("GraphML files", "*.graphml"), ("All files", "*.*")],
+        title="Select GraphML File or Graph Snapshot",
+        filetypes=[
+            ("Graph files", "*.graphml *.msgpack"),
+            ("GraphML files", "*.graphml"),
+            ("Graph snapshots", "*.msgpack"),
+            ("All files", "*.*"),
+        ],
     )
     return file_path if file_path else None
 
@@ -0,0 +1,85 @@
+"""
+Convert an existing LLM response cache to the per-entry layout.
+
+The LLM cache used to be stored as one record per mode holding all its entries
+({mode: {hash: entry}}). JsonKVStorage now stores every entry under its own
+"mode:hash" key, and RedisKVStorage keeps a Redis hash per mode. Both storages
+migrate a legacy cache when they are initialized, this tool does it ahead of time,
+e.g. before starting many workers on a large cache.
+
+Usage:
+    python -m lightrag.tools.migrate_llm_cache --storage JsonKVStorage --working-dir ./rag_storage
+    python -m lightrag.tools.migrate_llm_cache --storage RedisKVStorage
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+
+from lightrag.namespace import NameSpace, make_namespace
+from lightrag.utils import load_json, write_json
+
+
+def migrate_json_cache(working_dir: str, namespace: str) -> int:
+    """Migrate the cache file of JsonKVStorage, the original file is kept as .bak"""
+    from lightrag.kg.json_kv_impl import migrate_llm_cache_layout
+
+    file_name = os.path.join(working_dir, f"kv_store_{namespace}.json")
+    data = load_json(file_name)
+    if not data:
+        print(f"No LLM cache found at {file_name}")
+        return 0
+
+    migrated = migrate_llm_cache_layout(data)
+    if migrated:
+        shutil.copyfile(file_name, f"{file_name}.bak")
+        write_json(data, file_name)
+    return migrated
+
+
+async def migrate_redis_cache(namespace: str) -> int:
+    """Migrate the cache of RedisKVStorage, connecting to REDIS_URI"""
+    from lightrag.kg.redis_impl import RedisKVStorage
+
+    storage = RedisKVStorage(namespace=namespace, global_config={}, embedding_func=None)
+    try:
+        return await storage.migrate_llm_cache_layout()
+    finally:
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a LLM response cache to the per-entry layout"
+    )
+    parser.add_argument(
+        "--storage",
+        choices=["JsonKVStorage", "RedisKVStorage"],
+        default=os.getenv("LIGHTRAG_KV_STORAGE", "JsonKVStorage"),
+        help="KV storage holding the cache (default: from LIGHTRAG_KV_STORAGE)",
+    )
+    parser.add_argument(
+        "--working-dir",
+        default=os.getenv("WORKING_DIR", "./rag_storage"),
+        help="Working directory of JsonKVStorage (default: from WORKING_DIR)",
+    )
+    parser.add_argument(
+        "--namespace-prefix",
+        default="",
+        help="Namespace prefix of the LightRAG instance (default: none)",
+    )
+    args = parser.parse_args()
+
+    namespace = make_namespace(
+        args.namespace_prefix, NameSpace.KV_STORE_LLM_RESPONSE_CACHE
+    )
+    if args.storage == "JsonKVStorage":
+        migrated = migrate_json_cache(args.working_dir, namespace)
+    else:
+        migrated = asyncio.run(migrate_redis_cache(namespace))
+    print(f"Migrated {migrated} LLM cache entries of {namespace} ({args.storage})")
+
+
+if __name__ == "__main__":
+    main()
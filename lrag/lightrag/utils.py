@@ -8,10 +8,23 @@ import logging
 import logging.handlers
 import os
 import re
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from functools import wraps
 from hashlib import md5
-from typing import Any, Protocol, Callable, TYPE_CHECKING, List
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Protocol,
+    Callable,
+    TYPE_CHECKING,
+    List,
+)
 import xml.etree.ElementTree as ET
 import numpy as np
 from .prompt import PROMPTS
@@ -191,15 +204,119 @@ class UnlimitedSemaphore:
         pass
 
 
+class EmbeddingMemo:
+    """LRU memo of embeddings keyed by (model, text), entries expire after ttl seconds"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, np.ndarray]] = (
+            OrderedDict()
+        )
+
+    def get(self, key: tuple[str, str]) -> np.ndarray | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl > 0 and time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple[str, str], embedding: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic(), embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Query embeddings of the process, shared by all EmbeddingFunc of the same model
+embedding_memo = EmbeddingMemo(
+    max_size=int(os.getenv("EMBEDDING_MEMO_SIZE", 1024)),
+    ttl=float(os.getenv("EMBEDDING_MEMO_TTL", 3600)),
+)
+# Embeddings of the current request, see embedding_request_scope
+_request_embeddings: ContextVar[dict[tuple[str, str], np.ndarray] | None] = ContextVar(
+    "request_embeddings", default=None
+)
+
+
+@contextmanager
+def embedding_request_scope():
+    """Embed every text at most once within the scope (e.g. one query), even if the
+    process memo is disabled or evicted it meanwhile
+
+    Only the embeddings computed within a scope are memoized, the batches of the
+    indexing pipeline are not.
+    """
+    token = _request_embeddings.set({})
+    try:
+        yield
+    finally:
+        _request_embeddings.reset(token)
+
+
 @dataclass
 class EmbeddingFunc:
     embedding_dim: int
     max_token_size: int
     func: callable
     # concurrent_limit: int = 16
+    model_name: str | None = None
+    """Model of the embeddings, keys them in the memo and the persistent embedding store.
+    The memo falls back to func itself if not given, the store (enable_embedding_store)
+    requires it. Change it whenever the model changes."""
 
     async def __call__(self, *args, **kwargs) -> np.ndarray:
-        return await self.func(*args, **kwargs)
+        request_embeddings = _request_embeddings.get()
+        if (
+            request_embeddings is None
+            or kwargs
+            or len(args) != 1
+            or not isinstance(args[0], list)
+        ):
+            return await self.func(*args, **kwargs)
+
+        # Only the texts not embedded yet by the process or the request are sent
+        texts = args[0]
+        model = (
+            self.model_name
+            or f"{getattr(self.func, '__qualname__', '')}@{id(self.func)}"
+        )
+        found: dict[str, np.ndarray] = {}
+        for text in texts:
+            key = (model, text)
+            embedding = request_embeddings.get(key)
+            if embedding is None:
+                embedding = embedding_memo.get(key)
+            if embedding is not None:
+                found[text] = embedding
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if not missing:
+            return np.array([found[text] for text in texts])
+
+        embeddings = await self.func(missing)
+        if len(embeddings) != len(missing):
+            if not found and len(missing) == len(texts):
+                # Let the caller report the mismatch
+                return embeddings
+            raise ValueError(
+                f"Embedding function returned {len(embeddings)} embeddings for {len(missing)} texts"
+            )
+        for text, embedding in zip(missing, embeddings):
+            key = (model, text)
+            # A copy, a row view would keep the whole batch array alive in the memo
+            embedding = np.array(embedding)
+            embedding_memo.put(key, embedding)
+            request_embeddings[key] = embedding
+            found[text] = embedding
+        return np.array([found[text] for text in texts])
 
 
 def locate_json_string_body_from_string(content: str) -> str | None:
@@ -467,6 +584,11 @@ def save_data_to_file(data, file_name):
 
 
 def xml_to_json(xml_file):
+    """Convert a GraphML export of the graph (see NetworkXStorage.export_graphml)
+    to {"nodes": [...], "edges": [...]}
+
+    The data keys are resolved by attribute name, their ids depend on the writer.
+    """
     try:
         tree = ET.parse(xml_file)
         root = tree.getroot()
@@ -480,37 +602,37 @@ def xml_to_json(xml_file):
         # Use namespace
         namespace = {"": "http://graphml.graphdrawing.org/xmlns"}
 
+        # Attribute name -> key id, for nodes and for edges
+        key_ids = {"node": {}, "edge": {}}
+        for key in root.findall(".//key", namespace):
+            if key.get("for") in key_ids:
+                key_ids[key.get("for")][key.get("attr.name")] = key.get("id")
+
+        def get_text(element, kind: str, name: str):
+            key_id = key_ids[kind].get(name)
+            if key_id is None:
+                return None
+            found = element.find(f"./data[@key='{key_id}']", namespace)
+            return found.text if found is not None else None
+
         for node in root.findall(".//node", namespace):
             node_data = {
                 "id": node.get("id").strip('"'),
-                "entity_type": node.find("./data[@key='d0']", namespace).text.strip('"')
-                if node.find("./data[@key='d0']", namespace) is not None
-                else "",
-                "description": node.find("./data[@key='d1']", namespace).text
-                if node.find("./data[@key='d1']", namespace) is not None
-                else "",
-                "source_id": node.find("./data[@key='d2']", namespace).text
-                if node.find("./data[@key='d2']", namespace) is not None
-                else "",
+                "entity_type": (get_text(node, "node", "entity_type") or "").strip('"'),
+                "description": get_text(node, "node", "description") or "",
+                "source_id": get_text(node, "node", "source_id") or "",
             }
             data["nodes"].append(node_data)
 
         for edge in root.findall(".//edge", namespace):
+            weight = get_text(edge, "edge", "weight")
             edge_data = {
                 "source": edge.get("source").strip('"'),
                 "target": edge.get("target").strip('"'),
-                "weight": float(edge.find("./data[@key='d3']", namespace).text)
-                if edge.find("./data[@key='d3']", namespace) is not None
-                else 0.0,
-                "description": edge.find("./data[@key='d4']", namespace).text
-                if edge.find("./data[@key='d4']", namespace) is not None
-                else "",
-                "keywords": edge.find("./data[@key='d5']", namespace).text
-                if edge.find("./data[@key='d5']", namespace) is not None
-                else "",
-                "source_id": edge.find("./data[@key='d6']", namespace).text
-                if edge.find("./data[@key='d6']", namespace) is not None
-                else "",
+                "weight": float(weight) if weight is not None else 0.0,
+                "description": get_text(edge, "edge", "description") or "",
+                "keywords": get_text(edge, "edge", "keywords") or "",
+                "source_id": get_text(edge, "edge", "source_id") or "",
             }
             data["edges"].append(edge_data)
 
@@ -766,10 +888,7 @@ async def handle_cache(
     # Here is the conditions of code reaching this point:
     #     1. All query mode: enable_llm_cache is True and embedding simularity is not enabled
     #     2. Entity extract: enable_llm_cache_for_entity_extract is True
-    if exists_func(hashing_kv, "get_by_mode_and_id"):
-        mode_cache = await hashing_kv.get_by_mode_and_id(mode, args_hash) or {}
-    else:
-        mode_cache = await hashing_kv.get_by_id(mode) or {}
+    mode_cache = await hashing_kv.get_by_mode_and_id(mode, args_hash) or {}
     if args_hash in mode_cache:
         logger.debug(f"Non-embedding cached hit(mode:{mode} type:{cache_type})")
         return mode_cache[args_hash]["return"], None, None, None
@@ -788,6 +907,7 @@ class CacheData:
     max_val: float | None = None
     mode: str = "default"
     cache_type: str = "query"
+    chunk_id: str | None = None
 
 
 async def save_to_cache(hashing_kv, cache_data: CacheData):
@@ -801,19 +921,16 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
     if hashing_kv is None or not cache_data.content:
         return
 
-    # If content is a streaming response, don't cache it
+    # Streaming responses are saved by save_stream_to_cache once complete
     if hasattr(cache_data.content, "__aiter__"):
         logger.debug("Streaming response detected, skipping cache")
         return
 
-    # Get existing cache data
-    if exists_func(hashing_kv, "get_by_mode_and_id"):
-        mode_cache = (
-            await hashing_kv.get_by_mode_and_id(cache_data.mode, cache_data.args_hash)
-            or {}
-        )
-    else:
-        mode_cache = await hashing_kv.get_by_id(cache_data.mode) or {}
+    # Get existing cache entry
+    mode_cache = (
+        await hashing_kv.get_by_mode_and_id(cache_data.mode, cache_data.args_hash)
+        or {}
+    )
 
     # Check if we already have identical content cached
     if cache_data.args_hash in mode_cache:
@@ -824,8 +941,7 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
             )
             return
 
-    # Update cache with new content
-    mode_cache[cache_data.args_hash] = {
+    entry = {
         "return": cache_data.content,
         "cache_type": cache_data.cache_type,
         "embedding": cache_data.quantized.tobytes().hex()
@@ -838,11 +954,203 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
         "embedding_max": cache_data.max_val,
         "original_prompt": cache_data.prompt,
     }
+    if cache_data.chunk_id:
+        # Lets the garbage collection drop the entries of deleted chunks
+        entry["chunk_id"] = cache_data.chunk_id
 
     logger.info(f" == LLM cache == saving {cache_data.mode}: {cache_data.args_hash}")
 
-    # Only upsert if there's actual new content
-    await hashing_kv.upsert({cache_data.mode: mode_cache})
+    # Only upsert the new entry, not the whole cache of the mode
+    await hashing_kv.upsert({cache_data.mode: {cache_data.args_hash: entry}})
+
+
+async def save_stream_to_cache(
+    hashing_kv, stream: AsyncIterator[str], cache_data: CacheData
+) -> AsyncIterator[str]:
+    """Yield the chunks of a streaming response while collecting them, and save the
+    complete response to cache once the stream finished.
+
+    Nothing is cached if the stream fails or is closed early, e.g. by a client disconnect.
+
+    Args:
+        hashing_kv: The key-value storage for caching
+        stream: The streaming response of the LLM
+        cache_data: The cache data to save, its content is set to the complete response
+    """
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    cache_data.content = "".join(chunks)
+    await save_to_cache(hashing_kv, cache_data)
+
+
+async def stream_cached_response(content: str) -> AsyncIterator[str]:
+    """Replay a cached response through the streaming interface"""
+    yield content
+
+
+class _SharedStream:
+    """A streaming response consumed by several callers, each of them gets all chunks
+
+    Chunks are pulled from the source in a task of its own and buffered for the
+    callers behind, so a caller cancelled while waiting for a chunk (e.g. by a client
+    disconnect) does not cut the stream short for the others. on_done is called once
+    the source is exhausted, failed, or every caller stopped consuming before the end,
+    including callers which dropped their iterator without consuming it.
+    """
+
+    def __init__(self, stream: AsyncIterator[str], on_done: Callable[[], None]):
+        self._stream = stream
+        self._chunks: list[str] = []
+        self._done = False
+        self._error: Exception | None = None
+        self._pull: asyncio.Task | None = None
+        self._consumers = 0
+        self._on_done = on_done
+
+    def _finish(self) -> None:
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done()
+
+    async def _pull_next(self) -> None:
+        try:
+            self._chunks.append(await self._stream.__anext__())
+        except StopAsyncIteration:
+            self._done = True
+        except asyncio.CancelledError:
+            # Every caller stopped consuming, callers joining late get an error
+            self._done = True
+            self._error = RuntimeError("The stream was closed by all its consumers")
+        except Exception as e:
+            self._done = True
+            self._error = e
+        if self._done:
+            self._finish()
+
+    def _unsubscribe(self) -> None:
+        self._consumers -= 1
+        if not self._consumers and not self._done:
+            if self._pull is not None:
+                self._pull.cancel()
+            self._finish()
+
+    def subscribe(self) -> AsyncIterator[str]:
+        self._consumers += 1
+        unsubscribe: list[weakref.finalize] = []
+        stream = self._iterate(unsubscribe)
+        # An iterator dropped before its first chunk never runs the finally of _iterate
+        finalizer = weakref.finalize(stream, self._unsubscribe)
+        finalizer.atexit = False
+        unsubscribe.append(finalizer)
+        return stream
+
+    async def _iterate(self, unsubscribe: list[weakref.finalize]) -> AsyncIterator[str]:
+        i = 0
+        try:
+            while True:
+                if i < len(self._chunks):
+                    yield self._chunks[i]
+                    i += 1
+                    continue
+                if self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                if self._pull is None or self._pull.done():
+                    self._pull = asyncio.ensure_future(self._pull_next())
+                # Cancelling the wait leaves the pull running for the other callers
+                await asyncio.wait({self._pull})
+        finally:
+            # Runs _unsubscribe once, whether the iterator ends or is dropped
+            unsubscribe[0]()
+
+
+class SingleFlight:
+    """Deduplicate identical computations running concurrently
+
+    Callers of do() with the key of a running computation await its result instead of
+    running it again. Streaming results are shared, every caller gets an iterator over
+    all chunks.
+
+    With across_workers, a computation running in another worker process is waited for
+    too, and then run, which is expected to be answered from the cache it filled.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _result(result: Any) -> Any:
+        if isinstance(result, _SharedStream):
+            return result.subscribe()
+        return result
+
+    def _release(self, key: str, future: asyncio.Future, claimed: bool) -> None:
+        from .kg.shared_storage import release_inflight
+
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if claimed:
+            release_inflight(key)
+
+    async def do(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        across_workers: bool = False,
+    ) -> Any:
+        """Run func, or await the running computation with the same key
+
+        Args:
+            key: Identifies the computation, e.g. the args_hash of an LLM call
+            func: Runs the computation
+            across_workers: Also wait for the computation in other worker processes
+        """
+        from .kg.shared_storage import claim_inflight, wait_inflight
+
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                return self._result(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The caller running the computation was cancelled, run it ourselves
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        claimed = False
+        try:
+            if across_workers:
+                claimed = claim_inflight(key)
+                if not claimed:
+                    await wait_inflight(key)
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            self._release(key, future, claimed)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved, the callers awaiting the future get the exception raised
+            future.exception()
+            self._release(key, future, claimed)
+            raise
+
+        if hasattr(result, "__aiter__"):
+            # Late callers join the stream until it is consumed
+            result = _SharedStream(result, lambda: self._release(key, future, claimed))
+        else:
+            self._release(key, future, claimed)
+        future.set_result(result)
+        return self._result(result)
+
+
+single_flight = SingleFlight()
 
 
 def safe_unicode_decode(content):
@@ -990,70 +1298,58 @@ async def aexport_data(
     relationships_data = []
 
     # --- Entities ---
-    all_entities = await chunk_entity_relation_graph.get_all_labels()
-    for entity_name in all_entities:
-        # Get entity information from graph
-        node_data = await chunk_entity_relation_graph.get_node(entity_name)
-        source_id = node_data.get("source_id") if node_data else None
-
-        entity_info = {
-            "graph_data": node_data,
-            "source_id": source_id,
-        }
-
-        # Optional: Get vector database information
+    # Nodes and edges are read in pages, vector data is looked up per page
+    async for nodes in chunk_entity_relation_graph.iter_nodes():
+        vector_records = {}
         if include_vector_data:
-            entity_id = compute_mdhash_id(entity_name, prefix="ent-")
-            vector_data = await entities_vdb.get_by_id(entity_id)
-            entity_info["vector_data"] = vector_data
-
-        entity_row = {
-            "entity_name": entity_name,
-            "source_id": source_id,
-            "graph_data": str(
-                entity_info["graph_data"]
-            ),  # Convert to string to ensure compatibility
-        }
-        if include_vector_data and "vector_data" in entity_info:
-            entity_row["vector_data"] = str(entity_info["vector_data"])
-        entities_data.append(entity_row)
+            entity_ids = {
+                compute_mdhash_id(entity_name, prefix="ent-"): entity_name
+                for entity_name in nodes
+            }
+            for record in await entities_vdb.get_by_ids(list(entity_ids)):
+                record_id = record.get("__id__", record.get("id")) if record else None
+                if record_id in entity_ids:
+                    vector_records[entity_ids[record_id]] = record
+
+        for entity_name, node_data in nodes.items():
+            entity_row = {
+                "entity_name": entity_name,
+                "source_id": node_data.get("source_id") if node_data else None,
+                # Convert to string to ensure compatibility
+                "graph_data": str(node_data),
+            }
+            if include_vector_data:
+                entity_row["vector_data"] = str(vector_records.get(entity_name))
+            entities_data.append(entity_row)
 
     # --- Relations ---
-    for src_entity in all_entities:
-        for tgt_entity in all_entities:
-            if src_entity == tgt_entity:
-                continue
-
-            edge_exists = await chunk_entity_relation_graph.has_edge(
-                src_entity, tgt_entity
-            )
-            if edge_exists:
-                # Get edge information from graph
-                edge_data = await chunk_entity_relation_graph.get_edge(
-                    src_entity, tgt_entity
+    async for edges in chunk_entity_relation_graph.iter_edges():
+        vector_records = {}
+        if include_vector_data:
+            rel_ids = {
+                compute_mdhash_id(src_entity + tgt_entity, prefix="rel-"): (
+                    src_entity,
+                    tgt_entity,
                 )
-                source_id = edge_data.get("source_id") if edge_data else None
-
-                relation_info = {
-                    "graph_data": edge_data,
-                    "source_id": source_id,
-                }
-
-                # Optional: Get vector database information
-                if include_vector_data:
-                    rel_id = compute_mdhash_id(src_entity + tgt_entity, prefix="rel-")
-                    vector_data = await relationships_vdb.get_by_id(rel_id)
-                    relation_info["vector_data"] = vector_data
-
-                relation_row = {
-                    "src_entity": src_entity,
-                    "tgt_entity": tgt_entity,
-                    "source_id": relation_info["source_id"],
-                    "graph_data": str(relation_info["graph_data"]),  # Convert to string
-                }
-                if include_vector_data and "vector_data" in relation_info:
-                    relation_row["vector_data"] = str(relation_info["vector_data"])
-                relations_data.append(relation_row)
+                for src_entity, tgt_entity in edges
+            }
+            for record in await relationships_vdb.get_by_ids(list(rel_ids)):
+                record_id = record.get("__id__", record.get("id")) if record else None
+                if record_id in rel_ids:
+                    vector_records[rel_ids[record_id]] = record
+
+        for (src_entity, tgt_entity), edge_data in edges.items():
+            relation_row = {
+                "src_entity": src_entity,
+                "tgt_entity": tgt_entity,
+                "source_id": edge_data.get("source_id") if edge_data else None,
+                "graph_data": str(edge_data),  # Convert to string
+            }
+            if include_vector_data:
+                relation_row["vector_data"] = str(
+                    vector_records.get((src_entity, tgt_entity))
+                )
+            relations_data.append(relation_row)
 
     # --- Relationships (from VectorDB) ---
     all_relationships = await relationships_vdb.client_storage
@@ -1332,6 +1628,7 @@ async def use_llm_func_with_cache(
     max_tokens: int = None,
     history_messages: list[dict[str, str]] = None,
     cache_type: str = "extract",
+    chunk_id: str | None = None,
 ) -> str:
     """Call LLM function with cache support
 
@@ -1345,6 +1642,7 @@ async def use_llm_func_with_cache(
         max_tokens: Maximum tokens for generation
         history_messages: History messages list
         cache_type: Type of cache
+        chunk_id: Chunk the input text was built from, saved with the cache entry
 
     Returns:
         LLM response text
@@ -1357,40 +1655,52 @@ async def use_llm_func_with_cache(
             _prompt = input_text
 
         arg_hash = compute_args_hash(_prompt)
-        cached_return, _1, _2, _3 = await handle_cache(
-            llm_response_cache,
-            arg_hash,
-            _prompt,
-            "default",
-            cache_type=cache_type,
-        )
-        if cached_return:
-            logger.debug(f"Found cache for {arg_hash}")
-            statistic_data["llm_cache"] += 1
-            return cached_return
-        statistic_data["llm_call"] += 1
-
-        # Call LLM
-        kwargs = {}
-        if history_messages:
-            kwargs["history_messages"] = history_messages
-        if max_tokens is not None:
-            kwargs["max_tokens"] = max_tokens
-
-        res: str = await use_llm_func(input_text, **kwargs)
 
-        if llm_response_cache.global_config.get("enable_llm_cache_for_entity_extract"):
-            await save_to_cache(
+        async def call_llm_with_cache() -> str:
+            cached_return, _1, _2, _3 = await handle_cache(
                 llm_response_cache,
-                CacheData(
-                    args_hash=arg_hash,
-                    content=res,
-                    prompt=_prompt,
-                    cache_type=cache_type,
-                ),
+                arg_hash,
+                _prompt,
+                "default",
+                cache_type=cache_type,
             )
+            if cached_return:
+                logger.debug(f"Found cache for {arg_hash}")
+                statistic_data["llm_cache"] += 1
+                return cached_return
+            statistic_data["llm_call"] += 1
+
+            # Call LLM
+            kwargs = {}
+            if history_messages:
+                kwargs["history_messages"] = history_messages
+            if max_tokens is not None:
+                kwargs["max_tokens"] = max_tokens
+
+            res: str = await use_llm_func(input_text, **kwargs)
+
+            if cache_enabled:
+                await save_to_cache(
+                    llm_response_cache,
+                    CacheData(
+                        args_hash=arg_hash,
+                        content=res,
+                        prompt=_prompt,
+                        cache_type=cache_type,
+                        chunk_id=chunk_id,
+                    ),
+                )
+
+            return res
 
-        return res
+        # Identical chunks of different documents are extracted concurrently,
+        # only one of them calls the LLM
+        cache_enabled = llm_response_cache.global_config.get(
+            "enable_llm_cache_for_entity_extract"
+        )
+        return await single_flight.do(
+            arg_hash, call_llm_with_cache, across_workers=bool(cache_enabled)
+        )
 
     # When cache is disabled, directly call LLM
     kwargs = {}
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, cast
+import json
+import os
+from typing import Any, Callable, Iterator, cast
+
+import numpy as np
+import pipmaster as pm
 
 from .kg.shared_storage import get_graph_db_lock
 from .prompt import GRAPH_FIELD_SEP
 from .utils import compute_mdhash_id, logger
 from .base import StorageNameSpace
+from .types import KnowledgeGraph, KnowledgeGraphEdge, KnowledgeGraphNode
 
 
 async def adelete_by_entity(
@@ -186,38 +192,23 @@ async def aedit_entity(
                     new_entity_name, new_node_data
                 )
 
-                # Store relationships that need to be updated
-                relations_to_update = []
-                relations_to_delete = []
-                # Get all edges related to the original entity
+                # Get all edges related to the original entity, in one batch
                 edges = await chunk_entity_relation_graph.get_node_edges(entity_name)
-                if edges:
-                    # Recreate edges for the new entity
-                    for source, target in edges:
-                        edge_data = await chunk_entity_relation_graph.get_edge(
-                            source, target
-                        )
-                        if edge_data:
-                            relations_to_delete.append(
-                                compute_mdhash_id(source + target, prefix="rel-")
-                            )
-                            relations_to_delete.append(
-                                compute_mdhash_id(target + source, prefix="rel-")
-                            )
-                            if source == entity_name:
-                                await chunk_entity_relation_graph.upsert_edge(
-                                    new_entity_name, target, edge_data
-                                )
-                                relations_to_update.append(
-                                    (new_entity_name, target, edge_data)
-                                )
-                            else:  # target == entity_name
-                                await chunk_entity_relation_graph.upsert_edge(
-                                    source, new_entity_name, edge_data
-                                )
-                                relations_to_update.append(
-                                    (source, new_entity_name, edge_data)
-                                )
+                edges_data = await chunk_entity_relation_graph.get_edges_batch(
+                    [{"src": source, "tgt": target} for source, target in edges or []]
+                )
+
+                # Recreate edges for the new entity
+                relations_to_update = {}
+                relations_to_delete = []
+                for (source, target), edge_data in edges_data.items():
+                    relations_to_delete.extend(_relation_vdb_ids(source, target))
+                    new_source = new_entity_name if source == entity_name else source
+                    new_target = new_entity_name if target == entity_name else target
+                    relations_to_update[(new_source, new_target)] = edge_data
+                await chunk_entity_relation_graph.upsert_edges_batch(
+                    relations_to_update
+                )
 
                 # Delete old entity
                 await chunk_entity_relation_graph.delete_node(entity_name)
@@ -235,34 +226,11 @@ async def aedit_entity(
                     f"Deleted {len(relations_to_delete)} relation records for entity '{entity_name}' from vector database"
                 )
 
-                # Update relationship vector representations
-                for src, tgt, edge_data in relations_to_update:
-                    description = edge_data.get("description", "")
-                    keywords = edge_data.get("keywords", "")
-                    source_id = edge_data.get("source_id", "")
-                    weight = float(edge_data.get("weight", 1.0))
-
-                    # Create new content for embedding
-                    content = f"{src}\t{tgt}\n{keywords}\n{description}"
-
-                    # Calculate relationship ID
-                    relation_id = compute_mdhash_id(src + tgt, prefix="rel-")
-
-                    # Prepare data for vector database update
-                    relation_data = {
-                        relation_id: {
-                            "content": content,
-                            "src_id": src,
-                            "tgt_id": tgt,
-                            "source_id": source_id,
-                            "description": description,
-                            "keywords": keywords,
-                            "weight": weight,
-                        }
-                    }
-
-                    # Update vector database
-                    await relationships_vdb.upsert(relation_data)
+                # Update relationship vector representations, embedded in one batch
+                if relations_to_update:
+                    await relationships_vdb.upsert(
+                        _relation_vdb_data(relations_to_update)
+                    )
 
                 # Update working entity name to new name
                 entity_name = new_entity_name
@@ -633,6 +601,51 @@ async def acreate_relation(
             raise
 
 
+def _relation_vdb_ids(src: str, tgt: str) -> list[str]:
+    """Ids a relation may be stored under in the vector database, in both directions"""
+    return [
+        compute_mdhash_id(src + tgt, prefix="rel-"),
+        compute_mdhash_id(tgt + src, prefix="rel-"),
+    ]
+
+
+def _relation_vdb_data(
+    relations: dict[tuple[str, str], dict[str, Any]],
+) -> dict[str, dict[str, Any]]:
+    """Vector database records of relations, embedded like the indexed relations"""
+    data_for_vdb = {}
+    for (src, tgt), edge_data in relations.items():
+        description = edge_data.get("description", "")
+        keywords = edge_data.get("keywords", "")
+        data_for_vdb[compute_mdhash_id(src + tgt, prefix="rel-")] = {
+            "content": f"{keywords}\t{src}\n{tgt}\n{description}",
+            "src_id": src,
+            "tgt_id": tgt,
+            "source_id": edge_data.get("source_id", ""),
+            "description": description,
+            "keywords": keywords,
+            "weight": float(edge_data.get("weight", 1.0)),
+        }
+    return data_for_vdb
+
+
+# How duplicate relationships are combined when their entities are merged
+_RELATION_MERGE_STRATEGY = {
+    "description": "concatenate",
+    "keywords": "join_unique",
+    "source_id": "join_unique",
+    "weight": "max",
+}
+
+
+async def _run_locked(lock, func):
+    """Await func() holding lock, lock is None if the caller holds the graph lock"""
+    if lock is None:
+        return await func()
+    async with lock:
+        return await func()
+
+
 async def amerge_entities(
     chunk_entity_relation_graph,
     entities_vdb,
@@ -641,12 +654,19 @@ async def amerge_entities(
     target_entity: str,
     merge_strategy: dict[str, str] = None,
     target_entity_data: dict[str, Any] = None,
+    chunk_size: int | None = None,
 ) -> dict[str, Any]:
     """Asynchronously merge multiple entities into one entity.
 
     Merges multiple source entities into a target entity, handling all relationships,
     and updating both the knowledge graph and vector database.
 
+    Relationships are read, rewritten and re-embedded in batches. By default the
+    whole merge holds the graph database lock. With chunk_size, relationships are
+    moved chunk_size at a time and the lock is released between chunks, so the
+    merge of entities with many relationships does not block indexing. Other
+    operations may then see a partially merged graph.
+
     Args:
         chunk_entity_relation_graph: Graph storage instance
         entities_vdb: Vector database storage for entities
@@ -661,54 +681,91 @@ async def amerge_entities(
             - "join_unique": Join all unique values (for fields separated by delimiter)
         target_entity_data: Dictionary of specific values to set for the target entity,
             overriding any merged values, e.g. {"description": "custom description", "entity_type": "PERSON"}
+        chunk_size: Relationships moved per acquisition of the graph database lock,
+            None to merge holding the lock throughout
 
     Returns:
         Dictionary containing the merged entity information
     """
     graph_db_lock = get_graph_db_lock(enable_logging=False)
-    # Use graph database lock to ensure atomic graph and vector db operations
-    async with graph_db_lock:
-        try:
-            # Default merge strategy
-            default_strategy = {
-                "description": "concatenate",
-                "entity_type": "keep_first",
-                "source_id": "join_unique",
-            }
-
-            merge_strategy = (
-                default_strategy
-                if merge_strategy is None
-                else {**default_strategy, **merge_strategy}
-            )
-            target_entity_data = (
-                {} if target_entity_data is None else target_entity_data
+    if chunk_size is None:
+        # Use graph database lock to ensure atomic graph and vector db operations
+        async with graph_db_lock:
+            return await _merge_entities(
+                chunk_entity_relation_graph,
+                entities_vdb,
+                relationships_vdb,
+                source_entities,
+                target_entity,
+                merge_strategy,
+                target_entity_data,
+                None,
+                None,
             )
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    return await _merge_entities(
+        chunk_entity_relation_graph,
+        entities_vdb,
+        relationships_vdb,
+        source_entities,
+        target_entity,
+        merge_strategy,
+        target_entity_data,
+        graph_db_lock,
+        chunk_size,
+    )
+
 
+async def _merge_entities(
+    chunk_entity_relation_graph,
+    entities_vdb,
+    relationships_vdb,
+    source_entities: list[str],
+    target_entity: str,
+    merge_strategy: dict[str, str] | None,
+    target_entity_data: dict[str, Any] | None,
+    lock,
+    chunk_size: int | None,
+) -> dict[str, Any]:
+    """Merge entities, each step holds lock unless the caller holds it (lock is None)"""
+    try:
+        # Default merge strategy
+        default_strategy = {
+            "description": "concatenate",
+            "entity_type": "keep_first",
+            "source_id": "join_unique",
+        }
+
+        merge_strategy = (
+            default_strategy
+            if merge_strategy is None
+            else {**default_strategy, **merge_strategy}
+        )
+        target_entity_data = {} if target_entity_data is None else target_entity_data
+        # Entities whose relationships are moved to the target and which are deleted
+        merged_entities = [name for name in source_entities if name != target_entity]
+
+        async def merge_nodes() -> None:
             # 1. Check if all source entities exist
-            source_entities_data = {}
+            nodes = await chunk_entity_relation_graph.get_nodes_batch(
+                list(dict.fromkeys(source_entities + [target_entity]))
+            )
             for entity_name in source_entities:
-                node_exists = await chunk_entity_relation_graph.has_node(entity_name)
-                if not node_exists:
+                if entity_name not in nodes:
                     raise ValueError(f"Source entity '{entity_name}' does not exist")
-                node_data = await chunk_entity_relation_graph.get_node(entity_name)
-                source_entities_data[entity_name] = node_data
 
             # 2. Check if target entity exists and get its data if it does
-            target_exists = await chunk_entity_relation_graph.has_node(target_entity)
-            existing_target_entity_data = {}
+            target_exists = target_entity in nodes
             if target_exists:
-                existing_target_entity_data = (
-                    await chunk_entity_relation_graph.get_node(target_entity)
-                )
                 logger.info(
                     f"Target entity '{target_entity}' already exists, will merge data"
                 )
 
             # 3. Merge entity data
             merged_entity_data = _merge_entity_attributes(
-                list(source_entities_data.values())
-                + ([existing_target_entity_data] if target_exists else []),
+                [nodes[entity_name] for entity_name in source_entities]
+                + ([nodes[target_entity]] if target_exists else []),
                 merge_strategy,
             )
 
@@ -716,40 +773,65 @@ async def amerge_entities(
             for key, value in target_entity_data.items():
                 merged_entity_data[key] = value
 
-            # 4. Get all relationships of the source entities
-            all_relations = []
-            for entity_name in source_entities:
-                # Get all relationships of the source entities
-                edges = await chunk_entity_relation_graph.get_node_edges(entity_name)
-                if edges:
-                    for src, tgt in edges:
-                        # Ensure src is the current entity
-                        if src == entity_name:
-                            edge_data = await chunk_entity_relation_graph.get_edge(
-                                src, tgt
-                            )
-                            all_relations.append((src, tgt, edge_data))
-
-            # 5. Create or update the target entity
+            # 4. Create or update the target entity
             merged_entity_data["entity_id"] = target_entity
-            if not target_exists:
-                await chunk_entity_relation_graph.upsert_node(
-                    target_entity, merged_entity_data
-                )
-                logger.info(f"Created new target entity '{target_entity}'")
-            else:
-                await chunk_entity_relation_graph.upsert_node(
-                    target_entity, merged_entity_data
+            await chunk_entity_relation_graph.upsert_node(
+                target_entity, merged_entity_data
+            )
+            logger.info(
+                f"{'Updated existing' if target_exists else 'Created new'} target entity '{target_entity}'"
+            )
+
+            # 5. Update entity vector representation
+            description = merged_entity_data.get("description", "")
+            await entities_vdb.upsert(
+                {
+                    compute_mdhash_id(target_entity, prefix="ent-"): {
+                        "content": target_entity + "\n" + description,
+                        "entity_name": target_entity,
+                        "source_id": merged_entity_data.get("source_id", ""),
+                        "description": description,
+                        "entity_type": merged_entity_data.get("entity_type", ""),
+                    }
+                }
+            )
+
+        await _run_locked(lock, merge_nodes)
+
+        # 6. Move the relationships of the source entities to the target entity,
+        # the moved relationships are removed so each chunk reads the remaining ones
+        moved: set[frozenset] = set()
+
+        async def move_relations() -> bool:
+            nodes_edges = await chunk_entity_relation_graph.get_nodes_edges_batch(
+                merged_entities
+            )
+            pairs: dict[frozenset, tuple[str, str]] = {}
+            for edges in nodes_edges.values():
+                for src, tgt in edges:
+                    pairs.setdefault(frozenset((src, tgt)), (src, tgt))
+            if not pairs:
+                return False
+            if set(pairs) <= moved:
+                logger.warning(
+                    f"Relationships of {merged_entities} were moved but still exist, stopping"
                 )
-                logger.info(f"Updated existing target entity '{target_entity}'")
+                return False
+            chunk = [pair for key, pair in pairs.items() if key not in moved]
+            chunk = chunk[:chunk_size] if chunk_size is not None else chunk
+            moved.update(frozenset(pair) for pair in chunk)
 
-            # 6. Recreate all relationships, pointing to the target entity
-            relation_updates = {}  # Track relationships that need to be merged
+            edges_data = await chunk_entity_relation_graph.get_edges_batch(
+                [{"src": src, "tgt": tgt} for src, tgt in chunk]
+            )
+            relation_updates: dict[tuple[str, str], dict[str, Any]] = {}
+            keys: dict[frozenset, tuple[str, str]] = {}
             relations_to_delete = []
-
-            for src, tgt, edge_data in all_relations:
-                relations_to_delete.append(compute_mdhash_id(src + tgt, prefix="rel-"))
-                relations_to_delete.append(compute_mdhash_id(tgt + src, prefix="rel-"))
+            for src, tgt in chunk:
+                relations_to_delete.extend(_relation_vdb_ids(src, tgt))
+                edge_data = edges_data.get((src, tgt))
+                if edge_data is None:
+                    continue
                 new_src = target_entity if src in source_entities else src
                 new_tgt = target_entity if tgt in source_entities else tgt
 
@@ -761,129 +843,79 @@ async def amerge_entities(
                     continue
 
                 # Check if the same relationship already exists
-                relation_key = f"{new_src}|{new_tgt}"
-                if relation_key in relation_updates:
-                    # Merge relationship data
-                    existing_data = relation_updates[relation_key]["data"]
-                    merged_relation = _merge_relation_attributes(
-                        [existing_data, edge_data],
-                        {
-                            "description": "concatenate",
-                            "keywords": "join_unique",
-                            "source_id": "join_unique",
-                            "weight": "max",
-                        },
+                key = keys.setdefault(frozenset((new_src, new_tgt)), (new_src, new_tgt))
+                if key in relation_updates:
+                    relation_updates[key] = _merge_relation_attributes(
+                        [relation_updates[key], edge_data], _RELATION_MERGE_STRATEGY
                     )
-                    relation_updates[relation_key]["data"] = merged_relation
                     logger.info(
                         f"Merged duplicate relationship: {new_src} -> {new_tgt}"
                     )
                 else:
-                    relation_updates[relation_key] = {
-                        "src": new_src,
-                        "tgt": new_tgt,
-                        "data": edge_data.copy(),
-                    }
-
-            # Apply relationship updates
-            for rel_data in relation_updates.values():
-                await chunk_entity_relation_graph.upsert_edge(
-                    rel_data["src"], rel_data["tgt"], rel_data["data"]
-                )
-                logger.info(
-                    f"Created or updated relationship: {rel_data['src']} -> {rel_data['tgt']}"
-                )
-
-                # Delete relationships records from vector database
-                await relationships_vdb.delete(relations_to_delete)
-                logger.info(
-                    f"Deleted {len(relations_to_delete)} relation records for entity from vector database"
-                )
-
-            # 7. Update entity vector representation
-            description = merged_entity_data.get("description", "")
-            source_id = merged_entity_data.get("source_id", "")
-            entity_type = merged_entity_data.get("entity_type", "")
-            content = target_entity + "\n" + description
+                    relation_updates[key] = dict(edge_data)
 
-            entity_id = compute_mdhash_id(target_entity, prefix="ent-")
-            entity_data_for_vdb = {
-                entity_id: {
-                    "content": content,
-                    "entity_name": target_entity,
-                    "source_id": source_id,
-                    "description": description,
-                    "entity_type": entity_type,
-                }
-            }
-
-            await entities_vdb.upsert(entity_data_for_vdb)
-
-            # 8. Update relationship vector representations
-            for rel_data in relation_updates.values():
-                src = rel_data["src"]
-                tgt = rel_data["tgt"]
-                edge_data = rel_data["data"]
-
-                description = edge_data.get("description", "")
-                keywords = edge_data.get("keywords", "")
-                source_id = edge_data.get("source_id", "")
-                weight = float(edge_data.get("weight", 1.0))
-
-                content = f"{keywords}\t{src}\n{tgt}\n{description}"
-                relation_id = compute_mdhash_id(src + tgt, prefix="rel-")
-
-                relation_data_for_vdb = {
-                    relation_id: {
-                        "content": content,
-                        "src_id": src,
-                        "tgt_id": tgt,
-                        "source_id": source_id,
-                        "description": description,
-                        "keywords": keywords,
-                        "weight": weight,
-                    }
-                }
-
-                await relationships_vdb.upsert(relation_data_for_vdb)
-
-            # 9. Delete source entities
-            for entity_name in source_entities:
-                if entity_name == target_entity:
-                    logger.info(
-                        f"Skipping deletion of '{entity_name}' as it's also the target entity"
+            # Merge with the relationships the target entity already has
+            existing = await chunk_entity_relation_graph.get_edges_batch(
+                [{"src": src, "tgt": tgt} for src, tgt in relation_updates]
+            )
+            for key, edge_data in existing.items():
+                if key in relation_updates and edge_data.get("description"):
+                    relation_updates[key] = _merge_relation_attributes(
+                        [edge_data, relation_updates[key]], _RELATION_MERGE_STRATEGY
                     )
-                    continue
 
-                # Delete entity node from knowledge graph
-                await chunk_entity_relation_graph.delete_node(entity_name)
+            # Apply relationship updates, with a single embedding batch
+            await chunk_entity_relation_graph.remove_edges(chunk)
+            if relation_updates:
+                await chunk_entity_relation_graph.upsert_edges_batch(relation_updates)
+            await relationships_vdb.delete(relations_to_delete)
+            if relation_updates:
+                await relationships_vdb.upsert(_relation_vdb_data(relation_updates))
+            logger.info(
+                f"Moved {len(chunk)} relationships to '{target_entity}' ({len(moved)} so far)"
+            )
+            return True
 
-                # Delete entity record from vector database
-                entity_id = compute_mdhash_id(entity_name, prefix="ent-")
-                await entities_vdb.delete([entity_id])
+        while await _run_locked(lock, move_relations):
+            pass
 
+        # 7. Delete source entities
+        async def delete_sources() -> None:
+            if target_entity in source_entities:
                 logger.info(
-                    f"Deleted source entity '{entity_name}' and its vector embedding from database"
+                    f"Skipping deletion of '{target_entity}' as it's also the target entity"
                 )
+            await chunk_entity_relation_graph.remove_nodes(merged_entities)
+            await entities_vdb.delete(
+                [
+                    compute_mdhash_id(entity_name, prefix="ent-")
+                    for entity_name in merged_entities
+                ]
+            )
+            logger.info(
+                f"Deleted source entities {merged_entities} and their vector embeddings from database"
+            )
 
-            # 10. Save changes
+            # 8. Save changes
             await _merge_entities_done(
                 entities_vdb, relationships_vdb, chunk_entity_relation_graph
             )
 
-            logger.info(
-                f"Successfully merged {len(source_entities)} entities into '{target_entity}'"
-            )
-            return await get_entity_info(
-                chunk_entity_relation_graph,
-                entities_vdb,
-                target_entity,
-                include_vector_data=True,
-            )
+        await _run_locked(lock, delete_sources)
 
-        except Exception as e:
-            logger.error(f"Error merging entities: {e}")
-            raise
+        logger.info(
+            f"Successfully merged {len(source_entities)} entities into '{target_entity}'"
+        )
+        return await get_entity_info(
+            chunk_entity_relation_graph,
+            entities_vdb,
+            target_entity,
+            include_vector_data=True,
+        )
+
+    except Exception as e:
+        logger.error(f"Error merging entities: {e}")
+        raise
 
 
 def _merge_entity_attributes(
@@ -1064,3 +1096,377 @@ async def get_relation_info(
         result["vector_data"] = vector_data
 
     return result
+
+
+def project_knowledge_graph(
+    knowledge_graph: KnowledgeGraph, properties: list[str]
+) -> KnowledgeGraph:
+    """Copy a knowledge graph keeping only the given node and edge properties
+
+    Args:
+        knowledge_graph: The knowledge graph to project
+        properties: Names of the properties to keep, e.g. the ones shown by the web UI
+    """
+    keys = set(properties)
+    return KnowledgeGraph(
+        nodes=[
+            KnowledgeGraphNode(
+                id=node.id,
+                labels=node.labels,
+                properties={k: v for k, v in node.properties.items() if k in keys},
+            )
+            for node in knowledge_graph.nodes
+        ],
+        edges=[
+            KnowledgeGraphEdge(
+                id=edge.id,
+                type=edge.type,
+                source=edge.source,
+                target=edge.target,
+                properties={k: v for k, v in edge.properties.items() if k in keys},
+            )
+            for edge in knowledge_graph.edges
+        ],
+        is_truncated=knowledge_graph.is_truncated,
+    )
+
+
+# Bulk export and import of the knowledge graph
+#
+# The graph is streamed page by page with iter_nodes/iter_edges and written as it
+# is read, an import reads the file page by page and upserts each page with the
+# batch graph and vector storage APIs, the memory used does not grow with the graph.
+#
+# jsonl: one file, an {"type": "entity" | "relation", ...} object per line
+# parquet: a directory with entities.parquet and relations.parquet, graph and vector
+# data are stored as JSON strings
+
+GRAPH_EXPORT_FORMATS = ("jsonl", "parquet")
+
+_GRAPH_EXPORT_COLUMNS = {
+    "entity": ("entity_name", "data", "vector_data"),
+    "relation": ("src_id", "tgt_id", "data", "vector_data"),
+}
+
+
+def _vector_metadata(record: dict[str, Any] | None) -> dict[str, Any] | None:
+    """The metadata of a vector storage record, without the vector itself"""
+    if record is None:
+        return None
+    return {
+        k: v
+        for k, v in record.items()
+        if k not in ("vector", "__vector__") and not isinstance(v, np.ndarray)
+    }
+
+
+class _JsonlGraphWriter:
+    def __init__(self, output_path: str):
+        self._file = open(output_path, "w", encoding="utf-8")
+
+    def write(self, kind: str, rows: list[dict[str, Any]]) -> None:
+        for row in rows:
+            self._file.write(
+                json.dumps({"type": kind, **row}, ensure_ascii=False, default=str)
+                + "\n"
+            )
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetGraphWriter:
+    def __init__(self, output_path: str):
+        if not pm.is_installed("pyarrow"):
+            pm.install("pyarrow")
+        import pyarrow as pa  # type: ignore
+        import pyarrow.parquet as pq  # type: ignore
+
+        self._pa, self._pq = pa, pq
+        self._output_path = output_path
+        os.makedirs(output_path, exist_ok=True)
+        self._writers = {}
+
+    def _schema(self, kind: str):
+        return self._pa.schema(
+            [(column, self._pa.string()) for column in _GRAPH_EXPORT_COLUMNS[kind]]
+        )
+
+    def write(self, kind: str, rows: list[dict[str, Any]]) -> None:
+        if kind not in self._writers:
+            self._writers[kind] = self._pq.ParquetWriter(
+                os.path.join(self._output_path, f"{kind}s.parquet"), self._schema(kind)
+            )
+        columns = {
+            column: [
+                row[column]
+                if column not in ("data", "vector_data")
+                else json.dumps(row[column], ensure_ascii=False, default=str)
+                for row in rows
+            ]
+            for column in _GRAPH_EXPORT_COLUMNS[kind]
+        }
+        self._writers[kind].write_table(
+            self._pa.table(columns, schema=self._schema(kind))
+        )
+
+    def close(self) -> None:
+        for kind in _GRAPH_EXPORT_COLUMNS:
+            # Files of empty graphs are written too
+            if kind not in self._writers:
+                self._pq.write_table(
+                    self._schema(kind).empty_table(),
+                    os.path.join(self._output_path, f"{kind}s.parquet"),
+                )
+        for writer in self._writers.values():
+            writer.close()
+
+
+def _read_graph_rows(
+    input_path: str, file_format: str, kind: str, batch_size: int
+) -> Iterator[list[dict[str, Any]]]:
+    """Read the entity or relation rows of an export, in pages of batch_size rows"""
+    if file_format == "jsonl":
+        with open(input_path, encoding="utf-8") as f:
+            rows = []
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if row.pop("type", None) != kind:
+                    continue
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    yield rows
+                    rows = []
+            if rows:
+                yield rows
+        return
+
+    if not pm.is_installed("pyarrow"):
+        pm.install("pyarrow")
+    import pyarrow.parquet as pq  # type: ignore
+
+    parquet_file = pq.ParquetFile(os.path.join(input_path, f"{kind}s.parquet"))
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        rows = batch.to_pylist()
+        for row in rows:
+            row["data"] = json.loads(row["data"])
+            row["vector_data"] = json.loads(row["vector_data"] or "null")
+        yield rows
+
+
+async def aexport_graph(
+    chunk_entity_relation_graph,
+    entities_vdb,
+    relationships_vdb,
+    output_path: str,
+    file_format: str = "jsonl",
+    include_vector_data: bool = False,
+    batch_size: int = 1000,
+    progress_callback: Callable[[str, int], None] | None = None,
+) -> dict[str, int]:
+    """Export all entities and relations, streaming them page by page
+
+    Args:
+        chunk_entity_relation_graph: Graph storage instance
+        entities_vdb: Vector database storage for entities
+        relationships_vdb: Vector database storage for relationships
+        output_path: File (jsonl) or directory (parquet) to write
+        file_format: "jsonl" or "parquet"
+        include_vector_data: Also export the metadata of the vector storage records
+        batch_size: Nodes or edges read, looked up and written at once
+        progress_callback: Called with ("entities" | "relations", count exported)
+
+    Returns:
+        The number of exported entities and relations
+    """
+    if file_format not in GRAPH_EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    writer = (
+        _JsonlGraphWriter(output_path)
+        if file_format == "jsonl"
+        else _ParquetGraphWriter(output_path)
+    )
+    counts = {"entities": 0, "relations": 0}
+    try:
+        async for nodes in chunk_entity_relation_graph.iter_nodes(batch_size):
+            vector_data = {}
+            if include_vector_data:
+                records = await entities_vdb.get_by_ids(
+                    [compute_mdhash_id(name, prefix="ent-") for name in nodes]
+                )
+                vector_data = {
+                    record.get("entity_name"): _vector_metadata(record)
+                    for record in records
+                    if record
+                }
+            rows = [
+                {
+                    "entity_name": name,
+                    "data": data,
+                    "vector_data": vector_data.get(name),
+                }
+                for name, data in nodes.items()
+            ]
+            await asyncio.to_thread(writer.write, "entity", rows)
+            counts["entities"] += len(rows)
+            logger.info(f"Exported {counts['entities']} entities")
+            if progress_callback:
+                progress_callback("entities", counts["entities"])
+
+        async for edges in chunk_entity_relation_graph.iter_edges(batch_size):
+            vector_data = {}
+            if include_vector_data:
+                # The relation may be stored in either direction
+                ids = {}
+                for src_id, tgt_id in edges:
+                    ids[compute_mdhash_id(src_id + tgt_id, prefix="rel-")] = (
+                        src_id,
+                        tgt_id,
+                    )
+                    ids[compute_mdhash_id(tgt_id + src_id, prefix="rel-")] = (
+                        src_id,
+                        tgt_id,
+                    )
+                records = await relationships_vdb.get_by_ids(list(ids))
+                for record in records:
+                    record_id = (
+                        record.get("__id__", record.get("id")) if record else None
+                    )
+                    if record_id in ids:
+                        vector_data[ids[record_id]] = _vector_metadata(record)
+            rows = [
+                {
+                    "src_id": src_id,
+                    "tgt_id": tgt_id,
+                    "data": data,
+                    "vector_data": vector_data.get((src_id, tgt_id)),
+                }
+                for (src_id, tgt_id), data in edges.items()
+            ]
+            await asyncio.to_thread(writer.write, "relation", rows)
+            counts["relations"] += len(rows)
+            logger.info(f"Exported {counts['relations']} relations")
+            if progress_callback:
+                progress_callback("relations", counts["relations"])
+    finally:
+        await asyncio.to_thread(writer.close)
+
+    logger.info(
+        f"Exported {counts['entities']} entities and {counts['relations']} relations to {output_path}"
+    )
+    return counts
+
+
+async def aimport_graph(
+    chunk_entity_relation_graph,
+    entities_vdb,
+    relationships_vdb,
+    input_path: str,
+    file_format: str = "jsonl",
+    batch_size: int = 1000,
+    progress_callback: Callable[[str, int], None] | None = None,
+) -> dict[str, int]:
+    """Import entities and relations exported by aexport_graph
+
+    Each page of entities or relations is upserted with one batch call to the graph
+    and one to the vector storage, existing entities and relations are updated.
+
+    Args:
+        chunk_entity_relation_graph: Graph storage instance
+        entities_vdb: Vector database storage for entities
+        relationships_vdb: Vector database storage for relationships
+        input_path: File (jsonl) or directory (parquet) to read
+        file_format: "jsonl" or "parquet"
+        batch_size: Entities or relations read and upserted at once
+        progress_callback: Called with ("entities" | "relations", count imported)
+
+    Returns:
+        The number of imported entities and relations
+    """
+    if file_format not in GRAPH_EXPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {file_format}")
+    counts = {"entities": 0, "relations": 0}
+    graph_db_lock = get_graph_db_lock(enable_logging=False)
+    # The lock is held per page, indexing and entity edits run between the pages
+    try:
+        rows_iter = _read_graph_rows(input_path, file_format, "entity", batch_size)
+        while rows := await asyncio.to_thread(next, rows_iter, None):
+            nodes = {row["entity_name"]: row["data"] for row in rows}
+            entities_data = {}
+            for row in rows:
+                name, data = row["entity_name"], row["data"]
+                description = data.get("description", "")
+                vector_data = row.get("vector_data") or {}
+                entities_data[compute_mdhash_id(name, prefix="ent-")] = {
+                    "content": vector_data.get("content") or f"{name}\n{description}",
+                    "entity_name": name,
+                    "source_id": data.get("source_id", ""),
+                    "description": description,
+                    "entity_type": data.get("entity_type", "UNKNOWN"),
+                    "file_path": data.get("file_path", "custom_kg"),
+                }
+            # Use graph database lock to ensure atomic graph and vector db operations
+            async with graph_db_lock:
+                await chunk_entity_relation_graph.upsert_nodes_batch(nodes)
+                await entities_vdb.upsert(entities_data)
+            counts["entities"] += len(rows)
+            logger.info(f"Imported {counts['entities']} entities")
+            if progress_callback:
+                progress_callback("entities", counts["entities"])
+
+        rows_iter = _read_graph_rows(input_path, file_format, "relation", batch_size)
+        while rows := await asyncio.to_thread(next, rows_iter, None):
+            edges = {(row["src_id"], row["tgt_id"]): row["data"] for row in rows}
+            relationships_data = {}
+            for row in rows:
+                src_id, tgt_id, data = row["src_id"], row["tgt_id"], row["data"]
+                keywords = data.get("keywords", "")
+                description = data.get("description", "")
+                vector_data = row.get("vector_data") or {}
+                relationships_data[
+                    compute_mdhash_id(src_id + tgt_id, prefix="rel-")
+                ] = {
+                    "src_id": src_id,
+                    "tgt_id": tgt_id,
+                    "source_id": data.get("source_id", ""),
+                    "content": vector_data.get("content")
+                    or f"{keywords}\t{src_id}\n{tgt_id}\n{description}",
+                    "keywords": keywords,
+                    "description": description,
+                    "weight": data.get("weight", 1.0),
+                    "file_path": data.get("file_path", "custom_kg"),
+                }
+            # Relations may reference entities which were not exported
+            endpoints = list({node for edge in edges for node in edge})
+            async with graph_db_lock:
+                existing = await chunk_entity_relation_graph.get_nodes_batch(endpoints)
+                missing = {
+                    node_id: {
+                        "entity_id": node_id,
+                        "source_id": "UNKNOWN",
+                        "description": "UNKNOWN",
+                        "entity_type": "UNKNOWN",
+                    }
+                    for node_id in endpoints
+                    if node_id not in existing
+                }
+                if missing:
+                    await chunk_entity_relation_graph.upsert_nodes_batch(missing)
+                await chunk_entity_relation_graph.upsert_edges_batch(edges)
+                await relationships_vdb.upsert(relationships_data)
+            counts["relations"] += len(rows)
+            logger.info(f"Imported {counts['relations']} relations")
+            if progress_callback:
+                progress_callback("relations", counts["relations"])
+    finally:
+        async with graph_db_lock:
+            await _edit_entity_done(
+                entities_vdb, relationships_vdb, chunk_entity_relation_graph
+            )
+
+    logger.info(
+        f"Imported {counts['entities']} entities and {counts['relations']} relations from {input_path}"
+    )
+    return counts